@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Antirrebote de eventos de enlace por puerto.
+Cada puerto tiene una máquina de estados que espera una ventana sin eventos nuevos
+antes de actuar: una secuencia linkDown/linkUp se reduce a su estado final, el trabajo
+pendiente que queda obsoleto se cancela y se cuentan los eventos suprimidos.
+"""
+
+import sys
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_utils import log
+from access_control import metricas
+
+VENTANA_ANTIRREBOTE = 3.0  # segundos sin eventos nuevos antes de actuar sobre un puerto
+
+# Fases de la máquina de estados de un puerto
+FASE_REPOSO = "reposo"
+FASE_ESPERA = "espera"  # dentro de la ventana de antirrebote
+FASE_TRABAJANDO = "trabajando"  # resolviendo MAC o esperando lote: cancelable
+FASE_APLICANDO = "aplicando"  # configurando el switch: no se interrumpe
+
+class EstadoPuerto:
+    """Estado de un puerto en la máquina de antirrebote."""
+
+    __slots__ = ('fase', 'accion', 'tarea', 'aplicado', 'macs_aplicadas', 'eventos', 'suprimidos', 'ultimo_evento')
+
+    def __init__(self):
+        self.fase = FASE_REPOSO
+        self.accion = None  # última acción recibida
+        self.tarea = None  # tarea que procesa la última acción
+        self.aplicado = None  # (acción, detalle) aplicado por última vez; None si se desconoce
+        self.macs_aplicadas = frozenset()  # MACs autorizadas en el puerto por la última aplicación
+        self.eventos = 0
+        self.suprimidos = 0
+        self.ultimo_evento = 0.0
+
+class AntirrebotePuertos:
+    """Máquinas de estado de antirrebote de todos los puertos, en el event loop del daemon."""
+
+    def __init__(self, ventana: float = VENTANA_ANTIRREBOTE):
+        self.ventana = ventana
+        self.puertos = {}  # clave (ip, ifIndex) -> EstadoPuerto
+        self.suprimidos = metricas.contador(
+            "antirrebote_eventos_suprimidos_total",
+            "Eventos de enlace sustituidos por otro posterior dentro de la ventana")
+        self.cancelados = metricas.contador(
+            "antirrebote_trabajos_cancelados_total",
+            "Trabajos pendientes cancelados por un evento posterior del mismo puerto")
+        self.sin_cambios_total = metricas.contador(
+            "antirrebote_aplicaciones_omitidas_total",
+            "Estados finales iguales al ya aplicado que no se vuelven a aplicar")
+
+    def notificar(self, clave: Hashable, accion: str, trabajo: Callable[[], Awaitable]) -> bool:
+        """
+        Registra un evento del puerto. `trabajo` se ejecuta cuando pasa la ventana sin
+        eventos nuevos; si llega otro antes, este evento se suprime.
+
+        Returns:
+            bool: True si se canceló el trabajo pendiente de un evento anterior (en
+            FASE_APLICANDO no se cancela: ese evento termina por sí mismo).
+        """
+        estado = self.puertos.setdefault(clave, EstadoPuerto())
+        estado.eventos += 1
+        estado.ultimo_evento = time.time()
+        estado.accion = accion
+
+        # En FASE_APLICANDO la tarea anterior no se interrumpe: la nueva espera a que termine
+        anterior = estado.tarea if estado.tarea is not None and not estado.tarea.done() else None
+        cancelado = anterior is not None and estado.fase in (FASE_ESPERA, FASE_TRABAJANDO)
+        if anterior is not None and estado.fase == FASE_ESPERA:
+            anterior.cancel()
+            estado.suprimidos += 1
+            self.suprimidos.incrementar()
+        elif anterior is not None and estado.fase == FASE_TRABAJANDO:
+            anterior.cancel()
+            estado.suprimidos += 1
+            self.cancelados.incrementar()
+            # El trabajo cancelado pudo llegar a aplicarse: el estado real es desconocido
+            estado.aplicado = None
+            estado.macs_aplicadas = frozenset()
+            log(f"Trabajo pendiente en {clave} cancelado por un evento {accion} posterior", "DEBUG")
+
+        estado.fase = FASE_ESPERA
+        estado.tarea = asyncio.create_task(
+            self._ejecutar(clave, estado, anterior, trabajo), name=f"Puerto-{clave[-1]}")
+        return cancelado
+
+    async def _ejecutar(self, clave, estado: EstadoPuerto, anterior: Optional[asyncio.Task],
+                        trabajo: Callable[[], Awaitable]) -> None:
+        try:
+            await asyncio.sleep(self.ventana)
+            if anterior is not None and not anterior.done():
+                await asyncio.wait([anterior])
+            estado.fase = FASE_TRABAJANDO
+            await trabajo()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log(f"ERROR procesando evento de {clave}: {str(e)}", "ERROR")
+        finally:
+            if estado.tarea is asyncio.current_task():
+                estado.fase = FASE_REPOSO
+                estado.tarea = None
+
+    def marcar_aplicando(self, clave: Hashable) -> None:
+        """Indica que el trabajo del puerto ha empezado a configurar el switch y no debe cancelarse."""
+        estado = self.puertos.get(clave)
+        if estado is not None and estado.tarea is asyncio.current_task():
+            estado.fase = FASE_APLICANDO
+
+    def sin_cambios(self, clave: Hashable, accion: str, detalle: Hashable = None) -> bool:
+        """
+        True si el estado final del puerto coincide con el último aplicado. `detalle`
+        identifica lo aplicado (en una conexión: VLAN y MACs autorizadas).
+        """
+        estado = self.puertos.get(clave)
+        if estado is None or estado.aplicado != (accion, detalle):
+            return False
+        self.sin_cambios_total.incrementar()
+        return True
+
+    def en_curso(self, clave: Hashable) -> bool:
+        """True si el puerto tiene un trabajo pendiente o en curso."""
+        estado = self.puertos.get(clave)
+        return estado is not None and estado.tarea is not None
+
+    def atendido(self, clave: Hashable, accion: str, mac: Optional[str] = None) -> bool:
+        """
+        True si el puerto tiene un trabajo pendiente o en curso, o si la última aplicación
+        fue `accion` y ya autorizó `mac`.
+        """
+        estado = self.puertos.get(clave)
+        if estado is None:
+            return False
+        if estado.tarea is not None:
+            return True
+        return (estado.aplicado is not None and estado.aplicado[0] == accion
+                and (mac is None or mac in estado.macs_aplicadas))
+
+    def registrar_aplicado(self, clave: Hashable, accion: str, detalle: Hashable = None,
+                           macs: Iterable[str] = ()) -> None:
+        """Registra el estado aplicado al puerto (None en `accion` si el resultado es incierto)."""
+        estado = self.puertos.get(clave)
+        if estado is not None:
+            estado.aplicado = (accion, detalle) if accion else None
+            estado.macs_aplicadas = frozenset(macs) if accion else frozenset()
+
+    def obtener_estadisticas(self, max_puertos: int = 5) -> Dict:
+        """Resumen de eventos suprimidos, con los puertos más inestables."""
+        inestables = sorted(self.puertos.items(), key=lambda e: e[1].suprimidos, reverse=True)
+        return {
+            'puertos': len(self.puertos),
+            'eventos_suprimidos': self.suprimidos.valor,
+            'trabajos_cancelados': self.cancelados.valor,
+            'aplicaciones_omitidas': self.sin_cambios_total.valor,
+            'puertos_inestables': {
+                f"{clave[0]}#{clave[1]}": estado.suprimidos
+                for clave, estado in inestables[:max_puertos] if estado.suprimidos
+            },
+        }
@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+
+"""
+Aprovisionamiento por lotes de puertos de switch.
+Agrupa las conexiones/desconexiones pendientes de cada switch durante una ventana
+corta y las aplica en una sola ejecución del backend, informando del resultado de
+cada puerto al evento que lo solicitó. Todos los backends comparan el lote con el
+modelo de la configuración en ejecución del switch (reconciliador) y solo envían las
+líneas que faltan.
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import ipaddress
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control import metricas
+from access_control.snmp_utils import log
+from access_control import reconciliador
+from access_control.reconciliador import (ModeloSwitch, COMANDOS_MODELO, interpretar_configuracion,
+                                          lineas_vlan, lineas_svi, lineas_puerto, actualizar_modelo)
+from access_control.sesion_cli import PoolSesionesCLI, ErrorSesionCLI, PROMPT_CLI, ERROR_CLI
+from access_control.configuracion import PUERTO_CLI
+from access_control.vlans_conocidas import vlan_existente, registrar_vlan
+
+# Rutas
+BASE_DIR = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"
+INVENTORY_FILE = os.path.join(BASE_DIR, "inventory/inventory.yml")
+GROUP_VARS_DIR = os.path.join(BASE_DIR, "inventory/group_vars")
+PLAYBOOK_LOTE = "playbooks/aprovisionar_lote.yml"
+PLAYBOOK_LECTURA = "playbooks/leer_configuracion.yml"
+
+# Backend de aprovisionamiento: "ansible" (ansible-playbook), "cli" (sesiones SSH persistentes)
+# o "simulado" (CLI de los switches de simulador_snmp.py)
+BACKEND_APROVISIONAMIENTO = os.environ.get("BACKEND_APROVISIONAMIENTO", "ansible")
+
+VENTANA_LOTE = 2.0  # segundos que se esperan cambios adicionales del mismo switch
+MAX_ITEMS_LOTE = 48  # un lote lleno se aplica sin esperar al final de la ventana
+TIMEOUT_LOTE = 300  # segundos
+
+metrica_lotes = metricas.histograma_etiquetado(
+    "aprovisionamiento_lote_segundos", "Aplicación de un lote por el backend", ("switch", "backend"),
+    metricas.LIMITES_RED)
+metrica_puertos_lote = metricas.contador_etiquetado(
+    "aprovisionamiento_puertos_total", "Puertos aplicados en lotes por resultado", ("switch", "backend", "resultado"))
+
+def cargar_inventario() -> Dict[str, Dict]:
+    """
+    Carga los hosts del inventario de Ansible con sus variables.
+
+    Returns:
+        dict: nombre de host -> variables del host.
+    """
+    with open(INVENTORY_FILE) as f:
+        inventario = yaml.safe_load(f) or {}
+
+    hosts = {}
+    def recorrer(grupo):
+        for nombre, variables in (grupo.get('hosts') or {}).items():
+            hosts[nombre] = variables or {}
+        for subgrupo in (grupo.get('children') or {}).values():
+            recorrer(subgrupo or {})
+    for grupo in inventario.values():
+        recorrer(grupo or {})
+    return hosts
+
+def host_inventario_por_ip(ip: str) -> Optional[str]:
+    """
+    Devuelve el nombre de host del inventario cuyo ansible_host coincide con la IP.
+    La comparación se hace sobre la dirección normalizada (mayúsculas, ceros, ::).
+    """
+    try:
+        buscada = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    try:
+        hosts = cargar_inventario()
+    except Exception as e:
+        log(f"Error cargando inventario: {str(e)}", "ERROR")
+        return None
+    for nombre, variables in hosts.items():
+        try:
+            if ipaddress.ip_address(str(variables.get('ansible_host', ''))) == buscada:
+                return nombre
+        except ValueError:
+            continue
+    return None
+
+def cargar_variables_grupo(*grupos: str) -> Dict:
+    """Carga y combina las variables de inventory/group_vars de los grupos indicados."""
+    variables = {}
+    for grupo in grupos:
+        ruta = os.path.join(GROUP_VARS_DIR, f"{grupo}.yml")
+        if os.path.exists(ruta):
+            with open(ruta) as f:
+                variables.update(yaml.safe_load(f) or {})
+    return variables
+
+def credenciales_por_ip(ip: str) -> Dict:
+    """Devuelve host, usuario y contraseña del inventario para el switch con esa IP."""
+    nombre = host_inventario_por_ip(ip)
+    if nombre is None:
+        raise ValueError(f"Switch {ip} no encontrado en el inventario")
+    variables = cargar_inventario()[nombre]
+    return {
+        'host': str(variables.get('ansible_host', ip)),
+        'usuario': variables.get('ansible_user'),
+        'password': variables.get('ansible_password'),
+    }
+
+def bloques_lote(items: List[Dict], variables: Dict,
+                 modelo: ModeloSwitch) -> List[Tuple[object, str, List[str]]]:
+    """
+    Genera los bloques de configuración del lote con las mismas líneas que los roles
+    switch_vlan_dhcp, switch_mac_control y limpiar_puerto. Frente al modelo del switch
+    (reconciliador), que se lee antes del lote, cada bloque lleva solo las líneas que
+    faltan y se omiten los que ya están en el estado pedido. Las VLANs que el agrupador
+    encontró en el registro de vlans_conocidas.py (items con `vlan_conocida`) no generan
+    bloques de VLAN ni de interfaz Vlan, como en el camino por puerto.
+
+    Returns:
+        Lista de (clave, línea padre, líneas). La clave es el interface_name del puerto
+        o el id de la VLAN.
+    """
+    vlans_lote = {int(item['vlan_id']) for item in items
+                  if item['accion'] == 'conectar' and item.get('vlan_id') is not None
+                  and not item.get('vlan_conocida')}
+    vlans = [vlan for vlan in variables.get('vlans_switch', []) if int(vlan['id']) in vlans_lote]
+
+    candidatos = []
+    for vlan in vlans:
+        candidatos.append((int(vlan['id']), f"vlan {vlan['id']}", lineas_vlan(vlan, modelo)))
+    for vlan in vlans:
+        candidatos.append((int(vlan['id']), f"interface Vlan{vlan['id']}", lineas_svi(int(vlan['id']), [
+            f"ipv6 address {vlan['vlan_ipv6_address']}/64",
+            "ipv6 enable",
+            "ipv6 nd managed-config-flag",
+            f"ipv6 dhcp relay destination {variables.get('router_ipv6')}",
+            "no shutdown",
+        ], modelo)))
+    for item in items:
+        estado = modelo.estado_puerto(item['interface_name'])
+        candidatos.append((item['interface_name'], f"interface {item['interface_name']}", lineas_puerto(item, estado)))
+
+    bloques = [bloque for bloque in candidatos if bloque[2]]
+    reconciliador.metrica_omitidos.incrementar(len(candidatos) - len(bloques))
+    reconciliador.metrica_lineas.incrementar(sum(len(lineas) for _, _, lineas in bloques))
+    return bloques
+
+def resultados_bloques(items: List[Dict], bloques: List[Tuple[object, str, List[str]]],
+                       salidas: List[Tuple[bool, str]]) -> Dict[str, Tuple[bool, str]]:
+    """
+    Resultado de cada puerto del lote a partir del resultado de cada bloque de bloques_lote:
+    un puerto falla si falla su bloque o el de la VLAN que se le asigna, y un puerto sin
+    bloque propio ya estaba configurado ("sin cambios").
+    """
+    fallos_puerto = {}
+    fallos_vlan = {}
+    con_bloque = {clave for clave, _, _ in bloques}
+    for (clave, padre, _), (ok, salida) in zip(bloques, salidas):
+        if ok:
+            continue
+        mensaje = f"{padre}: {salida.strip()[-300:]}"
+        if isinstance(clave, int):
+            fallos_vlan[clave] = mensaje
+        else:
+            fallos_puerto[clave] = mensaje
+
+    resultados = {}
+    for item in items:
+        fallo = fallos_puerto.get(item['interface_name'])
+        if fallo is None and item['accion'] == 'conectar' and item.get('vlan_id') is not None:
+            fallo = fallos_vlan.get(int(item['vlan_id']))
+        if fallo:
+            resultados[item['interface_name']] = (False, fallo)
+        else:
+            resultados[item['interface_name']] = (True, "ok" if item['interface_name'] in con_bloque else "sin cambios")
+    return resultados
+
+class ErrorPlaybook(Exception):
+    """Fallo de una ejecución de ansible-playbook (timeout, salida no interpretable, switch inalcanzable)."""
+
+class BackendAnsible:
+    """
+    Aplica lotes con una única ejecución de playbooks/aprovisionar_lote.yml. Como los
+    backends con sesión CLI, compara el lote con el modelo del switch (reconciliador), que
+    se lee con playbooks/leer_configuracion.yml cuando no hay uno vigente, y el playbook
+    solo recibe las líneas que faltan: un puerto ya configurado o ya limpio no se toca y
+    se informa como "sin cambios", y las MACs seguras que sobran se retiran.
+    """
+
+    nombre = "ansible"
+
+    async def aplicar_lote(self, switch_ip: str, items: List[Dict]) -> Dict[str, Tuple[bool, str]]:
+        """
+        Aplica el lote sobre el switch.
+
+        Returns:
+            dict: interface_name -> (éxito, detalle).
+        """
+        objetivo = host_inventario_por_ip(switch_ip)
+        if objetivo is None:
+            # Nunca se cae a un grupo: el lote de un switch se aplicaría en todos los del grupo
+            log(f"Lote de {len(items)} cambios descartado: {switch_ip} no está en el inventario", "ERROR")
+            return {item['interface_name']: (False, "switch no está en el inventario") for item in items}
+
+        log(f"Ejecutando lote de {len(items)} cambios en {objetivo} ({switch_ip})", "INFO")
+        bloques, salidas = [], []
+        modelo = None
+        try:
+            modelo = reconciliador.modelo_vigente(switch_ip)
+            if modelo is None:
+                modelo = await self._leer_modelo(objetivo)
+                reconciliador.guardar_modelo(switch_ip, modelo)
+            bloques = bloques_lote(items, cargar_variables_grupo("all", "switches"), modelo)
+            if bloques:
+                salida = await self._ejecutar(PLAYBOOK_LOTE, {
+                    'objetivo': objetivo,
+                    'bloques': [{'padre': padre, 'lineas': lineas} for _, padre, lineas in bloques],
+                })
+                salidas = [(not resultado.get('failed'), str(resultado.get('msg', "error")))
+                           for resultado in self._resultados_tarea(salida)][:len(bloques)]
+                salidas += [(False, "sin resultado del playbook")] * (len(bloques) - len(salidas))
+        except Exception as e:  # ErrorPlaybook o fallo al arrancar ansible-playbook
+            return {item['interface_name']: (False, str(e)) for item in items}
+        finally:
+            if modelo is not None and (len(salidas) < len(bloques)
+                                       or not actualizar_modelo(modelo, items, bloques, salidas)):
+                reconciliador.invalidar_modelo(switch_ip)
+        return resultados_bloques(items, bloques, salidas)
+
+    async def _leer_modelo(self, objetivo: str) -> ModeloSwitch:
+        """Lee la configuración en ejecución y la tabla de VLANs del switch."""
+        salida = await self._ejecutar(PLAYBOOK_LECTURA, {'objetivo': objetivo, 'comandos': list(COMANDOS_MODELO)})
+        resultados = self._resultados_tarea(salida)
+        if not resultados or resultados[0].get('failed') or len(resultados[0].get('stdout', [])) != len(COMANDOS_MODELO):
+            detalle = resultados[0].get('msg', "sin salida") if resultados else "sin salida"
+            raise ErrorPlaybook(f"no se pudo leer la configuración del switch: {detalle}")
+        return interpretar_configuracion(*resultados[0]['stdout'])
+
+    async def _ejecutar(self, playbook: str, variables: Dict) -> Dict:
+        """Ejecuta un playbook sobre un host con el callback json y devuelve su salida."""
+        env = os.environ.copy()
+        env["ANSIBLE_STDOUT_CALLBACK"] = "json"
+        proceso = await asyncio.create_subprocess_exec(
+            "ansible-playbook", playbook, "--extra-vars", json.dumps(variables),
+            cwd=BASE_DIR, env=env,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proceso.communicate(), TIMEOUT_LOTE)
+        except asyncio.TimeoutError:
+            proceso.kill()
+            await proceso.wait()
+            raise ErrorPlaybook("timeout del playbook")
+
+        stdout = stdout.decode(errors="replace")
+        try:
+            salida = json.loads(stdout[stdout.index("{"):])
+        except ValueError:
+            raise ErrorPlaybook(f"salida de ansible-playbook no interpretable (código {proceso.returncode}): "
+                                f"{stderr.decode(errors='replace').strip()[-300:]}")
+        if any(estadisticas.get('unreachable') for estadisticas in salida.get('stats', {}).values()):
+            raise ErrorPlaybook("switch inalcanzable")
+        return salida
+
+    @staticmethod
+    def _resultados_tarea(salida: Dict) -> List[Dict]:
+        """
+        Resultados de la única tarea de un playbook en la salida del callback json: uno
+        por elemento del bucle, en orden, o el de la propia tarea si no tiene bucle.
+        """
+        for play in salida.get('plays', []):
+            for tarea in play.get('tasks', []):
+                for resultado_host in tarea.get('hosts', {}).values():
+                    return resultado_host.get('results', [resultado_host])
+        return []
+
+class BackendCLI:
+    """
+    Aplica lotes por una sesión SSH persistente con cada switch, sin arrancar
+    ansible-playbook. Las sesiones se reutilizan entre lotes.
+    """
+
+    nombre = "cli"
+
+    def __init__(self, pool: Optional[PoolSesionesCLI] = None):
+        self.pool = pool or PoolSesionesCLI(credenciales_por_ip)
+
+    async def aplicar_lote(self, switch_ip: str, items: List[Dict]) -> Dict[str, Tuple[bool, str]]:
+        """
+        Aplica el lote sobre el switch.
+
+        Returns:
+            dict: interface_name -> (éxito, detalle).
+        """
+        log(f"Aplicando lote de {len(items)} cambios en {switch_ip} por sesión CLI", "INFO")
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self._aplicar_lote_sync, switch_ip, items), TIMEOUT_LOTE)
+        except asyncio.TimeoutError:
+            return {item['interface_name']: (False, "timeout de la sesión CLI") for item in items}
+        except Exception as e:
+            return {item['interface_name']: (False, str(e)) for item in items}
+
+    def _aplicar_lote_sync(self, switch_ip: str, items: List[Dict]) -> Dict[str, Tuple[bool, str]]:
+        variables = cargar_variables_grupo("all", "switches")
+
+        def operacion(sesion):
+            modelo = reconciliador.modelo_vigente(switch_ip)
+            if modelo is None:
+                modelo = interpretar_configuracion(*(sesion.comando(comando) for comando in COMANDOS_MODELO))
+                reconciliador.guardar_modelo(switch_ip, modelo)
+            bloques = bloques_lote(items, variables, modelo)
+            salidas = []
+            try:
+                salidas = sesion.aplicar_bloques([(padre, lineas) for _, padre, lineas in bloques]) if bloques else []
+            finally:
+                if len(salidas) < len(bloques) or not actualizar_modelo(modelo, items, bloques, salidas):
+                    reconciliador.invalidar_modelo(switch_ip)
+            return resultados_bloques(items, bloques, salidas)
+
+        return self.pool.ejecutar(switch_ip, operacion)
+
+class BackendSimulado:
+    """
+    Aplica lotes sobre los switches de simulador_snmp.py: las mismas líneas que el
+    backend CLI, enviadas a la CLI simulada por TCP (sin SSH ni credenciales).
+    """
+
+    nombre = "simulado"
+
+    def __init__(self, puerto: int = PUERTO_CLI, timeout: float = TIMEOUT_LOTE):
+        self.puerto = puerto
+        self.timeout = timeout
+
+    async def aplicar_lote(self, switch_ip: str, items: List[Dict]) -> Dict[str, Tuple[bool, str]]:
+        """
+        Aplica el lote sobre el switch simulado.
+
+        Returns:
+            dict: interface_name -> (éxito, detalle).
+        """
+        log(f"Aplicando lote de {len(items)} cambios en el switch simulado {switch_ip}", "INFO")
+        try:
+            return await asyncio.wait_for(
+                self._aplicar_items(switch_ip, items, cargar_variables_grupo("all", "switches")), self.timeout)
+        except asyncio.TimeoutError:
+            return {item['interface_name']: (False, "timeout de la CLI simulada") for item in items}
+        except (OSError, ErrorSesionCLI) as e:
+            return {item['interface_name']: (False, str(e)) for item in items}
+
+    async def _aplicar_items(self, switch_ip: str, items: List[Dict], variables: Dict) -> Dict[str, Tuple[bool, str]]:
+        reader, writer = await asyncio.open_connection(switch_ip, self.puerto)
+
+        async def comando(linea: str) -> str:
+            writer.write((linea + "\n").encode())
+            await writer.drain()
+            salida = ""
+            while not PROMPT_CLI.search(salida):
+                bloque = await reader.read(65535)
+                if not bloque:
+                    raise ErrorSesionCLI(f"Sesión cerrada por {switch_ip}")
+                salida += bloque.decode(errors="replace")
+            return salida
+
+        bloques, salidas = [], []
+        modelo = None
+        try:
+            await reader.readuntil(b"#")
+            modelo = reconciliador.modelo_vigente(switch_ip)
+            if modelo is None:
+                modelo = interpretar_configuracion(*[await comando(linea) for linea in COMANDOS_MODELO])
+                reconciliador.guardar_modelo(switch_ip, modelo)
+            bloques = bloques_lote(items, variables, modelo)
+            if bloques:
+                await comando("configure terminal")
+                for _, padre, lineas in bloques:
+                    salida = await comando(padre)
+                    for linea in lineas:
+                        salida += await comando(linea)
+                    salida += await comando("exit")
+                    salidas.append((not ERROR_CLI.search(salida), salida))
+                await comando("end")
+        finally:
+            writer.close()
+            if modelo is not None and (len(salidas) < len(bloques)
+                                       or not actualizar_modelo(modelo, items, bloques, salidas)):
+                reconciliador.invalidar_modelo(switch_ip)
+        return resultados_bloques(items, bloques, salidas)
+
+BACKENDS_APROVISIONAMIENTO = {
+    BackendAnsible.nombre: BackendAnsible,
+    BackendCLI.nombre: BackendCLI,
+    BackendSimulado.nombre: BackendSimulado,
+}
+
+backend_cli = None
+
+def crear_backend(nombre: str = None):
+    """Crea el backend de aprovisionamiento configurado (BACKEND_APROVISIONAMIENTO)."""
+    global backend_cli
+    nombre = nombre or BACKEND_APROVISIONAMIENTO
+    if nombre not in BACKENDS_APROVISIONAMIENTO:
+        raise ValueError(f"Backend de aprovisionamiento desconocido: {nombre}")
+    if nombre == BackendCLI.nombre:
+        # El pool de sesiones sobrevive a los event loops: una sesión por switch en todo el proceso
+        if backend_cli is None:
+            backend_cli = BackendCLI()
+        return backend_cli
+    return BACKENDS_APROVISIONAMIENTO[nombre]()
+
+class AgrupadorAprovisionamiento:
+    """
+    Agrupa por switch los cambios de puertos pendientes y los aplica en lotes.
+    Solo hay un lote en ejecución por switch; lo que llega mientras tanto forma el
+    siguiente lote. Un puerto que se solicita de nuevo antes de aplicarse queda con
+    su último estado solicitado y todas sus esperas reciben el mismo resultado.
+    """
+
+    def __init__(self, backend=None, ventana: float = VENTANA_LOTE, max_items: int = MAX_ITEMS_LOTE):
+        self.loop = asyncio.get_running_loop()
+        self.backend = backend or crear_backend()
+        self.ventana = ventana
+        self.max_items = max_items
+        self.pendientes = {}  # switch -> {interface_name: (item, [futuros])}
+        self.temporizadores = {}  # switch -> tarea esperando el final de la ventana
+        self.locks = {}  # switch -> asyncio.Lock (un lote en ejecución por switch)
+        metricas.indicador("aprovisionamiento_puertos_pendientes", "Puertos esperando a formar o aplicar un lote",
+                           lambda: sum(len(lote) for lote in list(self.pendientes.values())))
+
+    async def solicitar(self, switch_ip: str, accion: str, puerto: str,
+                        mac_address: Optional[str] = None, vlan_id=None,
+                        mac_addresses: Optional[List[str]] = None, max_macs: Optional[int] = None) -> Tuple[bool, str]:
+        """
+        Solicita un cambio de puerto y espera a que su lote se aplique. En una conexión,
+        `mac_addresses` son todas las MACs autorizadas (por defecto solo `mac_address`) y
+        `max_macs` el máximo de port-security (por defecto, el número de MACs).
+
+        Returns:
+            tuple: (éxito, detalle) del puerto; "sin cambios" si ya estaba configurado.
+        """
+        mac_addresses = list(mac_addresses or ([mac_address] if mac_address else []))
+        item = {
+            'accion': accion,
+            'interface_name': puerto,
+            'mac_address': mac_addresses[0] if mac_addresses else mac_address,
+            'mac_addresses': mac_addresses,
+            'max_macs': max(max_macs or 1, len(mac_addresses), 1),
+            'vlan_id': int(vlan_id) if vlan_id is not None else None,
+        }
+        futuro = self.loop.create_future()
+        lote = self.pendientes.setdefault(switch_ip, {})
+        _, futuros = lote.get(puerto, (None, []))
+        futuros.append(futuro)
+        lote[puerto] = (item, futuros)
+
+        if len(lote) >= self.max_items:
+            self._programar(switch_ip, 0)
+        else:
+            self._programar(switch_ip, self.ventana)
+        try:
+            return await futuro
+        except asyncio.CancelledError:
+            self._retirar(switch_ip, puerto, futuro)
+            raise
+
+    def _retirar(self, switch_ip: str, puerto: str, futuro: asyncio.Future) -> None:
+        """Retira una solicitud cancelada; el puerto sale del lote si nadie más lo espera."""
+        lote = self.pendientes.get(switch_ip)
+        if not lote or puerto not in lote:
+            return  # Lote ya en ejecución: se aplica igualmente
+        item, futuros = lote[puerto]
+        if futuro in futuros:
+            futuros.remove(futuro)
+        if not futuros:
+            del lote[puerto]
+
+    def _programar(self, switch_ip: str, espera: float) -> None:
+        """Programa el vaciado del lote del switch; un lote lleno adelanta la ventana en curso."""
+        temporizador = self.temporizadores.get(switch_ip)
+        if temporizador is not None:
+            if espera:
+                return
+            temporizador.cancel()
+        self.temporizadores[switch_ip] = self.loop.create_task(
+            self._vaciar(switch_ip, espera), name=f"Lote-{switch_ip}")
+
+    async def _vaciar(self, switch_ip: str, espera: float) -> None:
+        await asyncio.sleep(espera)
+        # Fuera de la ventana: lo que llegue a partir de aquí abre una ventana nueva
+        if self.temporizadores.get(switch_ip) is asyncio.current_task():
+            del self.temporizadores[switch_ip]
+        lock = self.locks.setdefault(switch_ip, asyncio.Lock())
+        async with lock:
+            lote = self.pendientes.pop(switch_ip, {})
+            if not lote:
+                return
+            items = [item for item, _ in lote.values()]
+            await self._marcar_vlans_conocidas(switch_ip, items)
+            inicio = time.monotonic()
+            try:
+                resultados = await self.backend.aplicar_lote(switch_ip, items)
+            except Exception as e:
+                log(f"ERROR aplicando lote en {switch_ip}: {str(e)}", "ERROR")
+                resultados = {}
+            nombre_backend = getattr(self.backend, 'nombre', type(self.backend).__name__)
+            metrica_lotes.observar(time.monotonic() - inicio, switch_ip, nombre_backend)
+
+            exitos = 0
+            for puerto, (item, futuros) in lote.items():
+                resultado = resultados.get(puerto, (False, "sin resultado del backend"))
+                exitos += resultado[0]
+                if resultado[0] and item['accion'] == 'conectar' and item.get('vlan_id') is not None:
+                    registrar_vlan(switch_ip, item['vlan_id'])  # creada por el lote o ya existente
+                if not resultado[0]:
+                    log(f"Fallo aplicando {item['accion']} en {puerto} de {switch_ip}: {resultado[1]}", "ERROR")
+                for futuro in futuros:
+                    if not futuro.done():
+                        futuro.set_result(resultado)
+            metrica_puertos_lote.incrementar(switch_ip, nombre_backend, "ok", cantidad=exitos)
+            metrica_puertos_lote.incrementar(switch_ip, nombre_backend, "error", cantidad=len(lote) - exitos)
+            log(f"Lote aplicado en {switch_ip}: {exitos}/{len(lote)} puertos correctos", "INFO")
+
+    @staticmethod
+    async def _marcar_vlans_conocidas(switch_ip: str, items: List[Dict]) -> None:
+        """
+        Consulta el registro de vlans_conocidas.py por cada VLAN del lote y marca con
+        `vlan_conocida` las conexiones a VLANs que ya existen en el switch.
+        """
+        vlans = {item['vlan_id'] for item in items if item['accion'] == 'conectar' and item.get('vlan_id') is not None}
+        for vlan_id in vlans:
+            try:
+                conocida = await vlan_existente(switch_ip, vlan_id)
+            except Exception as e:
+                log(f"Error consultando el registro de VLANs de {switch_ip}: {str(e)}", "ERROR")
+                conocida = False
+            if conocida:
+                log(f"VLAN {vlan_id} ya existe en {switch_ip}: el lote no la vuelve a crear", "DEBUG")
+            for item in items:
+                if item['accion'] == 'conectar' and item.get('vlan_id') == vlan_id:
+                    item['vlan_conocida'] = conocida
+
+agrupador = None
+
+def obtener_agrupador() -> AgrupadorAprovisionamiento:
+    """Devuelve el agrupador de aprovisionamiento del event loop en curso."""
+    global agrupador
+    if agrupador is None or agrupador.loop is not asyncio.get_running_loop():
+        agrupador = AgrupadorAprovisionamiento()
+    return agrupador
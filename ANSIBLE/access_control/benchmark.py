@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+"""
+Banco de carga del manejador de traps.
+Inyecta traps (reproducidos de logs/snmp_traps.log o del diario de eventos, o una
+tormenta sintética) a un ritmo
+fijo en la cola del daemon, con el FDB servido por el agente simulado (simulador_snmp.py)
+en un proceso aparte y el aprovisionamiento sustituido por un backend que solo mide.
+Informa del rendimiento, la latencia trap -> puerto aprovisionado (p50/p95/p99), las
+peticiones SNMP por trap y el consumo de CPU y memoria del proceso del manejador.
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import resource
+import tempfile
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control import snmptrap_handler as manejador
+from access_control import snmp_utils
+from access_control import aprovisionamiento
+from access_control.antirrebote import AntirrebotePuertos, VENTANA_ANTIRREBOTE
+from access_control.planificador import PlanificadorTrabajos, MAX_TRABAJOS_SIMULTANEOS
+from access_control.diario import traps_del_diario, RUTA_DIARIO
+from access_control.simulador_snmp import (SimuladorEnProceso, IFINDEX_BASE, PUERTO_AGENTE,
+                                           mac_sintetica, nombre_interfaz)
+
+VLANS_SINTETICAS = (10, 20, 30)
+ESPERA_FINAL = 60  # segundos máximos esperando los aprovisionamientos pendientes al terminar
+
+def configuracion_sintetica(direcciones: List[str], puertos: int) -> Dict:
+    """dispositivos.json equivalente para los switches simulados."""
+    with open(manejador.CONFIG_FILE) as f:
+        acciones = json.load(f).get("acciones", {})
+    return {
+        "dispositivos_por_ip": {ip: f"SIMULADO{i + 1}" for i, ip in enumerate(direcciones)},
+        "ifindex_to_interface": {str(IFINDEX_BASE + p): nombre_interfaz(p) for p in range(1, puertos + 1)},
+        "acciones": acciones or {"linkUp": ["ENLACE UP", "conectar"], "linkDown": ["ENLACE DOWN", "desconectar"]},
+        "vlan_por_mac": {mac_sintetica(s, p): VLANS_SINTETICAS[(s + p) % len(VLANS_SINTETICAS)]
+                         for s in range(len(direcciones)) for p in range(1, puertos + 1)},
+    }
+
+def trap_sintetico(ip: str, puerto: int, evento: str) -> str:
+    """Trap linkUp/linkDown en el formato de texto de snmptrapd."""
+    ifindex = IFINDEX_BASE + puerto
+    return (f"<UNKNOWN>\n"
+            f"UDP: [{ip}]:50000->[127.0.0.1]:162\n"
+            f"DISMAN-EVENT-MIB::sysUpTimeInstance 0:0:02:56.81\n"
+            f"SNMPv2-MIB::snmpTrapOID.0 IF-MIB::{evento}\n"
+            f"IF-MIB::ifIndex.{ifindex} {ifindex}\n"
+            f"IF-MIB::ifDescr.{ifindex} {nombre_interfaz(puerto)}\n"
+            f"IF-MIB::ifType.{ifindex} ethernetCsmacd\n")
+
+def traps_sinteticos(direcciones: List[str], puertos: int, cantidad: int,
+                     semilla: Optional[int] = None) -> List[Tuple[str, int, str, str]]:
+    """
+    Tormenta sintética: puertos al azar que alternan entre linkUp y linkDown.
+
+    Returns:
+        Lista de (ip, puerto, evento, texto del trap).
+    """
+    azar = random.Random(semilla)
+    conectados = set()
+    traps = []
+    for _ in range(cantidad):
+        ip, puerto = azar.choice(direcciones), azar.randint(1, puertos)
+        evento = "linkDown" if (ip, puerto) in conectados else "linkUp"
+        conectados.symmetric_difference_update({(ip, puerto)})
+        traps.append((ip, puerto, evento, trap_sintetico(ip, puerto, evento)))
+    return traps
+
+def traps_de_log(direcciones: List[str], puertos: int, cantidad: int,
+                 ruta: str = manejador.LOG_FILE) -> List[Tuple[str, int, str, str]]:
+    """
+    Reproduce los traps registrados en el log, repartidos entre los switches simulados
+    (se sustituye la dirección de origen) y repetidos hasta `cantidad`.
+    """
+    return _repartir_traps(manejador.extraer_traps_de_log(ruta), direcciones, puertos, cantidad, ruta)
+
+def traps_de_diario(direcciones: List[str], puertos: int, cantidad: Optional[int] = None,
+                    ruta: str = RUTA_DIARIO) -> List[Tuple[str, int, str, str]]:
+    """
+    Reproduce los eventos del diario del daemon (incluidos sus archivos rotados) en su orden
+    de llegada, como traps_de_log; sin `cantidad`, cada evento una vez.
+    """
+    return _repartir_traps(traps_del_diario(ruta), direcciones, puertos, cantidad, ruta)
+
+def _repartir_traps(textos: List[str], direcciones: List[str], puertos: int, cantidad: Optional[int],
+                    ruta: str) -> List[Tuple[str, int, str, str]]:
+    registrados = []
+    for texto in textos:
+        trap = manejador.parsear_trap(texto)
+        puerto = (trap.ifindex or 0) - IFINDEX_BASE
+        if trap.evento_trap in ("linkUp", "linkDown") and 1 <= puerto <= puertos:
+            registrados.append((puerto, trap.evento_trap, texto))
+    if not registrados:
+        raise ValueError(f"No hay traps linkUp/linkDown reproducibles en {ruta}")
+    traps = []
+    for i in range(cantidad or len(registrados)):
+        puerto, evento, texto = registrados[i % len(registrados)]
+        ip = direcciones[i % len(direcciones)]
+        texto = manejador.PATRON_TRANSPORTE.sub(lambda m: f"UDP: [{ip}]:{m.group(2) or 162}", texto, count=1)
+        traps.append((ip, puerto, evento, texto))
+    return traps
+
+class BackendMedicion:
+    """Backend de aprovisionamiento que no toca ningún equipo: registra cuándo se aplica cada puerto."""
+
+    nombre = "medicion"
+
+    def __init__(self, retardo: float = 0.0):
+        self.retardo = retardo  # segundos simulados por lote
+        self.pendientes = {}  # (switch, interfaz) -> deque de instantes de inyección
+        self.latencias = []
+        self.lotes = 0
+        self.ultimo = None
+        self.vacio = asyncio.Event()
+        self.vacio.set()
+
+    def trap_inyectado(self, switch_ip: str, interfaz: str, instante: float) -> None:
+        self.pendientes.setdefault((switch_ip, interfaz), deque()).append(instante)
+        self.vacio.clear()
+
+    async def aplicar_lote(self, switch_ip: str, items: List[Dict]) -> Dict[str, Tuple[bool, str]]:
+        if self.retardo:
+            await asyncio.sleep(self.retardo)
+        ahora = time.monotonic()
+        self.lotes += 1
+        self.ultimo = ahora
+        # Todos los traps pendientes del puerto quedan resueltos por su estado final
+        for item in items:
+            for instante in self.pendientes.pop((switch_ip, item['interface_name']), ()):
+                self.latencias.append(ahora - instante)
+        if not self.pendientes:
+            self.vacio.set()
+        return {item['interface_name']: (True, "OK") for item in items}
+
+def _percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def _rss_actual_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+async def _inyectar(traps, ritmo: float, simulador: SimuladorEnProceso, backend: BackendMedicion,
+                    cola: asyncio.Queue) -> None:
+    """Encola los traps a `ritmo` por segundo (0 = sin límite), preparando antes el FDB simulado."""
+    indices = {ip: i for i, ip in enumerate(simulador.direcciones)}
+    inicio = time.monotonic()
+    for i, (ip, puerto, evento, texto) in enumerate(traps):
+        if ritmo:
+            retraso = inicio + i / ritmo - time.monotonic()
+            if retraso > 0:
+                await asyncio.sleep(retraso)
+        if evento == "linkUp":
+            simulador.conectar(ip, puerto, mac_sintetica(indices[ip], puerto))
+        else:
+            simulador.desconectar(ip, puerto)
+        backend.trap_inyectado(ip, nombre_interfaz(puerto), time.monotonic())
+        await manejador.encolar_trap(cola, texto, timeout=None)
+
+async def _ejecutar_benchmark(traps, simulador: SimuladorEnProceso, ritmo: float, workers: int,
+                              ventana_antirrebote: float, ventana_lote: float, retardo_backend: float,
+                              espera_final: float, trabajos: int) -> Dict:
+    backend = BackendMedicion(retardo_backend)
+    aprovisionamiento.agrupador = aprovisionamiento.AgrupadorAprovisionamiento(backend, ventana=ventana_lote)
+    manejador.antirrebote = AntirrebotePuertos(ventana_antirrebote) if ventana_antirrebote > 0 else None
+    manejador.planificador = PlanificadorTrabajos(trabajos)
+    cola = asyncio.Queue(maxsize=manejador.MAX_TRAPS_EN_COLA)
+    tareas = [asyncio.create_task(manejador._worker_traps(cola), name=f"TrapWorker-{i}")
+              for i in range(workers)]
+
+    uso_inicial = resource.getrusage(resource.RUSAGE_SELF)
+    inicio = time.monotonic()
+    await _inyectar(traps, ritmo, simulador, backend, cola)
+    fin_inyeccion = time.monotonic()
+    try:
+        await asyncio.wait_for(backend.vacio.wait(), espera_final)
+    except asyncio.TimeoutError:
+        pass
+    fin = time.monotonic()
+    uso_final = resource.getrusage(resource.RUSAGE_SELF)
+
+    for _ in tareas:
+        await cola.put(None)
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+    cpu = (uso_final.ru_utime - uso_inicial.ru_utime) + (uso_final.ru_stime - uso_inicial.ru_stime)
+    latencias = backend.latencias
+    duracion = (backend.ultimo or fin) - inicio
+    return {
+        'traps': len(traps),
+        'aprovisionados': len(latencias),
+        'sin_aprovisionar': sum(len(pendientes) for pendientes in backend.pendientes.values()),
+        'lotes': backend.lotes,
+        'duracion_s': duracion,
+        'ritmo_inyeccion_traps_s': len(traps) / (fin_inyeccion - inicio) if fin_inyeccion > inicio else None,
+        'rendimiento_traps_s': len(latencias) / duracion if duracion > 0 else None,
+        'latencia_p50_s': _percentil(latencias, 50),
+        'latencia_p95_s': _percentil(latencias, 95),
+        'latencia_p99_s': _percentil(latencias, 99),
+        'latencia_max_s': max(latencias) if latencias else None,
+        'cpu_s': cpu,
+        'cpu_pct': 100 * cpu / (fin - inicio) if fin > inicio else None,
+        'rss_kb': _rss_actual_kb(),
+        'rss_max_kb': uso_final.ru_maxrss,
+        'espera_turno_max_s': max(manejador.planificador.espera_max.values()),
+    }
+
+def ejecutar_benchmark(fuente: str = "sintetico", switches: int = 4, puertos: int = 48, traps: int = 1000,
+                       ritmo: float = 200, workers: int = manejador.MAX_CONCURRENT_TRAPS,
+                       ventana_antirrebote: float = VENTANA_ANTIRREBOTE, ventana_lote: float = aprovisionamiento.VENTANA_LOTE,
+                       retardo_backend: float = 0.0,
+                       puerto_agente: int = PUERTO_AGENTE, semilla: Optional[int] = None,
+                       ruta_log: str = manejador.LOG_FILE, ruta_diario: str = RUTA_DIARIO,
+                       conservar_logs: bool = False,
+                       espera_final: float = ESPERA_FINAL, trabajos: int = MAX_TRABAJOS_SIMULTANEOS) -> Dict:
+    """
+    Ejecuta el banco de carga completo y devuelve sus resultados.
+
+    Args:
+        fuente (str): "sintetico" (tormenta linkUp/linkDown), "log" (traps de `ruta_log`) o
+            "diario" (eventos de `ruta_diario`).
+        switches (int): Switches simulados.
+        puertos (int): Puertos por switch.
+        traps (int): Traps a inyectar (con "diario", None para reproducir cada evento una vez).
+        ritmo (float): Traps por segundo (0 = tan rápido como admita la cola).
+        workers (int): Corrutinas de procesamiento del manejador.
+        ventana_antirrebote (float): Antirrebote por puerto, como en el daemon (0 para desactivarlo;
+            sin él un linkUp seguido de un linkDown ocupa un worker hasta PLAZO_RESOLUCION_MAC).
+        ventana_lote (float): Ventana de agrupación de cambios por switch.
+        retardo_backend (float): Segundos que tarda cada lote simulado.
+        trabajos (int): Trabajos de puerto simultáneos del planificador del manejador.
+        conservar_logs (bool): Escribir en los logs reales en lugar de en un directorio temporal.
+    """
+    simulador = SimuladorEnProceso(switches, puertos, puerto_agente)
+    if fuente == "log":
+        lista_traps = traps_de_log(simulador.direcciones, puertos, traps, ruta_log)
+    elif fuente == "diario":
+        lista_traps = traps_de_diario(simulador.direcciones, puertos, traps, ruta_diario)
+    else:
+        lista_traps = traps_sinteticos(simulador.direcciones, puertos, traps, semilla)
+
+    directorio = tempfile.mkdtemp(prefix="benchmark_snmp_")
+    ruta_config = os.path.join(directorio, "dispositivos.json")
+    with open(ruta_config, "w") as f:
+        json.dump(configuracion_sintetica(simulador.direcciones, puertos), f)
+
+    # El manejador trabaja sobre la configuración sintética y el agente simulado
+    config_original = manejador.CONFIG_FILE
+    respaldo_original = snmp_utils.SNMP_FALLBACK_SUBPROCESO
+    manejador.CONFIG_FILE = ruta_config
+    snmp_utils.SNMP_FALLBACK_SUBPROCESO = False
+    snmp_utils.configurar_backend_snmp("nativo", puerto=puerto_agente, timeout=1, reintentos=1)
+    snmp_utils.cache_mac.vaciar()
+    snmp_utils.snapshots_puente.clear()
+    if not conservar_logs:
+        manejador.escritor_log.ruta = os.path.join(directorio, "snmp_traps.log")
+        snmp_utils.escritor_log.ruta = os.path.join(directorio, "snmp_utils.log")
+
+    simulador.iniciar()
+    try:
+        resultados = asyncio.run(_ejecutar_benchmark(lista_traps, simulador, ritmo, workers,
+                                                     ventana_antirrebote, ventana_lote, retardo_backend,
+                                                     espera_final, trabajos))
+    finally:
+        estadisticas_simulador = simulador.parar()
+        manejador.CONFIG_FILE = config_original
+        snmp_utils.SNMP_FALLBACK_SUBPROCESO = respaldo_original
+        snmp_utils.configurar_backend_snmp(snmp_utils.SNMP_BACKEND)
+
+    resultados['fuente'] = fuente
+    resultados['switches'] = switches
+    resultados['puertos_por_switch'] = puertos
+    resultados['peticiones_snmp'] = estadisticas_simulador['peticiones_snmp']
+    resultados['peticiones_snmp_por_trap'] = estadisticas_simulador['peticiones_snmp'] / len(lista_traps)
+    resultados['directorio_logs'] = None if conservar_logs else directorio
+    return resultados
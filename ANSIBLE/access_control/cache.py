@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+Cache acotado con expiración por TTL y desalojo LRU.
+Admite entradas negativas (resultado "no hay valor") con un TTL propio, invalidación
+explícita y contadores de aciertos, fallos, expiraciones y desalojos.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+AUSENTE = object()  # resultado de obtener() cuando la clave no está en el cache
+
+class CacheTTL:
+    """
+    Cache thread-safe con un máximo de entradas. El orden de uso (LRU) decide los
+    desalojos; las expiraciones se recorren por orden de inserción en una estructura
+    por TTL, de modo que purgar solo visita las entradas caducadas.
+    """
+
+    def __init__(self, nombre: str, max_entradas: int, ttl: float, ttl_negativo: float = 0):
+        """
+        Args:
+            nombre (str): Nombre del cache en las estadísticas.
+            max_entradas (int): Entradas máximas; al superarse se desaloja la menos usada.
+            ttl (float): Segundos de validez de una entrada.
+            ttl_negativo (float): Segundos de validez de una entrada negativa (0 para no guardarlas).
+        """
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.entradas = OrderedDict()  # clave -> (valor, guardado, expira), en orden de uso
+        self.expiraciones = {ttl: OrderedDict(), ttl_negativo: OrderedDict()}  # ttl -> {clave: expira}
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_negativos = 0
+        self.fallos = 0
+        self.expiradas = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave: Hashable, incluir_negativas: bool = True):
+        """
+        Devuelve el valor guardado (None para una entrada negativa) o AUSENTE.
+        Con incluir_negativas=False una entrada negativa cuenta como fallo.
+        """
+        ahora = time.monotonic()
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return AUSENTE
+            valor, _, expira = entrada
+            if expira <= ahora:
+                self._eliminar(clave, entrada)
+                self.expiradas += 1
+                self.fallos += 1
+                return AUSENTE
+            if valor is None and not incluir_negativas:
+                self.fallos += 1
+                return AUSENTE
+            self.entradas.move_to_end(clave)
+            if valor is None:
+                self.aciertos_negativos += 1
+            else:
+                self.aciertos += 1
+            return valor
+
+    def guardar(self, clave: Hashable, valor) -> None:
+        """
+        Guarda un valor; None se guarda como entrada negativa si ttl_negativo > 0. Si no,
+        se descarta lo que hubiera en la clave: el valor anterior ya no es cierto.
+        """
+        ttl = self.ttl if valor is not None else self.ttl_negativo
+        if ttl <= 0:
+            self.invalidar(clave)
+            return
+        ahora = time.monotonic()
+        with self.lock:
+            anterior = self.entradas.get(clave)
+            if anterior is not None:
+                self._eliminar(clave, anterior)
+            self.entradas[clave] = (valor, time.time(), ahora + ttl)
+            self.expiraciones[ttl][clave] = ahora + ttl
+            while len(self.entradas) > self.max_entradas:
+                clave_lru, entrada_lru = next(iter(self.entradas.items()))
+                self._eliminar(clave_lru, entrada_lru)
+                self.desalojos += 1
+
+    def _eliminar(self, clave, entrada) -> None:
+        """Quita una entrada de ambas estructuras. Llamar con el lock tomado."""
+        del self.entradas[clave]
+        ttl = self.ttl if entrada[0] is not None else self.ttl_negativo
+        self.expiraciones[ttl].pop(clave, None)
+
+    def invalidar(self, clave: Hashable) -> bool:
+        """Elimina una entrada. Devuelve True si existía."""
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                return False
+            self._eliminar(clave, entrada)
+            self.invalidaciones += 1
+            return True
+
+    def invalidar_si(self, condicion: Callable[[Hashable], bool]) -> int:
+        """Elimina las entradas cuya clave cumple la condición (recorre todo el cache)."""
+        with self.lock:
+            claves = [clave for clave in self.entradas if condicion(clave)]
+            for clave in claves:
+                self._eliminar(clave, self.entradas[clave])
+            self.invalidaciones += len(claves)
+            return len(claves)
+
+    def purgar(self) -> int:
+        """Elimina las entradas expiradas. Devuelve cuántas se eliminaron."""
+        ahora = time.monotonic()
+        eliminadas = 0
+        with self.lock:
+            for expiraciones in self.expiraciones.values():
+                while expiraciones:
+                    clave, expira = next(iter(expiraciones.items()))
+                    if expira > ahora:
+                        break
+                    self._eliminar(clave, self.entradas[clave])
+                    eliminadas += 1
+            self.expiradas += eliminadas
+        return eliminadas
+
+    def vaciar(self) -> None:
+        with self.lock:
+            self.invalidaciones += len(self.entradas)
+            self.entradas.clear()
+            for expiraciones in self.expiraciones.values():
+                expiraciones.clear()
+
+    def __len__(self) -> int:
+        return len(self.entradas)
+
+    def elementos(self) -> List[Tuple[Hashable, object, float, bool]]:
+        """Contenido del cache: (clave, valor, edad en segundos, vigente)."""
+        ahora = time.monotonic()
+        with self.lock:
+            return [(clave, valor, time.time() - guardado, expira > ahora)
+                    for clave, (valor, guardado, expira) in self.entradas.items()]
+
+    def exportar(self) -> List[Tuple[Hashable, object, float, float]]:
+        """Entradas vigentes con tiempos de reloj de pared: (clave, valor, guardado, expira)."""
+        ahora = time.monotonic()
+        desfase = time.time() - ahora
+        with self.lock:
+            return [(clave, valor, guardado, expira + desfase)
+                    for clave, (valor, guardado, expira) in self.entradas.items() if expira > ahora]
+
+    def importar(self, entradas) -> int:
+        """
+        Carga entradas exportadas (por este u otro proceso) conservando su caducidad.
+        No sustituye a las entradas ya presentes. Devuelve cuántas se cargaron.
+        """
+        ahora = time.monotonic()
+        desfase = time.time() - ahora
+        cargadas = 0
+        with self.lock:
+            for clave, valor, guardado, expira in sorted(entradas, key=lambda e: e[2]):
+                expira -= desfase
+                ttl = self.ttl if valor is not None else self.ttl_negativo
+                if expira <= ahora or clave in self.entradas or ttl <= 0:
+                    continue
+                self.entradas[clave] = (valor, guardado, expira)
+                self.expiraciones[ttl][clave] = expira
+                cargadas += 1
+            if cargadas:
+                # purgar() se detiene en la primera entrada vigente: las importadas pueden
+                # caducar antes que las ya presentes, así que se reordena por caducidad
+                for ttl, expiraciones in list(self.expiraciones.items()):
+                    self.expiraciones[ttl] = OrderedDict(sorted(expiraciones.items(), key=lambda e: e[1]))
+            while len(self.entradas) > self.max_entradas:
+                clave_lru, entrada_lru = next(iter(self.entradas.items()))
+                self._eliminar(clave_lru, entrada_lru)
+                self.desalojos += 1
+        return cargadas
+
+    def estadisticas(self) -> Dict:
+        ahora = time.monotonic()
+        with self.lock:
+            vigentes = sum(1 for _, _, expira in self.entradas.values() if expira > ahora)
+            negativas = sum(1 for valor, _, _ in self.entradas.values() if valor is None)
+            consultas = self.aciertos + self.aciertos_negativos + self.fallos
+            return {
+                'nombre': self.nombre,
+                'entradas': len(self.entradas),
+                'vigentes': vigentes,
+                'negativas': negativas,
+                'max_entradas': self.max_entradas,
+                'aciertos': self.aciertos,
+                'aciertos_negativos': self.aciertos_negativos,
+                'fallos': self.fallos,
+                'expiradas': self.expiradas,
+                'desalojos': self.desalojos,
+                'invalidaciones': self.invalidaciones,
+                'hit_ratio': (self.aciertos + self.aciertos_negativos) / consultas if consultas else None,
+            }
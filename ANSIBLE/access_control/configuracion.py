@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+"""
+Configuración compilada del manejador de traps.
+Carga config/dispositivos.json una sola vez en estructuras de consulta directa (MACs como
+enteros, ifIndex como enteros, dispositivos por dirección IP parseada), la valida al
+cargarla y solo la recarga cuando el archivo cambia. Una edición inválida se rechaza y
+se sigue usando la última configuración correcta.
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import threading
+import ipaddress
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_utils import log
+
+BASE_DIR = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"
+CONFIG_FILE = os.path.join(BASE_DIR, "access_control/config/dispositivos.json")
+
+INTERVALO_COMPROBACION_CONFIG = 1.0  # segundos entre comprobaciones del archivo
+ACCIONES_VALIDAS = ("conectar", "desconectar")
+# VLAN de un puerto con varias MACs de VLANs distintas: la de la primera MAC vista en el
+# puerto, la menor o la de más MACs (empate: la de la MAC vista antes)
+POLITICAS_VLAN = ("primera", "menor", "mayoritaria")
+POLITICA_VLAN = "primera"
+MAX_MACS_POR_PUERTO = 1  # port-security maximum mínimo de un puerto aprovisionado
+PUERTO_CLI = 2323  # puerto TCP de la CLI de los switches (backend cli y simulador)
+
+# Formatos de MAC admitidos: 30:13:8B:F1:00:BE, 30-13-8b-f1-00-be, 3013.8bf1.00be, 30138bf100be
+_SEPARADORES_MAC = re.compile(r"[:\-.]")
+_MAC_HEX = re.compile(r"^[0-9A-Fa-f]{12}$")
+
+class ErrorConfiguracion(Exception):
+    """Configuración inválida; el mensaje incluye todos los errores encontrados."""
+
+def mac_a_entero(mac: str) -> Optional[int]:
+    """Normaliza una dirección MAC en cualquiera de los formatos habituales a entero (None si no es válida)."""
+    if not isinstance(mac, str):
+        return None
+    hexadecimal = _SEPARADORES_MAC.sub("", mac.strip())
+    if not _MAC_HEX.match(hexadecimal):
+        return None
+    return int(hexadecimal, 16)
+
+def entero_a_mac(valor: int) -> str:
+    """Representa una MAC entera con el formato de los logs (XX:XX:XX:XX:XX:XX)."""
+    return ":".join(f"{(valor >> desplazamiento) & 0xFF:02X}" for desplazamiento in range(40, -8, -8))
+
+class ConfiguracionCompilada:
+    """Configuración validada e indexada; inmutable una vez construida."""
+
+    __slots__ = ('dispositivos', 'interfaces', 'acciones', 'vlan_por_mac', 'politica_vlan',
+                 'max_macs_por_puerto', 'origen')
+
+    def __init__(self, dispositivos: Dict, interfaces: Dict[int, str], acciones: Dict[str, Tuple[str, str]],
+                 vlan_por_mac: Dict[int, int], origen: Tuple = (), politica_vlan: str = POLITICA_VLAN,
+                 max_macs_por_puerto: int = MAX_MACS_POR_PUERTO):
+        self.dispositivos = dispositivos  # ipaddress -> nombre
+        self.interfaces = interfaces  # ifIndex -> nombre de interfaz
+        self.acciones = acciones  # palabra clave -> (evento, acción)
+        self.vlan_por_mac = vlan_por_mac  # MAC entera -> VLAN
+        self.politica_vlan = politica_vlan  # una de POLITICAS_VLAN
+        self.max_macs_por_puerto = max_macs_por_puerto
+        self.origen = origen  # (mtime_ns, tamaño, inodo) del archivo cargado
+
+    def dispositivo(self, ip: str) -> str:
+        """Nombre del dispositivo con esa IP, en cualquier notación, o "DESCONOCIDO"."""
+        try:
+            return self.dispositivos.get(ipaddress.ip_address(ip), "DESCONOCIDO")
+        except ValueError:
+            return "DESCONOCIDO"
+
+    def interfaz(self, ifindex) -> Optional[str]:
+        try:
+            return self.interfaces.get(int(ifindex))
+        except (TypeError, ValueError):
+            return None
+
+    def vlan_de_mac(self, mac: str) -> Optional[int]:
+        valor = mac_a_entero(mac)
+        return self.vlan_por_mac.get(valor) if valor is not None else None
+
+    def asignacion_puerto(self, macs: Sequence[Tuple[str, Optional[int]]]) -> Tuple[Optional[int], List[str]]:
+        """
+        VLAN y MACs autorizadas de un puerto con una o varias MACs.
+
+        Args:
+            macs: (MAC, VLAN en la que el switch la ve o None) en orden de aparición en el FDB.
+
+        Returns:
+            tuple: (VLAN o None si ninguna MAC tiene VLAN asignada, MACs de esa VLAN).
+            Si todos los equipos ya están en una de las VLANs candidatas se conserva,
+            para no reconfigurar el puerto al aparecer otra MAC.
+        """
+        candidatas = [(mac, self.vlan_de_mac(mac)) for mac, _ in macs]
+        candidatas = [(mac, vlan) for mac, vlan in candidatas if vlan is not None]
+        if not candidatas:
+            return None, []
+        vlans = [vlan for _, vlan in candidatas]
+        actuales = {vlan_actual for _, vlan_actual in macs}
+        if len(actuales) == 1 and next(iter(actuales)) in vlans:
+            vlan = next(iter(actuales))
+        elif self.politica_vlan == "menor":
+            vlan = min(vlans)
+        elif self.politica_vlan == "mayoritaria":
+            vlan = max(vlans, key=lambda v: (vlans.count(v), -vlans.index(v)))
+        else:
+            vlan = vlans[0]
+        return vlan, [mac for mac, vlan_mac in candidatas if vlan_mac == vlan]
+
+def compilar_configuracion(datos: Dict, origen: Tuple = ()) -> ConfiguracionCompilada:
+    """
+    Valida la configuración leída del JSON y la compila.
+
+    Raises:
+        ErrorConfiguracion: con la lista de todos los errores encontrados.
+    """
+    errores = []
+    if not isinstance(datos, dict):
+        raise ErrorConfiguracion("la raíz del archivo debe ser un objeto JSON")
+
+    def seccion(nombre):
+        valor = datos.get(nombre, {})
+        if not isinstance(valor, dict):
+            errores.append(f"'{nombre}' debe ser un objeto")
+            return {}
+        return valor
+
+    dispositivos = {}
+    for ip, nombre in seccion("dispositivos_por_ip").items():
+        try:
+            dispositivos[ipaddress.ip_address(ip)] = str(nombre)
+        except ValueError:
+            errores.append(f"dispositivos_por_ip: dirección IP inválida '{ip}'")
+
+    interfaces = {}
+    for ifindex, nombre in seccion("ifindex_to_interface").items():
+        if not str(ifindex).isdigit() or int(ifindex) <= 0:
+            errores.append(f"ifindex_to_interface: ifIndex inválido '{ifindex}'")
+        elif not isinstance(nombre, str) or not nombre.strip():
+            errores.append(f"ifindex_to_interface: interfaz vacía para ifIndex {ifindex}")
+        else:
+            interfaces[int(ifindex)] = nombre.strip()
+
+    acciones = {}
+    for palabra_clave, valor in seccion("acciones").items():
+        if (not isinstance(valor, (list, tuple)) or len(valor) != 2
+                or valor[1] not in ACCIONES_VALIDAS):
+            errores.append(f"acciones: '{palabra_clave}' debe ser [evento, {' | '.join(ACCIONES_VALIDAS)}]")
+        else:
+            acciones[palabra_clave] = (str(valor[0]), valor[1])
+
+    vlan_por_mac = {}
+    for mac, vlan in seccion("vlan_por_mac").items():
+        valor = mac_a_entero(mac)
+        if valor is None:
+            errores.append(f"vlan_por_mac: MAC inválida '{mac}'")
+        elif isinstance(vlan, bool) or not isinstance(vlan, int) or not 1 <= vlan <= 4094:
+            errores.append(f"vlan_por_mac: VLAN inválida {vlan!r} para {mac}")
+        elif valor in vlan_por_mac and vlan_por_mac[valor] != vlan:
+            errores.append(f"vlan_por_mac: MAC {mac} duplicada con VLANs distintas")
+        else:
+            vlan_por_mac[valor] = vlan
+
+    politica_vlan = datos.get("politica_vlan", POLITICA_VLAN)
+    if politica_vlan not in POLITICAS_VLAN:
+        errores.append(f"politica_vlan: debe ser {' | '.join(POLITICAS_VLAN)}")
+    max_macs = datos.get("max_macs_por_puerto", MAX_MACS_POR_PUERTO)
+    if isinstance(max_macs, bool) or not isinstance(max_macs, int) or not 1 <= max_macs <= 128:
+        errores.append(f"max_macs_por_puerto: valor inválido {max_macs!r} (1-128)")
+
+    if errores:
+        raise ErrorConfiguracion("; ".join(errores))
+    return ConfiguracionCompilada(dispositivos, interfaces, acciones, vlan_por_mac, origen,
+                                  politica_vlan, max_macs)
+
+# Configuración vigente por archivo; cada una se sustituye entera al recargar
+configuraciones = {}  # ruta -> ConfiguracionCompilada
+firmas_rechazadas = {}  # ruta -> firma de la última versión inválida, para no reintentarla
+ultimas_comprobaciones = {}  # ruta -> time.monotonic() de la última comprobación del archivo
+config_lock = threading.Lock()
+
+def _firma_archivo(ruta: str) -> Tuple:
+    estado = os.stat(ruta)
+    return (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+def cargar_archivo_configuracion(ruta: str = CONFIG_FILE) -> ConfiguracionCompilada:
+    """Lee, valida y compila el archivo de configuración."""
+    firma = _firma_archivo(ruta)
+    with open(ruta) as f:
+        datos = json.load(f)
+    return compilar_configuracion(datos, firma)
+
+def obtener_configuracion(ruta: str = CONFIG_FILE) -> ConfiguracionCompilada:
+    """
+    Devuelve la configuración compilada, recargándola si el archivo ha cambiado.
+    Si la nueva versión es inválida se registra el error y se mantiene la anterior.
+
+    Raises:
+        ErrorConfiguracion: si no hay ninguna configuración válida cargada.
+    """
+    ahora = time.monotonic()
+    actual = configuraciones.get(ruta)
+    if actual is not None and ahora - ultimas_comprobaciones.get(ruta, 0.0) < INTERVALO_COMPROBACION_CONFIG:
+        return actual
+
+    with config_lock:
+        actual = configuraciones.get(ruta)
+        ultimas_comprobaciones[ruta] = ahora
+        firma = None
+        try:
+            firma = _firma_archivo(ruta)
+            if actual is not None and firma in (actual.origen, firmas_rechazadas.get(ruta)):
+                return actual
+            nueva = cargar_archivo_configuracion(ruta)
+        except (OSError, ValueError, ErrorConfiguracion) as e:
+            if actual is None:
+                raise ErrorConfiguracion(f"No se pudo cargar {ruta}: {str(e)}")
+            # No volver a intentarlo hasta que el archivo cambie de nuevo
+            firmas_rechazadas[ruta] = firma
+            log(f"Configuración {ruta} inválida, se mantiene la anterior: {str(e)}", "ERROR")
+            return actual
+
+        if actual is not None:
+            log(f"Configuración recargada: {len(nueva.dispositivos)} dispositivos, "
+                f"{len(nueva.interfaces)} interfaces, {len(nueva.vlan_por_mac)} MACs", "INFO")
+        configuraciones[ruta] = nueva
+        return nueva
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""
+Diario de eventos del daemon de traps.
+Cada trap aceptado y sus cambios de etapa (MAC resuelta, aplicando en el switch,
+completado) se añaden a un archivo de solo escritura al final, una línea JSON por
+registro. Un thread escritor agrupa los registros encolados y hace un único fsync por
+grupo. Al arrancar, los eventos sin registro de completado son el trabajo que quedó
+pendiente o a medio aplicar cuando el proceso se detuvo, y el daemon los vuelve a encolar.
+"""
+
+import sys
+import os
+import json
+import time
+import queue
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_utils import log
+from access_control import metricas
+
+RUTA_DIARIO = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/eventos.diario"
+MAX_BYTES_DIARIO = 50 * 1024 * 1024
+COPIAS_DIARIO = 2  # archivos rotados que se conservan para reproducirlos (.1, .2)
+TAM_GRUPO_DIARIO = 512  # registros por escritura y fsync
+TIMEOUT_PERSISTENCIA = 5.0  # segundos máximos esperando el fsync de un evento
+ANTIGUEDAD_MAX_RECUPERACION = 600  # segundos: un evento más antiguo ya no describe el estado del puerto
+
+# Etapas de un evento
+ETAPA_RECIBIDO = "recibido"  # trap aceptado en la cola del daemon
+ETAPA_RESUELTO = "resuelto"  # MAC y VLAN del puerto resueltas
+ETAPA_APLICANDO = "aplicando"  # cambio enviado al switch (o a su lote)
+ETAPA_COMPLETADO = "completado"  # con su resultado: ok, error, sin_cambios, sin_accion, ignorado, sustituido...
+
+class DiarioEventos:
+    """Diario de un daemon; los registros se escriben desde un thread propio."""
+
+    def __init__(self, ruta: str = RUTA_DIARIO, max_bytes: int = MAX_BYTES_DIARIO, copias: int = COPIAS_DIARIO):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.copias = copias
+        self.pendientes = {}  # id -> registro "recibido" de los eventos sin completar
+        self.ultimo_id = 0
+        self.id_persistido = 0  # mayor id cuyo registro "recibido" ya pasó por fsync
+        self.cola = queue.Queue()
+        self.lock = threading.Lock()
+        self.persistencia = threading.Condition()
+        self.archivo = None
+        self.bytes_escritos = 0
+        self.hilo = None
+        self.grupos = 0
+        self.registros = 0
+        self.metrica_fsync = metricas.histograma(
+            "diario_fsync_segundos", "Escritura y fsync de un grupo de registros del diario")
+        self.recuperados = metricas.contador(
+            "diario_eventos_recuperados_total", "Eventos sin completar reanudados al arrancar el daemon")
+
+    def recuperar(self, antiguedad_max: float = ANTIGUEDAD_MAX_RECUPERACION) -> List[Tuple[int, str, str]]:
+        """
+        Lee el diario existente antes de empezar a escribir. Una última línea cortada por
+        una caída se ignora, y los eventos de más de `antiguedad_max` segundos se completan
+        como caducados sin reanudarlos.
+
+        Returns:
+            list: (id, texto del trap, última etapa) de los eventos sin completar, en orden.
+        """
+        for registro in leer_registros(self.ruta):
+            self.ultimo_id = max(self.ultimo_id, registro['id'])
+            if registro['etapa'] == ETAPA_RECIBIDO:
+                self.pendientes[registro['id']] = dict(registro)
+            elif registro['etapa'] == ETAPA_COMPLETADO:
+                self.pendientes.pop(registro['id'], None)
+            elif registro['id'] in self.pendientes:
+                self.pendientes[registro['id']]['ultima_etapa'] = registro['etapa']
+        self.id_persistido = self.ultimo_id
+        limite = time.time() - antiguedad_max
+        for id_evento in [id_evento for id_evento, registro in self.pendientes.items() if registro['t'] < limite]:
+            self.registrar_etapa(id_evento, ETAPA_COMPLETADO, resultado="caducado")
+        self.recuperados.incrementar(len(self.pendientes))
+        return [(id_evento, registro['trap'], registro.get('ultima_etapa', ETAPA_RECIBIDO))
+                for id_evento, registro in sorted(self.pendientes.items())]
+
+    def iniciar(self) -> None:
+        self.hilo = threading.Thread(target=self._bucle, name="DiarioEventos", daemon=True)
+        self.hilo.start()
+
+    def registrar_recibido(self, trap: str) -> int:
+        """Registra un trap aceptado y devuelve el id de su evento."""
+        with self.lock:
+            self.ultimo_id += 1
+            registro = {'id': self.ultimo_id, 'etapa': ETAPA_RECIBIDO, 't': time.time(), 'trap': trap}
+            self.pendientes[self.ultimo_id] = registro
+            self.cola.put(registro)
+            return self.ultimo_id
+
+    def registrar_etapa(self, id_evento: int, etapa: str, **datos) -> None:
+        """Registra una etapa de un evento pendiente; completarlo lo retira de los pendientes."""
+        with self.lock:
+            if id_evento not in self.pendientes:
+                return
+            if etapa == ETAPA_COMPLETADO:
+                del self.pendientes[id_evento]
+            self.cola.put(dict(datos, id=id_evento, etapa=etapa, t=time.time()))
+
+    def esperar_persistido(self, id_evento: int, timeout: float = TIMEOUT_PERSISTENCIA) -> bool:
+        """Bloquea hasta que el registro "recibido" del evento está en disco."""
+        with self.persistencia:
+            return self.persistencia.wait_for(lambda: self.id_persistido >= id_evento, timeout)
+
+    def _abrir(self) -> None:
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        self.archivo = open(self.ruta, "ab")
+        self.bytes_escritos = self.archivo.tell()
+
+    def _rotar(self) -> None:
+        """Rota el archivo; el nuevo empieza con los eventos aún pendientes para poder recuperarlos."""
+        self.archivo.close()
+        for i in range(self.copias - 1, 0, -1):
+            origen = f"{self.ruta}.{i}"
+            if os.path.exists(origen):
+                os.replace(origen, f"{self.ruta}.{i + 1}")
+        if self.copias > 0:
+            os.replace(self.ruta, f"{self.ruta}.1")
+        else:
+            os.remove(self.ruta)
+        self._abrir()
+        with self.lock:
+            pendientes = [dict(registro) for _, registro in sorted(self.pendientes.items())]
+        self._escribir(pendientes)
+
+    def _escribir(self, registros: List[Dict]) -> None:
+        inicio = time.monotonic()
+        bloque = "".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in registros).encode("utf-8")
+        self.archivo.write(bloque)
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+        self.bytes_escritos += len(bloque)
+        self.grupos += 1
+        self.registros += len(registros)
+        self.metrica_fsync.observar(time.monotonic() - inicio)
+
+    def _bucle(self) -> None:
+        while True:
+            registros = [self.cola.get()]
+            while len(registros) < TAM_GRUPO_DIARIO:
+                try:
+                    registros.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = None in registros
+            registros = [registro for registro in registros if registro is not None]
+            try:
+                if self.archivo is None:
+                    self._abrir()
+                if registros:
+                    self._escribir(registros)
+                recibidos = [registro['id'] for registro in registros if registro['etapa'] == ETAPA_RECIBIDO]
+                if recibidos:
+                    with self.persistencia:
+                        self.id_persistido = max(self.id_persistido, max(recibidos))
+                        self.persistencia.notify_all()
+                if self.bytes_escritos >= self.max_bytes:
+                    self._rotar()
+            except Exception as e:
+                log(f"ERROR escribiendo el diario de eventos {self.ruta}: {str(e)}", "ERROR")
+                self.archivo = None
+            if fin:
+                return
+
+    def cerrar(self) -> None:
+        """Escribe lo pendiente y detiene el thread escritor; los eventos sin completar se reanudarán."""
+        if self.hilo is None:
+            return
+        self.cola.put(None)
+        self.hilo.join(timeout=10)
+        self.hilo = None
+        if self.archivo is not None:
+            self.archivo.close()
+            self.archivo = None
+
+    def obtener_estadisticas(self) -> Dict:
+        return {
+            'pendientes': len(self.pendientes),
+            'ultimo_id': self.ultimo_id,
+            'en_cola': self.cola.qsize(),
+            'grupos_fsync': self.grupos,
+            'registros': self.registros,
+            'recuperados': self.recuperados.valor,
+        }
+
+def leer_registros(ruta: str) -> Iterator[Dict]:
+    """Registros de un archivo del diario, omitiendo líneas incompletas o corruptas."""
+    try:
+        with open(ruta, "rb") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    continue
+                if isinstance(registro, dict) and 'id' in registro and 'etapa' in registro:
+                    yield registro
+    except FileNotFoundError:
+        return
+
+def traps_del_diario(ruta: str = RUTA_DIARIO, copias: int = COPIAS_DIARIO) -> List[str]:
+    """
+    Textos de todos los traps del diario, incluidos los archivos rotados, en orden de
+    llegada y sin repetir los eventos reescritos al rotar.
+    """
+    traps = {}
+    for archivo in [f"{ruta}.{i}" for i in range(copias, 0, -1)] + [ruta]:
+        for registro in leer_registros(archivo):
+            if registro['etapa'] == ETAPA_RECIBIDO and 'trap' in registro:
+                traps.setdefault(registro['id'], registro['trap'])
+    return [trap for _, trap in sorted(traps.items())]
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Estado compartido entre procesos del sistema SNMP.
+El manejador de traps publica periódicamente, desde un thread propio, el contenido del
+cache de MACs y sus estadísticas en una base SQLite local (modo WAL). Los procesos de
+snmp_monitor.py la leen sin bloquear al manejador, y el cache se recupera al arrancar.
+"""
+
+import sys
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Callable, Dict, Optional
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_utils import log, cache_mac, obtener_estadisticas_cache, obtener_estadisticas_fdb
+from access_control.metricas import obtener_resumen_metricas
+
+RUTA_ESTADO = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/snmp_estado.db"
+INTERVALO_PUBLICACION = 2.0  # segundos entre publicaciones del daemon
+TIMEOUT_SQLITE = 5.0  # segundos de espera si otro proceso está escribiendo
+ANTIGUEDAD_MAX_PROCESO = 3600  # segundos tras los que se olvidan las estadísticas de un proceso
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    clave TEXT PRIMARY KEY,
+    valor TEXT,
+    guardado REAL NOT NULL,
+    expira REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS estadisticas (
+    proceso TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (proceso, nombre)
+);
+"""
+
+# Fuentes de estadísticas publicadas: nombre -> función sin argumentos que devuelve un dict
+fuentes_estadisticas = {
+    'cache': obtener_estadisticas_cache,
+    'metricas': obtener_resumen_metricas,
+    'fdb': obtener_estadisticas_fdb,
+}
+claves_publicadas = set()  # claves del cache escritas por este proceso en la última publicación
+publicacion_lock = threading.Lock()
+
+def registrar_fuente_estadisticas(nombre: str, fuente: Callable[[], Dict]) -> None:
+    """Añade una fuente de estadísticas a las que se publican."""
+    fuentes_estadisticas[nombre] = fuente
+
+def conectar(ruta: str = RUTA_ESTADO, solo_lectura: bool = False) -> sqlite3.Connection:
+    """Abre la base de estado; en escritura crea el esquema si no existe."""
+    if solo_lectura:
+        return sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, timeout=TIMEOUT_SQLITE)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conexion = sqlite3.connect(ruta, timeout=TIMEOUT_SQLITE)
+    # WAL: los lectores no bloquean al escritor ni al revés
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+def cargar_cache(ruta: str = RUTA_ESTADO) -> int:
+    """Recupera en cache_mac las entradas vigentes publicadas por cualquier proceso."""
+    if not os.path.exists(ruta):
+        return 0
+    try:
+        conexion = conectar(ruta, solo_lectura=True)
+        try:
+            filas = conexion.execute(
+                "SELECT clave, valor, guardado, expira FROM cache WHERE expira > ?", (time.time(),)
+            ).fetchall()
+        finally:
+            conexion.close()
+    except sqlite3.Error as e:
+        log(f"No se pudo leer el estado compartido: {str(e)}", "ERROR")
+        return 0
+    cargadas = cache_mac.importar(filas)
+    with publicacion_lock:
+        claves_publicadas.update(clave for clave, _, _, _ in filas)
+    if cargadas:
+        log(f"Cache recuperado del estado compartido: {cargadas} entradas", "INFO")
+    return cargadas
+
+def publicar_estado(proceso: str, ruta: str = RUTA_ESTADO) -> None:
+    """
+    Escribe el cache de este proceso y sus estadísticas. Las claves que este proceso
+    publicó antes y ya no están en su cache (expiradas, desalojadas o invalidadas) se borran.
+    """
+    entradas = cache_mac.exportar()
+    estadisticas = {}
+    for nombre, fuente in list(fuentes_estadisticas.items()):
+        try:
+            estadisticas[nombre] = fuente()
+        except Exception as e:
+            log(f"Error obteniendo estadísticas '{nombre}': {str(e)}", "ERROR")
+    ahora = time.time()
+
+    with publicacion_lock:
+        actuales = {clave for clave, _, _, _ in entradas}
+        retiradas = claves_publicadas - actuales
+        conexion = conectar(ruta)
+        try:
+            with conexion:
+                conexion.executemany("DELETE FROM cache WHERE clave = ?", [(clave,) for clave in retiradas])
+                conexion.executemany(
+                    "INSERT OR REPLACE INTO cache (clave, valor, guardado, expira) VALUES (?, ?, ?, ?)",
+                    entradas)
+                conexion.execute("DELETE FROM cache WHERE expira <= ?", (ahora,))
+                conexion.executemany(
+                    "INSERT OR REPLACE INTO estadisticas (proceso, nombre, valor, actualizado) VALUES (?, ?, ?, ?)",
+                    [(proceso, nombre, json.dumps(valor, default=str), ahora)
+                     for nombre, valor in estadisticas.items()])
+                conexion.execute("DELETE FROM estadisticas WHERE actualizado < ?",
+                                 (ahora - ANTIGUEDAD_MAX_PROCESO,))
+        finally:
+            conexion.close()
+        claves_publicadas.clear()
+        claves_publicadas.update(actuales)
+
+def leer_estado(ruta: str = RUTA_ESTADO) -> Optional[Dict]:
+    """
+    Lee el estado publicado (para snmp_monitor.py).
+
+    Returns:
+        dict con 'cache' [(clave, valor, guardado, expira)] y 'procesos'
+        {proceso: {'actualizado': t, nombre: estadísticas}}, o None si no hay estado.
+    """
+    if not os.path.exists(ruta):
+        return None
+    conexion = conectar(ruta, solo_lectura=True)
+    try:
+        cache = conexion.execute(
+            "SELECT clave, valor, guardado, expira FROM cache ORDER BY guardado DESC").fetchall()
+        procesos = {}
+        for proceso, nombre, valor, actualizado in conexion.execute(
+                "SELECT proceso, nombre, valor, actualizado FROM estadisticas ORDER BY actualizado DESC"):
+            datos = procesos.setdefault(proceso, {'actualizado': actualizado})
+            datos[nombre] = json.loads(valor)
+    finally:
+        conexion.close()
+    return {'cache': cache, 'procesos': procesos}
+
+class PublicadorEstado:
+    """Thread que publica el estado del proceso cada `intervalo` segundos."""
+
+    def __init__(self, proceso: str, intervalo: float = INTERVALO_PUBLICACION, ruta: str = RUTA_ESTADO):
+        self.proceso = proceso
+        self.intervalo = intervalo
+        self.ruta = ruta
+        self.detener = threading.Event()
+        self.hilo = threading.Thread(target=self._bucle, name="PublicadorEstado", daemon=True)
+
+    def iniciar(self) -> None:
+        self.hilo.start()
+
+    def _bucle(self) -> None:
+        while not self.detener.wait(self.intervalo):
+            try:
+                publicar_estado(self.proceso, self.ruta)
+            except Exception as e:
+                log(f"Error publicando el estado compartido: {str(e)}", "ERROR")
+
+    def parar(self) -> None:
+        """Detiene el thread y hace una última publicación."""
+        self.detener.set()
+        self.hilo.join(timeout=self.intervalo + TIMEOUT_SQLITE)
+        try:
+            publicar_estado(self.proceso, self.ruta)
+        except Exception as e:
+            log(f"Error publicando el estado compartido: {str(e)}", "ERROR")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""
+Lectura incremental e índice de los logs del sistema SNMP.
+Las últimas líneas se leen desde el final del archivo, el modo seguimiento solo lee los
+bytes añadidos desde la última lectura, y un índice en disco (SQLite) por instante,
+puerto y MAC permite buscar eventos sin recorrer los logs completos.
+"""
+
+import sys
+import os
+import re
+import time
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.configuracion import mac_a_entero, entero_a_mac
+from access_control.registro import COPIAS_LOG
+
+BASE_DIR = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"
+LOGS_DIR = os.path.join(BASE_DIR, "access_control/logs")
+ARCHIVOS_LOG = [
+    os.path.join(LOGS_DIR, "snmp_utils.log"),
+    os.path.join(LOGS_DIR, "snmp_traps.log"),
+]
+RUTA_INDICE = os.path.join(LOGS_DIR, "snmp_logs_indice.db")
+
+TAM_BLOQUE_LECTURA = 8192  # bytes leídos por paso al buscar desde el final
+TIMEOUT_SQLITE = 5.0
+
+# Cada entrada de log empieza por "[YYYY-MM-DD HH:MM:SS]"; las líneas siguientes sin
+# timestamp (salida de playbooks, detalle de traps) pertenecen a la misma entrada
+PATRON_ENTRADA = re.compile(rb"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]", re.MULTILINE)
+PATRON_PUERTO = re.compile(r"\b(?:FastEthernet|GigabitEthernet|TenGigabitEthernet|Ethernet)\d+(?:/\d+)+\b")
+PATRON_MAC = re.compile(r"\b[0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5}\b")
+ABREVIATURAS_PUERTO = {
+    "fa": "FastEthernet",
+    "gi": "GigabitEthernet",
+    "te": "TenGigabitEthernet",
+    "eth": "Ethernet",
+}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS archivos (
+    inodo INTEGER PRIMARY KEY,
+    ruta TEXT NOT NULL,
+    indexado INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS eventos (
+    inodo INTEGER NOT NULL,
+    posicion INTEGER NOT NULL,
+    longitud INTEGER NOT NULL,
+    instante REAL NOT NULL,
+    puerto TEXT,
+    mac TEXT
+);
+CREATE INDEX IF NOT EXISTS eventos_instante ON eventos (instante);
+CREATE INDEX IF NOT EXISTS eventos_puerto ON eventos (puerto, instante);
+CREATE INDEX IF NOT EXISTS eventos_mac ON eventos (mac, instante);
+CREATE INDEX IF NOT EXISTS eventos_posicion ON eventos (inodo, posicion);
+"""
+
+def leer_ultimas_lineas(ruta: str, lineas: int = 20) -> List[str]:
+    """Devuelve las últimas líneas del archivo leyendo bloques desde el final."""
+    with open(ruta, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        datos = b""
+        while posicion > 0 and datos.count(b"\n") <= lineas:
+            paso = min(TAM_BLOQUE_LECTURA, posicion)
+            posicion -= paso
+            f.seek(posicion)
+            datos = f.read(paso) + datos
+    return [linea.decode("utf-8", "replace") for linea in datos.splitlines()[-lineas:]] if lineas > 0 else []
+
+class SeguidorLog:
+    """
+    Sigue un archivo de log leyendo solo lo añadido (comprobación por stat).
+    Detecta la rotación (cambio de inodo o archivo más corto) y vuelve a empezar.
+    """
+
+    def __init__(self, ruta: str, desde_el_final: bool = True):
+        self.ruta = ruta
+        self.inodo = None
+        self.posicion = 0
+        self.pendiente = b""  # línea incompleta al final de la última lectura
+        if desde_el_final and os.path.exists(ruta):
+            estado = os.stat(ruta)
+            self.inodo = estado.st_ino
+            self.posicion = estado.st_size
+
+    def leer_nuevas(self) -> List[str]:
+        """Líneas completas añadidas desde la última llamada."""
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return []
+        if estado.st_ino != self.inodo or estado.st_size < self.posicion:
+            self.inodo = estado.st_ino
+            self.posicion = 0
+            self.pendiente = b""
+        if estado.st_size == self.posicion:
+            return []
+        with open(self.ruta, "rb") as f:
+            f.seek(self.posicion)
+            datos = f.read(estado.st_size - self.posicion)
+        self.posicion += len(datos)
+        datos = self.pendiente + datos
+        completas, separador, self.pendiente = datos.rpartition(b"\n")
+        if not separador:
+            return []
+        return [linea.decode("utf-8", "replace") for linea in completas.split(b"\n")]
+
+def normalizar_puerto(puerto: str) -> str:
+    """Admite nombres abreviados: Fa0/16 -> FastEthernet0/16."""
+    coincidencia = re.match(r"^([A-Za-z]+)(\d+(?:/\d+)+)$", puerto.strip())
+    if not coincidencia:
+        return puerto.strip()
+    prefijo, numero = coincidencia.groups()
+    for abreviatura, nombre in ABREVIATURAS_PUERTO.items():
+        if prefijo.lower() == nombre.lower() or prefijo.lower() == abreviatura:
+            return nombre + numero
+    return puerto.strip()
+
+def _normalizar_mac(mac: str) -> str:
+    valor = mac_a_entero(mac)
+    return entero_a_mac(valor) if valor is not None else mac.upper()
+
+def _archivos_con_rotados(ruta: str) -> List[str]:
+    """El archivo y sus copias rotadas, de la más antigua a la actual."""
+    rotados = [f"{ruta}.{i}" for i in range(COPIAS_LOG, 0, -1)]
+    return [r for r in rotados + [ruta] if os.path.exists(r)]
+
+def conectar_indice(ruta: str = RUTA_INDICE) -> sqlite3.Connection:
+    conexion = sqlite3.connect(ruta, timeout=TIMEOUT_SQLITE)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.executescript(ESQUEMA)
+    return conexion
+
+def _indexar_archivo(conexion: sqlite3.Connection, ruta: str) -> int:
+    """
+    Indexa lo añadido a un archivo desde la última vez. La última entrada se vuelve a
+    indexar en la siguiente pasada porque aún puede recibir líneas de continuación.
+    """
+    estado = os.stat(ruta)
+    fila = conexion.execute("SELECT indexado FROM archivos WHERE inodo = ?", (estado.st_ino,)).fetchone()
+    desde = fila[0] if fila else 0
+    if desde > estado.st_size:
+        desde = 0  # archivo truncado
+    conexion.execute("DELETE FROM eventos WHERE inodo = ? AND posicion >= ?", (estado.st_ino, desde))
+
+    with open(ruta, "rb") as f:
+        f.seek(desde)
+        datos = f.read(estado.st_size - desde)
+    fin = datos.rfind(b"\n") + 1  # solo líneas completas
+    datos = datos[:fin]
+
+    inicios = [(m.start(), m.group(1).decode()) for m in PATRON_ENTRADA.finditer(datos)]
+    filas = []
+    for i, (inicio, timestamp) in enumerate(inicios):
+        final = inicios[i + 1][0] if i + 1 < len(inicios) else len(datos)
+        texto = datos[inicio:final].decode("utf-8", "replace")
+        instante = time.mktime(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S"))
+        puertos = set(PATRON_PUERTO.findall(texto)) or {None}
+        macs = {_normalizar_mac(mac) for mac in PATRON_MAC.findall(texto)} or {None}
+        for puerto in puertos:
+            for mac in macs:
+                filas.append((estado.st_ino, desde + inicio, final - inicio, instante, puerto, mac))
+    conexion.executemany(
+        "INSERT INTO eventos (inodo, posicion, longitud, instante, puerto, mac) VALUES (?, ?, ?, ?, ?, ?)", filas)
+
+    # La próxima pasada empieza en la última entrada (o donde acaban las líneas completas si no hay)
+    siguiente = desde + inicios[-1][0] if inicios else desde + fin
+    conexion.execute("INSERT OR REPLACE INTO archivos (inodo, ruta, indexado) VALUES (?, ?, ?)",
+                     (estado.st_ino, ruta, siguiente))
+    return len(inicios)
+
+def actualizar_indice(archivos: List[str] = ARCHIVOS_LOG, ruta_indice: str = RUTA_INDICE) -> int:
+    """Indexa lo nuevo de cada log y sus rotados; olvida archivos que ya no existen."""
+    conexion = conectar_indice(ruta_indice)
+    entradas = 0
+    try:
+        with conexion:
+            presentes = set()
+            for archivo in archivos:
+                for ruta in _archivos_con_rotados(archivo):
+                    presentes.add(os.stat(ruta).st_ino)
+                    entradas += _indexar_archivo(conexion, ruta)
+            for (inodo,) in conexion.execute("SELECT inodo FROM archivos").fetchall():
+                if inodo not in presentes:
+                    conexion.execute("DELETE FROM eventos WHERE inodo = ?", (inodo,))
+                    conexion.execute("DELETE FROM archivos WHERE inodo = ?", (inodo,))
+    finally:
+        conexion.close()
+    return entradas
+
+def _localizar_inodos(archivos: List[str]) -> Dict[int, str]:
+    """Ruta actual de cada inodo (un archivo rotado conserva su inodo al renombrarse)."""
+    rutas = {}
+    for archivo in archivos:
+        for ruta in _archivos_con_rotados(archivo):
+            rutas[os.stat(ruta).st_ino] = ruta
+    return rutas
+
+def buscar_eventos(puerto: Optional[str] = None, mac: Optional[str] = None,
+                   desde: Optional[float] = None, hasta: Optional[float] = None,
+                   limite: Optional[int] = None, archivos: List[str] = ARCHIVOS_LOG,
+                   ruta_indice: str = RUTA_INDICE) -> List[Tuple[float, str, str]]:
+    """
+    Busca entradas de log por puerto, MAC y rango de tiempo usando el índice
+    (que se pone al día antes de consultar).
+
+    Returns:
+        Lista de (instante, archivo, texto de la entrada) en orden cronológico.
+    """
+    actualizar_indice(archivos, ruta_indice)
+    condiciones, parametros = [], []
+    if puerto:
+        condiciones.append("puerto = ?")
+        parametros.append(normalizar_puerto(puerto))
+    if mac:
+        condiciones.append("mac = ?")
+        parametros.append(_normalizar_mac(mac))
+    if desde is not None:
+        condiciones.append("instante >= ?")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("instante <= ?")
+        parametros.append(hasta)
+    consulta = "SELECT DISTINCT inodo, posicion, longitud, instante FROM eventos"
+    if condiciones:
+        consulta += " WHERE " + " AND ".join(condiciones)
+    consulta += " ORDER BY instante, inodo, posicion"
+
+    conexion = conectar_indice(ruta_indice)
+    try:
+        filas = conexion.execute(consulta, parametros).fetchall()
+    finally:
+        conexion.close()
+    if limite:
+        filas = filas[-limite:]
+
+    rutas = _localizar_inodos(archivos)
+    resultados = []
+    abiertos = {}
+    try:
+        for inodo, posicion, longitud, instante in filas:
+            ruta = rutas.get(inodo)
+            if ruta is None:
+                continue
+            if ruta not in abiertos:
+                abiertos[ruta] = open(ruta, "rb")
+            f = abiertos[ruta]
+            f.seek(posicion)
+            texto = f.read(longitud).decode("utf-8", "replace").rstrip("\n")
+            resultados.append((instante, os.path.basename(ruta), texto))
+    finally:
+        for f in abiertos.values():
+            f.close()
+    return resultados
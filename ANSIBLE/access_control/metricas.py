@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+"""
+Métricas operacionales del sistema SNMP.
+Contadores e histogramas de latencia thread-safe, registrados por nombre, familias con
+etiquetas (una serie por switch, acción...) e indicadores calculados al consultarlos.
+Se exportan en el formato de texto de Prometheus, también por un endpoint HTTP local.
+"""
+
+import os
+import json
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Límites de los buckets de latencia en segundos
+LIMITES_LATENCIA = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120]
+# Para etapas de microsegundos a milisegundos (parseo, espera en cola)
+LIMITES_RAPIDOS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1]
+# Para consultas de red (walks SNMP, lotes de configuración)
+LIMITES_RED = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+
+# Con METRICAS_HABILITADAS=0 las familias con etiquetas no registran nada (instrumentación de etapas)
+habilitadas = os.environ.get("METRICAS_HABILITADAS", "1") != "0"
+PUERTO_METRICAS = int(os.environ.get("PUERTO_METRICAS", "9464"))
+
+registro_metricas = {}  # nombre -> métrica
+registro_lock = threading.Lock()
+
+class Contador:
+    """Contador monótono."""
+
+    def __init__(self, nombre: str, descripcion: str = ""):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad: int = 1) -> None:
+        with self._lock:
+            self.valor += cantidad
+
+    def resumen(self) -> Dict:
+        return {'tipo': 'contador', 'valor': self.valor}
+
+class Histograma:
+    """Histograma de buckets acumulativos con estimación de percentiles."""
+
+    def __init__(self, nombre: str, descripcion: str = "", limites: Optional[List[float]] = None):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.limites = sorted(limites or LIMITES_LATENCIA)
+        self.buckets = [0] * (len(self.limites) + 1)  # el último es +Inf
+        self.cuenta = 0
+        self.suma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float) -> None:
+        with self._lock:
+            self.buckets[bisect.bisect_left(self.limites, valor)] += 1
+            self.cuenta += 1
+            self.suma += valor
+
+    def instantanea(self) -> Tuple[List[int], int, float]:
+        """Copia coherente de (buckets, cuenta, suma)."""
+        with self._lock:
+            return list(self.buckets), self.cuenta, self.suma
+
+    def percentil(self, p: float) -> Optional[float]:
+        """
+        Estima el percentil `p` (0-100) interpolando dentro del bucket correspondiente.
+
+        Returns:
+            Valor estimado o None si no hay observaciones.
+        """
+        with self._lock:
+            if not self.cuenta:
+                return None
+            objetivo = self.cuenta * p / 100
+            acumulado = 0
+            for i, cantidad in enumerate(self.buckets):
+                if cantidad and acumulado + cantidad >= objetivo:
+                    inferior = self.limites[i - 1] if i > 0 else 0.0
+                    if i == len(self.limites):
+                        return inferior
+                    return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / cantidad
+                acumulado += cantidad
+            return self.limites[-1]
+
+    def resumen(self) -> Dict:
+        return {
+            'tipo': 'histograma',
+            'cuenta': self.cuenta,
+            'media': self.suma / self.cuenta if self.cuenta else None,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99),
+        }
+
+class Indicador:
+    """Valor instantáneo (profundidad de cola, lotes pendientes) calculado al consultarlo."""
+
+    def __init__(self, nombre: str, descripcion: str = "", funcion: Callable[[], float] = None):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.funcion = funcion
+
+    def valor(self) -> Optional[float]:
+        try:
+            return self.funcion()
+        except Exception:
+            return None
+
+    def resumen(self) -> Dict:
+        return {'tipo': 'indicador', 'valor': self.valor()}
+
+class Familia:
+    """
+    Métrica con etiquetas: una serie (Contador o Histograma) por combinación de valores.
+    Si las métricas están deshabilitadas, observar e incrementar vuelven sin hacer nada.
+    """
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Tuple[str, ...], clase=Contador,
+                 limites: Optional[List[float]] = None):
+        self.clase = clase
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = tuple(etiquetas)
+        self.limites = limites
+        self.series = {}  # tupla de valores -> Contador o Histograma
+        self._lock = threading.Lock()
+
+    def serie(self, *valores):
+        serie = self.series.get(valores)
+        if serie is None:
+            with self._lock:
+                serie = self.series.get(valores)
+                if serie is None:
+                    if self.clase is Histograma:
+                        serie = Histograma(self.nombre, self.descripcion, self.limites)
+                    else:
+                        serie = Contador(self.nombre, self.descripcion)
+                    self.series[valores] = serie
+        return serie
+
+    def observar(self, valor: float, *valores) -> None:
+        if habilitadas:
+            self.serie(*valores).observar(valor)
+
+    def incrementar(self, *valores, cantidad: int = 1) -> None:
+        if habilitadas:
+            self.serie(*valores).incrementar(cantidad)
+
+    def pares(self, valores: Tuple) -> str:
+        """Etiquetas de una serie en el formato de Prometheus: switch="...",accion="..."."""
+        return ",".join(f'{etiqueta}="{_escapar(valor)}"' for etiqueta, valor in zip(self.etiquetas, valores))
+
+    def etiquetado(self, valores: Tuple) -> str:
+        """Nombre de la serie con sus etiquetas: nombre{switch="...",accion="..."}."""
+        return f"{self.nombre}{{{self.pares(valores)}}}" if self.etiquetas else self.nombre
+
+    def resumen(self) -> Dict:
+        return {self.etiquetado(valores): serie.resumen() for valores, serie in list(self.series.items())}
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _obtener_o_crear(clase, nombre: str, *args):
+    with registro_lock:
+        metrica = registro_metricas.get(nombre)
+        if metrica is None:
+            metrica = clase(nombre, *args)
+            registro_metricas[nombre] = metrica
+        return metrica
+
+def contador(nombre: str, descripcion: str = "") -> Contador:
+    """Devuelve el contador registrado con `nombre`, creándolo si no existe."""
+    return _obtener_o_crear(Contador, nombre, descripcion)
+
+def histograma(nombre: str, descripcion: str = "", limites: Optional[List[float]] = None) -> Histograma:
+    """Devuelve el histograma registrado con `nombre`, creándolo si no existe."""
+    return _obtener_o_crear(Histograma, nombre, descripcion, limites)
+
+def contador_etiquetado(nombre: str, descripcion: str, etiquetas: Tuple[str, ...]) -> Familia:
+    """Devuelve la familia de contadores `nombre` con esas etiquetas, creándola si no existe."""
+    return _obtener_o_crear(Familia, nombre, descripcion, etiquetas, Contador)
+
+def histograma_etiquetado(nombre: str, descripcion: str, etiquetas: Tuple[str, ...],
+                          limites: Optional[List[float]] = None) -> Familia:
+    """Devuelve la familia de histogramas `nombre` con esas etiquetas, creándola si no existe."""
+    return _obtener_o_crear(Familia, nombre, descripcion, etiquetas, Histograma, limites)
+
+def indicador(nombre: str, descripcion: str, funcion: Callable[[], float]) -> Indicador:
+    """Registra (o sustituye) el indicador `nombre`, calculado con `funcion` al consultarlo."""
+    metrica = Indicador(nombre, descripcion, funcion)
+    with registro_lock:
+        registro_metricas[nombre] = metrica
+    return metrica
+
+def obtener_resumen_metricas() -> Dict[str, Dict]:
+    """Devuelve el resumen de todas las métricas registradas (una entrada por serie)."""
+    with registro_lock:
+        metricas = list(registro_metricas.values())
+    resumen = {}
+    for metrica in metricas:
+        if isinstance(metrica, Familia):
+            resumen.update(metrica.resumen())
+        else:
+            resumen[metrica.nombre] = metrica.resumen()
+    return resumen
+
+def _formatear_numero(valor) -> str:
+    if valor is None:
+        return "NaN"
+    if isinstance(valor, float) and valor == int(valor) and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+def _lineas_serie(serie, nombre: str, etiquetas: str) -> List[str]:
+    """Líneas de exposición de una serie; `etiquetas` es 'a="x",b="y"' o ''."""
+    if isinstance(serie, Contador):
+        return [f"{nombre}{{{etiquetas}}} {serie.valor}" if etiquetas else f"{nombre} {serie.valor}"]
+    buckets, cuenta, suma = serie.instantanea()
+    prefijo = etiquetas + "," if etiquetas else ""
+    lineas = []
+    acumulado = 0
+    for limite, cantidad in zip(serie.limites + ["+Inf"], buckets):
+        acumulado += cantidad
+        lineas.append(f'{nombre}_bucket{{{prefijo}le="{limite}"}} {acumulado}')
+    sufijo = f"{{{etiquetas}}}" if etiquetas else ""
+    lineas.append(f"{nombre}_sum{sufijo} {_formatear_numero(suma)}")
+    lineas.append(f"{nombre}_count{sufijo} {cuenta}")
+    return lineas
+
+def exportar_prometheus() -> str:
+    """Todas las métricas registradas en el formato de texto de Prometheus (0.0.4)."""
+    with registro_lock:
+        metricas = sorted(registro_metricas.values(), key=lambda metrica: metrica.nombre)
+    lineas = []
+    for metrica in metricas:
+        if isinstance(metrica, Familia):
+            tipo = "histogram" if metrica.clase is Histograma else "counter"
+            series = [(metrica.pares(valores), serie)
+                      for valores, serie in sorted(list(metrica.series.items()), key=lambda par: str(par[0]))]
+        elif isinstance(metrica, Indicador):
+            lineas.extend([f"# HELP {metrica.nombre} {metrica.descripcion}", f"# TYPE {metrica.nombre} gauge",
+                           f"{metrica.nombre} {_formatear_numero(metrica.valor())}"])
+            continue
+        else:
+            tipo = "histogram" if isinstance(metrica, Histograma) else "counter"
+            series = [("", metrica)]
+        lineas.append(f"# HELP {metrica.nombre} {metrica.descripcion}")
+        lineas.append(f"# TYPE {metrica.nombre} {tipo}")
+        for etiquetas, serie in series:
+            lineas.extend(_lineas_serie(serie, metrica.nombre, etiquetas))
+    return "\n".join(lineas) + "\n"
+
+class _ManejadorHTTPMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            cuerpo, tipo = exportar_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            cuerpo, tipo = json.dumps(obtener_resumen_metricas(), default=str).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass  # sin ruido en stderr por cada consulta
+
+class ServidorMetricas:
+    """Endpoint HTTP local (/metrics y /metrics.json) servido desde un thread propio."""
+
+    def __init__(self, puerto: int = PUERTO_METRICAS, host: str = "127.0.0.1"):
+        self.servidor = ThreadingHTTPServer((host, puerto), _ManejadorHTTPMetricas)
+        self.servidor.daemon_threads = True
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, name="ServidorMetricas", daemon=True)
+
+    def iniciar(self) -> None:
+        self.hilo.start()
+
+    def parar(self) -> None:
+        self.servidor.shutdown()
+        self.servidor.server_close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+Planificador de los trabajos de puerto del daemon.
+Limita cuántos trabajos (resolución de MAC y aplicación en el switch) se ejecutan a
+la vez y, cuando no hay hueco, los atiende por clase de prioridad: limpiezas de
+desconexión antes que conexiones y estas antes que los refrescos de fondo del sondeo
+del FDB. Dentro de cada clase los switches se turnan, de modo que una ráfaga de un
+switch no retrasa a los demás.
+"""
+
+import sys
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control import metricas
+from access_control.metricas import LIMITES_RAPIDOS
+
+MAX_TRABAJOS_SIMULTANEOS = 128  # el trabajo incluye la espera al lote: un límite bajo reduce los lotes
+
+# Clases de prioridad, de mayor a menor
+PRIORIDAD_LIMPIEZA = "limpieza"  # linkDown: retirar port-security del puerto
+PRIORIDAD_CONEXION = "conexion"  # linkUp: aprovisionar el puerto
+PRIORIDAD_FONDO = "fondo"  # eventos sintéticos del sondeo periódico del FDB
+CLASES_PRIORIDAD = (PRIORIDAD_LIMPIEZA, PRIORIDAD_CONEXION, PRIORIDAD_FONDO)
+
+class PlanificadorTrabajos:
+    """
+    Semáforo con prioridades y reparto por switch, en el event loop del daemon.
+    Cada clase guarda, por switch, los trabajos en espera en orden de llegada; al
+    liberarse un hueco se elige la clase más prioritaria con espera y, dentro de ella,
+    el siguiente switch en turno rotatorio.
+    """
+
+    def __init__(self, max_simultaneos: int = MAX_TRABAJOS_SIMULTANEOS):
+        self.max_simultaneos = max_simultaneos
+        self.libres = max_simultaneos
+        self.colas = {clase: OrderedDict() for clase in CLASES_PRIORIDAD}  # clase -> switch -> deque de futuros
+        self.atendidos = {clase: 0 for clase in CLASES_PRIORIDAD}
+        self.espera_max = {clase: 0.0 for clase in CLASES_PRIORIDAD}
+        self.metrica_espera = metricas.histograma_etiquetado(
+            "planificador_espera_segundos", "Espera de un trabajo de puerto hasta obtener turno",
+            ("clase",), LIMITES_RAPIDOS)
+        metricas.indicador("planificador_trabajos_en_espera", "Trabajos de puerto esperando turno",
+                           self.en_espera)
+        metricas.indicador("planificador_trabajos_en_curso", "Trabajos de puerto en ejecución",
+                           lambda: self.max_simultaneos - self.libres)
+
+    @asynccontextmanager
+    async def turno(self, clase: str, switch: Hashable):
+        """Espera turno para un trabajo de `clase` en `switch` y lo libera al salir."""
+        await self._adquirir(clase, switch)
+        try:
+            yield
+        finally:
+            self._liberar()
+
+    async def _adquirir(self, clase: str, switch: Hashable) -> None:
+        llegada = time.monotonic()
+        if self.libres > 0 and not self.en_espera():
+            self.libres -= 1
+        else:
+            futuro = asyncio.get_running_loop().create_future()
+            self.colas[clase].setdefault(switch, deque()).append(futuro)
+            try:
+                await futuro
+            except asyncio.CancelledError:
+                if futuro.done() and not futuro.cancelled():
+                    # El turno se concedió justo antes de la cancelación: se devuelve
+                    self._liberar()
+                else:
+                    self._retirar(clase, switch, futuro)
+                raise
+        espera = time.monotonic() - llegada
+        self.atendidos[clase] += 1
+        self.espera_max[clase] = max(self.espera_max[clase], espera)
+        self.metrica_espera.observar(espera, clase)
+
+    def _retirar(self, clase: str, switch: Hashable, futuro: asyncio.Future) -> None:
+        """Retira de la espera un trabajo cancelado (antirrebote o parada del daemon)."""
+        futuros = self.colas[clase].get(switch)
+        if futuros is None:
+            return
+        try:
+            futuros.remove(futuro)
+        except ValueError:
+            return
+        if not futuros:
+            del self.colas[clase][switch]
+
+    def _liberar(self) -> None:
+        self.libres += 1
+        while self.libres > 0:
+            futuro = self._siguiente()
+            if futuro is None:
+                return
+            self.libres -= 1
+            futuro.set_result(None)
+
+    def _siguiente(self):
+        """Siguiente trabajo en espera: clase más prioritaria y, en ella, el switch en turno."""
+        for clase in CLASES_PRIORIDAD:
+            cola = self.colas[clase]
+            while cola:
+                switch, futuros = next(iter(cola.items()))
+                futuro = futuros.popleft()
+                if futuros:
+                    cola.move_to_end(switch)
+                else:
+                    del cola[switch]
+                if not futuro.done():
+                    return futuro
+        return None
+
+    def en_espera(self) -> int:
+        return sum(len(futuros) for cola in self.colas.values() for futuros in cola.values())
+
+    def obtener_estadisticas(self) -> Dict:
+        """Profundidad de espera por clase y espera máxima observada desde el arranque."""
+        return {
+            'en_curso': self.max_simultaneos - self.libres,
+            'max_simultaneos': self.max_simultaneos,
+            'en_espera': {clase: sum(len(futuros) for futuros in self.colas[clase].values())
+                          for clase in CLASES_PRIORIDAD},
+            'switches_en_espera': len({switch for cola in self.colas.values() for switch in cola}),
+            'atendidos': dict(self.atendidos),
+            'espera_max': {clase: round(espera, 3) for clase, espera in self.espera_max.items()},
+        }
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""
+Reconciliación de la configuración de los switches con el estado deseado.
+Por cada switch se guarda un modelo de la parte de su configuración en ejecución que
+toca el aprovisionamiento: VLANs, interfaces Vlan y, por puerto, VLAN de acceso y
+port-security. El modelo se lee con show running-config y show vlan brief y se
+actualiza con cada lote aplicado. Los lotes se reducen a las líneas que faltan frente
+al modelo, así que un puerto, VLAN o interfaz Vlan que ya está como se pide no genera
+ninguna línea.
+"""
+
+import sys
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control import metricas
+from access_control.configuracion import mac_a_entero
+
+MODELO_TTL = 300  # segundos que se confía en el modelo sin volver a leer el switch (cambios manuales)
+COMANDOS_MODELO = ("show running-config", "show vlan brief")
+
+modelos_switch = {}  # switch -> ModeloSwitch
+modelos_lock = threading.Lock()  # el backend CLI aplica los lotes desde threads
+
+metrica_lecturas = metricas.contador(
+    "reconciliador_lecturas_modelo_total", "Lecturas de la configuración en ejecución de un switch")
+metrica_lineas = metricas.contador(
+    "reconciliador_lineas_enviadas_total", "Líneas de configuración enviadas tras comparar con el modelo")
+metrica_omitidos = metricas.contador(
+    "reconciliador_bloques_omitidos_total", "VLANs, interfaces Vlan y puertos que ya estaban en el estado deseado")
+
+def macs_item(item: Dict) -> List[str]:
+    """MACs que una conexión autoriza en el puerto (mac_addresses, o solo mac_address)."""
+    return list(item.get('mac_addresses') or ([item['mac_address']] if item.get('mac_address') else []))
+
+def estado_configurado(salida: str) -> Dict:
+    """
+    Interpreta la salida de `show running-config interface X` de un puerto de acceso.
+
+    Returns:
+        dict: modo, vlan, seguridad, maximo, violacion, macs (en el orden mostrado) y apagado.
+    """
+    estado = {'modo': None, 'vlan': 1, 'seguridad': False, 'maximo': 1,
+              'violacion': "shutdown", 'macs': [], 'apagado': False}
+    for linea in salida.splitlines():
+        palabras = linea.split()
+        if palabras == ["switchport", "mode", "access"]:
+            estado['modo'] = "access"
+        elif palabras[:3] == ["switchport", "access", "vlan"] and len(palabras) == 4 and palabras[3].isdigit():
+            estado['vlan'] = int(palabras[3])
+        elif palabras == ["switchport", "port-security"]:
+            estado['seguridad'] = True
+        elif palabras[:3] == ["switchport", "port-security", "maximum"] and len(palabras) >= 4 and palabras[3].isdigit():
+            estado['maximo'] = int(palabras[3])
+        elif palabras[:3] == ["switchport", "port-security", "violation"] and len(palabras) == 4:
+            estado['violacion'] = palabras[3]
+        elif palabras[:3] == ["switchport", "port-security", "mac-address"] and len(palabras) >= 4:
+            estado['macs'].append(palabras[-1])  # admite la forma "mac-address sticky X"
+        elif palabras == ["shutdown"]:
+            estado['apagado'] = True
+    return estado
+
+def sin_cambios_puerto(item: Dict, estado: Dict) -> bool:
+    """True si la configuración en ejecución del puerto ya es la que pide el item."""
+    return not lineas_puerto(item, estado)
+
+def _nombre_canonico(interfaz: str) -> str:
+    return "".join(interfaz.split()).lower()
+
+def _normalizar_linea(linea: str) -> str:
+    """Línea de interfaz Vlan comparable: IOS muestra las direcciones IPv6 en mayúsculas."""
+    return " ".join(linea.split()).lower()
+
+class ModeloSwitch:
+    """Configuración relevante de un switch: la última leída más los lotes aplicados desde entonces."""
+
+    def __init__(self, vlans: Dict[int, str], svis: Dict[int, set], puertos: Dict[str, Dict]):
+        self.vlans = vlans  # id -> nombre
+        self.svis = svis  # id -> líneas normalizadas de su interfaz Vlan
+        self.puertos = puertos  # nombre de interfaz canónico -> estado_configurado()
+        self.leido = time.monotonic()
+
+    def vigente(self, ttl: float = MODELO_TTL) -> bool:
+        return time.monotonic() - self.leido < ttl
+
+    def estado_puerto(self, interfaz: str) -> Dict:
+        estado = self.puertos.get(_nombre_canonico(interfaz))
+        return estado if estado is not None else estado_configurado("")
+
+def interpretar_configuracion(configuracion: str, tabla_vlans: str = "") -> ModeloSwitch:
+    """
+    Construye el modelo a partir de show running-config y show vlan brief. Las VLANs
+    se toman de la tabla y de los bloques `vlan N` (VTP transparente) si los hay.
+    """
+    vlans, svis, puertos = {}, {}, {}
+    for linea in tabla_vlans.splitlines():
+        palabras = linea.split()
+        if len(palabras) >= 2 and palabras[0].isdigit():
+            vlans[int(palabras[0])] = linea[5:37].strip()  # columna de nombre de ancho fijo (admite espacios)
+
+    bloques = []
+    for linea in configuracion.splitlines():
+        if not linea.strip():
+            continue
+        if not linea[0].isspace():
+            bloques.append((linea.split(), []))
+        elif bloques:
+            bloques[-1][1].append(linea)
+    for palabras, hijas in bloques:
+        if palabras[0] == "vlan" and len(palabras) == 2 and palabras[1].isdigit():
+            nombres = [hija.split(None, 1)[1].strip() for hija in hijas if hija.split()[:1] == ["name"]]
+            vlans[int(palabras[1])] = nombres[-1] if nombres else f"VLAN{int(palabras[1]):04d}"
+        elif palabras[0] == "interface" and len(palabras) > 1:
+            nombre = "".join(palabras[1:])
+            if nombre.lower().startswith("vlan") and nombre[4:].isdigit():
+                svis[int(nombre[4:])] = {_normalizar_linea(hija) for hija in hijas}
+            else:
+                puertos[_nombre_canonico(nombre)] = estado_configurado("\n".join(hijas))
+    return ModeloSwitch(vlans, svis, puertos)
+
+def lineas_vlan(vlan: Dict, modelo: Optional[ModeloSwitch] = None) -> List[str]:
+    """Líneas del bloque `vlan N` que faltan (todas si no hay modelo)."""
+    if modelo is not None and modelo.vlans.get(int(vlan['id'])) == str(vlan['name']):
+        return []
+    return [f"name {vlan['name']}"]
+
+def lineas_svi(vlan_id: int, deseadas: List[str], modelo: Optional[ModeloSwitch] = None) -> List[str]:
+    """Líneas de la interfaz Vlan que faltan; "no shutdown" solo si la interfaz está apagada."""
+    actuales = modelo.svis.get(vlan_id) if modelo is not None else None
+    if actuales is None:
+        return list(deseadas)
+    return [linea for linea in deseadas
+            if (linea == "no shutdown" and "shutdown" in actuales)
+            or (linea != "no shutdown" and _normalizar_linea(linea) not in actuales)]
+
+def lineas_puerto(item: Dict, estado: Dict) -> List[str]:
+    """
+    Líneas de interfaz que faltan para llevar el puerto al estado que pide el item, en el
+    orden de los roles switch_mac_control y limpiar_puerto. El estado del puerto es
+    obligatorio: sin él no se sabe qué MACs seguras sobran, y hay que quitarlas antes de
+    fijar el máximo, que IOS no deja bajar por debajo de las ya fijadas.
+    """
+    if item['accion'] == 'conectar':
+        autorizadas = macs_item(item)
+        maximo = item.get('max_macs', 1)
+        enteros_autorizadas = {mac_a_entero(mac) for mac in autorizadas}
+        enteros_actuales = {mac_a_entero(mac) for mac in estado['macs']}
+        lineas = []
+        if estado['modo'] != "access":
+            lineas.append("switchport mode access")
+        if estado['vlan'] != item['vlan_id']:
+            lineas.append(f"switchport access vlan {item['vlan_id']}")
+        lineas.extend(f"no switchport port-security mac-address {mac}"
+                      for mac in estado['macs'] if mac_a_entero(mac) not in enteros_autorizadas)
+        if estado['maximo'] != maximo:
+            lineas.append(f"switchport port-security maximum {maximo}")
+        if not estado['seguridad']:
+            lineas.append("switchport port-security")
+        lineas.extend(f"switchport port-security mac-address {mac}"
+                      for mac in autorizadas if mac_a_entero(mac) not in enteros_actuales)
+        if estado['violacion'] != "restrict":
+            lineas.append("switchport port-security violation restrict")
+        if estado['apagado']:
+            lineas.append("no shutdown")
+        return lineas
+
+    cambios = []
+    if estado['vlan'] != 1:
+        cambios.append("no switchport access vlan")
+    if estado['seguridad']:
+        cambios.append("no switchport port-security")
+    if cambios:
+        # Rebote del puerto como en limpiar_puerto: el equipo siguiente empieza de cero
+        return ["shutdown", *cambios, "no shutdown"]
+    return ["no shutdown"] if estado['apagado'] else []
+
+def estado_objetivo(item: Dict, anterior: Dict) -> Dict:
+    """Estado del puerto una vez aplicado el item."""
+    if item['accion'] == 'conectar':
+        return {'modo': "access", 'vlan': item['vlan_id'], 'seguridad': True, 'maximo': item.get('max_macs', 1),
+                'violacion': "restrict", 'macs': macs_item(item), 'apagado': False}
+    return dict(anterior, vlan=1, seguridad=False, macs=[], apagado=False)
+
+def actualizar_modelo(modelo: ModeloSwitch, items: List[Dict], bloques: List, salidas: List) -> bool:
+    """
+    Incorpora al modelo un lote aplicado. Si algún bloque falló, el estado real es
+    incierto y se devuelve False para que el modelo se descarte.
+    """
+    if not all(ok for ok, _ in salidas):
+        return False
+    con_bloque = set()
+    for clave, padre, lineas in bloques:
+        if not isinstance(clave, int):
+            con_bloque.add(clave)
+        elif padre.startswith("vlan "):
+            modelo.vlans[clave] = lineas[0][len("name "):] if lineas else modelo.vlans.get(clave, "")
+        else:
+            actuales = modelo.svis.setdefault(clave, set())
+            for linea in lineas:
+                if linea == "no shutdown":
+                    actuales.discard("shutdown")
+                else:
+                    actuales.add(_normalizar_linea(linea))
+    for item in items:
+        if item['interface_name'] in con_bloque:
+            nombre = _nombre_canonico(item['interface_name'])
+            modelo.puertos[nombre] = estado_objetivo(item, modelo.estado_puerto(item['interface_name']))
+    return True
+
+def modelo_vigente(switch_ip: str) -> Optional[ModeloSwitch]:
+    """Modelo del switch si existe y no ha caducado."""
+    with modelos_lock:
+        modelo = modelos_switch.get(switch_ip)
+    return modelo if modelo is not None and modelo.vigente() else None
+
+def guardar_modelo(switch_ip: str, modelo: ModeloSwitch) -> None:
+    metrica_lecturas.incrementar()
+    with modelos_lock:
+        modelos_switch[switch_ip] = modelo
+
+def invalidar_modelo(switch_ip: str) -> None:
+    with modelos_lock:
+        modelos_switch.pop(switch_ip, None)
+
+def obtener_estadisticas_reconciliador() -> Dict:
+    with modelos_lock:
+        switches = len(modelos_switch)
+    return {
+        'switches': switches,
+        'lecturas': metrica_lecturas.valor,
+        'lineas_enviadas': metrica_lineas.valor,
+        'bloques_omitidos': metrica_omitidos.valor,
+    }
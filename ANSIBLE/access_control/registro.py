@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Escritura de logs en segundo plano.
+Los mensajes se filtran por nivel y se encolan sin formatear; un thread escritor los
+formatea y los escribe por lotes. La rotación por tamaño se decide con un contador de
+bytes escritos, sin volver a leer el archivo.
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import datetime
+import threading
+from typing import Optional
+
+NIVELES_LOG = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+MAX_MENSAJES_EN_COLA = 10000  # con la cola llena los mensajes se descartan (y se cuentan)
+TAM_LOTE_LOG = 256  # mensajes por escritura
+COPIAS_LOG = 3  # archivos rotados que se conservan (.1, .2, .3)
+
+class EscritorLog:
+    """Escritor de un archivo de log alimentado por una cola."""
+
+    def __init__(self, ruta: str, max_bytes: int, nivel_minimo: str = "DEBUG",
+                 con_nivel: bool = True, copias: int = COPIAS_LOG):
+        """
+        Args:
+            ruta (str): Archivo de log.
+            max_bytes (int): Tamaño a partir del cual se rota el archivo.
+            nivel_minimo (str): Los mensajes de nivel inferior se descartan sin formatear.
+            con_nivel (bool): Incluir el nivel en cada línea.
+            copias (int): Archivos rotados que se conservan.
+        """
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.umbral = NIVELES_LOG.get(nivel_minimo.upper(), 0)
+        self.con_nivel = con_nivel
+        self.copias = copias
+        self.cola = queue.Queue(maxsize=MAX_MENSAJES_EN_COLA)
+        self.descartados = 0
+        self.archivo = None
+        self.bytes_escritos = 0
+        self.hilo = None
+        self.lock = threading.Lock()
+
+    def habilitado(self, nivel: str) -> bool:
+        return NIVELES_LOG.get(nivel, 20) >= self.umbral
+
+    def escribir(self, mensaje, nivel: str = "INFO", contexto: Optional[str] = None) -> None:
+        """Encola un mensaje; no bloquea ni hace E/S en el thread que llama."""
+        if NIVELES_LOG.get(nivel, 20) < self.umbral:
+            return
+        if self.hilo is None:
+            self._arrancar()
+        try:
+            self.cola.put_nowait((time.time(), nivel, contexto or threading.current_thread().name, mensaje))
+        except queue.Full:
+            self.descartados += 1
+
+    def _arrancar(self) -> None:
+        with self.lock:
+            if self.hilo is None:
+                self.hilo = threading.Thread(target=self._bucle, name=f"Log-{os.path.basename(self.ruta)}",
+                                             daemon=True)
+                self.hilo.start()
+                atexit.register(self.cerrar)
+
+    def _abrir(self) -> None:
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        self.archivo = open(self.ruta, "ab")
+        self.bytes_escritos = self.archivo.tell()
+
+    def _rotar(self) -> None:
+        self.archivo.close()
+        for i in range(self.copias - 1, 0, -1):
+            origen = f"{self.ruta}.{i}"
+            if os.path.exists(origen):
+                os.replace(origen, f"{self.ruta}.{i + 1}")
+        if self.copias > 0:
+            os.replace(self.ruta, f"{self.ruta}.1")
+        else:
+            os.remove(self.ruta)
+        self._abrir()
+
+    def _formatear(self, registro) -> str:
+        instante, nivel, contexto, mensaje = registro
+        timestamp = datetime.datetime.fromtimestamp(instante).strftime("%Y-%m-%d %H:%M:%S")
+        if self.con_nivel:
+            return f"[{timestamp}] [{nivel}] [Thread:{contexto}] {mensaje}\n"
+        return f"[{timestamp}] [Thread:{contexto}] {mensaje}\n"
+
+    def _bucle(self) -> None:
+        while True:
+            registros = [self.cola.get()]
+            while len(registros) < TAM_LOTE_LOG:
+                try:
+                    registros.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            fin = None in registros
+            lineas = [self._formatear(registro) for registro in registros if registro is not None]
+            if self.descartados:
+                descartados, self.descartados = self.descartados, 0
+                lineas.append(self._formatear((time.time(), "ERROR", self.hilo.name,
+                                               f"{descartados} mensajes de log descartados (cola llena)")))
+            try:
+                if self.archivo is not None and self.archivo.name != self.ruta:
+                    # Ruta cambiada con el escritor en marcha (worker del supervisor, banco de carga)
+                    self.archivo.close()
+                    self.archivo = None
+                if self.archivo is None:
+                    self._abrir()
+                bloque = "".join(lineas).encode("utf-8")
+                self.archivo.write(bloque)
+                self.archivo.flush()
+                self.bytes_escritos += len(bloque)
+                if self.bytes_escritos >= self.max_bytes:
+                    self._rotar()
+            except Exception as e:
+                print(f"Error escribiendo log {self.ruta}: {e}", file=sys.stderr)
+                self.archivo = None
+            finally:
+                for _ in registros:
+                    self.cola.task_done()
+            if fin:
+                return
+
+    def vaciar(self) -> None:
+        """Espera a que se escriban todos los mensajes encolados."""
+        if self.hilo is not None and self.hilo.is_alive():
+            self.cola.join()
+
+    def cerrar(self) -> None:
+        """Escribe lo pendiente y detiene el thread escritor."""
+        if self.hilo is None or not self.hilo.is_alive():
+            return
+        self.cola.put(None)
+        self.hilo.join(timeout=5)
+        self.hilo = None
+        if self.archivo is not None:
+            self.archivo.close()
+            self.archivo = None
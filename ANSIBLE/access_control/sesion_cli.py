@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""
+Sesiones CLI persistentes con los switches.
+Mantiene una sesión SSH de larga duración por dispositivo (credenciales del inventario
+de Ansible), con keepalive, reconexión automática y serialización de comandos por
+dispositivo, para aplicar configuración sin el arranque de ansible-playbook.
+"""
+
+import sys
+import os
+import re
+import time
+import socket
+import threading
+from typing import Callable, Dict, List, Tuple
+
+try:
+    import paramiko
+except ImportError:  # Dependencia opcional: solo necesaria con el backend "cli"
+    paramiko = None
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_utils import log
+
+TIMEOUT_CLI = 15  # segundos de espera del prompt
+KEEPALIVE_CLI = 30  # segundos entre keepalives de sesiones inactivas
+PROMPT_CLI = re.compile(r"[\w\-.()/]+[>#]\s*$")
+# Los errores de Cisco IOS empiezan por "% " (Invalid input, Incomplete command, Ambiguous command...)
+ERROR_CLI = re.compile(r"^\s*% ", re.MULTILINE)
+
+class ErrorSesionCLI(Exception):
+    """Error de la sesión CLI (conexión perdida, prompt no recibido...)."""
+
+class SesionCLI:
+    """Sesión SSH interactiva con un dispositivo Cisco IOS."""
+
+    def __init__(self, host: str, usuario: str, password: str, puerto: int = 22, timeout: float = TIMEOUT_CLI):
+        if paramiko is None:
+            raise ErrorSesionCLI("El backend CLI requiere el paquete paramiko (pip install paramiko)")
+        self.host = host
+        self.usuario = usuario
+        self.password = password
+        self.puerto = puerto
+        self.timeout = timeout
+        self.cliente = None
+        self.canal = None
+        self.ultimo_uso = 0.0
+
+    def conectar(self) -> None:
+        cliente = paramiko.SSHClient()
+        # Igual que host_key_checking = False en ansible.cfg
+        cliente.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        cliente.connect(self.host, port=self.puerto, username=self.usuario, password=self.password,
+                        look_for_keys=False, allow_agent=False, timeout=self.timeout)
+        cliente.get_transport().set_keepalive(KEEPALIVE_CLI)
+        self.cliente = cliente
+        self.canal = cliente.invoke_shell(width=511)
+        self.canal.settimeout(self.timeout)
+        self._leer_hasta_prompt()
+        self.comando("terminal length 0")
+        log(f"Sesión CLI establecida con {self.host}", "INFO")
+
+    def activa(self) -> bool:
+        return (self.cliente is not None and self.cliente.get_transport() is not None
+                and self.cliente.get_transport().is_active())
+
+    def cerrar(self) -> None:
+        if self.cliente is not None:
+            try:
+                self.cliente.close()
+            except Exception:
+                pass
+        self.cliente = None
+        self.canal = None
+
+    def _leer_hasta_prompt(self) -> str:
+        salida = ""
+        limite = time.monotonic() + self.timeout
+        while time.monotonic() < limite:
+            try:
+                bloque = self.canal.recv(65535)
+            except socket.timeout:
+                break
+            if not bloque:
+                raise ErrorSesionCLI(f"Sesión cerrada por {self.host}")
+            salida += bloque.decode(errors="replace")
+            if PROMPT_CLI.search(salida):
+                self.ultimo_uso = time.monotonic()
+                return salida
+        raise ErrorSesionCLI(f"Prompt no recibido de {self.host}")
+
+    def comando(self, linea: str) -> str:
+        """Envía una línea y devuelve la salida hasta el siguiente prompt."""
+        self.canal.send(linea + "\n")
+        return self._leer_hasta_prompt()
+
+    def aplicar_bloques(self, bloques: List[Tuple[str, List[str]]]) -> List[Tuple[bool, str]]:
+        """
+        Aplica bloques de configuración (línea padre + líneas hijas) en modo configuración.
+
+        Returns:
+            Lista de (éxito, salida) por bloque, en el mismo orden.
+        """
+        resultados = []
+        self.comando("configure terminal")
+        try:
+            for padre, lineas in bloques:
+                salida = self.comando(padre)
+                for linea in lineas:
+                    salida += self.comando(linea)
+                salida += self.comando("exit")
+                resultados.append((not ERROR_CLI.search(salida), salida))
+        finally:
+            self.comando("end")
+        return resultados
+
+class PoolSesionesCLI:
+    """
+    Pool de sesiones CLI, una por dispositivo. Los comandos de un mismo dispositivo se
+    serializan; dispositivos distintos trabajan en paralelo.
+    """
+
+    def __init__(self, credenciales: Callable[[str], Dict]):
+        """
+        Args:
+            credenciales: función host -> {'host', 'usuario', 'password'}.
+        """
+        self.credenciales = credenciales
+        self.sesiones = {}  # host -> SesionCLI
+        self.locks = {}  # host -> threading.Lock
+        self.lock = threading.Lock()
+        self.activo = threading.Event()
+        self.activo.set()
+        threading.Thread(target=self._keepalive, name="KeepaliveCLI", daemon=True).start()
+
+    def _lock_host(self, host: str) -> threading.Lock:
+        with self.lock:
+            return self.locks.setdefault(host, threading.Lock())
+
+    def _sesion(self, host: str) -> SesionCLI:
+        """Devuelve la sesión del host, (re)conectando si hace falta. Llamar con el lock del host."""
+        sesion = self.sesiones.get(host)
+        if sesion is None or not sesion.activa():
+            if sesion is not None:
+                sesion.cerrar()
+            datos = self.credenciales(host)
+            sesion = SesionCLI(datos['host'], datos['usuario'], datos['password'])
+            sesion.conectar()
+            self.sesiones[host] = sesion
+        return sesion
+
+    def ejecutar(self, host: str, operacion: Callable[[SesionCLI], object]):
+        """
+        Ejecuta `operacion(sesion)` en exclusiva sobre la sesión del host. Si la sesión
+        se ha perdido, reconecta y reintenta una vez.
+        """
+        with self._lock_host(host):
+            for intento in (1, 2):
+                try:
+                    return operacion(self._sesion(host))
+                except (ErrorSesionCLI, OSError, EOFError) + ((paramiko.SSHException,) if paramiko else ()) as e:
+                    sesion = self.sesiones.pop(host, None)
+                    if sesion is not None:
+                        sesion.cerrar()
+                    if intento == 2:
+                        raise ErrorSesionCLI(f"Fallo en sesión CLI con {host}: {str(e)}")
+                    log(f"Sesión CLI con {host} perdida ({str(e)}), reconectando...", "ERROR")
+
+    def _keepalive(self) -> None:
+        """Mantiene vivas las sesiones inactivas; las que no responden se cierran."""
+        while self.activo.is_set():
+            time.sleep(KEEPALIVE_CLI)
+            with self.lock:
+                hosts = list(self.sesiones)
+            for host in hosts:
+                lock = self._lock_host(host)
+                if not lock.acquire(blocking=False):
+                    continue  # En uso: no necesita keepalive
+                try:
+                    sesion = self.sesiones.get(host)
+                    if sesion is None or time.monotonic() - sesion.ultimo_uso < KEEPALIVE_CLI:
+                        continue
+                    sesion.comando("")
+                except Exception as e:
+                    log(f"Keepalive fallido con {host}: {str(e)}", "DEBUG")
+                    sesion = self.sesiones.pop(host, None)
+                    if sesion is not None:
+                        sesion.cerrar()
+                finally:
+                    lock.release()
+
+    def cerrar(self) -> None:
+        self.activo.clear()
+        with self.lock:
+            sesiones = list(self.sesiones.values())
+            self.sesiones.clear()
+        for sesion in sesiones:
+            sesion.cerrar()
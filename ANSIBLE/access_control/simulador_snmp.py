@@ -0,0 +1,827 @@
+#!/usr/bin/env python3
+
+"""
+Agente SNMP simulado para pruebas sin switches reales.
+Sirve la tabla de puente (BRIDGE-MIB: dot1dTpFdbPort y dot1dBasePortIfIndex, y el FDB por
+VLAN de Q-BRIDGE-MIB: dot1qTpFdbPort) y la tabla de interfaces (IF-MIB) de N switches de
+M puertos por UDP en direcciones de loopback. Un puerto puede tener varias MACs (teléfono
+IP con un PC detrás, hub) y aplica port-security con su lista de MACs seguras y su máximo.
+Los enlaces suben y bajan en caliente enviando traps linkUp/linkDown al daemon, la MAC
+se aprende con un retardo programable, se puede inyectar latencia y pérdida, y cada
+switch acepta por TCP las líneas de configuración que aplican los roles (backend de
+aprovisionamiento "simulado"). Puede ejecutarse en un proceso aparte controlado desde
+el proceso que mide (SimuladorEnProceso), de modo que su CPU no se mezcla con la del
+manejador de traps.
+"""
+
+import sys
+import os
+import time
+import random
+import bisect
+import asyncio
+import argparse
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.configuracion import mac_a_entero, entero_a_mac, PUERTO_CLI
+from access_control.snmp_nativo import (VarBind, ErrorSNMP, codificar_mensaje, decodificar_mensaje, oid_a_tupla,
+                                        nuevo_request_id, VERSION_V2C,
+                                        PDU_GET, PDU_GETNEXT, PDU_GETBULK, PDU_RESPONSE, PDU_TRAP_V2)
+
+PUERTO_AGENTE = 1161  # puerto UDP del agente simulado (161 requiere privilegios)
+COMMUNITY_SIMULADA = "proyectoTDG"
+IFINDEX_BASE = 10000  # el puerto n del switch tiene ifIndex IFINDEX_BASE + n, como en dispositivos.json
+
+OID_FDB_PORT = oid_a_tupla("1.3.6.1.2.1.17.4.3.1.2")          # dot1dTpFdbPort
+OID_QFDB_PORT = oid_a_tupla("1.3.6.1.2.1.17.7.1.2.2.1.2")      # dot1qTpFdbPort (índice: FdbId = VLAN, MAC)
+OID_BASE_PORT_IFINDEX = oid_a_tupla("1.3.6.1.2.1.17.1.4.1.2")  # dot1dBasePortIfIndex
+OID_IF_INDEX = oid_a_tupla("1.3.6.1.2.1.2.2.1.1")              # ifIndex
+OID_IF_DESCR = oid_a_tupla("1.3.6.1.2.1.2.2.1.2")              # ifDescr
+OID_IF_TYPE = oid_a_tupla("1.3.6.1.2.1.2.2.1.3")               # ifType
+OID_IF_ADMIN_STATUS = oid_a_tupla("1.3.6.1.2.1.2.2.1.7")       # ifAdminStatus
+OID_IF_OPER_STATUS = oid_a_tupla("1.3.6.1.2.1.2.2.1.8")        # ifOperStatus
+OID_SYS_UPTIME = oid_a_tupla("1.3.6.1.2.1.1.3.0")
+OID_VTP_VLAN_STATE = oid_a_tupla("1.3.6.1.4.1.9.9.46.1.3.1.1.2.1")  # vtpVlanState del dominio de gestión 1
+ESTADO_VLAN_OPERATIVA = 1
+OID_SNMP_TRAP = oid_a_tupla("1.3.6.1.6.3.1.1.4.1.0")
+OIDS_TRAP = {"linkDown": "1.3.6.1.6.3.1.1.5.3", "linkUp": "1.3.6.1.6.3.1.1.5.4"}
+
+ESTADO_UP = 1
+ESTADO_DOWN = 2
+IFTYPE_ETHERNET = 6  # ethernetCsmacd
+
+ERROR_ENTRADA = "% Invalid input detected at '^' marker."
+MODOS_PROMPT = {"exec": "#", "config": "(config)#", "config-if": "(config-if)#", "config-vlan": "(config-vlan)#"}
+
+def direcciones_simuladas(cantidad: int) -> List[str]:
+    """Direcciones de loopback (127.1.x.y) para `cantidad` switches simulados."""
+    return [f"127.1.{i // 250}.{i % 250 + 1}" for i in range(cantidad)]
+
+def nombre_interfaz(puerto: int) -> str:
+    """Nombre de la interfaz del puerto n (ifDescr y nombre en la CLI)."""
+    return f"FastEthernet0/{puerto}"
+
+def mac_sintetica(indice_switch: int, puerto: int) -> str:
+    """MAC localmente administrada única por switch y puerto."""
+    return entero_a_mac((0x02 << 40) | (indice_switch << 16) | puerto)
+
+def _mac_a_bytes(mac: str) -> bytes:
+    valor = mac_a_entero(mac)
+    if valor is None:
+        raise ValueError(f"MAC inválida: {mac}")
+    return valor.to_bytes(6, "big")
+
+class SwitchSimulado:
+    """
+    Estado de un switch: tablas SNMP, enlaces y configuración de acceso de los puertos.
+    Las filas se guardan en una lista de OIDs ordenada que se actualiza por inserción,
+    de modo que un cambio del FDB no reordena la tabla completa (miles de puertos).
+    """
+
+    def __init__(self, ip: str, puertos: int, community: str = COMMUNITY_SIMULADA):
+        self.ip = ip
+        self.puertos = puertos
+        self.community = community
+        self.nombre = "SIM-" + ip.replace(".", "-")
+        self.inicio = time.monotonic()
+        self.fdb = {}  # MAC (bytes) -> número de puerto
+        self.macs_por_puerto = {}  # número de puerto -> [MACs (bytes)] en orden de aprendizaje
+        self.vlan_fdb = {}  # MAC (bytes) -> VLAN con la que se indexó en dot1qTpFdbPort
+        self.interfaces = {nombre_interfaz(puerto).lower(): puerto for puerto in range(1, puertos + 1)}
+        self.enlazados = set()  # puertos con un equipo conectado al otro extremo
+        self.apagados = set()  # puertos con shutdown
+        self.acceso = {}  # número de puerto -> configuración de acceso aplicada por CLI
+        self.vlans = {1: "default"}
+        self.svis = {}  # VLAN -> líneas de su interfaz Vlan
+        self.violaciones = 0
+        self.notificar = None  # función (switch, puerto, evento) llamada en cada cambio de ifOperStatus
+
+        self._valores = {}  # OID -> VarBind
+        for puerto in range(1, puertos + 1):
+            ifindex = IFINDEX_BASE + puerto
+            for oid, tipo, valor in ((OID_BASE_PORT_IFINDEX + (puerto,), "INTEGER", ifindex),
+                                     (OID_IF_INDEX + (ifindex,), "INTEGER", ifindex),
+                                     (OID_IF_DESCR + (ifindex,), "OCTET STRING", nombre_interfaz(puerto)),
+                                     (OID_IF_TYPE + (ifindex,), "INTEGER", IFTYPE_ETHERNET),
+                                     (OID_IF_ADMIN_STATUS + (ifindex,), "INTEGER", ESTADO_UP),
+                                     (OID_IF_OPER_STATUS + (ifindex,), "INTEGER", ESTADO_DOWN)):
+                self._valores[oid] = VarBind(oid, tipo, valor)
+        self._valores[OID_VTP_VLAN_STATE + (1,)] = VarBind(OID_VTP_VLAN_STATE + (1,), "INTEGER", ESTADO_VLAN_OPERATIVA)
+        self._oids = sorted(self._valores)
+
+    # --- Tablas SNMP ---
+
+    def _fijar(self, oid: Tuple[int, ...], tipo: str, valor) -> None:
+        if oid not in self._valores:
+            bisect.insort(self._oids, oid)
+        self._valores[oid] = VarBind(oid, tipo, valor)
+
+    def _quitar(self, oid: Tuple[int, ...]) -> None:
+        if self._valores.pop(oid, None) is not None:
+            del self._oids[bisect.bisect_left(self._oids, oid)]
+
+    def _siguiente(self, oid: Tuple[int, ...]) -> VarBind:
+        posicion = bisect.bisect_right(self._oids, oid)
+        if posicion < len(self._oids):
+            return self._valores[self._oids[posicion]]
+        return VarBind(oid, "endOfMibView", None)
+
+    def _exacto(self, oid: Tuple[int, ...]) -> VarBind:
+        return self._valores.get(oid) or VarBind(oid, "noSuchInstance", None)
+
+    def responder(self, mensaje: Dict) -> Optional[bytes]:
+        """Respuesta codificada a una petición GET, GETNEXT o GETBULK (None si no se responde)."""
+        if mensaje['community'] != self.community:
+            return None  # como un agente real: community incorrecta, sin respuesta
+        tipo = mensaje['tipo_pdu']
+        pedidos = [vb.oid for vb in mensaje['varbinds']]
+        if tipo == PDU_GET:
+            respuesta = [self._exacto(oid) for oid in pedidos]
+        elif tipo == PDU_GETNEXT:
+            respuesta = [self._siguiente(oid) for oid in pedidos]
+        elif tipo == PDU_GETBULK:
+            no_repetidores = max(0, mensaje['error_status'])
+            repeticiones = max(0, mensaje['error_index'])
+            respuesta = [self._siguiente(oid) for oid in pedidos[:no_repetidores]]
+            actuales = pedidos[no_repetidores:]
+            for _ in range(repeticiones):
+                if not actuales:
+                    break
+                fila = [self._siguiente(oid) for oid in actuales]
+                respuesta.extend(fila)
+                if all(vb.tipo == "endOfMibView" for vb in fila):
+                    break
+                actuales = [vb.oid for vb in fila]
+        else:
+            return None
+        return codificar_mensaje(mensaje['version'], mensaje['community'], PDU_RESPONSE,
+                                 mensaje['request_id'], respuesta)
+
+    def varbinds_trap(self, puerto: int, evento: str) -> List[VarBind]:
+        """Varbinds de un trap linkUp/linkDown del puerto, como los envía un Cisco IOS."""
+        ifindex = IFINDEX_BASE + puerto
+        centesimas = int((time.monotonic() - self.inicio) * 100)
+        return [
+            VarBind(OID_SYS_UPTIME, "Timeticks", centesimas),
+            VarBind(OID_SNMP_TRAP, "OID", OIDS_TRAP[evento]),
+            self._valores[OID_IF_INDEX + (ifindex,)],
+            self._valores[OID_IF_DESCR + (ifindex,)],
+            self._valores[OID_IF_TYPE + (ifindex,)],
+            self._valores[OID_IF_ADMIN_STATUS + (ifindex,)],
+            self._valores[OID_IF_OPER_STATUS + (ifindex,)],
+        ]
+
+    # --- FDB y enlaces ---
+
+    def conectar(self, puerto: int, mac: str, adicional: bool = False) -> bool:
+        """
+        Aprende `mac` en el puerto. Sin `adicional` sustituye a las MACs del puerto; con
+        `adicional` se suma a ellas (otro equipo detrás del mismo puerto).
+        Con port-security la trama se descarta (violation restrict) si la MAC no es segura
+        y el puerto ya tiene tantas MACs como su máximo.
+
+        Returns:
+            bool: True si la MAC quedó en el FDB.
+        """
+        if not adicional:
+            self.desconectar(puerto)
+        valor = _mac_a_bytes(mac)
+        actuales = self.macs_por_puerto.get(puerto, [])
+        if valor in actuales:
+            return True
+        acceso = self.acceso.get(puerto)
+        if acceso and acceso['seguridad'] and valor not in acceso['macs_seguras']:
+            ocupadas = set(acceso['macs_seguras']).union(actuales)
+            if len(ocupadas) >= acceso['maximo']:
+                self.violaciones += 1
+                return False
+        anterior = self.fdb.get(valor)
+        if anterior is not None:
+            self._olvidar(anterior, valor)
+        self.fdb[valor] = puerto
+        self.macs_por_puerto[puerto] = actuales + [valor]
+        self._fijar(OID_FDB_PORT + tuple(valor), "INTEGER", puerto)
+        self.vlan_fdb[valor] = self.vlan_puerto(puerto)
+        self._fijar(OID_QFDB_PORT + (self.vlan_fdb[valor],) + tuple(valor), "INTEGER", puerto)
+        return True
+
+    def desconectar(self, puerto: int) -> None:
+        """Olvida las MACs aprendidas en el puerto."""
+        for valor in self.macs_por_puerto.get(puerto, []):
+            self._olvidar(puerto, valor)
+
+    def _olvidar(self, puerto: int, valor: bytes) -> None:
+        macs = [m for m in self.macs_por_puerto.get(puerto, []) if m != valor]
+        if macs:
+            self.macs_por_puerto[puerto] = macs
+        else:
+            self.macs_por_puerto.pop(puerto, None)
+        self.fdb.pop(valor, None)
+        self._quitar(OID_FDB_PORT + tuple(valor))
+        vlan = self.vlan_fdb.pop(valor, None)
+        if vlan is not None:
+            self._quitar(OID_QFDB_PORT + (vlan,) + tuple(valor))
+
+    def _crear_vlan(self, vlan: int) -> None:
+        """Da de alta la VLAN (si no existe) en la configuración y en vtpVlanState."""
+        if vlan not in self.vlans:
+            self.vlans[vlan] = f"VLAN{vlan:04d}"
+            self._fijar(OID_VTP_VLAN_STATE + (vlan,), "INTEGER", ESTADO_VLAN_OPERATIVA)
+
+    def vlan_puerto(self, puerto: int) -> int:
+        """VLAN en la que el puerto aprende sus MACs (la de acceso; 1 si no es de acceso)."""
+        acceso = self.acceso.get(puerto)
+        return acceso['vlan'] if acceso and acceso['modo'] == "access" else 1
+
+    def _reindexar_vlan(self, puerto: int) -> None:
+        """Mueve las filas de dot1qTpFdbPort del puerto a su VLAN actual."""
+        vlan = self.vlan_puerto(puerto)
+        for valor in self.macs_por_puerto.get(puerto, []):
+            anterior = self.vlan_fdb.get(valor)
+            if anterior != vlan:
+                if anterior is not None:
+                    self._quitar(OID_QFDB_PORT + (anterior,) + tuple(valor))
+                self.vlan_fdb[valor] = vlan
+                self._fijar(OID_QFDB_PORT + (vlan,) + tuple(valor), "INTEGER", puerto)
+
+    def _aplicar_seguridad(self, puerto: int) -> None:
+        """Expulsa del puerto las MACs no seguras que exceden el máximo (violation restrict)."""
+        acceso = self.acceso.get(puerto)
+        if not acceso or not acceso['seguridad']:
+            return
+        libres = acceso['maximo'] - len(acceso['macs_seguras'])
+        for valor in list(self.macs_por_puerto.get(puerto, [])):
+            if valor in acceso['macs_seguras']:
+                continue
+            if libres > 0:
+                libres -= 1
+            else:
+                self.violaciones += 1
+                self._olvidar(puerto, valor)
+
+    def operativo(self, puerto: int) -> bool:
+        return puerto in self.enlazados and puerto not in self.apagados
+
+    def _actualizar_estado(self, puerto: int) -> None:
+        """Recalcula ifAdminStatus/ifOperStatus y notifica si el enlace cambió."""
+        ifindex = IFINDEX_BASE + puerto
+        self._fijar(OID_IF_ADMIN_STATUS + (ifindex,), "INTEGER",
+                    ESTADO_DOWN if puerto in self.apagados else ESTADO_UP)
+        anterior = self._valores[OID_IF_OPER_STATUS + (ifindex,)].valor
+        actual = ESTADO_UP if self.operativo(puerto) else ESTADO_DOWN
+        if actual == anterior:
+            return
+        self._fijar(OID_IF_OPER_STATUS + (ifindex,), "INTEGER", actual)
+        if actual == ESTADO_DOWN:
+            self.desconectar(puerto)
+        if self.notificar is not None:
+            self.notificar(self, puerto, "linkUp" if actual == ESTADO_UP else "linkDown")
+
+    def enlazar(self, puerto: int) -> None:
+        """Conecta un equipo al puerto (el enlace sube si el puerto no está apagado)."""
+        self._validar_puerto(puerto)
+        self.enlazados.add(puerto)
+        self._actualizar_estado(puerto)
+
+    def desenlazar(self, puerto: int) -> None:
+        """Desconecta el equipo del puerto: el enlace baja y su MAC sale del FDB."""
+        self._validar_puerto(puerto)
+        self.enlazados.discard(puerto)
+        self._actualizar_estado(puerto)
+
+    def _validar_puerto(self, puerto: int) -> None:
+        if not 1 <= puerto <= self.puertos:
+            raise ValueError(f"Puerto {puerto} fuera de rango en {self.ip} (1-{self.puertos})")
+
+    # --- CLI simulada ---
+
+    def prompt(self, sesion: Dict) -> str:
+        return self.nombre + MODOS_PROMPT[sesion['modo']]
+
+    def ejecutar_linea(self, sesion: Dict, linea: str) -> str:
+        """
+        Aplica una línea de CLI en el modo de la sesión ({'modo', 'contexto'}).
+
+        Returns:
+            str: Salida del comando ("" si no produce salida).
+        """
+        palabras = linea.split()
+        if not palabras:
+            return ""
+        modo = sesion['modo']
+        if modo == "exec":
+            if palabras[:2] in (["configure", "terminal"], ["conf", "t"]):
+                sesion['modo'] = "config"
+                return ""
+            if palabras[:2] == ["terminal", "length"]:
+                return ""
+            if palabras[:3] == ["show", "running-config", "interface"] and len(palabras) > 3:
+                puerto = self.interfaces.get("".join(palabras[3:]).lower())
+                return "\r\n".join(self.configuracion_puerto(puerto)) if puerto else ERROR_ENTRADA
+            if palabras == ["show", "running-config"]:
+                return "\r\n".join(self.configuracion_en_ejecucion())
+            if palabras == ["show", "vlan", "brief"]:
+                return "\r\n".join(self.tabla_vlans())
+            return ERROR_ENTRADA
+
+        if palabras[0] == "end":
+            sesion.update(modo="exec", contexto=None)
+            return ""
+        if palabras[0] == "exit":
+            sesion.update(modo="exec" if modo == "config" else "config", contexto=None)
+            return ""
+        # Como en IOS, una línea padre también se acepta desde un submodo
+        if palabras[0] == "vlan" and len(palabras) == 2 and palabras[1].isdigit():
+            vlan = int(palabras[1])
+            if not 1 <= vlan <= 4094:
+                return ERROR_ENTRADA
+            self._crear_vlan(vlan)
+            sesion.update(modo="config-vlan", contexto=vlan)
+            return ""
+        if palabras[0] == "interface" and len(palabras) > 1:
+            nombre = "".join(palabras[1:])
+            if nombre.lower().startswith("vlan") and nombre[4:].isdigit():
+                self.svis.setdefault(int(nombre[4:]), [])
+                sesion.update(modo="config-if", contexto=("svi", int(nombre[4:])))
+                return ""
+            puerto = self.interfaces.get(nombre.lower())
+            if puerto is None:
+                return ERROR_ENTRADA
+            sesion.update(modo="config-if", contexto=puerto)
+            return ""
+
+        if modo == "config-vlan" and palabras[0] == "name" and len(palabras) > 1:
+            self.vlans[sesion['contexto']] = " ".join(palabras[1:])
+            return ""
+        if modo == "config-if" and isinstance(sesion['contexto'], tuple):
+            lineas = self.svis[sesion['contexto'][1]]
+            if palabras == ["no", "shutdown"]:
+                if "shutdown" in lineas:
+                    lineas.remove("shutdown")
+                return ""
+            if palabras[0] in ("ipv6", "shutdown"):
+                if " ".join(palabras) not in lineas:
+                    lineas.append(" ".join(palabras))
+                return ""
+            return ERROR_ENTRADA
+        if modo == "config-if":
+            return self._configurar_puerto(sesion['contexto'], palabras)
+        return ERROR_ENTRADA
+
+    def _configurar_puerto(self, puerto: int, palabras: List[str]) -> str:
+        """Líneas de interfaz de los roles switch_vlan_dhcp, switch_mac_control y limpiar_puerto."""
+        acceso = self.acceso.setdefault(puerto, {'modo': "dynamic", 'vlan': 1, 'seguridad': False,
+                                                 'macs_seguras': [], 'maximo': 1, 'violacion': "shutdown"})
+        if palabras == ["shutdown"]:
+            self.apagados.add(puerto)
+            self._actualizar_estado(puerto)
+        elif palabras == ["no", "shutdown"]:
+            self.apagados.discard(puerto)
+            self._actualizar_estado(puerto)
+        elif palabras == ["switchport", "mode", "access"]:
+            acceso['modo'] = "access"
+            self._reindexar_vlan(puerto)
+        elif palabras[:3] == ["switchport", "access", "vlan"] and len(palabras) == 4 and palabras[3].isdigit():
+            acceso['vlan'] = int(palabras[3])
+            self._crear_vlan(acceso['vlan'])
+            self._reindexar_vlan(puerto)
+        elif palabras == ["no", "switchport", "access", "vlan"]:
+            acceso['vlan'] = 1
+            self._reindexar_vlan(puerto)
+        elif palabras == ["switchport", "port-security"]:
+            if acceso['modo'] != "access":
+                return f"% Command rejected: {nombre_interfaz(puerto)} is a dynamic port."
+            acceso['seguridad'] = True
+            self._aplicar_seguridad(puerto)
+        elif palabras == ["no", "switchport", "port-security"]:
+            acceso.update(seguridad=False, macs_seguras=[])
+        elif palabras[:3] == ["switchport", "port-security", "mac-address"] and len(palabras) == 4:
+            if mac_a_entero(palabras[3]) is None:
+                return ERROR_ENTRADA
+            valor = _mac_a_bytes(palabras[3])
+            if valor not in acceso['macs_seguras']:
+                if len(acceso['macs_seguras']) >= acceso['maximo']:
+                    return (f"% Total secure mac-addresses on interface {nombre_interfaz(puerto)} "
+                            f"has reached maximum limit.")
+                acceso['macs_seguras'].append(valor)
+            self._aplicar_seguridad(puerto)
+        elif palabras[:4] == ["no", "switchport", "port-security", "mac-address"] and len(palabras) == 5:
+            if mac_a_entero(palabras[4]) is None:
+                return ERROR_ENTRADA
+            valor = _mac_a_bytes(palabras[4])
+            if valor in acceso['macs_seguras']:
+                acceso['macs_seguras'].remove(valor)
+        elif palabras[:3] == ["switchport", "port-security", "maximum"] and len(palabras) == 4:
+            if not palabras[3].isdigit() or not 1 <= int(palabras[3]) <= 132:
+                return ERROR_ENTRADA
+            if int(palabras[3]) < len(acceso['macs_seguras']):
+                return "% Maximum is less than number of currently secured mac-addresses."
+            acceso['maximo'] = int(palabras[3])
+            self._aplicar_seguridad(puerto)
+        elif (palabras[:3] == ["switchport", "port-security", "violation"] and len(palabras) == 4
+              and palabras[3] in ("protect", "restrict", "shutdown")):
+            acceso['violacion'] = palabras[3]
+        else:
+            return ERROR_ENTRADA
+        return ""
+
+    def configuracion_puerto(self, puerto: int) -> List[str]:
+        """Configuración en ejecución del puerto, en el formato de show running-config."""
+        lineas = [f"interface {nombre_interfaz(puerto)}"]
+        acceso = self.acceso.get(puerto)
+        if acceso:
+            if acceso['vlan'] != 1:
+                lineas.append(f" switchport access vlan {acceso['vlan']}")
+            if acceso['modo'] == "access":
+                lineas.append(" switchport mode access")
+            if acceso['seguridad']:
+                lineas.append(" switchport port-security")
+                if acceso['maximo'] != 1:
+                    lineas.append(f" switchport port-security maximum {acceso['maximo']}")
+                if acceso['violacion'] != "shutdown":
+                    lineas.append(f" switchport port-security violation {acceso['violacion']}")
+            for valor in acceso['macs_seguras']:
+                lineas.append(f" switchport port-security mac-address "
+                              f"{entero_a_mac(int.from_bytes(valor, 'big'))}")
+        if puerto in self.apagados:
+            lineas.append(" shutdown")
+        lineas.append("end")
+        return lineas
+
+    def configuracion_en_ejecucion(self) -> List[str]:
+        """show running-config: interfaces Vlan y puertos (las VLANs están en vlan.dat, como con VTP servidor)."""
+        lineas = ["Building configuration...", "", f"hostname {self.nombre}", "!"]
+        for vlan, lineas_svi in sorted(self.svis.items()):
+            lineas.append(f"interface Vlan{vlan}")
+            # IOS muestra las direcciones IPv6 en mayúsculas
+            lineas.extend(f" ipv6 address {linea.split()[2].upper()}" if linea.startswith("ipv6 address") else f" {linea}"
+                          for linea in lineas_svi)
+            lineas.append("!")
+        for puerto in range(1, self.puertos + 1):
+            lineas.extend(self.configuracion_puerto(puerto)[:-1])
+            lineas.append("!")
+        lineas.append("end")
+        return lineas
+
+    def tabla_vlans(self) -> List[str]:
+        """show vlan brief (sin la lista de puertos)."""
+        lineas = ["VLAN Name                             Status    Ports",
+                  "---- -------------------------------- --------- -------------------------------"]
+        lineas.extend(f"{vlan:<4} {nombre:<32} active" for vlan, nombre in sorted(self.vlans.items()))
+        return lineas
+
+class _ProtocoloAgente(asyncio.DatagramProtocol):
+    """Atiende las peticiones SNMP dirigidas a un switch simulado."""
+
+    def __init__(self, switch: SwitchSimulado, agente: "AgenteSNMPSimulado"):
+        self.switch = switch
+        self.agente = agente
+        self.transporte = None
+
+    def connection_made(self, transporte):
+        self.transporte = transporte
+
+    def datagram_received(self, datos, origen):
+        self.agente.peticiones += 1
+        if self.agente.perder():
+            self.agente.peticiones_perdidas += 1
+            return
+        try:
+            respuesta = self.switch.responder(decodificar_mensaje(datos))
+        except ErrorSNMP:
+            self.agente.invalidas += 1
+            return
+        if respuesta is None:
+            return
+        retardo = self.agente.retardo()
+        if retardo > 0:
+            asyncio.get_running_loop().call_later(retardo, self.transporte.sendto, respuesta, origen)
+        else:
+            self.transporte.sendto(respuesta, origen)
+
+class AgenteSNMPSimulado:
+    """
+    Un endpoint UDP por switch simulado, todos en el mismo puerto, y opcionalmente una
+    CLI por TCP por switch. Los traps se envían desde la dirección del switch.
+    """
+
+    def __init__(self, switches: int, puertos: int, puerto_udp: int = PUERTO_AGENTE,
+                 community: str = COMMUNITY_SIMULADA, puerto_cli: Optional[int] = None,
+                 destino_traps: Optional[Tuple[str, int]] = None, latencia: float = 0.0,
+                 variacion: float = 0.0, perdida: float = 0.0, retardo_mac: float = 0.0,
+                 semilla: Optional[int] = None):
+        """
+        Args:
+            puerto_cli: Puerto TCP de la CLI simulada (None: sin CLI).
+            destino_traps: (ip IPv4, puerto) al que se envían los traps (None: no se envían).
+            latencia, variacion: Segundos de retardo de cada respuesta SNMP (± variación).
+            perdida: Probabilidad de descartar una petición SNMP o un trap.
+            retardo_mac: Segundos por defecto entre el linkUp y el aprendizaje de la MAC.
+        """
+        self.puerto_udp = puerto_udp
+        self.puerto_cli = puerto_cli
+        self.destino_traps = destino_traps
+        self.latencia = latencia
+        self.variacion = variacion
+        self.perdida = perdida
+        self.retardo_mac = retardo_mac
+        self.azar = random.Random(semilla)
+        self.switches = {ip: SwitchSimulado(ip, puertos, community) for ip in direcciones_simuladas(switches)}
+        for switch in self.switches.values():
+            switch.notificar = self._emitir_trap
+        self.transportes = {}  # ip -> transporte UDP del switch
+        self.servidores_cli = []
+        self.llegadas = {}  # (ip, puerto) -> aprendizaje de MAC programado
+        self.peticiones = 0
+        self.invalidas = 0
+        self.peticiones_perdidas = 0
+        self.traps_enviados = 0
+        self.traps_perdidos = 0
+        self.lineas_cli = 0
+
+    async def iniciar(self) -> None:
+        loop = asyncio.get_running_loop()
+        for ip, switch in self.switches.items():
+            transporte, _ = await loop.create_datagram_endpoint(
+                lambda switch=switch: _ProtocoloAgente(switch, self), local_addr=(ip, self.puerto_udp))
+            self.transportes[ip] = transporte
+            if self.puerto_cli:
+                servidor = await asyncio.start_server(
+                    lambda reader, writer, switch=switch: self._atender_cli(switch, reader, writer),
+                    host=ip, port=self.puerto_cli)
+                self.servidores_cli.append(servidor)
+
+    def cerrar(self) -> None:
+        for llegada in self.llegadas.values():
+            llegada.cancel()
+        self.llegadas = {}
+        for transporte in self.transportes.values():
+            transporte.close()
+        self.transportes = {}
+        for servidor in self.servidores_cli:
+            servidor.close()
+        self.servidores_cli = []
+
+    def perder(self) -> bool:
+        return self.perdida > 0 and self.azar.random() < self.perdida
+
+    def retardo(self) -> float:
+        if self.variacion:
+            return max(0.0, self.latencia + self.azar.uniform(-self.variacion, self.variacion))
+        return self.latencia
+
+    def _emitir_trap(self, switch: SwitchSimulado, puerto: int, evento: str) -> None:
+        transporte = self.transportes.get(switch.ip)
+        if self.destino_traps is None or transporte is None:
+            return
+        if self.perder():
+            self.traps_perdidos += 1
+            return
+        mensaje = codificar_mensaje(VERSION_V2C, switch.community, PDU_TRAP_V2, nuevo_request_id(),
+                                    switch.varbinds_trap(puerto, evento))
+        transporte.sendto(mensaje, self.destino_traps)
+        self.traps_enviados += 1
+
+    def enlazar(self, ip: str, puerto: int, mac: Optional[str] = None, retardo_mac: Optional[float] = None) -> None:
+        """Sube el enlace del puerto (trap linkUp) y programa el aprendizaje de `mac`."""
+        switch = self.switches[ip]
+        switch.enlazar(puerto)
+        anterior = self.llegadas.pop((ip, puerto), None)
+        if anterior is not None:
+            anterior.cancel()
+        if mac is None:
+            return
+        retardo = self.retardo_mac if retardo_mac is None else retardo_mac
+        if retardo > 0:
+            self.llegadas[(ip, puerto)] = asyncio.get_running_loop().call_later(
+                retardo, self._aprender, ip, puerto, mac)
+        else:
+            self._aprender(ip, puerto, mac)
+
+    def _aprender(self, ip: str, puerto: int, mac: str) -> None:
+        self.llegadas.pop((ip, puerto), None)
+        switch = self.switches[ip]
+        if switch.operativo(puerto):  # la primera trama solo llega con el enlace arriba
+            switch.conectar(puerto, mac)
+
+    def desenlazar(self, ip: str, puerto: int) -> None:
+        """Baja el enlace del puerto (trap linkDown) y cancela la llegada de MAC pendiente."""
+        llegada = self.llegadas.pop((ip, puerto), None)
+        if llegada is not None:
+            llegada.cancel()
+        self.switches[ip].desenlazar(puerto)
+
+    async def _atender_cli(self, switch: SwitchSimulado, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        """Sesión de la CLI simulada: una línea por comando, prompt tras cada respuesta."""
+        sesion = {'modo': "exec", 'contexto': None}
+        try:
+            writer.write(switch.prompt(sesion).encode())
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                linea = linea.decode(errors="replace").strip()
+                if sesion['modo'] == "exec" and linea in ("exit", "quit", "logout"):
+                    break
+                self.lineas_cli += 1
+                salida = switch.ejecutar_linea(sesion, linea)
+                writer.write(((salida + "\r\n") if salida else "").encode() + switch.prompt(sesion).encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def ejecutar_orden(self, orden: Tuple):
+        """
+        Aplica una orden de control: ("conectar", ip, puerto, mac, adicional), ("desconectar", ip, puerto),
+        ("enlazar", ip, puerto, mac, retardo_mac), ("desenlazar", ip, puerto),
+        ("red", latencia, variacion, perdida), ("configuracion", ip, puerto) o ("estadisticas",).
+        """
+        if orden[0] == "conectar":
+            return self.switches[orden[1]].conectar(*orden[2:])
+        elif orden[0] == "desconectar":
+            self.switches[orden[1]].desconectar(orden[2])
+        elif orden[0] == "enlazar":
+            self.enlazar(*orden[1:])
+        elif orden[0] == "desenlazar":
+            self.desenlazar(orden[1], orden[2])
+        elif orden[0] == "red":
+            self.latencia, self.variacion, self.perdida = orden[1:]
+        elif orden[0] == "configuracion":
+            return self.switches[orden[1]].configuracion_puerto(orden[2])
+        elif orden[0] == "estadisticas":
+            return self.estadisticas()
+        return None
+
+    def estadisticas(self) -> Dict:
+        return {
+            'switches': len(self.switches),
+            'puertos_enlazados': sum(len(switch.enlazados) for switch in self.switches.values()),
+            'macs_aprendidas': sum(len(switch.fdb) for switch in self.switches.values()),
+            'peticiones_snmp': self.peticiones,
+            'peticiones_invalidas': self.invalidas,
+            'peticiones_perdidas': self.peticiones_perdidas,
+            'traps_enviados': self.traps_enviados,
+            'traps_perdidos': self.traps_perdidos,
+            'lineas_cli': self.lineas_cli,
+            'violaciones': sum(switch.violaciones for switch in self.switches.values()),
+        }
+
+async def _ejecutar_agente(conexion, switches: int, puertos: int, puerto_udp: int, community: str,
+                           opciones: Dict) -> None:
+    """Bucle del proceso simulador: atiende SNMP y las órdenes recibidas por la tubería."""
+    loop = asyncio.get_running_loop()
+    agente = AgenteSNMPSimulado(switches, puertos, puerto_udp, community, **opciones)
+    await agente.iniciar()
+    terminado = loop.create_future()
+
+    def orden_recibida():
+        try:
+            orden = conexion.recv()
+        except EOFError:
+            orden = ("parar",)
+        if orden[0] == "parar":
+            loop.remove_reader(conexion.fileno())
+            if not terminado.done():
+                terminado.set_result(None)
+            conexion.send(agente.estadisticas())
+            return
+        try:
+            conexion.send(agente.ejecutar_orden(orden))
+        except Exception as e:
+            conexion.send(e)
+
+    loop.add_reader(conexion.fileno(), orden_recibida)
+    conexion.send("listo")
+    try:
+        await terminado
+    finally:
+        agente.cerrar()
+
+def _proceso_simulador(conexion, switches: int, puertos: int, puerto_udp: int, community: str,
+                       opciones: Dict) -> None:
+    asyncio.run(_ejecutar_agente(conexion, switches, puertos, puerto_udp, community, opciones))
+
+class SimuladorEnProceso:
+    """Agente simulado en un proceso hijo, controlado por una tubería (órdenes síncronas)."""
+
+    def __init__(self, switches: int, puertos: int, puerto_udp: int = PUERTO_AGENTE,
+                 community: str = COMMUNITY_SIMULADA, **opciones):
+        """`opciones` se pasan a AgenteSNMPSimulado (puerto_cli, destino_traps, latencia...)."""
+        self.direcciones = direcciones_simuladas(switches)
+        self.puertos = puertos
+        self.puerto_udp = puerto_udp
+        # spawn: el hijo no hereda los threads (escritores de log, pools) del proceso que mide
+        contexto = multiprocessing.get_context("spawn")
+        self.conexion, extremo_hijo = contexto.Pipe()
+        self.proceso = contexto.Process(target=_proceso_simulador, name="SimuladorSNMP", daemon=True,
+                                        args=(extremo_hijo, switches, puertos, puerto_udp, community, opciones))
+
+    def iniciar(self) -> None:
+        self.proceso.start()
+        if not self.conexion.poll(10):
+            raise RuntimeError("El simulador SNMP no arrancó")
+        respuesta = self.conexion.recv()
+        if respuesta != "listo":
+            raise RuntimeError(f"El simulador SNMP no arrancó: {respuesta}")
+
+    def _orden(self, *orden):
+        self.conexion.send(orden)
+        respuesta = self.conexion.recv()
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return respuesta
+
+    def conectar(self, ip: str, puerto: int, mac: str, adicional: bool = False) -> bool:
+        return self._orden("conectar", ip, puerto, mac, adicional)
+
+    def desconectar(self, ip: str, puerto: int) -> None:
+        self._orden("desconectar", ip, puerto)
+
+    def enlazar(self, ip: str, puerto: int, mac: Optional[str] = None, retardo_mac: Optional[float] = None) -> None:
+        self._orden("enlazar", ip, puerto, mac, retardo_mac)
+
+    def desenlazar(self, ip: str, puerto: int) -> None:
+        self._orden("desenlazar", ip, puerto)
+
+    def configurar_red(self, latencia: float = 0.0, variacion: float = 0.0, perdida: float = 0.0) -> None:
+        self._orden("red", latencia, variacion, perdida)
+
+    def configuracion_puerto(self, ip: str, puerto: int) -> List[str]:
+        return self._orden("configuracion", ip, puerto)
+
+    def estadisticas(self) -> Dict:
+        return self._orden("estadisticas")
+
+    def parar(self) -> Dict:
+        """Detiene el proceso y devuelve sus estadísticas finales."""
+        estadisticas = self._orden("parar")
+        self.proceso.join(timeout=5)
+        return estadisticas
+
+async def _escenario(agente: AgenteSNMPSimulado, eventos: int, ritmo: float) -> None:
+    """Conecta y desconecta equipos al azar en los puertos simulados (`ritmo` eventos/s)."""
+    direcciones = list(agente.switches)
+    for _ in range(eventos):
+        indice = agente.azar.randrange(len(direcciones))
+        switch = agente.switches[direcciones[indice]]
+        puerto = agente.azar.randint(1, switch.puertos)
+        if puerto in switch.enlazados:
+            agente.desenlazar(switch.ip, puerto)
+        else:
+            agente.enlazar(switch.ip, puerto, mac_sintetica(indice, puerto))
+        await asyncio.sleep(1 / ritmo)
+
+def _direccion(texto: str) -> Tuple[str, int]:
+    host, _, puerto = texto.rpartition(":")
+    return host or "127.0.0.1", int(puerto)
+
+def main():
+    parser = argparse.ArgumentParser(description="Agente SNMP simulado (BRIDGE-MIB, IF-MIB y CLI) para pruebas")
+    parser.add_argument('--switches', type=int, default=1, help='Número de switches simulados')
+    parser.add_argument('--puertos', type=int, default=24, help='Puertos por switch')
+    parser.add_argument('--puerto-udp', type=int, default=PUERTO_AGENTE, help='Puerto UDP del agente')
+    parser.add_argument('--puerto-cli', type=int, default=PUERTO_CLI, help='Puerto TCP de la CLI (0: sin CLI)')
+    parser.add_argument('--community', default=COMMUNITY_SIMULADA)
+    parser.add_argument('--traps', type=_direccion, metavar='[IP:]PUERTO',
+                        help='Enviar traps linkUp/linkDown a esta dirección IPv4 (p. ej. el daemon con --udp)')
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos de retardo de cada respuesta')
+    parser.add_argument('--variacion', type=float, default=0.0, help='Variación aleatoria de la latencia (s)')
+    parser.add_argument('--perdida', type=float, default=0.0, help='Probabilidad de perder una petición o un trap')
+    parser.add_argument('--retardo-mac', type=float, default=1.0,
+                        help='Segundos entre el linkUp y el aprendizaje de la MAC')
+    parser.add_argument('--eventos', type=int, default=0, help='Conexiones/desconexiones aleatorias a generar')
+    parser.add_argument('--ritmo', type=float, default=1.0, help='Eventos por segundo del escenario')
+    parser.add_argument('--semilla', type=int, default=None)
+    args = parser.parse_args()
+
+    async def ejecutar():
+        agente = AgenteSNMPSimulado(args.switches, args.puertos, args.puerto_udp, args.community,
+                                    puerto_cli=args.puerto_cli or None, destino_traps=args.traps,
+                                    latencia=args.latencia, variacion=args.variacion, perdida=args.perdida,
+                                    retardo_mac=args.retardo_mac, semilla=args.semilla)
+        await agente.iniciar()
+        print(f"Agente simulado: {args.switches} switches x {args.puertos} puertos en UDP/{args.puerto_udp}"
+              f"{f' y CLI en TCP/{args.puerto_cli}' if args.puerto_cli else ''} "
+              f"({', '.join(list(agente.switches)[:4])}{'...' if args.switches > 4 else ''})")
+        try:
+            if args.eventos:
+                await _escenario(agente, args.eventos, args.ritmo)
+                print(agente.estadisticas())
+            await asyncio.Event().wait()
+        finally:
+            agente.cerrar()
+
+    try:
+        asyncio.run(ejecutar())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -11,121 +11,303 @@ import time
 import threading
 import argparse
 import json
+import urllib.request
 from datetime import datetime, timedelta
 
 # Agregar el directorio raíz al sys.path
 sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
 
-from access_control.snmp_utils import obtener_estadisticas_cache, limpiar_cache, snmp_cache, cache_lock
+from access_control.snmp_utils import obtener_estadisticas_cache, limpiar_cache, cache_mac
+from access_control.estado_compartido import leer_estado, RUTA_ESTADO
+from access_control.metricas import PUERTO_METRICAS
+from access_control.indice_logs import (ARCHIVOS_LOG, leer_ultimas_lineas, SeguidorLog, buscar_eventos,
+                                        normalizar_puerto)
+
+def obtener_estado_publicado():
+    """
+    Estado publicado por el manejador de traps: (proceso más reciente, sus estadísticas,
+    todos los procesos, contenido del cache), o None si ningún proceso ha publicado aún.
+    """
+    try:
+        estado = leer_estado()
+    except Exception as e:
+        print(f"⚠️ No se pudo leer {RUTA_ESTADO}: {e}")
+        return None
+    if not estado or not estado['procesos']:
+        return None
+    proceso = max(estado['procesos'], key=lambda p: estado['procesos'][p]['actualizado'])
+    return proceso, estado['procesos'][proceso], estado['procesos'], estado['cache']
 
 def mostrar_estadisticas_cache():
-    """Muestra estadísticas detalladas del cache SNMP."""
-    stats = obtener_estadisticas_cache()
+    """Muestra estadísticas detalladas del cache SNMP del manejador de traps."""
+    publicado = obtener_estado_publicado()
+    if publicado is None:
+        print("⚠️ Sin estado publicado por el manejador de traps; se muestra el cache de este proceso")
+        stats = obtener_estadisticas_cache()
+        contenido = cache_mac.elementos()
+    else:
+        proceso, datos, procesos, cache = publicado
+        stats = datos.get('cache', obtener_estadisticas_cache())
+        ahora = time.time()
+        contenido = [(clave, valor, ahora - guardado, expira > ahora) for clave, valor, guardado, expira in cache]
+        print("🖥️ Procesos del manejador de traps")
+        print("=" * 40)
+        for nombre, datos_proceso in procesos.items():
+            edad = ahora - datos_proceso['actualizado']
+            print(f"{nombre}: publicado hace {edad:.0f}s")
+            if 'daemon' in datos_proceso:
+                print(f"  Traps: {datos_proceso['daemon']}")
+            if 'antirrebote' in datos_proceso:
+                print(f"  Antirrebote: {datos_proceso['antirrebote']}")
+            if 'sondeo_fdb' in datos_proceso:
+                print(f"  Sondeo del FDB: {datos_proceso['sondeo_fdb']}")
+            if 'diario' in datos_proceso:
+                diario = datos_proceso['diario']
+                print(f"  Diario: {diario['pendientes']} eventos pendientes, {diario['registros']} registros "
+                      f"en {diario['grupos_fsync']} fsync, {diario['recuperados']} recuperados al arrancar")
+            if 'planificador' in datos_proceso:
+                planificador = datos_proceso['planificador']
+                print(f"  Planificador: {planificador['en_curso']}/{planificador['max_simultaneos']} en curso, "
+                      f"en espera {planificador['en_espera']} de {planificador['switches_en_espera']} switches, "
+                      f"espera máxima {planificador['espera_max']}")
+            if 'reconciliador' in datos_proceso:
+                reconciliador = datos_proceso['reconciliador']
+                print(f"  Reconciliador: modelo de {reconciliador['switches']} switches "
+                      f"({reconciliador['lecturas']} lecturas), {reconciliador['lineas_enviadas']} líneas enviadas, "
+                      f"{reconciliador['bloques_omitidos']} bloques ya en el estado pedido")
+            if datos_proceso.get('vlans', {}).get('switches'):
+                vlans = datos_proceso['vlans']
+                print(f"  VLANs conocidas: {vlans['vlans']} en {vlans['switches']} switches, "
+                      f"{vlans['creaciones_omitidas']} creaciones omitidas")
+            if 'supervisor' in datos_proceso:
+                supervisor = datos_proceso['supervisor']
+                print(f"  Supervisor: {supervisor['activos']}/{supervisor['workers']} workers activos, "
+                      f"{supervisor['reinicios']} reinicios, {supervisor['descartados']} traps descartados")
+                for indice, worker in supervisor['por_worker'].items():
+                    print(f"    Worker {indice} (PID {worker['pid']}): {worker['switches']} switches, "
+                          f"{worker['enviados']} traps reenviados, {worker['en_cola']} en cola")
+            for switch, tabla in datos_proceso.get('fdb', {}).items():
+                print(f"  FDB {switch}: {tabla['macs']} MACs en {tabla['puertos_con_mac']} puertos, "
+                      f"{tabla['sin_cambios']}/{tabla['aplicaciones']} walks sin cambios")
+            if datos_proceso.get('metricas'):
+                print(f"  Métricas: {len(datos_proceso['metricas'])} series (ver el comando metrics)")
+        print(f"\nEstadísticas de {proceso}\n")
     
     print("📊 Estadísticas del Cache SNMP")
     print("=" * 40)
     print(f"Entradas totales: {stats['total_entries']}")
     print(f"Entradas válidas: {stats['valid_entries']}")
     print(f"Entradas expiradas: {stats['expired_entries']}")
+    print(f"Entradas negativas (puerto sin MAC): {stats['negative_entries']}")
+    print(f"Capacidad: {stats['max_entries']}")
+    print(f"Aciertos: {stats['hits']} (+{stats['negative_hits']} negativos)")
+    print(f"Fallos: {stats['misses']}")
+    print(f"Expiradas: {stats['expirations']}  Desalojos: {stats['evictions']}  Invalidaciones: {stats['invalidations']}")
     print(f"Tasa de aciertos: {stats['hit_ratio']}")
     
     # Mostrar contenido del cache si hay entradas
-    if stats['total_entries'] > 0:
+    if contenido:
         print("\n🗂️ Contenido del Cache:")
         print("-" * 40)
-        with cache_lock:
-            for key, (mac, timestamp) in snmp_cache.items():
-                age = time.time() - timestamp
-                status = "✅ Válida" if age < 30 else "❌ Expirada"
-                print(f"{key}: {mac} ({age:.1f}s) {status}")
-
-def mostrar_logs_recientes(lineas=20):
-    """Muestra las líneas más recientes de los logs."""
-    log_files = [
-        "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/snmp_utils.log",
-        "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/snmp_traps.log"
-    ]
-    
+        for key, mac, age, vigente in contenido:
+            status = "✅ Válida" if vigente else "❌ Expirada"
+            print(f"{key}: {mac or 'sin MAC'} ({age:.1f}s) {status}")
+
+def _formatear_segundos(valor):
+    if valor is None:
+        return "-"
+    return f"{valor * 1000:.1f}ms" if valor < 1 else f"{valor:.2f}s"
+
+def mostrar_metricas(url=None, filtro=None):
+    """
+    Muestra las métricas del manejador de traps: el texto de Prometheus del endpoint
+    HTTP si se indica `url`, o si no las publicadas en el estado compartido.
+    """
+    if url:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as respuesta:
+                texto = respuesta.read().decode()
+        except OSError as e:
+            print(f"❌ No se pudo consultar {url}: {e}")
+            return
+        for linea in texto.splitlines():
+            if not filtro or filtro in linea:
+                print(linea)
+        return
+
+    publicado = obtener_estado_publicado()
+    if publicado is None or not publicado[1].get('metricas'):
+        print(f"⚠️ Sin métricas publicadas; con el daemon en marcha use --url http://127.0.0.1:{PUERTO_METRICAS}/metrics")
+        return
+    proceso, datos, _, _ = publicado
+    series = {nombre: resumen for nombre, resumen in datos['metricas'].items() if not filtro or filtro in nombre}
+    print(f"📈 Métricas de {proceso} (publicadas hace {time.time() - datos['actualizado']:.0f}s)")
+    print("=" * 40)
+    histogramas = sorted((n, r) for n, r in series.items() if r['tipo'] == 'histograma' and r['cuenta'])
+    if histogramas:
+        ancho = max(len(nombre) for nombre, _ in histogramas)
+        print(f"{'Latencias':<{ancho}}  {'n':>7}  {'media':>9}  {'p50':>9}  {'p95':>9}  {'p99':>9}")
+        for nombre, r in histogramas:
+            print(f"{nombre:<{ancho}}  {r['cuenta']:>7}  {_formatear_segundos(r['media']):>9}  "
+                  f"{_formatear_segundos(r['p50']):>9}  {_formatear_segundos(r['p95']):>9}  "
+                  f"{_formatear_segundos(r['p99']):>9}")
+    valores = sorted((n, r['valor']) for n, r in series.items() if r['tipo'] in ('contador', 'indicador'))
+    if valores:
+        print("\nContadores e indicadores:")
+        for nombre, valor in valores:
+            print(f"  {nombre}: {valor}")
+
+def mostrar_logs_recientes(lineas=20, seguir=False, intervalo=1.0):
+    """Muestra las líneas más recientes de los logs; con seguir=True sigue mostrando las nuevas."""
     print(f"📄 Últimas {lineas} líneas de logs")
     print("=" * 50)
     
-    for log_file in log_files:
+    for log_file in ARCHIVOS_LOG:
         if os.path.exists(log_file):
             print(f"\n📁 {os.path.basename(log_file)}:")
             print("-" * 30)
             try:
-                with open(log_file, 'r') as f:
-                    lines = f.readlines()
-                    for line in lines[-lineas:]:
-                        print(line.strip())
+                for line in leer_ultimas_lineas(log_file, lineas):
+                    print(line.strip())
             except Exception as e:
                 print(f"Error leyendo {log_file}: {e}")
         else:
             print(f"\n❌ {log_file} no encontrado")
 
+    if not seguir:
+        return
+    # Solo se leen los bytes añadidos desde la última comprobación
+    seguidores = [SeguidorLog(log_file) for log_file in ARCHIVOS_LOG]
+    print(f"\n👁️ Siguiendo logs (cada {intervalo}s). Presiona Ctrl+C para detener")
+    try:
+        while True:
+            for seguidor in seguidores:
+                for line in seguidor.leer_nuevas():
+                    print(f"{os.path.basename(seguidor.ruta)}: {line}")
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("\n🛑 Seguimiento detenido")
+
+def _parsear_instante(texto):
+    """Instante absoluto ("2025-07-23 12:19:09", "2025-07-23") o relativo ("90s", "30m", "1h", "2d")."""
+    if texto is None:
+        return None
+    unidades = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if texto[-1:] in unidades and texto[:-1].isdigit():
+        return time.time() - int(texto[:-1]) * unidades[texto[-1]]
+    for formato in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Instante no reconocido: {texto}")
+
+def buscar_en_logs(puerto=None, mac=None, desde=None, hasta=None, limite=None):
+    """Busca entradas de log por puerto, MAC y rango de tiempo usando el índice en disco."""
+    try:
+        inicio, fin = _parsear_instante(desde), _parsear_instante(hasta)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    filtros = []
+    if puerto:
+        filtros.append(f"puerto {normalizar_puerto(puerto)}")
+    if mac:
+        filtros.append(f"MAC {mac}")
+    if desde:
+        filtros.append(f"desde {desde}")
+    if hasta:
+        filtros.append(f"hasta {hasta}")
+    print(f"🔎 Eventos en logs ({', '.join(filtros) or 'sin filtros'})")
+    print("=" * 50)
+
+    resultados = buscar_eventos(puerto=puerto, mac=mac, desde=inicio, hasta=fin, limite=limite)
+    for _, archivo, texto in resultados:
+        print(f"[{archivo}] {texto}")
+    print(f"\n📊 {len(resultados)} entradas encontradas")
+
 def limpiar_cache_comando():
     """Limpia el cache SNMP manualmente."""
     print("🧹 Limpiando cache SNMP...")
-    before_count = len(snmp_cache)
+    before_count = len(cache_mac)
     limpiar_cache()
-    after_count = len(snmp_cache)
+    after_count = len(cache_mac)
     removed = before_count - after_count
     print(f"✅ Cache limpiado. Eliminadas {removed} entradas expiradas.")
     print(f"📊 Entradas restantes: {after_count}")
 
-def simular_carga_concurrente(num_requests=5):
-    """Simula múltiples requests SNMP concurrentes para testing."""
-    from access_control.snmp_utils import buscar_mac_concurrente
-    
-    print(f"🔄 Simulando {num_requests} requests SNMP concurrentes...")
-    
-    # Crear requests de prueba
-    requests = []
-    for i in range(num_requests):
-        requests.append({
-            'request_id': f'test-{i}',
-            'switch_ip': '2001:db8::1',  # IP de ejemplo
-            'ifindex': 10 + i,
-            'community': 'proyectoTDG',
-            'max_reintentos': 1,
-            'espera_inicial': 1
-        })
-    
-    start_time = time.time()
-    results = buscar_mac_concurrente(requests)
-    end_time = time.time()
-    
-    print(f"⏱️ Procesamiento completado en {end_time - start_time:.2f} segundos")
-    print(f"✅ Resultados: {len(results)} responses")
-    
-    for request_id, mac in results.items():
-        status = "✅ Encontrada" if mac else "❌ No encontrada"
-        print(f"  {request_id}: {mac or 'N/A'} {status}")
+def ejecutar_benchmark_comando(args):
+    """
+    Banco de carga del manejador de traps contra el agente SNMP simulado (ver benchmark.py).
+    En el comando replay reproduce el diario de eventos del daemon sin límite de ritmo.
+    """
+    from access_control.benchmark import ejecutar_benchmark
+
+    if args.command == 'replay':
+        fuente, traps, ritmo = 'diario', args.traps, args.rate or 0
+    else:
+        fuente, traps, ritmo = args.source, args.traps or 1000, 200 if args.rate is None else args.rate
+    print(f"🔄 Benchmark: {traps or 'todos los'} traps ({fuente}) a {ritmo or 'máx.'} traps/s contra "
+          f"{args.switches} switches x {args.ports} puertos simulados")
+    opciones_fuente = {'ruta_diario': args.journal} if args.journal else {}
+    resultados = ejecutar_benchmark(
+        fuente=fuente, switches=args.switches, puertos=args.ports, traps=traps, ritmo=ritmo,
+        ventana_antirrebote=args.debounce, ventana_lote=args.batch_window, retardo_backend=args.backend_delay,
+        puerto_agente=args.agent_port, semilla=args.seed, **opciones_fuente,
+    )
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    def segundos(valor):
+        return f"{valor * 1000:.1f} ms" if valor is not None else "N/A"
+
+    print(f"⏱️ Duración: {resultados['duracion_s']:.2f}s "
+          f"(inyección a {resultados['ritmo_inyeccion_traps_s'] or 0:.0f} traps/s)")
+    print(f"✅ Aprovisionados: {resultados['aprovisionados']}/{resultados['traps']} traps "
+          f"en {resultados['lotes']} lotes ({resultados['sin_aprovisionar']} sin aprovisionar)")
+    print(f"📈 Rendimiento: {resultados['rendimiento_traps_s'] or 0:.1f} traps/s")
+    print(f"📊 Latencia trap -> aprovisionado: p50 {segundos(resultados['latencia_p50_s'])}, "
+          f"p95 {segundos(resultados['latencia_p95_s'])}, p99 {segundos(resultados['latencia_p99_s'])}, "
+          f"máx {segundos(resultados['latencia_max_s'])}")
+    print(f"📡 Peticiones SNMP: {resultados['peticiones_snmp']} "
+          f"({resultados['peticiones_snmp_por_trap']:.2f} por trap)")
+    print(f"🚦 Espera máxima de turno en el planificador: {segundos(resultados['espera_turno_max_s'])}")
+    print(f"🖥️ CPU: {resultados['cpu_s']:.2f}s ({resultados['cpu_pct'] or 0:.0f}%)  "
+          f"RSS: {resultados['rss_kb'] / 1024:.1f} MB (máx {resultados['rss_max_kb'] / 1024:.1f} MB)")
+    if resultados['directorio_logs']:
+        print(f"📁 Logs del benchmark: {resultados['directorio_logs']}")
 
 def monitorear_tiempo_real(intervalo=5):
     """Monitorea el sistema en tiempo real."""
     print(f"👁️ Monitoreando sistema en tiempo real (cada {intervalo}s)")
     print("Presiona Ctrl+C para detener")
     print("=" * 50)
+    seguidor_traps = SeguidorLog(ARCHIVOS_LOG[1])
     
     try:
         while True:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            stats = obtener_estadisticas_cache()
-            
-            print(f"\n[{timestamp}] Cache: {stats['valid_entries']}/{stats['total_entries']} válidas")
+            publicado = obtener_estado_publicado()
+            if publicado is None:
+                stats = obtener_estadisticas_cache()
+                print(f"\n[{timestamp}] Cache (local): {stats['valid_entries']}/{stats['total_entries']} válidas")
+            else:
+                proceso, datos, _, _ = publicado
+                stats = datos.get('cache', {})
+                print(f"\n[{timestamp}] {proceso} (hace {time.time() - datos['actualizado']:.0f}s) "
+                      f"Cache: {stats.get('valid_entries', 0)}/{stats.get('total_entries', 0)} válidas, "
+                      f"aciertos {stats.get('hit_ratio', 'N/A')}")
+                if 'daemon' in datos:
+                    print(f"Traps: {datos['daemon']}")
             
-            # Verificar actividad reciente en logs
-            log_file = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/snmp_traps.log"
-            if os.path.exists(log_file):
-                try:
-                    with open(log_file, 'r') as f:
-                        lines = f.readlines()
-                        if lines:
-                            last_line = lines[-1].strip()
-                            print(f"Último log: {last_line[:80]}...")
-                except:
-                    pass
+            # Verificar actividad reciente en logs (solo lo añadido desde la última vuelta)
+            try:
+                nuevas = [line for line in seguidor_traps.leer_nuevas() if line.strip()]
+                if nuevas:
+                    print(f"Nuevas líneas de log: {len(nuevas)}. Última: {nuevas[-1].strip()[:80]}...")
+            except OSError:
+                pass
             
             time.sleep(intervalo)
             
@@ -135,11 +317,31 @@ def monitorear_tiempo_real(intervalo=5):
 def main():
     parser = argparse.ArgumentParser(description="Monitor del sistema SNMP concurrente")
     parser.add_argument('command', choices=[
-        'stats', 'logs', 'clean-cache', 'test-concurrent', 'monitor'
+        'stats', 'metrics', 'logs', 'search', 'clean-cache', 'benchmark', 'replay', 'monitor'
     ], help='Comando a ejecutar')
     parser.add_argument('--lines', '-l', type=int, default=20, help='Número de líneas de log (default: 20)')
-    parser.add_argument('--requests', '-r', type=int, default=5, help='Número de requests concurrentes (default: 5)')
     parser.add_argument('--interval', '-i', type=int, default=5, help='Intervalo de monitoreo en segundos (default: 5)')
+    parser.add_argument('--follow', '-f', action='store_true', help='logs: seguir mostrando las líneas nuevas')
+    parser.add_argument('--port', '-p', help='search: puerto (FastEthernet0/16 o Fa0/16)')
+    parser.add_argument('--mac', '-m', help='search: dirección MAC')
+    parser.add_argument('--since', '-s', help='search: desde (1h, 30m, 2d o "YYYY-MM-DD HH:MM:SS")')
+    parser.add_argument('--until', '-u', help='search: hasta (mismo formato que --since)')
+    parser.add_argument('--max', type=int, help='search: máximo de entradas (las más recientes)')
+    parser.add_argument('--url', help=f'metrics: endpoint del daemon (p. ej. http://127.0.0.1:{PUERTO_METRICAS}/metrics)')
+    parser.add_argument('--filter', help='metrics: mostrar solo las métricas que contienen este texto')
+    parser.add_argument('--source', choices=['sintetico', 'log', 'diario'], default='sintetico',
+                        help='benchmark: tormenta sintética, traps de logs/snmp_traps.log o del diario de eventos (default: sintetico)')
+    parser.add_argument('--journal', help='benchmark/replay: diario de eventos (default: logs/eventos.diario)')
+    parser.add_argument('--traps', type=int, help='benchmark: traps a inyectar (default: 1000; replay: todo el diario)')
+    parser.add_argument('--rate', type=float, help='benchmark: traps por segundo, 0 sin límite (default: 200; replay: 0)')
+    parser.add_argument('--switches', type=int, default=4, help='benchmark: switches simulados (default: 4)')
+    parser.add_argument('--ports', type=int, default=48, help='benchmark: puertos por switch (default: 48)')
+    parser.add_argument('--debounce', type=float, default=3.0, help='benchmark: ventana de antirrebote, 0 la desactiva (default: 3)')
+    parser.add_argument('--batch-window', type=float, default=2.0, help='benchmark: ventana de lote por switch (default: 2)')
+    parser.add_argument('--backend-delay', type=float, default=0.0, help='benchmark: segundos por lote aplicado (default: 0)')
+    parser.add_argument('--agent-port', type=int, default=1161, help='benchmark: puerto UDP del agente simulado (default: 1161)')
+    parser.add_argument('--seed', type=int, help='benchmark: semilla de la tormenta sintética')
+    parser.add_argument('--json', action='store_true', help='benchmark: resultados en JSON')
     
     args = parser.parse_args()
     
@@ -148,12 +350,16 @@ def main():
     
     if args.command == 'stats':
         mostrar_estadisticas_cache()
+    elif args.command == 'metrics':
+        mostrar_metricas(args.url, args.filter)
     elif args.command == 'logs':
-        mostrar_logs_recientes(args.lines)
+        mostrar_logs_recientes(args.lines, args.follow)
+    elif args.command == 'search':
+        buscar_en_logs(args.port, args.mac, args.since, args.until, args.max)
     elif args.command == 'clean-cache':
         limpiar_cache_comando()
-    elif args.command == 'test-concurrent':
-        simular_carga_concurrente(args.requests)
+    elif args.command in ('benchmark', 'replay'):
+        ejecutar_benchmark_comando(args)
     elif args.command == 'monitor':
         monitorear_tiempo_real(args.interval)
 
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+
+"""
+Motor SNMP nativo (v1/v2c) en proceso.
+Implementa la codificación BER de mensajes SNMP y un cliente UDP con soporte de
+GET, GETNEXT y GETBULK, devolviendo varbinds tipados en lugar de texto.
+"""
+
+import asyncio
+import random
+import socket
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+# Tipos ASN.1 / SMI
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_IPADDRESS = 0x40
+TAG_COUNTER32 = 0x41
+TAG_GAUGE32 = 0x42
+TAG_TIMETICKS = 0x43
+TAG_OPAQUE = 0x44
+TAG_COUNTER64 = 0x46
+TAG_NO_SUCH_OBJECT = 0x80
+TAG_NO_SUCH_INSTANCE = 0x81
+TAG_END_OF_MIB_VIEW = 0x82
+
+# Tipos de PDU
+PDU_GET = 0xA0
+PDU_GETNEXT = 0xA1
+PDU_RESPONSE = 0xA2
+PDU_SET = 0xA3
+PDU_TRAP_V1 = 0xA4
+PDU_GETBULK = 0xA5
+PDU_INFORM = 0xA6
+PDU_TRAP_V2 = 0xA7
+
+VERSION_V1 = 0
+VERSION_V2C = 1
+
+NOMBRES_TIPO = {
+    TAG_INTEGER: "INTEGER",
+    TAG_OCTET_STRING: "OCTET STRING",
+    TAG_NULL: "NULL",
+    TAG_OID: "OID",
+    TAG_IPADDRESS: "IpAddress",
+    TAG_COUNTER32: "Counter32",
+    TAG_GAUGE32: "Gauge32",
+    TAG_TIMETICKS: "Timeticks",
+    TAG_OPAQUE: "Opaque",
+    TAG_COUNTER64: "Counter64",
+    TAG_NO_SUCH_OBJECT: "noSuchObject",
+    TAG_NO_SUCH_INSTANCE: "noSuchInstance",
+    TAG_END_OF_MIB_VIEW: "endOfMibView",
+}
+TAGS_POR_NOMBRE = {nombre: tag for tag, nombre in NOMBRES_TIPO.items()}
+TIPOS_EXCEPCION = ("noSuchObject", "noSuchInstance", "endOfMibView")
+
+# Varbind tipado: oid como tupla de enteros, tipo SMI y valor Python
+VarBind = namedtuple("VarBind", ["oid", "tipo", "valor"])
+
+class ErrorSNMP(Exception):
+    """Error en una operación SNMP (timeout, respuesta inválida o error del agente)."""
+
+def oid_a_tupla(oid) -> Tuple[int, ...]:
+    """Convierte un OID en texto ('1.3.6...' o '.1.3.6...') a tupla de enteros."""
+    if isinstance(oid, tuple):
+        return oid
+    return tuple(int(x) for x in str(oid).strip(".").split(".") if x)
+
+def oid_a_texto(oid: Tuple[int, ...]) -> str:
+    """Convierte un OID en tupla a su representación numérica con punto inicial."""
+    return "." + ".".join(str(x) for x in oid)
+
+# --- Codificación BER ---
+
+def _codificar_longitud(longitud: int) -> bytes:
+    if longitud < 0x80:
+        return bytes([longitud])
+    cuerpo = longitud.to_bytes((longitud.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(cuerpo)]) + cuerpo
+
+def _tlv(tag: int, contenido: bytes) -> bytes:
+    return bytes([tag]) + _codificar_longitud(len(contenido)) + contenido
+
+def _codificar_entero(valor: int, tag: int = TAG_INTEGER) -> bytes:
+    longitud = max(1, (valor.bit_length() + 8) // 8)
+    return _tlv(tag, valor.to_bytes(longitud, "big", signed=True))
+
+def _codificar_sin_signo(valor: int, tag: int) -> bytes:
+    longitud = max(1, (valor.bit_length() + 8) // 8)
+    return _tlv(tag, valor.to_bytes(longitud, "big", signed=False))
+
+def _codificar_oid(oid: Tuple[int, ...]) -> bytes:
+    if len(oid) < 2:
+        raise ErrorSNMP(f"OID demasiado corto: {oid}")
+    arcos = [oid[0] * 40 + oid[1]] + list(oid[2:])
+    contenido = bytearray()
+    for arco in arcos:
+        trozo = [arco & 0x7F]
+        arco >>= 7
+        while arco:
+            trozo.append(0x80 | (arco & 0x7F))
+            arco >>= 7
+        contenido.extend(reversed(trozo))
+    return _tlv(TAG_OID, bytes(contenido))
+
+def codificar_valor(tipo: str, valor) -> bytes:
+    """Codifica un valor SMI tipado en BER."""
+    tag = TAGS_POR_NOMBRE.get(tipo)
+    if tag is None:
+        raise ErrorSNMP(f"Tipo SNMP no soportado: {tipo}")
+    if tag == TAG_INTEGER:
+        return _codificar_entero(int(valor))
+    if tag in (TAG_COUNTER32, TAG_GAUGE32, TAG_TIMETICKS, TAG_COUNTER64):
+        return _codificar_sin_signo(int(valor), tag)
+    if tag in (TAG_OCTET_STRING, TAG_OPAQUE):
+        return _tlv(tag, valor.encode() if isinstance(valor, str) else bytes(valor))
+    if tag == TAG_IPADDRESS:
+        return _tlv(tag, socket.inet_aton(valor) if isinstance(valor, str) else bytes(valor))
+    if tag == TAG_OID:
+        return _codificar_oid(oid_a_tupla(valor))
+    return _tlv(tag, b"")
+
+def _codificar_varbinds(varbinds: List[VarBind]) -> bytes:
+    return _tlv(TAG_SEQUENCE, b"".join(
+        _tlv(TAG_SEQUENCE, _codificar_oid(vb.oid) + codificar_valor(vb.tipo, vb.valor))
+        for vb in varbinds
+    ))
+
+def codificar_mensaje(version: int, community: str, tipo_pdu: int, request_id: int,
+                      varbinds: List[VarBind], error_status: int = 0, error_index: int = 0) -> bytes:
+    """
+    Codifica un mensaje SNMP v1/v2c completo.
+
+    Para GETBULK, `error_status` y `error_index` transportan non-repeaters y
+    max-repetitions respectivamente, como define RFC 3416.
+    """
+    pdu = _tlv(tipo_pdu,
+               _codificar_entero(request_id)
+               + _codificar_entero(error_status)
+               + _codificar_entero(error_index)
+               + _codificar_varbinds(varbinds))
+    return _tlv(TAG_SEQUENCE, _codificar_entero(version) + _tlv(TAG_OCTET_STRING, community.encode()) + pdu)
+
+# --- Decodificación BER ---
+
+def _leer_tlv(datos: bytes, pos: int) -> Tuple[int, int, int]:
+    """Lee un TLV y devuelve (tag, inicio_contenido, fin_contenido)."""
+    if pos + 2 > len(datos):
+        raise ErrorSNMP("Mensaje BER truncado")
+    tag = datos[pos]
+    longitud = datos[pos + 1]
+    pos += 2
+    if longitud & 0x80:
+        num_bytes = longitud & 0x7F
+        if num_bytes == 0 or pos + num_bytes > len(datos):
+            raise ErrorSNMP("Longitud BER inválida")
+        longitud = int.from_bytes(datos[pos:pos + num_bytes], "big")
+        pos += num_bytes
+    if pos + longitud > len(datos):
+        raise ErrorSNMP("Mensaje BER truncado")
+    return tag, pos, pos + longitud
+
+def _decodificar_oid(contenido: bytes) -> Tuple[int, ...]:
+    """Decodifica un OID; uno vacío o con el último subidentificador cortado es ErrorSNMP."""
+    if not contenido:
+        raise ErrorSNMP("OID vacío")
+    if contenido[-1] & 0x80:
+        raise ErrorSNMP("OID truncado: el último subidentificador no termina")
+    arcos = []
+    valor = 0
+    for byte in contenido:
+        valor = (valor << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcos.append(valor)
+            valor = 0
+    primero = arcos[0]
+    if primero < 80:
+        inicio = [primero // 40, primero % 40]
+    else:
+        inicio = [2, primero - 80]
+    return tuple(inicio + arcos[1:])
+
+def decodificar_valor(tag: int, contenido: bytes):
+    """Decodifica el contenido BER de un valor SMI y devuelve (tipo, valor)."""
+    tipo = NOMBRES_TIPO.get(tag, f"0x{tag:02x}")
+    if tag == TAG_INTEGER:
+        return tipo, int.from_bytes(contenido, "big", signed=True)
+    if tag in (TAG_COUNTER32, TAG_GAUGE32, TAG_TIMETICKS, TAG_COUNTER64):
+        return tipo, int.from_bytes(contenido, "big", signed=False)
+    if tag == TAG_OID:
+        return tipo, _decodificar_oid(contenido)
+    if tag == TAG_IPADDRESS:
+        return tipo, socket.inet_ntoa(contenido) if len(contenido) == 4 else bytes(contenido)
+    if tag in (TAG_NULL, TAG_NO_SUCH_OBJECT, TAG_NO_SUCH_INSTANCE, TAG_END_OF_MIB_VIEW):
+        return tipo, None
+    return tipo, bytes(contenido)
+
+def _decodificar_varbinds(datos: bytes, inicio: int, fin: int) -> List[VarBind]:
+    varbinds = []
+    pos = inicio
+    while pos < fin:
+        _, ini_vb, fin_vb = _leer_tlv(datos, pos)
+        tag_oid, ini_oid, fin_oid = _leer_tlv(datos, ini_vb)
+        if tag_oid != TAG_OID:
+            raise ErrorSNMP("Varbind sin OID")
+        tag_valor, ini_valor, fin_valor = _leer_tlv(datos, fin_oid)
+        tipo, valor = decodificar_valor(tag_valor, datos[ini_valor:fin_valor])
+        varbinds.append(VarBind(_decodificar_oid(datos[ini_oid:fin_oid]), tipo, valor))
+        pos = fin_vb
+    return varbinds
+
+def decodificar_mensaje(datos: bytes) -> Dict:
+    """
+    Decodifica un mensaje SNMP v1/v2c.
+
+    Returns:
+        Dict con 'version', 'community', 'tipo_pdu' y 'varbinds'. Para PDUs
+        estándar incluye 'request_id', 'error_status' y 'error_index'; para traps
+        SNMPv1 incluye 'enterprise', 'agent_addr', 'generic_trap', 'specific_trap'
+        y 'timestamp'.
+    """
+    tag, inicio, fin = _leer_tlv(datos, 0)
+    if tag != TAG_SEQUENCE:
+        raise ErrorSNMP("El mensaje no es una SEQUENCE")
+    _, ini, pos = _leer_tlv(datos, inicio)
+    version = int.from_bytes(datos[ini:pos], "big", signed=True)
+    _, ini, pos_community = _leer_tlv(datos, pos)
+    community = datos[ini:pos_community].decode(errors="replace")
+    tipo_pdu, ini_pdu, fin_pdu = _leer_tlv(datos, pos_community)
+
+    mensaje = {'version': version, 'community': community, 'tipo_pdu': tipo_pdu}
+    campos = []
+    pos = ini_pdu
+    num_campos = 5 if tipo_pdu == PDU_TRAP_V1 else 3
+    for _ in range(num_campos):
+        tag_campo, ini, fin_campo = _leer_tlv(datos, pos)
+        campos.append(decodificar_valor(tag_campo, datos[ini:fin_campo])[1])
+        pos = fin_campo
+
+    if tipo_pdu == PDU_TRAP_V1:
+        (mensaje['enterprise'], mensaje['agent_addr'], mensaje['generic_trap'],
+         mensaje['specific_trap'], mensaje['timestamp']) = campos
+    else:
+        mensaje['request_id'], mensaje['error_status'], mensaje['error_index'] = campos
+
+    _, ini_vbs, fin_vbs = _leer_tlv(datos, pos)
+    mensaje['varbinds'] = _decodificar_varbinds(datos, ini_vbs, fin_vbs)
+    return mensaje
+
+# --- Cliente UDP ---
+
+_request_id_lock = threading.Lock()
+_siguiente_request_id = random.randint(1, 0x3FFFFFFF)
+
+def nuevo_request_id() -> int:
+    """Devuelve un request-id único dentro del proceso."""
+    global _siguiente_request_id
+    with _request_id_lock:
+        _siguiente_request_id = (_siguiente_request_id % 0x7FFFFFFF) + 1
+        return _siguiente_request_id
+
+class ClienteSNMP:
+    """
+    Cliente SNMP v2c sobre UDP. Cada operación usa su propio socket, por lo que
+    una instancia puede compartirse entre threads.
+    """
+
+    def __init__(self, community: str = "public", puerto: int = 161, timeout: float = 2.0,
+                 reintentos: int = 2, max_repeticiones: int = 25, version: int = VERSION_V2C):
+        self.community = community
+        self.puerto = puerto
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.max_repeticiones = max_repeticiones
+        self.version = version
+
+    def _peticion(self, host: str, tipo_pdu: int, varbinds: List[VarBind],
+                  error_status: int = 0, error_index: int = 0) -> Dict:
+        familia, _, _, _, direccion = socket.getaddrinfo(host, self.puerto, type=socket.SOCK_DGRAM)[0]
+        request_id = nuevo_request_id()
+        paquete = codificar_mensaje(self.version, self.community, tipo_pdu, request_id,
+                                    varbinds, error_status, error_index)
+        with socket.socket(familia, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(direccion)
+            for _ in range(self.reintentos + 1):
+                sock.send(paquete)
+                try:
+                    while True:
+                        try:
+                            respuesta = decodificar_mensaje(sock.recv(65535))
+                        except ErrorSNMP:
+                            continue  # Datagrama malformado: se sigue esperando la respuesta válida
+                        if respuesta['tipo_pdu'] == PDU_RESPONSE and respuesta.get('request_id') == request_id:
+                            break
+                except socket.timeout:
+                    continue
+                except ConnectionRefusedError:
+                    raise ErrorSNMP(f"Puerto SNMP inalcanzable en {host}")
+                if respuesta['error_status']:
+                    raise ErrorSNMP(f"Error SNMP {respuesta['error_status']} "
+                                    f"(índice {respuesta['error_index']}) desde {host}")
+                return respuesta
+        raise ErrorSNMP(f"Timeout SNMP tras {self.reintentos + 1} intentos contra {host}")
+
+    def get(self, host: str, oids: List) -> List[VarBind]:
+        """Ejecuta un GET sobre los OIDs indicados."""
+        varbinds = [VarBind(oid_a_tupla(oid), "NULL", None) for oid in oids]
+        return self._peticion(host, PDU_GET, varbinds)['varbinds']
+
+    def get_next(self, host: str, oids: List) -> List[VarBind]:
+        """Ejecuta un GETNEXT sobre los OIDs indicados."""
+        varbinds = [VarBind(oid_a_tupla(oid), "NULL", None) for oid in oids]
+        return self._peticion(host, PDU_GETNEXT, varbinds)['varbinds']
+
+    def get_bulk(self, host: str, oid, max_repeticiones: Optional[int] = None) -> List[VarBind]:
+        """Ejecuta un GETBULK (sin non-repeaters) a partir de un OID."""
+        if max_repeticiones is None:
+            max_repeticiones = self.max_repeticiones
+        varbinds = [VarBind(oid_a_tupla(oid), "NULL", None)]
+        return self._peticion(host, PDU_GETBULK, varbinds, 0, max_repeticiones)['varbinds']
+
+    def walk(self, host: str, oid, max_repeticiones: Optional[int] = None) -> List[VarBind]:
+        """
+        Recorre el subárbol de `oid` usando GETBULK (o GETNEXT en SNMPv1).
+
+        Returns:
+            Lista de varbinds del subárbol en orden lexicográfico.
+        """
+        base = oid_a_tupla(oid)
+        actual = base
+        resultado = []
+        while actual is not None:
+            if self.version == VERSION_V1:
+                varbinds = self.get_next(host, [actual])
+            else:
+                varbinds = self.get_bulk(host, actual, max_repeticiones)
+            actual = _acumular_walk(host, base, actual, varbinds, resultado)
+        return resultado
+
+def _acumular_walk(host: str, base: Tuple[int, ...], actual: Tuple[int, ...],
+                   varbinds: List[VarBind], resultado: List[VarBind]) -> Optional[Tuple[int, ...]]:
+    """
+    Añade a `resultado` los varbinds de una respuesta que pertenecen al subárbol.
+
+    Returns:
+        El OID desde el que continuar el walk, o None si el subárbol terminó.
+    """
+    if not varbinds:
+        return None
+    for vb in varbinds:
+        if vb.tipo in TIPOS_EXCEPCION or vb.oid[:len(base)] != base:
+            return None
+        if vb.oid <= actual:
+            raise ErrorSNMP(f"OID no creciente en walk de {host}: {oid_a_texto(vb.oid)}")
+        resultado.append(vb)
+        actual = vb.oid
+    return actual
+
+class _ProtocoloCliente(asyncio.DatagramProtocol):
+    """Entrega cada respuesta UDP a la petición en curso con el mismo request-id."""
+
+    def __init__(self):
+        self.pendientes = {}
+
+    def datagram_received(self, datos, direccion):
+        try:
+            mensaje = decodificar_mensaje(datos)
+        except ErrorSNMP:
+            return
+        futuro = self.pendientes.get(mensaje.get('request_id'))
+        if futuro is not None and not futuro.done() and mensaje['tipo_pdu'] == PDU_RESPONSE:
+            futuro.set_result(mensaje)
+
+    def error_received(self, exc):
+        for futuro in self.pendientes.values():
+            if not futuro.done():
+                futuro.set_exception(ErrorSNMP(str(exc)))
+
+class ClienteSNMPAsync(ClienteSNMP):
+    """
+    Variante asyncio de ClienteSNMP: las esperas de red no bloquean el event loop,
+    por lo que miles de consultas pendientes cuestan corrutinas y no threads.
+    """
+
+    async def _peticion(self, host: str, tipo_pdu: int, varbinds: List[VarBind],
+                        error_status: int = 0, error_index: int = 0) -> Dict:
+        loop = asyncio.get_running_loop()
+        familia, _, _, _, direccion = (await loop.getaddrinfo(host, self.puerto, type=socket.SOCK_DGRAM))[0]
+        request_id = nuevo_request_id()
+        paquete = codificar_mensaje(self.version, self.community, tipo_pdu, request_id,
+                                    varbinds, error_status, error_index)
+        transporte, protocolo = await loop.create_datagram_endpoint(
+            _ProtocoloCliente, family=familia, remote_addr=direccion[:2])
+        try:
+            for _ in range(self.reintentos + 1):
+                futuro = loop.create_future()
+                protocolo.pendientes[request_id] = futuro
+                transporte.sendto(paquete)
+                try:
+                    respuesta = await asyncio.wait_for(futuro, self.timeout)
+                except asyncio.TimeoutError:
+                    continue
+                if respuesta['error_status']:
+                    raise ErrorSNMP(f"Error SNMP {respuesta['error_status']} "
+                                    f"(índice {respuesta['error_index']}) desde {host}")
+                return respuesta
+        finally:
+            transporte.close()
+        raise ErrorSNMP(f"Timeout SNMP tras {self.reintentos + 1} intentos contra {host}")
+
+    async def get(self, host: str, oids: List) -> List[VarBind]:
+        varbinds = [VarBind(oid_a_tupla(oid), "NULL", None) for oid in oids]
+        return (await self._peticion(host, PDU_GET, varbinds))['varbinds']
+
+    async def get_next(self, host: str, oids: List) -> List[VarBind]:
+        varbinds = [VarBind(oid_a_tupla(oid), "NULL", None) for oid in oids]
+        return (await self._peticion(host, PDU_GETNEXT, varbinds))['varbinds']
+
+    async def get_bulk(self, host: str, oid, max_repeticiones: Optional[int] = None) -> List[VarBind]:
+        if max_repeticiones is None:
+            max_repeticiones = self.max_repeticiones
+        varbinds = [VarBind(oid_a_tupla(oid), "NULL", None)]
+        return (await self._peticion(host, PDU_GETBULK, varbinds, 0, max_repeticiones))['varbinds']
+
+    async def walk(self, host: str, oid, max_repeticiones: Optional[int] = None) -> List[VarBind]:
+        base = oid_a_tupla(oid)
+        actual = base
+        resultado = []
+        while actual is not None:
+            if self.version == VERSION_V1:
+                varbinds = await self.get_next(host, [actual])
+            else:
+                varbinds = await self.get_bulk(host, actual, max_repeticiones)
+            actual = _acumular_walk(host, base, actual, varbinds, resultado)
+        return resultado
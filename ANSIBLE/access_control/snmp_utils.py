@@ -1,100 +1,130 @@
 #!/usr/bin/env python3
 
 import subprocess
-import datetime
 import time
 import os
 import threading
 import queue
-import concurrent.futures
-from typing import Optional, Dict, List
+import sys
+import asyncio
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-# Locks globales para thread-safety
-log_lock = threading.Lock()
-snmp_operation_lock = threading.Lock()
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_nativo import ClienteSNMP, ClienteSNMPAsync, ErrorSNMP, VarBind, TIPOS_EXCEPCION, oid_a_tupla
+from access_control import metricas
+from access_control.registro import EscritorLog
+from access_control.cache import CacheTTL, AUSENTE
+from access_control.tabla_fdb import TablaFDB, CAMBIO_NUEVA, CAMBIO_MOVIDA
+
+# Log escrito en segundo plano, con rotación por tamaño y filtrado por nivel
+LOG_FILE = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/snmp_utils.log"
+MAX_BYTES_LOG = 1024 * 1024
+NIVEL_LOG = os.environ.get("NIVEL_LOG", "INFO")
+escritor_log = EscritorLog(LOG_FILE, MAX_BYTES_LOG, NIVEL_LOG)
+
+# Límite de operaciones SNMP simultáneas por switch (en lugar de un lock global)
+MAX_OPERACIONES_SNMP_POR_SWITCH = 2
+semaforos_snmp = {}        # switch -> threading.BoundedSemaphore
+semaforos_snmp_async = {}  # switch -> asyncio.Semaphore
+semaforos_snmp_lock = threading.Lock()
 
 # Cola para operaciones SNMP concurrentes
 snmp_queue = queue.Queue()
 
-# Cache de resultados SNMP para evitar consultas duplicadas
-snmp_cache = {}
-cache_lock = threading.Lock()
+# Cache de resultados SNMP para evitar consultas duplicadas (MAC por puerto; None = puerto sin MAC)
 CACHE_TTL = 30  # segundos
+CACHE_TTL_NEGATIVO = 5  # segundos que se recuerda que un puerto no tiene MAC
+CACHE_MAX_ENTRADAS = 4096
+cache_mac = CacheTTL("mac_por_puerto", CACHE_MAX_ENTRADAS, CACHE_TTL, CACHE_TTL_NEGATIVO)
 
-# Función para limpiar logs antiguos y rotar archivos
-def rotar_logs_si_necesario(max_lines=1000):
-    """
-    Rota el archivo de log si supera el número máximo de líneas.
-    
-    Args:
-        max_lines (int): Número máximo de líneas antes de rotar.
-    """
-    log_path = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs/snmp_utils.log"
-    
-    if not os.path.exists(log_path):
-        return
-        
-    try:
-        with open(log_path, 'r') as f:
-            lines = f.readlines()
-            
-        if len(lines) > max_lines:
-            # Mantener solo las últimas max_lines/2 líneas
-            keep_lines = lines[-(max_lines//2):]
-            with open(log_path, 'w') as f:
-                f.write(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [INFO] Log rotado - manteniendo últimas {len(keep_lines)} líneas\n")
-                f.writelines(keep_lines)
-    except Exception as e:
-        print(f"Error rotando logs: {e}")
+# Snapshots por switch de la tabla de puente (FDB + portNum -> ifIndex)
+OID_MAC_TO_PORT = "1.3.6.1.2.1.17.4.3.1.2"       # dot1dTpFdbPort
+OID_PORT_TO_IFINDEX = "1.3.6.1.2.1.17.1.4.1.2"   # dot1dBasePortIfIndex
+OID_QBRIDGE_MAC_TO_PORT = "1.3.6.1.2.1.17.7.1.2.2.1.2"  # dot1qTpFdbPort (FDB por VLAN, Q-BRIDGE-MIB)
+soporte_qbridge = {}  # switch -> True/False cuando se sabe si ofrece el FDB de Q-BRIDGE-MIB
+snapshots_puente = {}     # "switch:community" -> snapshot
+snapshots_en_curso = {}   # "switch:community" -> walk en vuelo compartido
+snapshots_en_curso_async = {}  # "switch:community" -> asyncio.Future del walk en vuelo
+snapshot_lock = threading.Lock()
+SNAPSHOT_TTL = 10  # segundos
+SNAPSHOT_WAIT_TIMEOUT = 30  # segundos
+suscriptores_snapshot = []  # callbacks(switch_ip, community, snapshot) ante cada snapshot nuevo
+tablas_fdb = {}  # "switch:community" -> TablaFDB: cada walk se aplica como diferencia con el anterior
+suscriptores_cambios_fdb = []  # callbacks(switch_ip, community, cambios) ante MACs nuevas, movidas o envejecidas
+metrica_walk = metricas.histograma_etiquetado(
+    "snmp_walk_segundos", "Walks de BRIDGE-MIB de un snapshot completo", ("switch",), metricas.LIMITES_RED)
+metrica_walk_errores = metricas.contador_etiquetado(
+    "snmp_walk_errores_total", "Snapshots de la tabla de puente fallidos", ("switch",))
+metrica_cambios_fdb = metricas.contador_etiquetado(
+    "snmp_fdb_cambios_total", "Cambios del FDB entre walks consecutivos", ("switch", "tipo"))
+
+# MAC presente en un puerto y VLAN en la que la ve el switch (None sin Q-BRIDGE-MIB)
+MACPuerto = namedtuple("MACPuerto", ["mac", "vlan"])
+
+# Resolución de MAC por eventos: sondeo adaptativo del FDB mientras haya puertos esperando
+PLAZO_RESOLUCION_MAC = 30  # segundos
+INTERVALO_SONDEO_MIN = 0.5  # segundos, justo después de un linkUp
+INTERVALO_SONDEO_MAX = 5  # segundos
+FACTOR_BACKOFF_SONDEO = 1.5
+
+# Sondeo periódico opcional del FDB de todos los switches (ver SondeoPeriodicoFDB)
+INTERVALO_SONDEO_FDB = 20  # segundos; por debajo de CACHE_TTL las MACs conocidas no expiran del cache
+metrica_macs_nuevas = metricas.contador_etiquetado(
+    "snmp_fdb_macs_nuevas_total", "MACs nuevas en un puerto detectadas al comparar snapshots del FDB", ("switch",))
+
+# Backend SNMP: "nativo" (UDP/BER en proceso) o "subproceso" (binario snmpwalk)
+SNMP_BACKEND = os.environ.get("SNMP_BACKEND", "nativo")
+SNMP_FALLBACK_SUBPROCESO = True  # Reintentar con snmpwalk si el backend nativo falla
+SNMP_PUERTO = int(os.environ.get("SNMP_PUERTO", "161"))  # otro puerto para el agente simulado (simulador_snmp.py)
+SNMP_MAX_REPETICIONES = 25
+SNMP_TIMEOUT = 2  # segundos por petición (backend nativo)
+SNMP_REINTENTOS = 2
 
-# Función para registrar mensajes en un archivo de log
 def log(message, level="INFO"):
     """
-    Escribe un mensaje en el archivo de log `snmp_utils.log` de forma thread-safe.
+    Registra un mensaje en el archivo de log `snmp_utils.log`. El mensaje se encola y
+    lo escribe el thread del escritor de logs; los niveles inferiores a NIVEL_LOG se
+    descartan sin formatear.
 
     Args:
         message (str): Mensaje a registrar.
         level (str): Nivel de log (INFO, DEBUG, ERROR, etc.)
     """
-    with log_lock:  # Thread-safe logging
-        os.chdir("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE/access_control/logs")
-        
-        # Rotar logs si es necesario antes de escribir
-        if level in ["INFO", "ERROR"]:  # Solo rotar en logs importantes
-            rotar_logs_si_necesario()
-        
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        thread_id = threading.current_thread().name
-        with open("snmp_utils.log", "a") as log_file:
-            log_file.write(f"[{timestamp}] [{level}] [Thread:{thread_id}] {message}\n")
+    escritor_log.escribir(message, level)
 
 def get_cache_key(switch_ip: str, ifindex: int, community: str) -> str:
     """Genera una clave única para el cache de operaciones SNMP."""
     return f"{switch_ip}:{ifindex}:{community}"
 
-def is_cache_valid(timestamp: float) -> bool:
-    """Verifica si el resultado en cache aún es válido."""
-    return (time.time() - timestamp) < CACHE_TTL
+def consultar_cache(cache_key: str, incluir_negativas: bool = True):
+    """
+    Consulta el cache de MACs.
+
+    Returns:
+        La MAC, None si se sabe que el puerto no tiene MAC, o AUSENTE si no hay dato vigente.
+    """
+    mac = cache_mac.obtener(cache_key, incluir_negativas)
+    if mac is not AUSENTE:
+        log(f"Cache hit para {cache_key}: {mac or 'sin MAC'}", "DEBUG")
+    return mac
 
 def get_from_cache(cache_key: str) -> Optional[str]:
-    """Obtiene un resultado del cache si es válido."""
-    with cache_lock:
-        if cache_key in snmp_cache:
-            mac, timestamp = snmp_cache[cache_key]
-            if is_cache_valid(timestamp):
-                log(f"Cache hit para {cache_key}: {mac}", "DEBUG")
-                return mac
-            else:
-                # Cache expirado, eliminarlo
-                del snmp_cache[cache_key]
-                log(f"Cache expirado para {cache_key}", "DEBUG")
-    return None
+    """Obtiene una MAC del cache si es válida (las entradas negativas se ignoran)."""
+    mac = consultar_cache(cache_key, incluir_negativas=False)
+    return None if mac is AUSENTE else mac
 
-def set_cache(cache_key: str, mac: str) -> None:
-    """Almacena un resultado en el cache."""
-    with cache_lock:
-        snmp_cache[cache_key] = (mac, time.time())
-        log(f"Cache actualizado para {cache_key}: {mac}", "DEBUG")
+def set_cache(cache_key: str, mac: Optional[str]) -> None:
+    """Almacena un resultado en el cache; None registra que el puerto no tiene MAC."""
+    cache_mac.guardar(cache_key, mac)
+    log(f"Cache actualizado para {cache_key}: {mac or 'sin MAC'}", "DEBUG")
+
+def invalidar_cache_puerto(switch_ip: str, ifindex, community: str = "proyectoTDG") -> None:
+    """Descarta lo que se sabe de la MAC de un puerto (p. ej. tras un linkDown)."""
+    if cache_mac.invalidar(get_cache_key(switch_ip, ifindex, community)):
+        log(f"Cache invalidado para ifIndex {ifindex} de {switch_ip}", "DEBUG")
 
 def execute_snmp_command_with_timeout(command: List[str], timeout: int = 10) -> Optional[str]:
     """
@@ -126,8 +156,534 @@ def execute_snmp_command_with_timeout(command: List[str], timeout: int = 10) ->
         log(f"Error ejecutando comando SNMP: {str(e)}", "ERROR")
         return None
 
+async def execute_snmp_command_async(command: List[str], timeout: int = 10) -> Optional[str]:
+    """
+    Versión asyncio de execute_snmp_command_with_timeout: espera al proceso sin
+    bloquear el event loop.
+
+    Returns:
+        Salida del comando o None si falla
+    """
+    try:
+        proceso = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except Exception as e:
+        log(f"Error ejecutando comando SNMP: {str(e)}", "ERROR")
+        return None
+    try:
+        stdout, stderr = await asyncio.wait_for(proceso.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proceso.kill()
+        await proceso.wait()
+        log(f"Timeout ejecutando comando SNMP: {' '.join(command)}", "ERROR")
+        return None
+    if proceso.returncode != 0:
+        log(f"Error en comando SNMP: {stderr.decode(errors='replace')}", "ERROR")
+        return None
+    return stdout.decode(errors="replace")
+
+def semaforo_snmp(switch_ip: str) -> threading.BoundedSemaphore:
+    """Devuelve el semáforo que limita las operaciones SNMP simultáneas contra un switch."""
+    with semaforos_snmp_lock:
+        semaforo = semaforos_snmp.get(switch_ip)
+        if semaforo is None:
+            semaforo = threading.BoundedSemaphore(MAX_OPERACIONES_SNMP_POR_SWITCH)
+            semaforos_snmp[switch_ip] = semaforo
+        return semaforo
+
+def semaforo_snmp_async(switch_ip: str) -> asyncio.Semaphore:
+    """Equivalente asyncio de semaforo_snmp (debe usarse desde el event loop)."""
+    semaforo = semaforos_snmp_async.get(switch_ip)
+    if semaforo is None:
+        semaforo = asyncio.Semaphore(MAX_OPERACIONES_SNMP_POR_SWITCH)
+        semaforos_snmp_async[switch_ip] = semaforo
+    return semaforo
+
+def _parsear_linea_snmpwalk(linea: str) -> Optional[VarBind]:
+    """
+    Convierte una línea de salida de `snmpwalk -On` en un varbind tipado.
+
+    Returns:
+        VarBind o None si la línea no tiene el formato esperado.
+    """
+    partes = linea.split(" = ", 1)
+    if len(partes) != 2:
+        return None
+    try:
+        oid = oid_a_tupla(partes[0])
+    except ValueError:
+        return None
+
+    texto = partes[1].strip()
+    if texto.startswith("No Such Instance"):
+        return VarBind(oid, "noSuchInstance", None)
+    if texto.startswith("No Such Object"):
+        return VarBind(oid, "noSuchObject", None)
+    if texto.startswith("No more variables"):
+        return VarBind(oid, "endOfMibView", None)
+
+    tipo, _, valor = texto.partition(": ")
+    try:
+        if tipo == "INTEGER":
+            # Enumeraciones con nombre: "up(1)"
+            if "(" in valor:
+                valor = valor[valor.index("(") + 1:valor.index(")")]
+            return VarBind(oid, "INTEGER", int(valor))
+        if tipo in ("Counter32", "Gauge32", "Counter64"):
+            return VarBind(oid, tipo, int(valor))
+        if tipo == "Timeticks":
+            return VarBind(oid, "Timeticks", int(valor[valor.index("(") + 1:valor.index(")")]))
+        if tipo == "OID":
+            return VarBind(oid, "OID", oid_a_tupla(valor))
+        if tipo == "Hex-STRING":
+            return VarBind(oid, "OCTET STRING", bytes.fromhex(valor.replace(" ", "")))
+        if tipo == "STRING":
+            return VarBind(oid, "OCTET STRING", valor.strip('"').encode())
+        if tipo == "IpAddress":
+            return VarBind(oid, "IpAddress", valor)
+    except ValueError:
+        return None
+    return VarBind(oid, "OCTET STRING", texto.encode())
+
+class BackendSNMPSubproceso:
+    """Backend SNMP que ejecuta el binario `snmpwalk` y parsea su salida."""
+
+    nombre = "subproceso"
+
+    def walk(self, switch_ip: str, oid: str, community: str) -> Optional[List[VarBind]]:
+        salida = execute_snmp_command_with_timeout([
+            "snmpwalk", "-v2c", "-c", community, "-On", switch_ip, oid
+        ])
+        return self._parsear_salida(salida)
+
+    async def walk_async(self, switch_ip: str, oid: str, community: str) -> Optional[List[VarBind]]:
+        salida = await execute_snmp_command_async([
+            "snmpwalk", "-v2c", "-c", community, "-On", switch_ip, oid
+        ])
+        return self._parsear_salida(salida)
+
+    @staticmethod
+    def _parsear_salida(salida: Optional[str]) -> Optional[List[VarBind]]:
+        if salida is None:
+            return None
+        varbinds = []
+        for linea in salida.splitlines():
+            varbind = _parsear_linea_snmpwalk(linea)
+            if varbind:
+                varbinds.append(varbind)
+        return varbinds
+
+class BackendSNMPNativo:
+    """Backend SNMP en proceso: UDP + BER con GETBULK, sin fork/exec por consulta."""
+
+    nombre = "nativo"
+
+    def __init__(self, max_repeticiones: int = SNMP_MAX_REPETICIONES, timeout: float = SNMP_TIMEOUT,
+                 reintentos: int = SNMP_REINTENTOS, puerto: int = SNMP_PUERTO):
+        self.max_repeticiones = max_repeticiones
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.puerto = puerto
+
+    def walk(self, switch_ip: str, oid: str, community: str) -> Optional[List[VarBind]]:
+        cliente = ClienteSNMP(community=community, puerto=self.puerto, timeout=self.timeout,
+                              reintentos=self.reintentos, max_repeticiones=self.max_repeticiones)
+        try:
+            return cliente.walk(switch_ip, oid)
+        except (ErrorSNMP, OSError) as e:
+            log(f"Error en walk SNMP nativo de {oid} en {switch_ip}: {str(e)}", "ERROR")
+            return None
+
+    async def walk_async(self, switch_ip: str, oid: str, community: str) -> Optional[List[VarBind]]:
+        cliente = ClienteSNMPAsync(community=community, puerto=self.puerto, timeout=self.timeout,
+                                   reintentos=self.reintentos, max_repeticiones=self.max_repeticiones)
+        try:
+            return await cliente.walk(switch_ip, oid)
+        except (ErrorSNMP, OSError) as e:
+            log(f"Error en walk SNMP nativo de {oid} en {switch_ip}: {str(e)}", "ERROR")
+            return None
+
+BACKENDS_SNMP = {
+    BackendSNMPNativo.nombre: BackendSNMPNativo,
+    BackendSNMPSubproceso.nombre: BackendSNMPSubproceso,
+}
+_backend_snmp = None
+_backend_subproceso = BackendSNMPSubproceso()
+
+def configurar_backend_snmp(nombre: str, **opciones):
+    """
+    Selecciona el backend SNMP usado por todas las consultas del módulo.
+
+    Args:
+        nombre (str): "nativo" o "subproceso".
+        **opciones: Parámetros del backend (p. ej. max_repeticiones para el nativo).
+
+    Returns:
+        El backend configurado.
+    """
+    global _backend_snmp
+    if nombre not in BACKENDS_SNMP:
+        raise ValueError(f"Backend SNMP desconocido: {nombre}")
+    _backend_snmp = BACKENDS_SNMP[nombre](**opciones)
+    log(f"Backend SNMP configurado: {nombre}", "INFO")
+    return _backend_snmp
+
+def obtener_backend_snmp():
+    """Devuelve el backend SNMP activo, creándolo según SNMP_BACKEND si hace falta."""
+    global _backend_snmp
+    if _backend_snmp is None:
+        _backend_snmp = BACKENDS_SNMP.get(SNMP_BACKEND, BackendSNMPNativo)()
+    return _backend_snmp
+
+def snmp_walk(switch_ip: str, oid: str, community: str = "proyectoTDG") -> Optional[List[VarBind]]:
+    """
+    Recorre un subárbol SNMP con el backend activo.
+
+    Returns:
+        Lista de varbinds tipados o None si la consulta falla.
+    """
+    backend = obtener_backend_snmp()
+    with semaforo_snmp(switch_ip):
+        varbinds = backend.walk(switch_ip, oid, community)
+        if varbinds is None and SNMP_FALLBACK_SUBPROCESO and backend.nombre != _backend_subproceso.nombre:
+            log(f"Backend {backend.nombre} falló para {switch_ip}, usando snmpwalk como respaldo", "ERROR")
+            varbinds = _backend_subproceso.walk(switch_ip, oid, community)
+    return varbinds
+
+async def snmp_walk_async(switch_ip: str, oid: str, community: str = "proyectoTDG") -> Optional[List[VarBind]]:
+    """Versión asyncio de snmp_walk, limitada por switch con semaforo_snmp_async."""
+    backend = obtener_backend_snmp()
+    async with semaforo_snmp_async(switch_ip):
+        varbinds = await backend.walk_async(switch_ip, oid, community)
+        if varbinds is None and SNMP_FALLBACK_SUBPROCESO and backend.nombre != _backend_subproceso.nombre:
+            log(f"Backend {backend.nombre} falló para {switch_ip}, usando snmpwalk como respaldo", "ERROR")
+            varbinds = await _backend_subproceso.walk_async(switch_ip, oid, community)
+    return varbinds
+
+def _parsear_tabla_mac(varbinds: List[VarBind]) -> Dict[str, int]:
+    """
+    Construye el mapeo MAC -> portNum a partir del walk de dot1dTpFdbPort.
+    """
+    mac_to_port = {}
+    for vb in varbinds:
+        if vb.tipo in TIPOS_EXCEPCION:
+            log(f"No hay MACs disponibles en la tabla de forwarding", "DEBUG")
+            continue
+        if len(vb.oid) < 6 or not isinstance(vb.valor, int):
+            log(f"Entrada de FDB inesperada: {vb}", "DEBUG")
+            continue
+        mac = ":".join(f"{x:02x}" for x in vb.oid[-6:]).upper()  # Últimos 6 bytes = MAC
+        mac_to_port[mac] = vb.valor
+
+    # Solo mostrar el número de MACs encontradas en lugar de toda la salida
+    log(f"Encontradas {len(mac_to_port)} MACs en la tabla de forwarding", "DEBUG")
+    return mac_to_port
+
+def _parsear_tabla_mac_qbridge(varbinds: List[VarBind]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Construye los mapeos MAC -> portNum y MAC -> VLAN a partir del walk de dot1qTpFdbPort
+    (índice FdbId.MAC). Con aprendizaje independiente por VLAN, el FdbId es el VLAN ID.
+    """
+    mac_to_port = {}
+    mac_to_vlan = {}
+    for vb in varbinds:
+        if vb.tipo in TIPOS_EXCEPCION or len(vb.oid) < 7 or not isinstance(vb.valor, int) or not vb.valor:
+            continue  # portNum 0: MAC del propio switch o de puerto desconocido
+        mac = ":".join(f"{x:02x}" for x in vb.oid[-6:]).upper()
+        mac_to_port[mac] = vb.valor
+        mac_to_vlan[mac] = vb.oid[-7]
+    log(f"Encontradas {len(mac_to_port)} MACs en el FDB de Q-BRIDGE", "DEBUG")
+    return mac_to_port, mac_to_vlan
+
+def _tabla_qbridge(switch_ip: str, varbinds: Optional[List[VarBind]]) -> Optional[Tuple[Dict, Dict]]:
+    """(mac_to_port, mac_to_vlan) del FDB de Q-BRIDGE, o None para usar el de BRIDGE-MIB."""
+    if varbinds is None:
+        return None
+    mac_to_port, mac_to_vlan = _parsear_tabla_mac_qbridge(varbinds)
+    if not mac_to_port:
+        return None
+    if soporte_qbridge.get(switch_ip) is None:
+        log(f"{switch_ip} ofrece Q-BRIDGE-MIB: las MACs se leen con su VLAN", "INFO")
+    soporte_qbridge[switch_ip] = True
+    return mac_to_port, mac_to_vlan
+
+def _registrar_sin_qbridge(switch_ip: str, mac_to_port: Dict[str, int]) -> None:
+    """Con MACs en BRIDGE-MIB y ninguna en Q-BRIDGE, no se vuelve a intentar Q-BRIDGE."""
+    if mac_to_port and soporte_qbridge.get(switch_ip) is None:
+        soporte_qbridge[switch_ip] = False
+        log(f"{switch_ip} no ofrece Q-BRIDGE-MIB: se usa dot1dTpFdbPort (sin VLAN por MAC)", "INFO")
+
+def _parsear_puerto_ifindex(varbinds: List[VarBind]) -> Dict[int, int]:
+    """
+    Construye el mapeo portNum -> ifIndex a partir del walk de dot1dBasePortIfIndex.
+    """
+    port_to_ifindex = {}
+    for vb in varbinds:
+        if vb.tipo in TIPOS_EXCEPCION or not isinstance(vb.valor, int):
+            continue
+        port_to_ifindex[vb.oid[-1]] = vb.valor
+
+    log(f"Mapeados {len(port_to_ifindex)} puertos a ifIndex", "DEBUG")
+    return port_to_ifindex
+
+def _aplicar_tabla_fdb(switch_ip: str, community: str, mac_to_port: Dict[str, int],
+                       port_to_ifindex: Dict[int, int], mac_to_vlan: Optional[Dict[str, int]] = None) -> Dict:
+    """
+    Aplica un walk al modelo FDB del switch y devuelve el snapshot resultante.
+
+    Returns:
+        Dict con 'timestamp', 'mac_to_port', 'port_to_ifindex', 'mac_to_ifindex',
+        'ifindex_to_macs', 'mac_to_vlan' y 'cambios' (lista de CambioFDB respecto al walk anterior).
+    """
+    clave = f"{switch_ip}:{community}"
+    with snapshot_lock:
+        tabla = tablas_fdb.get(clave)
+        if tabla is None:
+            tabla = tablas_fdb[clave] = TablaFDB(switch_ip)
+    snapshot, _ = tabla.aplicar(mac_to_port, port_to_ifindex, mac_to_vlan=mac_to_vlan)
+    return snapshot
+
+def _construir_snapshot_puente(switch_ip: str, community: str) -> Optional[Dict]:
+    """
+    Realiza los walks del FDB (Q-BRIDGE-MIB si el switch lo ofrece, si no BRIDGE-MIB) y
+    del mapeo puerto->ifIndex, y construye el snapshot del switch.
+
+    Returns:
+        Snapshot de la tabla de puente o None si alguno de los walks falla.
+    """
+    inicio = time.monotonic()
+    tabla = None
+    if soporte_qbridge.get(switch_ip) is not False:
+        tabla = _tabla_qbridge(switch_ip, snmp_walk(switch_ip, OID_QBRIDGE_MAC_TO_PORT, community))
+    if tabla is None:
+        varbinds_fdb = snmp_walk(switch_ip, OID_MAC_TO_PORT, community)
+        if varbinds_fdb is None:
+            log(f"Error obteniendo tabla MAC para {switch_ip}", "ERROR")
+            metrica_walk_errores.incrementar(switch_ip)
+            return None
+        tabla = (_parsear_tabla_mac(varbinds_fdb), {})
+        _registrar_sin_qbridge(switch_ip, tabla[0])
+    varbinds_puertos = snmp_walk(switch_ip, OID_PORT_TO_IFINDEX, community)
+    if varbinds_puertos is None:
+        log(f"Error obteniendo mapeo puerto->ifIndex para {switch_ip}", "ERROR")
+        metrica_walk_errores.incrementar(switch_ip)
+        return None
+    metrica_walk.observar(time.monotonic() - inicio, switch_ip)
+    return _aplicar_tabla_fdb(switch_ip, community, tabla[0], _parsear_puerto_ifindex(varbinds_puertos), tabla[1])
+
+async def _construir_snapshot_puente_async(switch_ip: str, community: str) -> Optional[Dict]:
+    """Versión asyncio de _construir_snapshot_puente; el FDB y el mapeo de puertos se piden a la vez."""
+    inicio = time.monotonic()
+    qbridge = soporte_qbridge.get(switch_ip) is not False
+    varbinds_fdb, varbinds_puertos = await asyncio.gather(
+        snmp_walk_async(switch_ip, OID_QBRIDGE_MAC_TO_PORT if qbridge else OID_MAC_TO_PORT, community),
+        snmp_walk_async(switch_ip, OID_PORT_TO_IFINDEX, community),
+    )
+    tabla = _tabla_qbridge(switch_ip, varbinds_fdb) if qbridge else None
+    if tabla is None:
+        if qbridge:
+            varbinds_fdb = await snmp_walk_async(switch_ip, OID_MAC_TO_PORT, community)
+        if varbinds_fdb is None:
+            log(f"Error obteniendo tabla MAC para {switch_ip}", "ERROR")
+            metrica_walk_errores.incrementar(switch_ip)
+            return None
+        tabla = (_parsear_tabla_mac(varbinds_fdb), {})
+        _registrar_sin_qbridge(switch_ip, tabla[0])
+    if varbinds_puertos is None:
+        log(f"Error obteniendo mapeo puerto->ifIndex para {switch_ip}", "ERROR")
+        metrica_walk_errores.incrementar(switch_ip)
+        return None
+    metrica_walk.observar(time.monotonic() - inicio, switch_ip)
+    return _aplicar_tabla_fdb(switch_ip, community, tabla[0], _parsear_puerto_ifindex(varbinds_puertos), tabla[1])
+
+def _snapshot_vigente(clave: str, edad_maxima: float) -> Optional[Dict]:
+    """Devuelve el snapshot almacenado si no supera `edad_maxima` (llamar con snapshot_lock)."""
+    snapshot = snapshots_puente.get(clave)
+    if snapshot and (time.time() - snapshot['timestamp']) < edad_maxima:
+        return snapshot
+    return None
+
+def _guardar_snapshot(clave: str, switch_ip: str, community: str, snapshot: Dict) -> None:
+    with snapshot_lock:
+        snapshots_puente[clave] = snapshot
+        suscriptores = list(suscriptores_snapshot)
+    log(f"Snapshot de tabla de puente actualizado para {switch_ip}: "
+        f"{len(snapshot['mac_to_port'])} MACs en {len(snapshot['ifindex_to_macs'])} ifIndex", "DEBUG")
+    cambios = snapshot.get('cambios')
+    if cambios:
+        _actualizar_cache_con_cambios(switch_ip, community, snapshot, cambios)
+    for callback in suscriptores:
+        try:
+            callback(switch_ip, community, snapshot)
+        except Exception as e:
+            log(f"Error notificando snapshot de {switch_ip}: {str(e)}", "ERROR")
+    if cambios:
+        with snapshot_lock:
+            suscriptores = list(suscriptores_cambios_fdb)
+        for callback in suscriptores:
+            try:
+                callback(switch_ip, community, cambios)
+            except Exception as e:
+                log(f"Error notificando cambios del FDB de {switch_ip}: {str(e)}", "ERROR")
+
+def _actualizar_cache_con_cambios(switch_ip: str, community: str, snapshot: Dict, cambios: List) -> None:
+    """Refleja en el cache de MACs los puertos afectados por los cambios del FDB."""
+    ifindex_to_macs = snapshot['ifindex_to_macs']
+    afectados = set()
+    for cambio in cambios:
+        metrica_cambios_fdb.incrementar(switch_ip, cambio.tipo)
+        if cambio.tipo == CAMBIO_MOVIDA:
+            log(f"MAC {cambio.mac} movida de ifIndex {cambio.ifindex_anterior} a {cambio.ifindex} en {switch_ip}", "INFO")
+        else:
+            log(f"MAC {cambio.mac} {cambio.tipo} en ifIndex {cambio.ifindex or cambio.ifindex_anterior} "
+                f"de {switch_ip}", "DEBUG")
+        afectados.update(i for i in (cambio.ifindex, cambio.ifindex_anterior) if i is not None)
+    for ifindex in afectados:
+        macs = ifindex_to_macs.get(ifindex)
+        if macs:
+            set_cache(get_cache_key(switch_ip, ifindex, community), macs[0])
+        else:
+            invalidar_cache_puerto(switch_ip, ifindex, community)
+
+def suscribir_cambios_fdb(callback) -> None:
+    """
+    Registra un callback(switch_ip, community, cambios) que recibe la lista de CambioFDB
+    (MACs nuevas, movidas de puerto o envejecidas) de cada walk que modifica el FDB.
+    """
+    with snapshot_lock:
+        suscriptores_cambios_fdb.append(callback)
+
+def cancelar_suscripcion_cambios_fdb(callback) -> None:
+    """Elimina un callback registrado con suscribir_cambios_fdb."""
+    with snapshot_lock:
+        if callback in suscriptores_cambios_fdb:
+            suscriptores_cambios_fdb.remove(callback)
+
+def suscribir_snapshots(callback) -> None:
+    """Registra un callback(switch_ip, community, snapshot) que se invoca con cada snapshot nuevo."""
+    with snapshot_lock:
+        suscriptores_snapshot.append(callback)
+
+def cancelar_suscripcion_snapshots(callback) -> None:
+    """Elimina un callback registrado con suscribir_snapshots."""
+    with snapshot_lock:
+        if callback in suscriptores_snapshot:
+            suscriptores_snapshot.remove(callback)
+
+def obtener_snapshot_puente(switch_ip: str, community: str = "proyectoTDG", edad_maxima: Optional[float] = None) -> Optional[Dict]:
+    """
+    Obtiene el snapshot de la tabla de puente de un switch, compartido por todas las
+    consultas de ifIndex. Si hay un walk en curso para el mismo switch, espera a ese
+    walk en lugar de lanzar uno propio (single-flight).
+
+    Args:
+        switch_ip (str): Dirección IP del switch.
+        community (str): Comunidad SNMP.
+        edad_maxima (float): Antigüedad máxima aceptable del snapshot en segundos
+            (por defecto SNAPSHOT_TTL).
+
+    Returns:
+        dict: Snapshot del switch o None si no se pudo obtener.
+    """
+    if edad_maxima is None:
+        edad_maxima = SNAPSHOT_TTL
+    clave = f"{switch_ip}:{community}"
+
+    with snapshot_lock:
+        snapshot = _snapshot_vigente(clave, edad_maxima)
+        if snapshot:
+            return snapshot
+        en_curso = snapshots_en_curso.get(clave)
+        if en_curso is None:
+            en_curso = {'evento': threading.Event(), 'snapshot': None}
+            snapshots_en_curso[clave] = en_curso
+            lider = True
+        else:
+            lider = False
+
+    if not lider:
+        log(f"Esperando walk en curso de la tabla de puente de {switch_ip}", "DEBUG")
+        if not en_curso['evento'].wait(SNAPSHOT_WAIT_TIMEOUT):
+            log(f"Timeout esperando walk en curso de {switch_ip}", "ERROR")
+        return en_curso['snapshot']
+
+    try:
+        snapshot = _construir_snapshot_puente(switch_ip, community)
+        en_curso['snapshot'] = snapshot
+        if snapshot is not None:
+            _guardar_snapshot(clave, switch_ip, community, snapshot)
+        return snapshot
+    finally:
+        with snapshot_lock:
+            snapshots_en_curso.pop(clave, None)
+        en_curso['evento'].set()
+
+async def obtener_snapshot_puente_async(switch_ip: str, community: str = "proyectoTDG",
+                                        edad_maxima: Optional[float] = None) -> Optional[Dict]:
+    """
+    Versión asyncio de obtener_snapshot_puente. Comparte el almacén de snapshots con
+    la versión síncrona; las corrutinas que piden el mismo switch esperan al mismo walk.
+    """
+    if edad_maxima is None:
+        edad_maxima = SNAPSHOT_TTL
+    clave = f"{switch_ip}:{community}"
+
+    with snapshot_lock:
+        snapshot = _snapshot_vigente(clave, edad_maxima)
+    if snapshot:
+        return snapshot
+
+    en_curso = snapshots_en_curso_async.get(clave)
+    if en_curso is not None:
+        log(f"Esperando walk en curso de la tabla de puente de {switch_ip}", "DEBUG")
+        try:
+            return await asyncio.wait_for(asyncio.shield(en_curso), SNAPSHOT_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            log(f"Timeout esperando walk en curso de {switch_ip}", "ERROR")
+            return None
+
+    en_curso = asyncio.get_running_loop().create_future()
+    snapshots_en_curso_async[clave] = en_curso
+    snapshot = None
+    try:
+        snapshot = await _construir_snapshot_puente_async(switch_ip, community)
+        if snapshot is not None:
+            _guardar_snapshot(clave, switch_ip, community, snapshot)
+        return snapshot
+    finally:
+        snapshots_en_curso_async.pop(clave, None)
+        en_curso.set_result(snapshot)
+
+def invalidar_snapshot_puente(switch_ip: str, community: str = "proyectoTDG") -> None:
+    """Descarta el snapshot de la tabla de puente de un switch."""
+    with snapshot_lock:
+        snapshots_puente.pop(f"{switch_ip}:{community}", None)
+
+def _ifindex_valido(ifindex, ifindex_validos) -> bool:
+    """Comprueba el ifIndex contra los puertos mapeados (claves int o str); sin mapeo todo es válido."""
+    if not ifindex_validos:
+        return True
+    return int(ifindex) in ifindex_validos or str(ifindex) in ifindex_validos
+
+def _mac_en_snapshot(snapshot: Dict, switch_ip, ifindex, cache_key: Optional[str]) -> Optional[str]:
+    """
+    Busca la MAC de un ifIndex en un snapshot y guarda el resultado en el cache,
+    también cuando no hay MAC (entrada negativa). Sin cache_key no se guarda nada.
+    """
+    macs = snapshot['ifindex_to_macs'].get(int(ifindex))
+    mac = macs[0] if macs else None
+    if mac:
+        log(f"MAC encontrada para ifIndex {ifindex}: {mac}", "INFO")
+    else:
+        log(f"No se encontró MAC para ifIndex {ifindex}", "DEBUG")
+    if cache_key is not None:
+        set_cache(cache_key, mac)
+    return mac
+
 # Función para buscar la dirección MAC asociada a un puerto en un switch
-def buscar_mac_por_puerto(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None):
+def buscar_mac_por_puerto(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None, edad_maxima=None,
+                          usar_cache=True):
     """
     Busca la dirección MAC asociada a un puerto en un switch utilizando SNMP de forma thread-safe.
 
@@ -136,203 +692,403 @@ def buscar_mac_por_puerto(switch_ip, ifindex, community="proyectoTDG", ifindex_v
         ifindex (int): Índice del puerto en el switch.
         community (str): Comunidad SNMP.
         ifindex_validos (dict): Diccionario de ifIndex válidos (puertos físicos mapeados).
+        edad_maxima (float): Antigüedad máxima aceptable del snapshot de la tabla de puente.
+            Si se indica, no se usan las entradas negativas del cache.
+        usar_cache (bool): Consultar y actualizar el cache de MACs.
 
     Returns:
         str: Dirección MAC encontrada o None si no se encuentra.
     """
     # Verificar cache primero
-    cache_key = get_cache_key(switch_ip, ifindex, community)
-    cached_result = get_from_cache(cache_key)
-    if cached_result:
-        return cached_result
+    cache_key = get_cache_key(switch_ip, ifindex, community) if usar_cache else None
+    if usar_cache:
+        cached_result = consultar_cache(cache_key, incluir_negativas=edad_maxima is None)
+        if cached_result is not AUSENTE:
+            return cached_result
     
     try:
         # Validar que el ifIndex corresponde a un puerto físico mapeado
-        if ifindex_validos and str(ifindex) not in ifindex_validos:
+        if not _ifindex_valido(ifindex, ifindex_validos):
             log(f"ifIndex {ifindex} no está en la lista de puertos físicos mapeados. Ignorando.", "DEBUG")
             return None
-            
-        oid_mac_to_port = "1.3.6.1.2.1.17.4.3.1.2"
-        oid_port_to_ifindex = "1.3.6.1.2.1.17.1.4.1.2"
-
-        # Usar lock para operaciones SNMP críticas (evitar saturar el dispositivo)
-        with snmp_operation_lock:
-            # Obtener MAC -> portNum con timeout
-            mac_to_port_output = execute_snmp_command_with_timeout([
-                "snmpwalk", "-v2c", "-c", community, "-On", switch_ip, oid_mac_to_port
-            ])
-            
-            if not mac_to_port_output:
-                log(f"Error obteniendo tabla MAC para {switch_ip}", "ERROR")
-                return None
-
-        mac_to_port = {}
-        for line in mac_to_port_output.splitlines():
-            if "No Such Instance" in line:
-                log(f"No hay MACs disponibles en la tabla de forwarding", "DEBUG")
-                continue
-                
-            parts = line.split(" = ")
-            if len(parts) == 2:
-                oid_suffix = parts[0].split(".")[-6:]  # Últimos 6 bytes = MAC
-                try:
-                    mac = ":".join(f"{int(x):02x}" for x in oid_suffix).upper()
-                    port_num = int(parts[1].split(":")[-1].strip())
-                    mac_to_port[mac] = port_num
-                except ValueError as ve:
-                    log(f"Error procesando MAC: {ve}", "DEBUG")
-                    continue
-
-        # Solo mostrar el número de MACs encontradas en lugar de toda la salida
-        log(f"Encontradas {len(mac_to_port)} MACs en la tabla de forwarding", "DEBUG")
-
-        # Obtener portNum -> ifIndex con timeout
-        with snmp_operation_lock:
-            port_to_ifindex_output = execute_snmp_command_with_timeout([
-                "snmpwalk", "-v2c", "-c", community, "-On", switch_ip, oid_port_to_ifindex
-            ])
-            
-            if not port_to_ifindex_output:
-                log(f"Error obteniendo mapeo puerto->ifIndex para {switch_ip}", "ERROR")
-                return None
-
-        port_to_ifindex = {}
-        for line in port_to_ifindex_output.splitlines():
-            parts = line.split(" = ")
-            if len(parts) == 2:
-                try:
-                    port_num_str = parts[0].split(".")[-1]
-                    port_num = int(port_num_str)
 
-                    value_parts = parts[1].split(":")
-                    if len(value_parts) < 2:
-                        continue
+        snapshot = obtener_snapshot_puente(switch_ip, community, edad_maxima)
+        if snapshot is None:
+            return None
+        return _mac_en_snapshot(snapshot, switch_ip, ifindex, cache_key)
 
-                    if_index_str = value_parts[-1].strip()
-                    if_index = int(if_index_str)
+    except Exception as e:
+        log(f"ERROR en buscar_mac_por_puerto: {str(e)}", "ERROR")
+        return None
 
-                    port_to_ifindex[port_num] = if_index
-                except ValueError:
-                    continue
+async def buscar_mac_por_puerto_async(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None, edad_maxima=None,
+                                      usar_cache=True):
+    """Versión asyncio de buscar_mac_por_puerto."""
+    cache_key = get_cache_key(switch_ip, ifindex, community) if usar_cache else None
+    if usar_cache:
+        cached_result = consultar_cache(cache_key, incluir_negativas=edad_maxima is None)
+        if cached_result is not AUSENTE:
+            return cached_result
 
-        log(f"Mapeados {len(port_to_ifindex)} puertos a ifIndex", "DEBUG")
+    try:
+        if not _ifindex_valido(ifindex, ifindex_validos):
+            log(f"ifIndex {ifindex} no está en la lista de puertos físicos mapeados. Ignorando.", "DEBUG")
+            return None
 
-        # Buscar la MAC cuyo portNum se asocia al ifIndex dado
-        for mac, port_num in mac_to_port.items():
-            if port_to_ifindex.get(port_num) == ifindex:
-                log(f"MAC encontrada para ifIndex {ifindex}: {mac}", "INFO")
-                # Guardar en cache antes de devolver
-                set_cache(cache_key, mac)
-                return mac
+        snapshot = await obtener_snapshot_puente_async(switch_ip, community, edad_maxima)
+        if snapshot is None:
+            return None
+        return _mac_en_snapshot(snapshot, switch_ip, ifindex, cache_key)
 
-        log(f"No se encontró MAC para ifIndex {ifindex}", "DEBUG")
+    except Exception as e:
+        log(f"ERROR en buscar_mac_por_puerto_async: {str(e)}", "ERROR")
         return None
 
+def _macs_en_snapshot(snapshot: Dict, ifindex) -> List[MACPuerto]:
+    mac_to_vlan = snapshot.get('mac_to_vlan', {})
+    return [MACPuerto(mac, mac_to_vlan.get(mac)) for mac in snapshot['ifindex_to_macs'].get(int(ifindex), [])]
+
+def buscar_macs_por_puerto(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None,
+                           edad_maxima=None) -> List[MACPuerto]:
+    """
+    Todas las MACs presentes en un puerto (teléfono IP con un PC detrás, hub...), en
+    orden de aparición en los walks (TablaFDB) y con su VLAN si el switch ofrece Q-BRIDGE-MIB. Se responde con
+    el snapshot de la tabla de puente, sin pasar por el cache de MAC por puerto.
+
+    Returns:
+        list: MACPuerto(mac, vlan); vacía si el puerto no tiene MACs o falla el walk.
+    """
+    try:
+        if not _ifindex_valido(ifindex, ifindex_validos):
+            return []
+        snapshot = obtener_snapshot_puente(switch_ip, community, edad_maxima)
+        return _macs_en_snapshot(snapshot, ifindex) if snapshot else []
     except Exception as e:
-        log(f"ERROR en buscar_mac_por_puerto: {str(e)}", "ERROR")
-        return None
+        log(f"ERROR en buscar_macs_por_puerto: {str(e)}", "ERROR")
+        return []
+
+async def buscar_macs_por_puerto_async(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None,
+                                       edad_maxima=None) -> List[MACPuerto]:
+    """Versión asyncio de buscar_macs_por_puerto."""
+    try:
+        if not _ifindex_valido(ifindex, ifindex_validos):
+            return []
+        snapshot = await obtener_snapshot_puente_async(switch_ip, community, edad_maxima)
+        return _macs_en_snapshot(snapshot, ifindex) if snapshot else []
+    except Exception as e:
+        log(f"ERROR en buscar_macs_por_puerto_async: {str(e)}", "ERROR")
+        return []
 
-def buscar_mac_por_puerto_con_reintentos(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None, max_reintentos=3, espera_inicial=5):
+class ResolvedorMAC:
     """
-    Realiza hasta `max_reintentos` intentos para obtener la dirección MAC asociada a un ifIndex.
-    Espera progresivamente más tiempo entre cada intento para dar tiempo a que las interfaces y VLANs se estabilicen.
+    Resuelve la MAC de puertos recién levantados sin reintentos a ciegas: mientras
+    haya ifIndex esperando en un switch, sondea su FDB con intervalos cortos que se
+    alargan progresivamente, y completa todas las esperas en cuanto la MAC aparece en
+    cualquier snapshot del switch (propio o de otro consumidor).
     """
-    # Validar que el ifIndex corresponde a un puerto físico mapeado
-    if ifindex_validos and str(ifindex) not in ifindex_validos:
-        log(f"ifIndex {ifindex} no está en la lista de puertos físicos configurados. No se realizarán intentos.", "INFO")
-        return None
-        
-    log(f"Iniciando búsqueda de MAC para puerto físico ifIndex {ifindex} en {switch_ip}", "INFO")
-    
-    for intento in range(1, max_reintentos + 1):
-        # Tiempo de espera progresivo: 10s, 15s, 20s
-        espera_actual = espera_inicial + (intento - 1) * 5
-        
-        if intento > 1:
-            log(f"Esperando {espera_actual}s antes del intento {intento} para permitir estabilización...", "INFO")
-            time.sleep(espera_actual)
-            
-        log(f"Intento {intento}/{max_reintentos} para obtener MAC en ifIndex {ifindex}", "INFO")
-        mac = buscar_mac_por_puerto(switch_ip, ifindex, community, ifindex_validos)
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.esperas = {}     # "switch:community" -> {ifIndex: [futuros]}
+        self.sondeos = {}     # "switch:community" -> tarea de sondeo
+        self.intervalos = {}  # "switch:community" -> intervalo de sondeo actual
+        self.latencia = metricas.histograma("snmp_tiempo_hasta_mac_segundos",
+                                            "Tiempo desde la petición hasta que la MAC aparece en el FDB")
+        self.plazos_vencidos = metricas.contador("snmp_resolucion_mac_plazo_vencido_total",
+                                                 "Resoluciones de MAC que agotaron el plazo")
+        suscribir_snapshots(self._snapshot_recibido)
+
+    async def esperar_mac(self, switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None,
+                          plazo: Optional[float] = None) -> Optional[str]:
+        """
+        Espera a que aparezca una MAC en el ifIndex indicado.
+
+        Args:
+            switch_ip (str): Dirección IP del switch.
+            ifindex (int): Índice del puerto.
+            community (str): Comunidad SNMP.
+            ifindex_validos (dict): ifIndex de puertos físicos mapeados.
+            plazo (float): Segundos máximos de espera (por defecto PLAZO_RESOLUCION_MAC).
+
+        Returns:
+            str: Dirección MAC o None si no apareció dentro del plazo.
+        """
+        if not _ifindex_valido(ifindex, ifindex_validos):
+            log(f"ifIndex {ifindex} no está en la lista de puertos físicos configurados. No se esperará MAC.", "INFO")
+            return None
+
+        inicio = time.monotonic()
+        cache_key = get_cache_key(switch_ip, ifindex, community)
+        mac = get_from_cache(cache_key)
         if mac:
-            log(f"MAC encontrada exitosamente en intento {intento}: {mac}", "INFO")
+            self.latencia.observar(time.monotonic() - inicio)
             return mac
-        log(f"Intento {intento} sin éxito. MAC no encontrada para ifIndex {ifindex}.", "DEBUG")
-    
-    log(f"Búsqueda finalizada sin éxito tras {max_reintentos} intentos para ifIndex {ifindex}", "INFO")
-    return None
+
+        clave = f"{switch_ip}:{community}"
+        ifindex = int(ifindex)
+        futuro = self.loop.create_future()
+        self.esperas.setdefault(clave, {}).setdefault(ifindex, []).append(futuro)
+        # Un linkUp reciente: volver al sondeo rápido
+        self.intervalos[clave] = INTERVALO_SONDEO_MIN
+        if clave not in self.sondeos:
+            self.sondeos[clave] = self.loop.create_task(
+                self._sondear(switch_ip, community, clave), name=f"SondeoFDB-{switch_ip}")
+
+        log(f"Esperando MAC en ifIndex {ifindex} de {switch_ip}", "INFO")
+        try:
+            mac = await asyncio.wait_for(asyncio.shield(futuro), plazo or PLAZO_RESOLUCION_MAC)
+        except asyncio.TimeoutError:
+            mac = None
+        finally:
+            self._retirar_espera(clave, ifindex, futuro)
+
+        transcurrido = time.monotonic() - inicio
+        if mac:
+            self.latencia.observar(transcurrido)
+            log(f"MAC {mac} resuelta para ifIndex {ifindex} en {transcurrido:.2f}s", "INFO")
+        else:
+            self.plazos_vencidos.incrementar()
+            log(f"Plazo agotado ({transcurrido:.1f}s) sin MAC en ifIndex {ifindex} de {switch_ip}", "INFO")
+        return mac
+
+    def _retirar_espera(self, clave: str, ifindex: int, futuro) -> None:
+        esperas = self.esperas.get(clave, {})
+        futuros = esperas.get(ifindex, [])
+        if futuro in futuros:
+            futuros.remove(futuro)
+        if not futuros:
+            esperas.pop(ifindex, None)
+        if not esperas:
+            self.esperas.pop(clave, None)
+
+    async def _sondear(self, switch_ip: str, community: str, clave: str) -> None:
+        """Sondea el FDB del switch mientras queden ifIndex esperando, con backoff."""
+        try:
+            while self.esperas.get(clave):
+                intervalo = self.intervalos.get(clave, INTERVALO_SONDEO_MIN)
+                snapshot = await obtener_snapshot_puente_async(switch_ip, community, edad_maxima=intervalo)
+                if snapshot:
+                    self._completar(switch_ip, community, snapshot)
+                if not self.esperas.get(clave):
+                    break
+                await asyncio.sleep(intervalo)
+                self.intervalos[clave] = min(self.intervalos.get(clave, intervalo) * FACTOR_BACKOFF_SONDEO,
+                                             INTERVALO_SONDEO_MAX)
+        except Exception as e:
+            log(f"ERROR sondeando FDB de {switch_ip}: {str(e)}", "ERROR")
+        finally:
+            self.sondeos.pop(clave, None)
+            self.intervalos.pop(clave, None)
+
+    def _snapshot_recibido(self, switch_ip: str, community: str, snapshot: Dict) -> None:
+        """Callback de suscripción; puede invocarse desde cualquier thread."""
+        if self.loop.is_closed():
+            cancelar_suscripcion_snapshots(self._snapshot_recibido)
+            return
+        self.loop.call_soon_threadsafe(self._completar, switch_ip, community, snapshot)
+
+    def _completar(self, switch_ip: str, community: str, snapshot: Dict) -> None:
+        """Completa todas las esperas cuyos ifIndex tienen ya MAC en el snapshot."""
+        esperas = self.esperas.get(f"{switch_ip}:{community}")
+        if not esperas:
+            return
+        for ifindex in list(esperas):
+            macs = snapshot['ifindex_to_macs'].get(ifindex)
+            if not macs:
+                continue
+            set_cache(get_cache_key(switch_ip, ifindex, community), macs[0])
+            for futuro in esperas.get(ifindex, []):
+                if not futuro.done():
+                    futuro.set_result(macs[0])
+
+resolvedor_mac = None
+
+def obtener_resolvedor_mac() -> ResolvedorMAC:
+    """Devuelve el resolvedor de MAC del event loop en curso, creándolo si hace falta."""
+    global resolvedor_mac
+    if resolvedor_mac is None or resolvedor_mac.loop is not asyncio.get_running_loop():
+        if resolvedor_mac is not None:
+            cancelar_suscripcion_snapshots(resolvedor_mac._snapshot_recibido)
+        resolvedor_mac = ResolvedorMAC()
+    return resolvedor_mac
+
+async def esperar_mac_en_puerto(switch_ip, ifindex, community="proyectoTDG", ifindex_validos=None,
+                                plazo: Optional[float] = None) -> Optional[str]:
+    """Espera por eventos a que aparezca una MAC en el puerto (ver ResolvedorMAC)."""
+    return await obtener_resolvedor_mac().esperar_mac(switch_ip, ifindex, community, ifindex_validos, plazo)
+
+class SondeoPeriodicoFDB:
+    """
+    Refresca cada `intervalo` segundos el snapshot de la tabla de puente de todos los
+    switches, de modo que la MAC de un puerto se resuelve normalmente desde el snapshot
+    vigente sin esperar a un walk. Con los cambios de cada snapshot (propio o de cualquier otro
+    consumidor), por cada MAC nueva o movida a un puerto mapeado se invoca
+    `al_detectar(switch_ip, ifindex, mac)`, también si el trap del puerto se perdió o si
+    es una MAC más en un puerto ya aprovisionado.
+    """
+
+    def __init__(self, switches: Callable[[], Iterable], al_detectar: Optional[Callable] = None,
+                 ifindex_validos: Optional[Callable[[], Dict]] = None,
+                 intervalo: float = INTERVALO_SONDEO_FDB, community: str = "proyectoTDG"):
+        self.loop = asyncio.get_running_loop()
+        self.switches = switches  # función -> IPs a sondear (se consulta en cada ronda: sigue las recargas)
+        self.al_detectar = al_detectar
+        self.ifindex_validos = ifindex_validos  # función -> ifIndex de puertos físicos mapeados
+        self.intervalo = intervalo
+        self.community = community
+        self.puertos_con_mac = {}  # switch -> puertos mapeados con MAC en el último snapshot
+        self.tarea = None
+        self.rondas = 0
+        self.duracion_ultima_ronda = 0.0
+
+    def iniciar(self) -> None:
+        suscribir_snapshots(self._snapshot_recibido)
+        self.tarea = self.loop.create_task(self._bucle(), name="SondeoPeriodicoFDB")
+        log(f"Sondeo periódico del FDB cada {self.intervalo}s", "INFO")
+
+    async def parar(self) -> None:
+        cancelar_suscripcion_snapshots(self._snapshot_recibido)
+        if self.tarea is not None:
+            self.tarea.cancel()
+            await asyncio.gather(self.tarea, return_exceptions=True)
+
+    async def _bucle(self) -> None:
+        while True:
+            inicio = time.monotonic()
+            try:
+                await self.sondear()
+            except Exception as e:
+                log(f"ERROR en el sondeo periódico del FDB: {str(e)}", "ERROR")
+            await asyncio.sleep(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+
+    async def sondear(self) -> None:
+        """Una ronda: un snapshot por switch, en paralelo."""
+        inicio = time.monotonic()
+        switches = [str(ip) for ip in self.switches()]
+        # Un snapshot de menos de medio intervalo (de un trap, por ejemplo) ya sirve para esta ronda
+        await asyncio.gather(*(obtener_snapshot_puente_async(ip, self.community, self.intervalo / 2)
+                               for ip in switches))
+        for ip in set(self.puertos_con_mac) - set(switches):
+            self.puertos_con_mac.pop(ip, None)  # switch retirado de la configuración
+        self.rondas += 1
+        self.duracion_ultima_ronda = time.monotonic() - inicio
+
+    def _snapshot_recibido(self, switch_ip: str, community: str, snapshot: Dict) -> None:
+        """Callback de suscripción; puede invocarse desde cualquier thread."""
+        if community != self.community:
+            return
+        if self.loop.is_closed():
+            cancelar_suscripcion_snapshots(self._snapshot_recibido)
+            return
+        self.loop.call_soon_threadsafe(self._comparar, switch_ip, snapshot)
+
+    def _comparar(self, switch_ip: str, snapshot: Dict) -> None:
+        """
+        Notifica las MACs que llegan a un puerto. El cache no se reescribe aquí: los
+        puertos con cambios ya se actualizan al guardar el snapshot, y volver a escribir
+        los demás desharía invalidar_cache_puerto() de un linkDown posterior al walk.
+        """
+        validos = self.ifindex_validos() if self.ifindex_validos else None
+        actuales = {ifindex for ifindex, macs in snapshot['ifindex_to_macs'].items()
+                    if macs and _ifindex_valido(ifindex, validos)}
+        self.puertos_con_mac[switch_ip] = len(actuales)
+
+        # Una MAC envejecida o que deja un puerto no limpia nada sin linkDown
+        esperas = resolvedor_mac.esperas.get(f"{switch_ip}:{self.community}", {}) if resolvedor_mac else {}
+        for cambio in snapshot.get('cambios', ()):
+            if cambio.tipo not in (CAMBIO_NUEVA, CAMBIO_MOVIDA) or cambio.ifindex not in actuales:
+                continue  # MAC envejecida o en un puerto no mapeado
+            if cambio.ifindex in esperas:
+                continue  # un trap ya está esperando la MAC de este puerto
+            metrica_macs_nuevas.incrementar(switch_ip)
+            log(f"Sondeo del FDB: MAC {cambio.mac} {cambio.tipo} en ifIndex {cambio.ifindex} de {switch_ip}", "INFO")
+            if self.al_detectar is not None:
+                try:
+                    self.al_detectar(switch_ip, cambio.ifindex, cambio.mac)
+                except Exception as e:
+                    log(f"Error notificando MAC nueva de {switch_ip}: {str(e)}", "ERROR")
+
+    def obtener_estadisticas(self) -> Dict:
+        return {
+            'switches': len(self.puertos_con_mac),
+            'rondas': self.rondas,
+            'intervalo': self.intervalo,
+            'duracion_ultima_ronda': round(self.duracion_ultima_ronda, 3),
+            'puertos_con_mac': sum(self.puertos_con_mac.values()),
+        }
 
 def buscar_mac_concurrente(requests: List[Dict]) -> Dict[str, Optional[str]]:
     """
     Procesa múltiples solicitudes de búsqueda de MAC de forma concurrente.
+    Todas las esperas se resuelven con el ResolvedorMAC de un mismo event loop, de modo
+    que las solicitudes de un switch comparten sus snapshots del FDB en lugar de
+    reintentar cada una por su cuenta.
     
     Args:
         requests: Lista de diccionarios con 'switch_ip', 'ifindex', 'community', 'ifindex_validos'
+                  y opcionalmente 'plazo' (segundos máximos de espera)
     
     Returns:
         Dict con las MACs encontradas por request_id
     """
-    def proceso_individual(request):
-        request_id = request.get('request_id', f"{request['switch_ip']}:{request['ifindex']}")
-        mac = buscar_mac_por_puerto_con_reintentos(
-            request['switch_ip'],
-            request['ifindex'],
-            request.get('community', 'proyectoTDG'),
-            request.get('ifindex_validos'),
-            request.get('max_reintentos', 3),
-            request.get('espera_inicial', 5)
-        )
-        return request_id, mac
-    
+    def id_solicitud(request):
+        return request.get('request_id', f"{request['switch_ip']}:{request['ifindex']}")
+
+    async def procesar_todas():
+        return await asyncio.gather(*(
+            esperar_mac_en_puerto(request['switch_ip'], request['ifindex'],
+                                  request.get('community', 'proyectoTDG'),
+                                  request.get('ifindex_validos'), request.get('plazo'))
+            for request in requests
+        ), return_exceptions=True)
+
     log(f"Iniciando procesamiento concurrente de {len(requests)} solicitudes SNMP", "INFO")
-    
+
     results = {}
-    # Usar ThreadPoolExecutor para procesar en paralelo
-    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(requests), 5)) as executor:
-        # Enviar todas las tareas
-        future_to_request = {
-            executor.submit(proceso_individual, request): request 
-            for request in requests
-        }
-        
-        # Recoger resultados conforme se completan
-        for future in concurrent.futures.as_completed(future_to_request):
-            request = future_to_request[future]
-            try:
-                request_id, mac = future.result()
-                results[request_id] = mac
-                log(f"Solicitud completada para {request_id}: {mac or 'No encontrada'}", "INFO")
-            except Exception as exc:
-                request_id = request.get('request_id', f"{request['switch_ip']}:{request['ifindex']}")
-                log(f"Error procesando solicitud {request_id}: {exc}", "ERROR")
-                results[request_id] = None
-    
+    for request, mac in zip(requests, asyncio.run(procesar_todas()) if requests else []):
+        request_id = id_solicitud(request)
+        if isinstance(mac, Exception):
+            log(f"Error procesando solicitud {request_id}: {mac}", "ERROR")
+            mac = None
+        else:
+            log(f"Solicitud completada para {request_id}: {mac or 'No encontrada'}", "INFO")
+        results[request_id] = mac
+
     log(f"Procesamiento concurrente completado. {len([r for r in results.values() if r])} éxitos de {len(requests)}", "INFO")
     return results
 
 def limpiar_cache() -> None:
     """Limpia entradas expiradas del cache SNMP."""
-    with cache_lock:
-        keys_to_remove = []
-        for key, (mac, timestamp) in snmp_cache.items():
-            if not is_cache_valid(timestamp):
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del snmp_cache[key]
-        
-        if keys_to_remove:
-            log(f"Cache limpiado: {len(keys_to_remove)} entradas expiradas eliminadas", "DEBUG")
+    eliminadas = cache_mac.purgar()
+    if eliminadas:
+        log(f"Cache limpiado: {eliminadas} entradas expiradas eliminadas", "DEBUG")
+
+    with snapshot_lock:
+        ahora = time.time()
+        for clave in [c for c, snap in snapshots_puente.items() if ahora - snap['timestamp'] >= SNAPSHOT_TTL]:
+            del snapshots_puente[clave]
+
+def obtener_estadisticas_fdb() -> Dict:
+    """Estado del modelo FDB de cada switch (MACs, puertos con MAC y walks sin cambios)."""
+    with snapshot_lock:
+        tablas = dict(tablas_fdb)
+    return {clave: tabla.obtener_estadisticas() for clave, tabla in tablas.items()}
 
 def obtener_estadisticas_cache() -> Dict:
     """Obtiene estadísticas del cache SNMP."""
-    with cache_lock:
-        total_entries = len(snmp_cache)
-        valid_entries = sum(1 for _, timestamp in snmp_cache.values() if is_cache_valid(timestamp))
-        
-        return {
-            'total_entries': total_entries,
-            'valid_entries': valid_entries,
-            'expired_entries': total_entries - valid_entries,
-            'hit_ratio': 'N/A'  # Se podría implementar contadores de hits/misses
-        }
+    stats = cache_mac.estadisticas()
+    return {
+        'total_entries': stats['entradas'],
+        'valid_entries': stats['vigentes'],
+        'expired_entries': stats['entradas'] - stats['vigentes'],
+        'negative_entries': stats['negativas'],
+        'max_entries': stats['max_entradas'],
+        'bridge_snapshots': len(snapshots_puente),
+        'hits': stats['aciertos'],
+        'negative_hits': stats['aciertos_negativos'],
+        'misses': stats['fallos'],
+        'expirations': stats['expiradas'],
+        'evictions': stats['desalojos'],
+        'invalidations': stats['invalidaciones'],
+        'hit_ratio': f"{stats['hit_ratio']:.1%}" if stats['hit_ratio'] is not None else 'N/A',
+    }
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+"""
+Reenviador mínimo para la directiva traphandle de snmptrapd.
+Entrega el trap leído de stdin al daemon de snmptrap_handler.py por su socket local,
+sin importar el resto del sistema. Si el daemon no está en ejecución, procesa el
+trap con snmptrap_handler.py en modo clásico (un proceso por trap).
+
+Uso en snmptrapd.conf:
+    traphandle default /usr/bin/python3 /ruta/a/access_control/snmptrap_forward.py
+"""
+
+import os
+import socket
+import subprocess
+import sys
+
+BASE_DIR = "/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"
+SOCKET_DAEMON = os.path.join(BASE_DIR, "access_control/snmptrap_handler.sock")
+HANDLER = os.path.join(BASE_DIR, "access_control/snmptrap_handler.py")
+TIMEOUT_RESPUESTA = 30  # segundos; el daemon puede retener la respuesta si su cola está llena
+
+def reenviar(trap_data: bytes) -> str:
+    """
+    Envía el trap al daemon y devuelve su respuesta ("OK", "BUSY", ...).
+    Lanza OSError si el daemon no está disponible.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(TIMEOUT_RESPUESTA)
+        sock.connect(SOCKET_DAEMON)
+        sock.sendall(trap_data)
+        sock.shutdown(socket.SHUT_WR)
+        return sock.recv(64).decode().strip()
+
+def main():
+    trap_data = sys.stdin.buffer.read()
+    try:
+        respuesta = reenviar(trap_data)
+    except OSError:
+        # Daemon no disponible: procesar en modo clásico
+        resultado = subprocess.run([sys.executable, HANDLER], input=trap_data)
+        sys.exit(resultado.returncode)
+    sys.exit(0 if respuesta == "OK" else 1)
+
+if __name__ == "__main__":
+    main()
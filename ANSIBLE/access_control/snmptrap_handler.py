@@ -4,18 +4,37 @@ import sys
 import os
 import time
 import threading
-import queue
-import concurrent.futures
+import asyncio
+import argparse
+import signal
+import socket
+import json
 from typing import Dict, List, Optional
 
 # Agregar el directorio raíz al sys.path
 sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
 
-from access_control.snmp_utils import buscar_mac_por_puerto_con_reintentos, limpiar_cache
+from access_control.snmp_utils import (esperar_mac_en_puerto, buscar_mac_por_puerto_async, buscar_macs_por_puerto_async,
+                                       MACPuerto, limpiar_cache,
+                                       invalidar_cache_puerto, SondeoPeriodicoFDB, INTERVALO_SONDEO_FDB, NIVEL_LOG)
+from access_control.registro import EscritorLog
+from access_control import metricas
+from access_control.metricas import obtener_resumen_metricas, ServidorMetricas, LIMITES_RAPIDOS
+from access_control.aprovisionamiento import obtener_agrupador
+from access_control.reconciliador import obtener_estadisticas_reconciliador
+from access_control.vlans_conocidas import (vlan_existente, esperar_vlan_operativa, registrar_vlan,
+                                            sembrar_registro, obtener_estadisticas_vlans)
+from access_control.antirrebote import AntirrebotePuertos, VENTANA_ANTIRREBOTE
+from access_control.diario import DiarioEventos, RUTA_DIARIO, ETAPA_RESUELTO, ETAPA_APLICANDO, ETAPA_COMPLETADO
+from access_control.planificador import (PlanificadorTrabajos, MAX_TRABAJOS_SIMULTANEOS,
+                                         PRIORIDAD_LIMPIEZA, PRIORIDAD_CONEXION, PRIORIDAD_FONDO)
+from access_control.configuracion import obtener_configuracion, ErrorConfiguracion
+from access_control.estado_compartido import (PublicadorEstado, cargar_cache, publicar_estado,
+                                              registrar_fuente_estadisticas)
+from access_control.snmp_nativo import decodificar_mensaje, ErrorSNMP, PDU_TRAP_V1, PDU_TRAP_V2, PDU_INFORM
 
-import datetime
-import json
-import subprocess
+import ipaddress
+from collections import namedtuple
 import re
 
 # Rutas
@@ -26,43 +45,124 @@ CONFIG_FILE = os.path.join(BASE_DIR, "access_control/config/dispositivos.json")
 # Asegurar existencia del directorio de logs
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
+# Modo daemon: recepción directa de traps (UDP) o desde el reenviador de snmptrapd (socket local)
+SOCKET_DAEMON = os.path.join(BASE_DIR, "access_control/snmptrap_handler.sock")
+PUERTO_TRAPS = 162
+MAX_TRAPS_EN_COLA = 1000
+TIMEOUT_ENCOLADO = 10  # segundos de espera con la cola llena antes de rechazar un trap
+INTERVALO_LIMPIEZA_CACHE = 60  # segundos
+
+# Log escrito en segundo plano (ver registro.py); NIVEL_LOG filtra los mensajes de menor nivel
+MAX_BYTES_LOG = 10 * 1024 * 1024
+escritor_log = EscritorLog(LOG_FILE, MAX_BYTES_LOG, NIVEL_LOG, con_nivel=False)
+
 # Variables globales para control de concurrencia
-log_lock = threading.Lock()
-playbook_execution_lock = threading.Lock()
-trap_queue = queue.Queue()
+playbook_execution_lock = None  # asyncio.Lock, creado dentro del event loop
 active_playbooks = {}  # Puerto -> timestamp de ejecución activa
 active_playbooks_lock = threading.Lock()
 
-# Pool de threads para procesamiento de traps
-MAX_CONCURRENT_TRAPS = 3
-trap_executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TRAPS)
+# Corrutinas que procesan traps en paralelo; cada trap pendiente cuesta una corrutina, no un thread
+MAX_CONCURRENT_TRAPS = 64
+TIMEOUT_PLAYBOOK = 120  # segundos
+ESPERA_TRAS_VLAN_CONFIG = 15  # segundos; solo sin switch conocido (con él se consulta vtpVlanState)
+ESPERA_ESTABILIZACION_VLAN = 5  # segundos
+# Agrupar los cambios de cada switch en una sola aplicación del backend configurado en
+# aprovisionamiento.py (BACKEND_APROVISIONAMIENTO: ansible o cli); False mantiene un playbook por puerto y etapa
+APROVISIONAMIENTO_POR_LOTES = True
+
+# Estado del daemon
+detener_daemon = None  # asyncio.Event, creado dentro del event loop
+antirrebote = None  # AntirrebotePuertos del daemon; en modo stdin cada trap se procesa directamente
+planificador = None  # PlanificadorTrabajos del daemon; en modo stdin no se limita la concurrencia
+diario = None  # DiarioEventos del daemon; en modo stdin los traps no se registran
+eventos_puerto = {}  # clave (ip, ifIndex) -> id del último evento del diario pendiente en el puerto
+estadisticas_daemon = {'recibidos': 0, 'rechazados': 0, 'procesados': 0, 'errores': 0, 'sin_trap': 0}
+reparto_switches = None  # worker de supervisor.py: (anillo consistente, índice del worker)
+
+# Métricas por etapa del procesamiento de un trap (METRICAS_HABILITADAS=0 las desactiva)
+metrica_traps = metricas.contador_etiquetado(
+    "snmp_traps_total", "Traps procesados por switch y evento", ("switch", "evento"))
+metrica_cola = metricas.histograma_etiquetado(
+    "snmp_trap_cola_segundos", "Espera del trap en la cola del daemon", ("switch",), LIMITES_RAPIDOS)
+metrica_parseo = metricas.histograma_etiquetado(
+    "snmp_trap_parseo_segundos", "Interpretación del texto del trap", (), LIMITES_RAPIDOS)
+metrica_resolucion = metricas.histograma_etiquetado(
+    "snmp_trap_resolucion_mac_segundos", "Resolución de la MAC del puerto por SNMP", ("switch", "accion"))
+metrica_aplicacion = metricas.histograma_etiquetado(
+    "snmp_trap_aplicacion_segundos", "Aplicación de la acción en el switch (lote o playbooks)", ("switch", "accion"))
+metrica_total = metricas.histograma_etiquetado(
+    "snmp_trap_total_segundos", "Desde la recepción del trap hasta la acción aplicada", ("switch", "accion"))
+metrica_resultados = metricas.contador_etiquetado(
+    "snmp_acciones_total", "Acciones por switch, acción y resultado", ("switch", "accion", "resultado"))
+metrica_playbooks = metricas.histograma_etiquetado(
+    "ansible_playbook_segundos", "Ejecuciones de ansible-playbook por playbook y resultado", ("playbook", "resultado"))
+
+# Nombres de OIDs para reconstruir traps UDP en el formato de texto de snmptrapd
+NOMBRES_OID_TRAP = {
+    "1.3.6.1.2.1.1.3.0": "DISMAN-EVENT-MIB::sysUpTimeInstance",
+    "1.3.6.1.6.3.1.1.4.1.0": "SNMPv2-MIB::snmpTrapOID.0",
+    "1.3.6.1.6.3.1.1.5.1": "SNMPv2-MIB::coldStart",
+    "1.3.6.1.6.3.1.1.5.2": "SNMPv2-MIB::warmStart",
+    "1.3.6.1.6.3.1.1.5.3": "IF-MIB::linkDown",
+    "1.3.6.1.6.3.1.1.5.4": "IF-MIB::linkUp",
+    "1.3.6.1.2.1.2.2.1.1": "IF-MIB::ifIndex",
+    "1.3.6.1.2.1.2.2.1.2": "IF-MIB::ifDescr",
+    "1.3.6.1.2.1.2.2.1.3": "IF-MIB::ifType",
+    "1.3.6.1.2.1.2.2.1.7": "IF-MIB::ifAdminStatus",
+    "1.3.6.1.2.1.2.2.1.8": "IF-MIB::ifOperStatus",
+}
+OID_TRAP = "SNMPv2-MIB::snmpTrapOID.0"
+OID_IFINDEX = "IF-MIB::ifIndex"
+OID_IFDESCR = "IF-MIB::ifDescr"
+ORIGEN_SONDEO = "<SONDEO-FDB>"  # primera línea de los linkUp sintéticos del sondeo del FDB
+
+# Patrones precompilados del parser de traps
+PATRON_TRANSPORTE = re.compile(r"UDP(?:/IPv6)?:\s*\[([0-9A-Fa-f:.]+)\](?::(\d+))?")
+PATRON_TIPO_VALOR = re.compile(r"[A-Za-z0-9\-]+:\s")
+PATRON_MAC = re.compile(r"(([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})")
+PATRON_CARACTERES_PUERTO = re.compile(r'[^A-Za-z0-9/]')
+
+# Trap interpretado: varbinds por nombre de OID; evento_trap es el nombre corto del trap (linkUp...)
+TrapSNMP = namedtuple("TrapSNMP", ["origen", "puerto_origen", "trap_oid", "evento_trap",
+                                   "varbinds", "ifindex", "ifdescr", "texto"])
+
+# generic-trap de SNMPv1 -> OID de trap SNMPv2
+TRAPS_GENERICOS_V1 = {0: "1.3.6.1.6.3.1.1.5.1", 1: "1.3.6.1.6.3.1.1.5.2",
+                      2: "1.3.6.1.6.3.1.1.5.3", 3: "1.3.6.1.6.3.1.1.5.4"}
 
 def cargar_configuracion():
     """
-    Carga la configuración desde el archivo JSON especificado en CONFIG_FILE.
+    Devuelve la configuración compilada de CONFIG_FILE. El archivo solo se vuelve a
+    leer cuando cambia; una versión inválida no sustituye a la última correcta.
 
     Returns:
-        dict: Diccionario con la configuración cargada.
+        ConfiguracionCompilada: Configuración validada e indexada.
     """
     try:
-        with open(CONFIG_FILE) as f:
-            return json.load(f)
-    except Exception as e:
+        return obtener_configuracion(CONFIG_FILE)
+    except ErrorConfiguracion as e:
         log(f"ERROR cargando configuración: {str(e)}")
         sys.exit(1)
 
-def log(mensaje):
+def _nombre_contexto() -> str:
+    """Nombre de la tarea asyncio en curso o, fuera del event loop, del thread actual."""
+    try:
+        tarea = asyncio.current_task()
+    except RuntimeError:
+        tarea = None
+    return tarea.get_name() if tarea else threading.current_thread().name
+
+def log(mensaje, nivel="INFO"):
     """
-    Registra un mensaje en el archivo de log de forma thread-safe.
+    Registra un mensaje en el archivo de log. El mensaje se encola y lo escribe el
+    thread del escritor de logs, sin bloquear el event loop.
 
     Args:
         mensaje (str): Mensaje a registrar.
+        nivel (str): Nivel del mensaje; se descarta si es inferior a NIVEL_LOG.
     """
-    with log_lock:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        thread_id = threading.current_thread().name
-        with open(LOG_FILE, "a") as f:
-            f.write(f"[{timestamp}] [Thread:{thread_id}] {mensaje}\n")
+    if escritor_log.habilitado(nivel):
+        escritor_log.escribir(mensaje, nivel, _nombre_contexto())
 
 def obtener_dispositivo(ip, dispositivos_por_ip):
     """
@@ -70,39 +170,105 @@ def obtener_dispositivo(ip, dispositivos_por_ip):
 
     Args:
         ip (str): Dirección IP del dispositivo.
-        dispositivos_por_ip (dict): Diccionario de dispositivos por IP.
+        dispositivos_por_ip (dict): Diccionario de dispositivos por dirección IP parseada.
 
     Returns:
         str: Nombre del dispositivo o "DESCONOCIDO" si no se encuentra.
     """
-    return dispositivos_por_ip.get(ip, "DESCONOCIDO")
+    try:
+        return dispositivos_por_ip.get(ipaddress.ip_address(ip), "DESCONOCIDO")
+    except ValueError:
+        return "DESCONOCIDO"
+
+def _texto_oid(nombre: str) -> str:
+    """Normaliza el nombre de un OID del texto de snmptrapd a su forma simbólica conocida."""
+    if nombre[:1] in ".0123456789":
+        numerico = nombre.lstrip(".")
+        if numerico in NOMBRES_OID_TRAP:
+            return NOMBRES_OID_TRAP[numerico]
+        for prefijo, simbolico in NOMBRES_OID_TRAP.items():
+            if numerico.startswith(prefijo + "."):
+                return simbolico + numerico[len(prefijo):]
+    return nombre
 
-def obtener_puerto(trap_data, ifindex_to_interface):
+def _limpiar_valor(valor: str) -> str:
+    """Quita el prefijo de tipo (STRING:, INTEGER:...) y las comillas de un valor de snmptrapd."""
+    if ": " in valor:
+        tipo = PATRON_TIPO_VALOR.match(valor)
+        if tipo:
+            valor = valor[tipo.end():]
+    if len(valor) >= 2 and valor[0] == valor[-1] == '"':
+        valor = valor[1:-1]
+    return valor
+
+def _crear_trap(origen, puerto_origen, trap_oid, varbinds, texto) -> TrapSNMP:
+    """Completa el registro con los campos derivados de los varbinds (ifIndex, ifDescr)."""
+    ifindex = None
+    ifdescr = None
+    for nombre, valor in varbinds.items():
+        if ifindex is None and nombre.startswith(OID_IFINDEX):
+            try:
+                ifindex = int(valor)
+            except ValueError:
+                sufijo = nombre[len(OID_IFINDEX) + 1:]
+                ifindex = int(sufijo) if sufijo.isdigit() else None
+        elif ifdescr is None and nombre.startswith(OID_IFDESCR):
+            ifdescr = valor
+    evento_trap = trap_oid.rpartition("::")[2] if trap_oid else None
+    return TrapSNMP(origen, puerto_origen, trap_oid, evento_trap, varbinds, ifindex, ifdescr, texto)
+
+def parsear_trap(trap_data: str) -> TrapSNMP:
     """
-    Extrae el puerto y su índice del trap SNMP recibido.
+    Interpreta en una sola pasada un trap en el formato de texto de snmptrapd
+    (línea de host, línea de transporte y una línea "OID valor" por varbind).
 
     Args:
         trap_data (str): Datos del trap SNMP.
-        ifindex_to_interface (dict): Mapeo de índices a nombres de interfaces.
 
     Returns:
-        tuple: Nombre del puerto y su índice.
+        TrapSNMP: Registro con origen, OID del trap, varbinds por OID e ifIndex.
     """
-    puerto = "desconocido"
-    puerto_index = "desconocido"
+    origen = "desconocido"
+    puerto_origen = None
+    trap_oid = None
+    varbinds = {}
     for linea in trap_data.splitlines():
-        if "ifDescr" in linea and "FastEthernet" in linea:
-            partes = linea.strip().split(" = ")
-            if len(partes) == 2 and "FastEthernet" in partes[1]:
-                puerto = partes[1].replace("STRING: ", "").strip()
-        elif "ifIndex" in linea and puerto == "desconocido":
-            partes = linea.strip().split()
-            for parte in partes:
-                if parte.isdigit():
-                    puerto_index = parte
-                    puerto = ifindex_to_interface.get(puerto_index, "desconocido")
-                    break
-    return puerto, puerto_index
+        linea = linea.strip()
+        if not linea:
+            continue
+        if origen == "desconocido" and linea[:3] == "UDP":
+            transporte = PATRON_TRANSPORTE.match(linea)
+            if transporte:
+                origen = transporte.group(1)
+                puerto_origen = int(transporte.group(2)) if transporte.group(2) else None
+                continue
+        nombre, separador, valor = linea.partition(" = ")
+        if not separador:
+            nombre, _, valor = linea.partition(" ")
+        if "::" not in nombre and nombre[:1] not in ".0123456789":
+            continue  # línea de host u otra sin OID
+        nombre = _texto_oid(nombre)
+        valor = _limpiar_valor(valor.strip())
+        if nombre == OID_TRAP:
+            trap_oid = _texto_oid(valor)
+        varbinds[nombre] = valor
+    return _crear_trap(origen, puerto_origen, trap_oid, varbinds, trap_data)
+
+def obtener_puerto(trap: TrapSNMP, ifindex_to_interface):
+    """
+    Obtiene el puerto y su índice del trap SNMP interpretado.
+
+    Args:
+        trap (TrapSNMP): Trap interpretado por parsear_trap o trap_desde_pdu.
+        ifindex_to_interface (dict): Mapeo de índices (int) a nombres de interfaces.
+
+    Returns:
+        tuple: Nombre del puerto y su índice.
+    """
+    if trap.ifindex is None:
+        return "desconocido", "desconocido"
+    puerto = ifindex_to_interface.get(trap.ifindex) or trap.ifdescr or "desconocido"
+    return puerto, str(trap.ifindex)
 
 def detectar_mac(trap_data):
     """
@@ -114,7 +280,7 @@ def detectar_mac(trap_data):
     Returns:
         str: Dirección MAC encontrada o None si no se encuentra.
     """
-    mac_match = re.search(r"(([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})", trap_data)
+    mac_match = PATRON_MAC.search(trap_data)
     if mac_match:
         return mac_match.group(1)
     return None
@@ -129,27 +295,27 @@ def validar_puerto(puerto):
     Returns:
         str: Nombre del puerto limpio.
     """
-    return re.sub(r'[^A-Za-z0-9/]', '', puerto)
+    return PATRON_CARACTERES_PUERTO.sub('', puerto)
 
-def determinar_evento(trap_data, acciones):
+def determinar_evento(trap: TrapSNMP, acciones):
     """
-    Determina el evento y la acción asociada al trap SNMP.
+    Determina el evento y la acción asociada al trap SNMP a partir de su OID.
 
     Args:
-        trap_data (str): Datos del trap SNMP.
-        acciones (dict): Diccionario de acciones por palabra clave.
+        trap (TrapSNMP): Trap interpretado.
+        acciones (dict): Diccionario de acciones por palabra clave (nombre del trap).
 
     Returns:
         tuple: Evento detectado y acción asociada.
     """
-    evento = "TRAP DESCONOCIDO"
-    accion = None
-    for palabra_clave, (evento_detectado, accion_detectada) in acciones.items():
-        if palabra_clave in trap_data:
-            evento = evento_detectado
-            accion = accion_detectada
-            break
-    return evento, accion
+    if trap.evento_trap in acciones:
+        return acciones[trap.evento_trap]
+    # Palabras clave que no son el nombre exacto del trap
+    if trap.trap_oid:
+        for palabra_clave, (evento_detectado, accion_detectada) in acciones.items():
+            if palabra_clave in trap.trap_oid:
+                return evento_detectado, accion_detectada
+    return "TRAP DESCONOCIDO", None
 
 def puede_ejecutar_playbook(puerto: str) -> bool:
     """
@@ -179,7 +345,37 @@ def marcar_playbook_completado(puerto: str) -> None:
             del active_playbooks[puerto]
             log(f"Playbook completado en puerto {puerto}")
 
-def ejecutar_playbook(mac_address, puerto, vlan_id, playbook):
+def _obtener_lock_playbooks() -> asyncio.Lock:
+    """Devuelve el lock que serializa las ejecuciones de Ansible, creándolo en el loop actual."""
+    global playbook_execution_lock
+    if playbook_execution_lock is None:
+        playbook_execution_lock = asyncio.Lock()
+    return playbook_execution_lock
+
+async def ejecutar_comando_async(comando: List[str], env: Optional[Dict] = None,
+                                 timeout: Optional[float] = None):
+    """
+    Ejecuta un comando externo desde BASE_DIR sin bloquear el event loop.
+
+    Returns:
+        tuple: (código de salida, stdout, stderr).
+
+    Raises:
+        asyncio.TimeoutError: si el comando supera `timeout`; el proceso se termina.
+    """
+    proceso = await asyncio.create_subprocess_exec(
+        *comando, cwd=BASE_DIR, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proceso.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proceso.kill()
+        await proceso.wait()
+        raise
+    return proceso.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+async def ejecutar_playbook(mac_address, puerto, vlan_id, playbook, variables: Optional[Dict] = None):
     """
     Ejecuta un playbook de Ansible con control de concurrencia.
 
@@ -188,15 +384,17 @@ def ejecutar_playbook(mac_address, puerto, vlan_id, playbook):
         puerto (str): Puerto en el que se encuentra el dispositivo.
         vlan_id (str): ID de la VLAN a configurar.
         playbook (str): Ruta del playbook a ejecutar.
+        variables (dict): Variables adicionales para --extra-vars (mac_addresses, max_macs).
+
+    Returns:
+        bool: True si el playbook terminó correctamente.
     """
     if not puede_ejecutar_playbook(puerto):
         log(f"Ejecución de playbook cancelada para puerto {puerto} - ya hay una ejecución activa")
-        return
+        return False
     
     try:
-        with playbook_execution_lock:  # Serializar ejecuciones de Ansible
-            os.chdir("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE")
-            
+        async with _obtener_lock_playbooks():  # Serializar ejecuciones de Ansible
             env = os.environ.copy()
             env["MAC_ADDRESS"] = mac_address
             env["PUERTO"] = puerto
@@ -204,145 +402,738 @@ def ejecutar_playbook(mac_address, puerto, vlan_id, playbook):
                 env["VLAN_ID"] = str(vlan_id)
             
             log(f"Ejecutando playbook {playbook} para MAC {mac_address} en puerto {puerto}")
+            inicio = time.monotonic()
             
-            result = subprocess.run(
-                ["ansible-playbook", playbook],
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=120  # Timeout de 2 minutos
-            )
+            comando = ["ansible-playbook", playbook]
+            if variables:
+                comando += ["--extra-vars", json.dumps(variables)]
+            returncode, _, stderr = await ejecutar_comando_async(comando, env=env, timeout=TIMEOUT_PLAYBOOK)
+            metrica_playbooks.observar(time.monotonic() - inicio, os.path.basename(playbook),
+                                       "ok" if returncode == 0 else "error")
             
-            if result.returncode == 0:
+            if returncode == 0:
                 log(f"Playbook {playbook} ejecutado exitosamente")
             else:
-                log(f"Error ejecutando playbook {playbook}: {result.stderr}")
+                log(f"Error ejecutando playbook {playbook}: {stderr}")
+            return returncode == 0
                 
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
+        metrica_playbooks.observar(TIMEOUT_PLAYBOOK, os.path.basename(playbook), "timeout")
         log(f"Timeout ejecutando playbook {playbook} para puerto {puerto}")
     except Exception as e:
         log(f"ERROR ejecutando playbook: {str(e)}")
     finally:
         marcar_playbook_completado(puerto)
+    return False
 
-def limpiar_puerto(puerto):
+async def limpiar_puerto(puerto):
     """
     Limpia la configuración de un puerto en el switch.
 
     Args:
         puerto (str): Nombre del puerto a limpiar.
     """
-    os.chdir("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE")
     try:
-        result = subprocess.run([
+        inicio = time.monotonic()
+        returncode, stdout, stderr = await ejecutar_comando_async([
             "ansible-playbook",
             "playbooks/limpiar_puerto.yml",
             "--extra-vars", f"interface_name={puerto}"
-        ], capture_output=True, text=True)
+        ])
+        metrica_playbooks.observar(time.monotonic() - inicio, "limpiar_puerto.yml",
+                                   "ok" if returncode == 0 else "error")
 
-        log(f"Playbook de limpieza ejecutado para el puerto {puerto}. Salida:\n{result.stdout}\nErrores:\n{result.stderr}")
+        log(f"Playbook de limpieza ejecutado para el puerto {puerto}. Salida:\n{stdout}\nErrores:\n{stderr}")
     except Exception as e:
         log(f"ERROR ejecutando playbook de limpieza: {str(e)}")
 
-def procesar_trap_async(trap_data: str) -> None:
+async def configurar_vlan_puerto(mac_address, puerto, vlan_id, mac_addresses: Optional[List[str]] = None,
+                                 max_macs: Optional[int] = None, switch_ip: Optional[str] = None):
+    """
+    Crea o actualiza la VLAN y después asigna el puerto con port-security, autorizando
+    todas las MACs de `mac_addresses` (por defecto solo `mac_address`).
+    Con `switch_ip`, una VLAN que ya está en el registro de vlans_conocidas.py no se
+    vuelve a crear, y una nueva se espera consultando su estado por SNMP; sin él se
+    mantienen las esperas fijas de estabilización.
     """
-    Procesa un trap SNMP de forma asíncrona.
+    if vlan_id and switch_ip and await vlan_existente(switch_ip, vlan_id):
+        log(f"VLAN {vlan_id} ya existe en {switch_ip}: no se ejecuta vlan_config.yml")
+    elif switch_ip:
+        creada = await ejecutar_playbook(mac_address, puerto, vlan_id, "playbooks/vlan_config.yml")
+        if vlan_id:
+            log(f"Esperando a que la VLAN {vlan_id} esté operativa en {switch_ip}...")
+            if not await esperar_vlan_operativa(switch_ip, vlan_id):
+                log(f"VLAN {vlan_id} no confirmada por SNMP en {switch_ip}; se continúa con el puerto")
+            if creada:
+                registrar_vlan(switch_ip, vlan_id)
+    else:
+        await ejecutar_playbook(mac_address, puerto, vlan_id, "playbooks/vlan_config.yml")
+        await asyncio.sleep(ESPERA_TRAS_VLAN_CONFIG)
+        if vlan_id:
+            log(f"Esperando para que la VLAN {vlan_id} se estabilice...")
+            await asyncio.sleep(ESPERA_ESTABILIZACION_VLAN)
+    if vlan_id:
+        log(f"Configurando VLAN {vlan_id} en puerto {puerto} para MAC {mac_address}...")
+        variables = {'mac_addresses': mac_addresses, 'max_macs': max_macs} if mac_addresses else None
+        await ejecutar_playbook(mac_address, puerto, vlan_id, "playbooks/asignar_vlanxmac.yml", variables)
+    else:
+        log(f"No se encontró una VLAN asignada para la MAC {mac_address}.")
+
+async def procesar_trap_async(trap_data, recibido: Optional[float] = None, id_evento: Optional[int] = None) -> None:
+    """
+    Procesa un trap SNMP de forma asíncrona: resolución de MAC y aprovisionamiento
+    se ejecutan como corrutinas sin ocupar threads.
     
     Args:
-        trap_data: Datos del trap SNMP recibido
+        trap_data: Datos del trap SNMP recibido (texto de snmptrapd o TrapSNMP ya interpretado)
+        recibido (float): Instante (time.monotonic) en que el daemon encoló el trap.
+        id_evento (int): Evento del diario del daemon que corresponde al trap.
     """
+    inicio = time.monotonic()
+    resultado = "ignorado"  # resultado en el diario si el trap no llega a resolverse
     try:
         log(f"Iniciando procesamiento asíncrono de trap")
         
         config = cargar_configuracion()
-        dispositivos_por_ip = config.get("dispositivos_por_ip", {})
-        ifindex_to_interface = config.get("ifindex_to_interface", {})
-        acciones = config.get("acciones", {})
-
-        # Detectar IP de origen
-        ip_origen_aux = re.search(r'UDP/IPv6:\s+\[([0-9a-fA-F:]+)\]', trap_data)
-        if ip_origen_aux:
-            ip_origen = ip_origen_aux.group(1)
+        dispositivos_por_ip = config.dispositivos
+        ifindex_to_interface = config.interfaces
+        acciones = config.acciones
+
+        if isinstance(trap_data, TrapSNMP):
+            trap = trap_data
         else:
-            ip_origen = "desconocido"
+            antes_parseo = time.monotonic()
+            trap = parsear_trap(trap_data)
+            metrica_parseo.observar(time.monotonic() - antes_parseo)
+        trap_data = trap.texto
+
+        # IP de origen
+        ip_origen = trap.origen
         dispositivo = obtener_dispositivo(ip_origen, dispositivos_por_ip)
+        metrica_traps.incrementar(ip_origen, trap.evento_trap or "desconocido")
+        if recibido is not None:
+            metrica_cola.observar(inicio - recibido, ip_origen)
 
         # Detectar evento y acción
-        evento, accion = determinar_evento(trap_data, acciones)
+        evento, accion = determinar_evento(trap, acciones)
 
         # Detectar puerto
-        puerto, puerto_index = obtener_puerto(trap_data, ifindex_to_interface)
+        puerto, puerto_index = obtener_puerto(trap, ifindex_to_interface)
         
         # Filtrar eventos usando la lista de puertos físicos configurados
         if puerto_index.isdigit():
-            if puerto_index not in ifindex_to_interface:
+            if int(puerto_index) not in ifindex_to_interface:
                 log(f"Evento ignorado: ifIndex {puerto_index} no está configurado como puerto físico")
                 return
         else:
             log(f"Evento ignorado: puerto_index no válido ({puerto_index})")
             return
 
-        # Obtener dirección MAC mediante SNMP polling con reintentos
+        if accion == "desconectar":
+            # La MAC que hubiera en el puerto deja de ser válida, también para el próximo linkUp
+            invalidar_cache_puerto(ip_origen, puerto_index)
+
+        clase = clase_trabajo(trap, accion)
+        trabajo = lambda: resolver_y_aplicar_evento(trap_data, config, ip_origen, dispositivo,
+                                                    evento, accion, puerto, puerto_index, recibido or inicio,
+                                                    id_evento)
+        resultado = None  # lo registra resolver_y_aplicar_evento
+        if antirrebote is not None and accion in ("conectar", "desconectar"):
+            # El puerto se procesa cuando pasa la ventana de antirrebote sin eventos nuevos
+            cancelado = antirrebote.notificar((ip_origen, puerto_index), accion,
+                                              lambda: ejecutar_en_turno(clase, ip_origen, trabajo))
+            _sustituir_evento_puerto((ip_origen, puerto_index), id_evento, cancelado)
+            return
+
+        await ejecutar_en_turno(clase, ip_origen, trabajo)
+
+    except Exception as e:
+        resultado = "error"
+        log(f"ERROR en procesamiento asíncrono de trap: {str(e)}")
+    finally:
+        if resultado:
+            _registrar_etapa(id_evento, ETAPA_COMPLETADO, resultado=resultado)
+
+def _registrar_etapa(id_evento: Optional[int], etapa: str, **datos) -> None:
+    if diario is not None and id_evento is not None:
+        diario.registrar_etapa(id_evento, etapa, **datos)
+
+def _sustituir_evento_puerto(clave_puerto, id_evento: Optional[int], cancelado: bool) -> None:
+    """
+    El evento pasa a ser el último del puerto. El anterior solo queda sustituido si el
+    antirrebote canceló su trabajo; si ya estaba aplicando, termina y se completa solo.
+    """
+    anterior = eventos_puerto.pop(clave_puerto, None)
+    if cancelado and anterior is not None and anterior != id_evento:
+        _registrar_etapa(anterior, ETAPA_COMPLETADO, resultado="sustituido", por=id_evento)
+    if id_evento is not None:
+        eventos_puerto[clave_puerto] = id_evento
+
+def _completar_evento_puerto(clave_puerto, id_evento: Optional[int], resultado: str) -> None:
+    _registrar_etapa(id_evento, ETAPA_COMPLETADO, resultado=resultado)
+    if id_evento is not None and eventos_puerto.get(clave_puerto) == id_evento:
+        del eventos_puerto[clave_puerto]
+
+def clase_trabajo(trap: TrapSNMP, accion) -> str:
+    """Clase de prioridad del trabajo de un trap: limpieza, conexión o refresco de fondo."""
+    if accion == "desconectar":
+        return PRIORIDAD_LIMPIEZA
+    if trap.texto.startswith(ORIGEN_SONDEO):
+        return PRIORIDAD_FONDO
+    return PRIORIDAD_CONEXION
+
+async def ejecutar_en_turno(clase: str, ip_origen: str, trabajo) -> None:
+    """
+    En modo daemon, espera turno en el planificador antes de ejecutar `trabajo`: con
+    todos los huecos ocupados, las limpiezas adelantan a las conexiones pendientes.
+    """
+    if planificador is None:
+        await trabajo()
+        return
+    async with planificador.turno(clase, ip_origen):
+        await trabajo()
+
+async def resolver_y_aplicar_evento(trap_data, config, ip_origen, dispositivo,
+                                    evento, accion, puerto, puerto_index, recibido: Optional[float] = None,
+                                    id_evento: Optional[int] = None) -> None:
+    """
+    Resuelve la MAC del puerto y aplica la acción del evento en el switch.
+    En modo daemon se ejecuta con el estado final del puerto tras el antirrebote.
+    `recibido` (time.monotonic) es la llegada del trap, para medir la latencia total, e
+    `id_evento` su evento en el diario, que se completa con el resultado.
+    """
+    ifindex_to_interface = config.interfaces
+    clave_puerto = (ip_origen, puerto_index)
+    etiqueta_accion = accion or "ninguna"
+    resultado = "error"
+    try:
+        # Obtener dirección MAC: en conexiones se espera a que aparezca en el FDB;
+        # en el resto de eventos basta con la tabla actual
         mac_address = None
+        macs_puerto = []
+        inicio = time.monotonic()
         log(f"Procesando evento para puerto físico configurado ifIndex {puerto_index}...")
-        mac_address = buscar_mac_por_puerto_con_reintentos(
-            ip_origen, int(puerto_index), ifindex_validos=ifindex_to_interface
-        )
+        if accion == "conectar":
+            mac_address = await esperar_mac_en_puerto(
+                ip_origen, int(puerto_index), ifindex_validos=ifindex_to_interface
+            )
+            if mac_address:
+                # Todos los equipos del puerto (teléfono IP con un PC detrás, hub), con su VLAN actual
+                macs_puerto = await buscar_macs_por_puerto_async(
+                    ip_origen, int(puerto_index), ifindex_validos=ifindex_to_interface
+                )
+                if mac_address not in [mac for mac, _ in macs_puerto]:
+                    macs_puerto.insert(0, MACPuerto(mac_address, None))
+        else:
+            # Sin cache: en una desconexión la MAC se consulta solo para el registro
+            mac_address = await buscar_mac_por_puerto_async(
+                ip_origen, int(puerto_index), ifindex_validos=ifindex_to_interface,
+                usar_cache=accion != "desconectar"
+            )
+
+        metrica_resolucion.observar(time.monotonic() - inicio, ip_origen, etiqueta_accion)
 
         if not mac_address:
-            log("No se pudo obtener la dirección MAC mediante SNMP polling con reintentos.")
+            log("No se pudo obtener la dirección MAC mediante SNMP.")
             mac_address = "desconocida"
 
         log_entry = (
             f"Evento: {evento}\n"
             f"Dispositivo: {dispositivo} IP origen: {ip_origen}\n"
             f"Puerto detectado: {puerto} (Index {puerto_index})\n"
-            f"MAC detectada: {mac_address}\n"
+            f"MAC detectada: {mac_address}"
+            f"{' (en el puerto: ' + ', '.join(mac for mac, _ in macs_puerto) + ')' if len(macs_puerto) > 1 else ''}\n"
             f"{trap_data}\n{'-'*60}\n"
         )
         log(log_entry)
 
         puerto = validar_puerto(puerto)
 
+        # VLAN del puerto según la política de configuración y MACs autorizadas en ella
+        vlan_id, autorizadas = config.asignacion_puerto(macs_puerto) if accion == "conectar" else (None, [])
+        estado_final = (vlan_id, tuple(sorted(autorizadas))) if accion == "conectar" else None
+        _registrar_etapa(id_evento, ETAPA_RESUELTO, mac=mac_address, vlan=vlan_id, autorizadas=list(autorizadas))
+        if antirrebote is not None and antirrebote.sin_cambios(clave_puerto, accion, estado_final):
+            log(f"Puerto {puerto} de {ip_origen} ya está en el estado final ({accion}), no se reconfigura")
+            metrica_resultados.incrementar(ip_origen, etiqueta_accion, "sin_cambios")
+            resultado = "sin_cambios"
+            return
+
+        inicio = time.monotonic()
+        exito = None  # None: no se aplicó ninguna acción
+        detalle = None
         if accion == "conectar" and puerto != "desconocido" and mac_address != "desconocida":
-            vlan_id = config.get("vlan_por_mac", {}).get(mac_address)
-            log(f"Creando o actualizando VLAN {vlan_id} para MAC {mac_address}")
-            
-            # Ejecutar playbook en thread separado para no bloquear
-            def ejecutar_vlan_config():
-                ejecutar_playbook(mac_address, puerto, vlan_id, "playbooks/vlan_config.yml")
-                time.sleep(15)
-                if vlan_id:
-                    log(f"Esperando para que la VLAN {vlan_id} se estabilice...")
-                    time.sleep(5)
-                    log(f"Configurando VLAN {vlan_id} en puerto {puerto} para MAC {mac_address}...")
-                    ejecutar_playbook(mac_address, puerto, vlan_id, "playbooks/asignar_vlanxmac.yml")
-                else:
-                    log(f"No se encontró una VLAN asignada para la MAC {mac_address}.")
-            
-            # Ejecutar en thread separado
-            config_thread = threading.Thread(target=ejecutar_vlan_config, name=f"VLANConfig-{puerto}")
-            config_thread.start()
+            max_macs = max(len(autorizadas), config.max_macs_por_puerto)
+            log(f"Creando o actualizando VLAN {vlan_id} para MAC {', '.join(autorizadas) or mac_address}")
+            if not APROVISIONAMIENTO_POR_LOTES:
+                _marcar_aplicando(clave_puerto, id_evento)
+                await configurar_vlan_puerto(autorizadas[0] if autorizadas else mac_address, puerto, vlan_id,
+                                             autorizadas, max_macs, switch_ip=ip_origen)
+                _registrar_aplicado(clave_puerto, accion, estado_final, autorizadas)
+                exito = True
+            elif vlan_id:
+                _registrar_etapa(id_evento, ETAPA_APLICANDO)
+                exito, detalle = await obtener_agrupador().solicitar(
+                    ip_origen, "conectar", puerto, autorizadas[0], vlan_id,
+                    mac_addresses=autorizadas, max_macs=max_macs)
+                log(f"Configuración de VLAN {vlan_id} en puerto {puerto}: {'OK' if exito else detalle}")
+                _registrar_aplicado(clave_puerto, accion if exito else None, estado_final, autorizadas)
+            else:
+                log(f"No se encontró una VLAN asignada para la MAC {mac_address}.")
             
         elif accion == "desconectar" and puerto != "desconocido":
             log(f"Dispositivo desconectado en puerto {puerto} del {dispositivo}")
             log(f"Limpieza del puerto {puerto} tras desconexión del dispositivo en {dispositivo}.")
-            
-            # Ejecutar limpieza en thread separado
-            def ejecutar_limpieza():
-                limpiar_puerto(puerto)
-            
-            cleanup_thread = threading.Thread(target=ejecutar_limpieza, name=f"Cleanup-{puerto}")
-            cleanup_thread.start()
+            if APROVISIONAMIENTO_POR_LOTES:
+                _registrar_etapa(id_evento, ETAPA_APLICANDO)
+                exito, detalle = await obtener_agrupador().solicitar(ip_origen, "desconectar", puerto)
+                log(f"Limpieza del puerto {puerto}: {'OK' if exito else detalle}")
+                _registrar_aplicado(clave_puerto, accion if exito else None)
+            else:
+                _marcar_aplicando(clave_puerto, id_evento)
+                await limpiar_puerto(puerto)
+                _registrar_aplicado(clave_puerto, accion)
+                exito = True
         else:
             log("Trap recibido sin acción automática definida.")
+
+        ahora = time.monotonic()
+        if exito is None:
+            resultado = "sin_accion"
+            metrica_resultados.incrementar(ip_origen, etiqueta_accion, resultado)
+        elif exito and detalle == "sin cambios":
+            # El switch ya tenía la configuración pedida: no se tocó el puerto
+            resultado = "sin_cambios"
+            metrica_resultados.incrementar(ip_origen, etiqueta_accion, resultado)
+        else:
+            resultado = "ok" if exito else "error"
+            metrica_aplicacion.observar(ahora - inicio, ip_origen, etiqueta_accion)
+            metrica_resultados.incrementar(ip_origen, etiqueta_accion, resultado)
+        if recibido is not None:
+            metrica_total.observar(ahora - recibido, ip_origen, etiqueta_accion)
             
+    except asyncio.CancelledError:
+        # Sustituido por un evento posterior o daemon deteniéndose: el evento no se completa
+        resultado = None
+        raise
     except Exception as e:
         log(f"ERROR en procesamiento asíncrono de trap: {str(e)}")
+    finally:
+        if resultado:
+            _completar_evento_puerto(clave_puerto, id_evento, resultado)
 
-def main():
+def _marcar_aplicando(clave_puerto, id_evento: Optional[int] = None) -> None:
+    """En modo daemon, impide que un evento posterior interrumpa la configuración del puerto."""
+    _registrar_etapa(id_evento, ETAPA_APLICANDO)
+    if antirrebote is not None:
+        antirrebote.marcar_aplicando(clave_puerto)
+
+def _registrar_aplicado(clave_puerto, accion, estado_final=None, macs=()) -> None:
+    if antirrebote is not None:
+        antirrebote.registrar_aplicado(clave_puerto, accion, estado_final, macs)
+
+def _nombre_oid(oid) -> str:
+    """Traduce un OID numérico a su nombre simbólico conocido, conservando el sufijo de instancia."""
+    texto = ".".join(str(x) for x in oid)
+    if texto in NOMBRES_OID_TRAP:
+        return NOMBRES_OID_TRAP[texto]
+    for prefijo, nombre in NOMBRES_OID_TRAP.items():
+        if texto.startswith(prefijo + "."):
+            return nombre + texto[len(prefijo):]
+    return "." + texto
+
+def _formatear_valor_trap(vb) -> str:
+    """Representa el valor de un varbind como lo haría snmptrapd."""
+    if vb.tipo == "OID":
+        return _nombre_oid(vb.valor)
+    if vb.tipo == "Timeticks":
+        centesimas = vb.valor
+        dias, resto = divmod(centesimas, 8640000)
+        horas, resto = divmod(resto, 360000)
+        minutos, resto = divmod(resto, 6000)
+        return f"{dias}:{horas}:{minutos:02d}:{resto / 100:05.2f}"
+    if isinstance(vb.valor, bytes):
+        try:
+            return vb.valor.decode()
+        except UnicodeDecodeError:
+            return " ".join(f"{b:02X}" for b in vb.valor)
+    return str(vb.valor)
+
+def trap_desde_pdu(mensaje: Dict, origen: tuple) -> TrapSNMP:
+    """
+    Construye el registro de un trap recibido por UDP directamente desde sus varbinds
+    tipados, junto con su representación en el formato de texto de snmptrapd.
+
+    Args:
+        mensaje (dict): Mensaje decodificado por snmp_nativo.decodificar_mensaje.
+        origen (tuple): Dirección (ip, puerto, ...) del emisor.
+
+    Returns:
+        TrapSNMP: Trap interpretado.
+    """
+    ip, puerto = origen[0], origen[1]
+    if ip.startswith("::ffff:") and "." in ip:
+        ip = ip[7:]
+        lineas = ["<UNKNOWN>", f"UDP: [{ip}]:{puerto}"]
+    elif ":" in ip:
+        lineas = ["<UNKNOWN>", f"UDP/IPv6: [{ip}]:{puerto}"]
+    else:
+        lineas = ["<UNKNOWN>", f"UDP: [{ip}]:{puerto}"]
+
+    varbinds = {}
+    trap_oid = None
+    if mensaje['tipo_pdu'] == PDU_TRAP_V1:
+        oid_trap = TRAPS_GENERICOS_V1.get(mensaje['generic_trap'])
+        if oid_trap is None:
+            oid_trap = ".".join(str(x) for x in mensaje['enterprise']) + f".0.{mensaje['specific_trap']}"
+        trap_oid = _nombre_oid(tuple(int(x) for x in oid_trap.split('.')))
+        varbinds["DISMAN-EVENT-MIB::sysUpTimeInstance"] = str(mensaje['timestamp'])
+        varbinds[OID_TRAP] = trap_oid
+
+    for vb in mensaje['varbinds']:
+        nombre = _nombre_oid(vb.oid)
+        valor = _formatear_valor_trap(vb)
+        if nombre == OID_TRAP:
+            trap_oid = valor
+        varbinds[nombre] = valor
+
+    lineas.extend(f"{nombre} {valor}" for nombre, valor in varbinds.items())
+    return _crear_trap(ip, puerto, trap_oid, varbinds, "\n".join(lineas) + "\n")
+
+def formatear_trap_pdu(mensaje: Dict, origen: tuple) -> str:
+    """
+    Reconstruye un trap recibido por UDP en el formato de texto que entrega snmptrapd.
+
+    Returns:
+        str: Trap en formato texto.
+    """
+    return trap_desde_pdu(mensaje, origen).texto
+
+def elemento_cola(trap_data) -> tuple:
+    """
+    Elemento de la cola del daemon: (instante de llegada, trap, id de su evento en el
+    diario). El trap queda registrado en el diario como recibido.
     """
-    Función principal que procesa traps SNMP de forma concurrente.
+    if diario is None:
+        return time.monotonic(), trap_data, None
+    texto = trap_data.texto if isinstance(trap_data, TrapSNMP) else trap_data
+    return time.monotonic(), trap_data, diario.registrar_recibido(texto)
+
+def _descartar_elemento(elemento: tuple) -> None:
+    """Completa en el diario el evento de un trap que no cupo en la cola."""
+    _registrar_etapa(elemento[2], ETAPA_COMPLETADO, resultado="rechazado")
+
+async def encolar_trap(cola: asyncio.Queue, trap_data: str, timeout: Optional[float] = TIMEOUT_ENCOLADO) -> bool:
+    """
+    Encola un trap para los workers del daemon. Si la cola está llena espera hasta
+    `timeout` segundos (backpressure hacia el emisor) antes de rechazarlo. Con diario,
+    el trap solo se da por aceptado cuando su registro está en disco.
+
+    Returns:
+        bool: True si el trap fue encolado.
+    """
+    elemento = elemento_cola(trap_data)
+    try:
+        await asyncio.wait_for(cola.put(elemento), timeout)
+    except asyncio.TimeoutError:
+        _descartar_elemento(elemento)
+        estadisticas_daemon['rechazados'] += 1
+        log(f"Cola de traps llena ({cola.maxsize}), trap rechazado")
+        return False
+    estadisticas_daemon['recibidos'] += 1
+    if diario is not None and not await asyncio.to_thread(diario.esperar_persistido, elemento[2]):
+        log(f"El evento {elemento[2]} del diario no se confirmó en disco a tiempo", "WARNING")
+    return True
+
+def trap_sintetico(ip_origen: str, ifindex: int, mac: str) -> TrapSNMP:
+    """
+    linkUp equivalente al que habría enviado el switch, para una MAC que el sondeo del
+    FDB encontró en un puerto sin que llegara su trap.
+    """
+    varbinds = {OID_TRAP: "IF-MIB::linkUp", f"{OID_IFINDEX}.{ifindex}": str(ifindex)}
+    lineas = [ORIGEN_SONDEO, f"UDP: [{ip_origen}]:0"]
+    lineas.extend(f"{nombre} {valor}" for nombre, valor in varbinds.items())
+    lineas.append(f"# Sin trap: MAC {mac} detectada por el sondeo periódico del FDB")
+    return _crear_trap(ip_origen, None, "IF-MIB::linkUp", varbinds, "\n".join(lineas) + "\n")
+
+def _crear_notificador_sin_trap(cola: asyncio.Queue):
+    """
+    Callback del sondeo del FDB: encola un linkUp sintético si el puerto no está ya
+    atendido, también por una MAC más en un puerto aprovisionado (se recalculan sus MACs).
+    """
+    loop = asyncio.get_running_loop()
+
+    def mac_sin_trap(switch_ip: str, ifindex: int, mac: str) -> None:
+        clave = (switch_ip, str(ifindex))
+        if antirrebote is not None and antirrebote.en_curso(clave):
+            # El trabajo en curso pudo resolver el puerto antes de aprender esta MAC:
+            # se vuelve a comprobar cuando termine
+            loop.call_later(antirrebote.ventana, mac_sin_trap, switch_ip, ifindex, mac)
+            return
+        if antirrebote is not None and antirrebote.atendido(clave, "conectar", mac):
+            return
+        log(f"MAC {mac} en ifIndex {ifindex} de {switch_ip} sin trap: se procesa como linkUp")
+        elemento = elemento_cola(trap_sintetico(switch_ip, ifindex, mac))
+        try:
+            cola.put_nowait(elemento)
+            estadisticas_daemon['sin_trap'] += 1
+        except asyncio.QueueFull:
+            _descartar_elemento(elemento)
+            estadisticas_daemon['rechazados'] += 1
+            log(f"Cola de traps llena ({cola.maxsize}), evento del sondeo de {switch_ip} descartado")
+    return mac_sin_trap
+
+async def _worker_traps(cola: asyncio.Queue):
+    """Consume traps de la cola del daemon y los procesa."""
+    while True:
+        elemento = await cola.get()
+        try:
+            if elemento is None:
+                return
+            recibido, trap_data, id_evento = elemento
+            await procesar_trap_async(trap_data, recibido, id_evento)
+            estadisticas_daemon['procesados'] += 1
+        except Exception as e:
+            estadisticas_daemon['errores'] += 1
+            log(f"ERROR en worker de traps: {str(e)}")
+        finally:
+            cola.task_done()
+
+class _ProtocoloTraps(asyncio.DatagramProtocol):
+    """Recibe traps SNMP directamente por UDP y los encola."""
+
+    def __init__(self, cola: asyncio.Queue):
+        self.cola = cola
+
+    def datagram_received(self, datos, origen):
+        _encolar_datagrama(self.cola, datos, origen)
+
+def _encolar_datagrama(cola: asyncio.Queue, datos: bytes, origen: tuple) -> None:
+    """Decodifica un datagrama SNMP y encola el trap que contiene."""
+    try:
+        mensaje = decodificar_mensaje(datos)
+    except ErrorSNMP as e:
+        log(f"Paquete SNMP inválido desde {origen[0]}: {str(e)}")
+        return
+    if mensaje['tipo_pdu'] not in (PDU_TRAP_V1, PDU_TRAP_V2, PDU_INFORM):
+        return
+    # UDP no admite backpressure: con la cola llena el trap se descarta
+    elemento = elemento_cola(trap_desde_pdu(mensaje, origen))
+    try:
+        cola.put_nowait(elemento)
+        estadisticas_daemon['recibidos'] += 1
+    except asyncio.QueueFull:
+        _descartar_elemento(elemento)
+        estadisticas_daemon['rechazados'] += 1
+        log(f"Cola de traps llena ({cola.maxsize}), trap UDP de {origen[0]} descartado")
+
+def es_switch_propio(ip) -> bool:
+    """En un worker de supervisor.py, True si el switch le corresponde; fuera de él, siempre."""
+    return reparto_switches is None or reparto_switches[0].nodo(ip) == reparto_switches[1]
+
+def _crear_lector_supervisor(cola: asyncio.Queue, conexion):
+    """
+    Lector de la tubería con el supervisor: ("udp", datos, origen), ("texto", trap),
+    ("reparto", anillo, índice) y ("parar",). Sin supervisor (EOF) el worker se detiene.
+    """
+    loop = asyncio.get_running_loop()
+
+    def mensaje_recibido():
+        global reparto_switches
+        try:
+            mensaje = conexion.recv()
+        except (EOFError, OSError):
+            mensaje = ("parar",)
+        if mensaje[0] == "udp":
+            _encolar_datagrama(cola, mensaje[1], mensaje[2])
+        elif mensaje[0] == "texto":
+            elemento = elemento_cola(mensaje[1])
+            try:
+                cola.put_nowait(elemento)
+                estadisticas_daemon['recibidos'] += 1
+            except asyncio.QueueFull:
+                _descartar_elemento(elemento)
+                estadisticas_daemon['rechazados'] += 1
+                log(f"Cola de traps llena ({cola.maxsize}), trap reenviado por el supervisor descartado")
+        elif mensaje[0] == "reparto":
+            reparto_switches = (mensaje[1], mensaje[2])
+            log(f"Worker {mensaje[2]}: reparto actualizado ({len(mensaje[1].nodos)} workers activos)")
+        elif mensaje[0] == "parar":
+            loop.remove_reader(conexion.fileno())
+            detener_daemon.set()
+    return mensaje_recibido
+
+def _crear_manejador_socket_local(cola: asyncio.Queue):
+    """Crea el manejador de conexiones del socket local usado por snmptrap_forward.py."""
+    async def manejar_conexion(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            trap_data = (await reader.read()).decode(errors="replace")
+            if not trap_data.strip():
+                writer.write(b"EMPTY\n")
+            else:
+                # El reenviador queda a la espera mientras la cola está llena (backpressure)
+                writer.write(b"OK\n" if await encolar_trap(cola, trap_data) else b"BUSY\n")
+            await writer.drain()
+        except OSError as e:
+            log(f"Error recibiendo trap por socket local: {str(e)}")
+        finally:
+            writer.close()
+    return manejar_conexion
+
+async def _mantenimiento_periodico(cola: asyncio.Queue):
+    """Tareas periódicas del daemon: limpieza de cache y resumen de actividad."""
+    while True:
+        await asyncio.sleep(INTERVALO_LIMPIEZA_CACHE)
+        limpiar_cache()
+        log(f"Daemon activo: {estadisticas_daemon}, en cola: {cola.qsize()}")
+        # Solo las métricas globales: las series por switch se consultan en el endpoint o con snmp_monitor.py
+        globales = {nombre: resumen for nombre, resumen in obtener_resumen_metricas().items() if "{" not in nombre}
+        log(f"Métricas: {globales}")
+        if antirrebote is not None:
+            log(f"Antirrebote: {antirrebote.obtener_estadisticas()}")
+        log(f"Planificador: {planificador.obtener_estadisticas()}")
+
+async def ejecutar_daemon(puerto_udp: Optional[int] = None, ruta_socket: Optional[str] = SOCKET_DAEMON,
+                          workers: int = MAX_CONCURRENT_TRAPS,
+                          ventana_antirrebote: float = VENTANA_ANTIRREBOTE,
+                          puerto_metricas: Optional[int] = None,
+                          intervalo_sondeo_fdb: Optional[float] = None,
+                          conexion_supervisor=None,
+                          trabajos_simultaneos: int = MAX_TRABAJOS_SIMULTANEOS,
+                          ruta_diario: Optional[str] = RUTA_DIARIO) -> None:
+    """
+    Ejecuta el handler como proceso de larga duración sobre asyncio. Cache SNMP,
+    snapshots de la tabla de puente y tabla de puertos activos se conservan entre traps.
+
+    Args:
+        puerto_udp (int): Puerto UDP en el que escuchar traps directamente (None para no escuchar).
+        ruta_socket (str): Socket local para el reenviador de snmptrapd (None para no escuchar).
+        workers (int): Número de corrutinas que procesan la cola de traps.
+        ventana_antirrebote (float): Segundos de antirrebote por puerto (0 para desactivarlo).
+        puerto_metricas (int): Puerto HTTP local de las métricas (None para no servirlas).
+        intervalo_sondeo_fdb (float): Segundos entre sondeos del FDB de todos los switches
+            (None para resolver las MACs solo a partir de los traps).
+        conexion_supervisor: Extremo de la tubería con supervisor.py en un worker: los traps
+            llegan por ella, el sondeo se limita a los switches del worker y las señales
+            las atiende el supervisor.
+        trabajos_simultaneos (int): Trabajos de puerto (resolución de MAC y aplicación)
+            en ejecución a la vez; el resto espera turno por prioridad y switch.
+        ruta_diario (str): Diario de eventos; los que quedaron sin completar en la ejecución
+            anterior se vuelven a encolar al arrancar (None para no llevar diario).
+    """
+    global detener_daemon, antirrebote, planificador, diario
+    loop = asyncio.get_running_loop()
+    detener_daemon = asyncio.Event()
+    antirrebote = AntirrebotePuertos(ventana_antirrebote) if ventana_antirrebote > 0 else None
+    planificador = PlanificadorTrabajos(trabajos_simultaneos)
+    cola = asyncio.Queue(maxsize=MAX_TRAPS_EN_COLA)
+    cierres = []
+    recuperados = []
+    eventos_puerto.clear()
+    if ruta_diario:
+        diario = DiarioEventos(ruta_diario)
+        recuperados = diario.recuperar()
+        diario.iniciar()
+        registrar_fuente_estadisticas('diario', diario.obtener_estadisticas)
+
+    # Estado compartido con snmp_monitor.py: cache recuperado y publicación periódica
+    cargar_cache()
+    registrar_fuente_estadisticas('daemon', lambda: dict(estadisticas_daemon, en_cola=cola.qsize()))
+    if antirrebote is not None:
+        registrar_fuente_estadisticas('antirrebote', antirrebote.obtener_estadisticas)
+    registrar_fuente_estadisticas('planificador', planificador.obtener_estadisticas)
+    registrar_fuente_estadisticas('reconciliador', obtener_estadisticas_reconciliador)
+    registrar_fuente_estadisticas('vlans', obtener_estadisticas_vlans)
+    publicador = PublicadorEstado(f"daemon:{os.getpid()}")
+    publicador.iniciar()
+    metricas.indicador("snmp_traps_en_cola", "Traps esperando en la cola del daemon", cola.qsize)
+    if puerto_metricas:
+        servidor_metricas = ServidorMetricas(puerto_metricas)
+        servidor_metricas.iniciar()
+        cierres.append(servidor_metricas.parar)
+        log(f"Métricas disponibles en http://127.0.0.1:{puerto_metricas}/metrics")
+
+    if ruta_socket:
+        if os.path.exists(ruta_socket):
+            os.unlink(ruta_socket)
+        servidor = await asyncio.start_unix_server(_crear_manejador_socket_local(cola), path=ruta_socket)
+        os.chmod(ruta_socket, 0o660)
+        cierres.append(servidor.close)
+        log(f"Daemon escuchando traps reenviados en {ruta_socket}")
+
+    if puerto_udp:
+        sock_udp = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        sock_udp.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        sock_udp.bind(("::", puerto_udp))
+        transporte, _ = await loop.create_datagram_endpoint(lambda: _ProtocoloTraps(cola), sock=sock_udp)
+        cierres.append(transporte.close)
+        log(f"Daemon escuchando traps SNMP en UDP/{puerto_udp}")
+
+    if conexion_supervisor is not None:
+        loop.add_reader(conexion_supervisor.fileno(), _crear_lector_supervisor(cola, conexion_supervisor))
+        cierres.append(lambda: loop.remove_reader(conexion_supervisor.fileno()))
+
+    sondeo = None
+    if intervalo_sondeo_fdb:
+        sondeo = SondeoPeriodicoFDB(lambda: [ip for ip in cargar_configuracion().dispositivos if es_switch_propio(ip)],
+                                    _crear_notificador_sin_trap(cola),
+                                    lambda: cargar_configuracion().interfaces,
+                                    intervalo_sondeo_fdb)
+        sondeo.iniciar()
+        registrar_fuente_estadisticas('sondeo_fdb', sondeo.obtener_estadisticas)
+
+    # Registro de VLANs existentes: lo consultan el camino por puerto y el agrupador de lotes
+    siembra_vlans = asyncio.create_task(
+        sembrar_registro([ip for ip in cargar_configuracion().dispositivos if es_switch_propio(ip)]),
+        name="RegistroVLANs")
+
+    tareas_workers = [
+        asyncio.create_task(_worker_traps(cola), name=f"TrapWorker-{i}")
+        for i in range(workers)
+    ]
+    mantenimiento = asyncio.create_task(_mantenimiento_periodico(cola), name="Mantenimiento")
+
+    if recuperados:
+        # Trabajo aceptado y no completado en la ejecución anterior. Los eventos que llegaron
+        # a aplicarse se reconcilian: el aprovisionamiento no toca un puerto ya configurado
+        a_medias = sum(1 for _, _, etapa in recuperados if etapa == ETAPA_APLICANDO)
+        log(f"Diario de eventos: se reanudan {len(recuperados)} eventos pendientes "
+            f"({a_medias} a medio aplicar)")
+        for id_evento, trap_data, _ in recuperados:
+            await cola.put((time.monotonic(), trap_data, id_evento))
+
+    if conexion_supervisor is None:
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(senal, detener_daemon.set)
+
+    try:
+        await detener_daemon.wait()
+        log("Señal recibida, deteniendo daemon...")
+    finally:
+        for cerrar in cierres:
+            cerrar()
+        if ruta_socket and os.path.exists(ruta_socket):
+            os.unlink(ruta_socket)
+        mantenimiento.cancel()
+        if siembra_vlans is not None:
+            siembra_vlans.cancel()
+        if sondeo is not None:
+            await sondeo.parar()
+        # Procesar lo pendiente y detener los workers
+        for _ in tareas_workers:
+            await cola.put(None)
+        await asyncio.gather(*tareas_workers, return_exceptions=True)
+        if diario is not None:
+            # Lo que sigue en el antirrebote o en un lote queda pendiente para el próximo arranque
+            await asyncio.to_thread(diario.cerrar)
+            log(f"Diario de eventos cerrado: {diario.obtener_estadisticas()}")
+            diario = None
+        await asyncio.to_thread(publicador.parar)
+        log(f"Daemon detenido. Estadísticas: {estadisticas_daemon}")
+
+def procesar_trap_stdin():
+    """
+    Procesa un único trap leído de stdin (modo traphandle clásico de snmptrapd).
     """
     try:
         trap_data = sys.stdin.read()
@@ -354,27 +1145,140 @@ def main():
         
         # Limpiar cache periódicamente
         limpiar_cache()
+        cargar_cache()
         
-        # Procesar el trap de forma asíncrona
-        future = trap_executor.submit(procesar_trap_async, trap_data)
-        
-        # Opcional: esperar a que termine o continuar
-        # Para debugging, esperamos el resultado
+        asyncio.run(procesar_trap_async(trap_data))
+        log("Procesamiento de trap completado exitosamente")
         try:
-            future.result(timeout=30)  # Timeout de 30 segundos
-            log("Procesamiento de trap completado exitosamente")
-        except concurrent.futures.TimeoutError:
-            log("Timeout procesando trap - continuando en background")
+            publicar_estado(f"stdin:{os.getpid()}")
         except Exception as e:
-            log(f"Error en procesamiento de trap: {str(e)}")
+            log(f"Error publicando el estado compartido: {str(e)}")
             
     except KeyboardInterrupt:
-        log("Interrupción recibida, cerrando executor...")
-        trap_executor.shutdown(wait=True)
+        log("Interrupción recibida, terminando...")
         sys.exit(0)
     except Exception as e:
         log(f"ERROR general en main: {str(e)}")
         sys.exit(1)
 
+def extraer_traps_de_log(ruta: str = LOG_FILE) -> List[str]:
+    """
+    Extrae los traps registrados en el log del handler (bloques que empiezan por la
+    línea de host seguida de la línea de transporte UDP).
+    """
+    with open(ruta, errors="replace") as f:
+        lineas = f.read().splitlines()
+    traps = []
+    actual = None
+    for i, linea in enumerate(lineas):
+        if actual is not None:
+            if not linea.strip() or linea.startswith("---"):
+                traps.append("\n".join(actual) + "\n")
+                actual = None
+            else:
+                actual.append(linea)
+        elif i > 0 and PATRON_TRANSPORTE.match(linea):
+            actual = [lineas[i - 1], linea]
+    if actual:
+        traps.append("\n".join(actual) + "\n")
+    return traps
+
+def _escaneo_referencia(trap_data: str, acciones: Dict, ifindex_to_interface: Dict):
+    """Extracción anterior al parser (un recorrido del texto por campo); solo para el benchmark."""
+    origen = re.search(r'UDP/IPv6:\s+\[([0-9a-fA-F:]+)\]', trap_data)
+    evento = next((valor for clave, valor in acciones.items() if clave in trap_data), None)
+    puerto_index = None
+    for linea in trap_data.splitlines():
+        if "ifDescr" in linea and "FastEthernet" in linea:
+            linea.strip().split(" = ")
+        elif "ifIndex" in linea and puerto_index is None:
+            puerto_index = next((parte for parte in linea.strip().split() if parte.isdigit()), None)
+    re.search(r"(([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2})", trap_data)
+    return origen, evento, ifindex_to_interface.get(int(puerto_index)) if puerto_index else None
+
+def benchmark_parser(ruta: str = LOG_FILE, repeticiones: int = 20000) -> Dict:
+    """
+    Micro-benchmark del parser de traps sobre las muestras registradas en el log.
+
+    Returns:
+        dict: Microsegundos por trap del parser y de la extracción anterior.
+    """
+    import timeit
+
+    muestras = extraer_traps_de_log(ruta)
+    if not muestras:
+        raise ValueError(f"No hay traps registrados en {ruta}")
+    config = cargar_configuracion()
+
+    def con_parser():
+        for muestra in muestras:
+            trap = parsear_trap(muestra)
+            determinar_evento(trap, config.acciones)
+            obtener_puerto(trap, config.interfaces)
+
+    def con_referencia():
+        for muestra in muestras:
+            _escaneo_referencia(muestra, config.acciones, config.interfaces)
+
+    total = repeticiones * len(muestras)
+    return {
+        'muestras': len(muestras),
+        'parser_us_por_trap': min(timeit.repeat(con_parser, number=repeticiones, repeat=3)) / total * 1e6,
+        'referencia_us_por_trap': min(timeit.repeat(con_referencia, number=repeticiones, repeat=3)) / total * 1e6,
+    }
+
+def main():
+    """
+    Función principal: procesa un trap desde stdin o, con --daemon, ejecuta el
+    handler como proceso de larga duración.
+    """
+    parser = argparse.ArgumentParser(description="Manejador de traps SNMP")
+    parser.add_argument('--daemon', action='store_true', help='Ejecutar como daemon de larga duración')
+    parser.add_argument('--udp', type=int, nargs='?', const=PUERTO_TRAPS, default=None,
+                        help=f'Escuchar traps directamente en UDP (puerto por defecto: {PUERTO_TRAPS})')
+    parser.add_argument('--socket', default=SOCKET_DAEMON,
+                        help='Socket local para traps reenviados por snmptrap_forward.py')
+    parser.add_argument('--sin-socket', action='store_true', help='No abrir el socket local')
+    parser.add_argument('--diario', default=RUTA_DIARIO,
+                        help='Diario de eventos con recuperación al arrancar (por defecto: logs/eventos.diario)')
+    parser.add_argument('--sin-diario', action='store_true', help='No llevar diario de eventos')
+    parser.add_argument('--workers', type=int, default=MAX_CONCURRENT_TRAPS, help='Corrutinas de procesamiento')
+    parser.add_argument('--trabajos', type=int, default=MAX_TRABAJOS_SIMULTANEOS,
+                        help=f'Trabajos de puerto simultáneos; el resto espera turno por prioridad '
+                             f'(por defecto: {MAX_TRABAJOS_SIMULTANEOS})')
+    parser.add_argument('--antirrebote', type=float, default=VENTANA_ANTIRREBOTE,
+                        help=f'Ventana de antirrebote por puerto en segundos, 0 para desactivar (por defecto: {VENTANA_ANTIRREBOTE})')
+    parser.add_argument('--metricas', type=int, nargs='?', const=metricas.PUERTO_METRICAS, default=None,
+                        help=f'Servir las métricas por HTTP en 127.0.0.1 (puerto por defecto: {metricas.PUERTO_METRICAS})')
+    parser.add_argument('--sondeo-fdb', type=float, nargs='?', const=INTERVALO_SONDEO_FDB, default=None,
+                        metavar='SEGUNDOS',
+                        help=f'Sondear periódicamente el FDB de todos los switches (por defecto cada {INTERVALO_SONDEO_FDB}s)')
+    parser.add_argument('--procesos', type=int, nargs='?', const=os.cpu_count() or 1, default=None,
+                        metavar='N',
+                        help='Con --daemon: supervisor que reparte los switches entre N procesos worker '
+                             '(por defecto, uno por núcleo)')
+    parser.add_argument('--benchmark-parser', nargs='?', const=LOG_FILE, metavar='LOG',
+                        help='Medir el parser de traps con las muestras de un log (por defecto: snmp_traps.log)')
+    args = parser.parse_args()
+
+    if args.benchmark_parser:
+        for clave, valor in benchmark_parser(args.benchmark_parser).items():
+            print(f"{clave}: {valor:.2f}" if isinstance(valor, float) else f"{clave}: {valor}")
+    elif args.daemon and args.procesos:
+        from access_control.supervisor import ejecutar_supervisor
+        asyncio.run(ejecutar_supervisor(args.procesos, args.udp, None if args.sin_socket else args.socket,
+                                        args.metricas, workers=args.workers,
+                                        ventana_antirrebote=args.antirrebote,
+                                        intervalo_sondeo_fdb=args.sondeo_fdb,
+                                        trabajos_simultaneos=args.trabajos,
+                                        ruta_diario=None if args.sin_diario else args.diario))
+    elif args.daemon:
+        asyncio.run(ejecutar_daemon(args.udp, None if args.sin_socket else args.socket, args.workers,
+                                    args.antirrebote, args.metricas, args.sondeo_fdb,
+                                    trabajos_simultaneos=args.trabajos,
+                                    ruta_diario=None if args.sin_diario else args.diario))
+    else:
+        procesar_trap_stdin()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
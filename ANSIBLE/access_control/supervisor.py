@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+
+"""
+Supervisor multiproceso del manejador de traps.
+Reparte los switches entre N procesos worker por hashing consistente de la IP de
+origen: todos los eventos de un switch se procesan en el mismo worker, con su
+antirrebote, sus lotes y sus snapshots, mientras switches distintos avanzan en
+paralelo en todos los núcleos. El supervisor solo recibe los traps (UDP y socket
+local), extrae la IP de origen y los reenvía por una tubería. Si un worker muere, sus
+switches pasan a los demás (el resto no cambia de worker), que reciben también los
+eventos que dejó sin completar en su diario, y se arranca otro que recupera su parte
+del anillo. Cada worker escribe sus propios logs y su propio diario.
+"""
+
+import sys
+import os
+import time
+import queue
+import signal
+import socket
+import asyncio
+import bisect
+import hashlib
+import threading
+import ipaddress
+import multiprocessing
+from typing import Dict, Hashable, List, Optional
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control import snmptrap_handler as manejador
+from access_control import metricas
+from access_control import snmp_utils
+from access_control.snmptrap_handler import log, PATRON_TRANSPORTE, MAX_TRAPS_EN_COLA, TIMEOUT_ENCOLADO
+from access_control.diario import DiarioEventos, ETAPA_COMPLETADO
+from access_control.estado_compartido import PublicadorEstado, registrar_fuente_estadisticas
+
+REPLICAS_ANILLO = 64  # puntos de cada worker en el anillo: reparto más uniforme entre pocos workers
+ESPERA_REINICIO_WORKER = 1.0  # segundos antes de arrancar el sustituto de un worker caído
+ESPERA_REINICIO_MAX = 30.0  # tope de la espera si el worker vuelve a caer enseguida
+VIDA_MINIMA_WORKER = 10.0  # un worker que cae antes de este tiempo duplica la espera de reinicio
+TIMEOUT_PARADA_WORKER = 30.0  # segundos para que un worker procese lo pendiente al detenerse
+
+metrica_reenviados = metricas.contador_etiquetado(
+    "supervisor_traps_reenviados_total", "Traps reenviados por el supervisor a cada worker", ("worker",))
+metrica_descartados = metricas.contador(
+    "supervisor_traps_descartados_total", "Traps descartados por el supervisor (worker saturado)")
+metrica_reinicios = metricas.contador(
+    "supervisor_reinicios_worker_total", "Workers arrancados de nuevo tras caer")
+
+def clave_switch(ip) -> str:
+    """Forma canónica de la IP de un switch (la misma para cualquier notación)."""
+    try:
+        direccion = ipaddress.ip_address(str(ip))
+    except ValueError:
+        return str(ip)
+    if direccion.version == 6 and direccion.ipv4_mapped is not None:
+        direccion = direccion.ipv4_mapped
+    return direccion.compressed
+
+class AnilloConsistente:
+    """
+    Anillo de hashing consistente con `replicas` puntos por nodo. Al retirar un nodo
+    solo cambian de nodo sus claves; al añadirlo recupera las mismas.
+    """
+
+    def __init__(self, nodos=(), replicas: int = REPLICAS_ANILLO):
+        self.replicas = replicas
+        self.puntos = []  # hashes ordenados
+        self.nodo_de_punto = {}  # hash -> nodo
+        self.nodos = set()
+        for nodo in nodos:
+            self.agregar(nodo)
+
+    @staticmethod
+    def _hash(texto: str) -> int:
+        return int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=8).digest(), "big")
+
+    def agregar(self, nodo: Hashable) -> None:
+        if nodo in self.nodos:
+            return
+        self.nodos.add(nodo)
+        for replica in range(self.replicas):
+            punto = self._hash(f"{nodo}#{replica}")
+            self.nodo_de_punto[punto] = nodo
+            bisect.insort(self.puntos, punto)
+
+    def retirar(self, nodo: Hashable) -> None:
+        if nodo not in self.nodos:
+            return
+        self.nodos.discard(nodo)
+        self.puntos = [punto for punto in self.puntos if self.nodo_de_punto[punto] != nodo]
+        self.nodo_de_punto = {punto: self.nodo_de_punto[punto] for punto in self.puntos}
+
+    def nodo(self, ip) -> Optional[Hashable]:
+        """Nodo al que corresponde el switch (None con el anillo vacío)."""
+        if not self.puntos:
+            return None
+        posicion = bisect.bisect(self.puntos, self._hash(clave_switch(ip))) % len(self.puntos)
+        return self.nodo_de_punto[self.puntos[posicion]]
+
+def ruta_worker(ruta: str, indice: int) -> str:
+    """Archivo propio del worker `indice` (logs, diario): base-workerN.extensión."""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}-worker{indice}{extension}"
+
+def _proceso_worker(indice: int, conexion, opciones: Dict) -> None:
+    """Proceso worker: el daemon del manejador, con los traps llegando por la tubería."""
+    # Ctrl+C llega a todo el grupo de procesos: solo el supervisor decide cuándo parar
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Logs propios: cada proceso rota sus archivos según lo que él ha escrito, y con
+    # archivos compartidos unos rotarían los de otros bajo sus descriptores abiertos
+    manejador.escritor_log.ruta = ruta_worker(manejador.LOG_FILE, indice)
+    snmp_utils.escritor_log.ruta = ruta_worker(snmp_utils.LOG_FILE, indice)
+    log(f"Worker {indice} iniciado (PID {os.getpid()})")
+    asyncio.run(manejador.ejecutar_daemon(None, None, conexion_supervisor=conexion, **opciones))
+
+class WorkerTraps:
+    """Proceso worker y su canal de envío (un thread que escribe en la tubería)."""
+
+    def __init__(self, indice: int, contexto, opciones: Dict):
+        self.indice = indice
+        lector, self.conexion = contexto.Pipe(duplex=False)
+        self.proceso = contexto.Process(target=_proceso_worker, name=f"TrapWorker-{indice}", daemon=True,
+                                        args=(indice, lector, opciones))
+        self.ruta_diario = opciones.get('ruta_diario')
+        self.pendientes = queue.Queue(maxsize=MAX_TRAPS_EN_COLA)
+        self.hilo = threading.Thread(target=self._enviar, name=f"EnvioWorker-{indice}", daemon=True)
+        self.iniciado = 0.0
+        self.enviados = 0
+        self.switches = set()
+
+    def iniciar(self) -> None:
+        self.proceso.start()
+        self.iniciado = time.monotonic()
+        self.hilo.start()
+
+    def _enviar(self) -> None:
+        while True:
+            mensaje = self.pendientes.get()
+            if mensaje is None:
+                return
+            try:
+                self.conexion.send(mensaje)
+            except (OSError, ValueError):
+                return  # worker caído: lo que quede en la cola lo redistribuye el supervisor
+            if mensaje[0] in ("udp", "texto"):
+                self.enviados += 1
+
+    def vaciar(self) -> List:
+        """Mensajes que no llegaron a enviarse."""
+        mensajes = []
+        while True:
+            try:
+                mensaje = self.pendientes.get_nowait()
+            except queue.Empty:
+                return mensajes
+            if mensaje is not None:
+                mensajes.append(mensaje)
+
+class SupervisorTraps:
+    """
+    Recibe los traps y los reparte entre los workers por hashing consistente de la IP
+    del switch; vigila los workers y rehace el reparto cuando uno cae o vuelve.
+    """
+
+    def __init__(self, procesos: int, opciones: Dict):
+        self.loop = asyncio.get_running_loop()
+        self.procesos = procesos
+        self.opciones = opciones
+        # spawn: los workers no heredan los threads del supervisor (escritor de log, publicador)
+        self.contexto = multiprocessing.get_context("spawn")
+        self.anillo = AnilloConsistente()
+        self.workers = {}  # índice -> WorkerTraps vivo
+        self.esperas_reinicio = {}  # índice -> segundos de espera del próximo reinicio
+        self.reinicios = 0
+        self.deteniendo = False
+
+    def iniciar(self) -> None:
+        for indice in range(self.procesos):
+            self._arrancar(indice)
+        self._difundir_reparto()
+
+    def _arrancar(self, indice: int) -> None:
+        opciones = dict(self.opciones)
+        if opciones.get('puerto_metricas'):
+            opciones['puerto_metricas'] += 1 + indice  # el puerto base es el del supervisor
+        if opciones.get('ruta_diario'):
+            # Un diario por worker; al caer, sus eventos pendientes pasan a los nuevos dueños
+            opciones['ruta_diario'] = ruta_worker(opciones['ruta_diario'], indice)
+        worker = WorkerTraps(indice, self.contexto, opciones)
+        worker.iniciar()
+        self.workers[indice] = worker
+        self.anillo.agregar(indice)
+        self.loop.add_reader(worker.proceso.sentinel, self._worker_terminado, indice)
+        log(f"Supervisor: worker {indice} arrancado (PID {worker.proceso.pid})")
+
+    def _worker_terminado(self, indice: int) -> None:
+        worker = self.workers.pop(indice, None)
+        if worker is None:
+            return
+        self.loop.remove_reader(worker.proceso.sentinel)
+        worker.proceso.join(1)  # el sentinel ya indicó el final: solo recoge el código de salida
+        if self.deteniendo:
+            return
+        vida = time.monotonic() - worker.iniciado
+        log(f"Supervisor: worker {indice} terminó (código {worker.proceso.exitcode}) tras {vida:.0f}s; "
+            f"sus switches pasan a los demás workers", "ERROR")
+        self.anillo.retirar(indice)
+        self._difundir_reparto()
+        # Primero lo que el worker ya había recibido y después lo que no llegó a enviarse:
+        # los nuevos dueños lo procesan en el orden de llegada y antes que cualquier trap posterior
+        if worker.ruta_diario:
+            self._traspasar_diario(worker.ruta_diario)
+        for mensaje in worker.vaciar():
+            if mensaje[0] in ("udp", "texto"):
+                self.reenviar(mensaje)
+        worker.pendientes.put_nowait(None)  # termina su thread de envío si sigue esperando
+
+        espera = self.esperas_reinicio.get(indice, ESPERA_REINICIO_WORKER)
+        self.esperas_reinicio[indice] = (min(espera * 2, ESPERA_REINICIO_MAX) if vida < VIDA_MINIMA_WORKER
+                                         else ESPERA_REINICIO_WORKER)
+        self.loop.call_later(espera, self._reiniciar, indice)
+
+    def _traspasar_diario(self, ruta: str) -> None:
+        """
+        Reenvía a los nuevos dueños de los switches los eventos sin completar del diario de
+        un worker caído y los completa en ese diario. Si el sustituto los reanudara al
+        arrancar, un linkUp antiguo podría aplicarse después de un linkDown posterior que
+        ya procesó el dueño provisional.
+        """
+        diario = DiarioEventos(ruta)
+        pendientes = diario.recuperar()
+        reasignados = 0
+        for id_evento, trap, _ in pendientes:
+            entregado = self.reenviar(("texto", trap))
+            reasignados += entregado
+            diario.registrar_etapa(id_evento, ETAPA_COMPLETADO, resultado="reasignado" if entregado else "rechazado")
+        diario.iniciar()
+        diario.cerrar()
+        if pendientes:
+            log(f"Supervisor: {reasignados}/{len(pendientes)} eventos pendientes de {ruta} reasignados", "INFO")
+
+    def _reiniciar(self, indice: int) -> None:
+        if self.deteniendo or indice in self.workers:
+            return
+        self.reinicios += 1
+        metrica_reinicios.incrementar()
+        self._arrancar(indice)
+        self._difundir_reparto()
+
+    def _difundir_reparto(self) -> None:
+        """Envía el anillo vigente a todos los workers (cada uno filtra su sondeo del FDB)."""
+        for indice, worker in self.workers.items():
+            try:
+                worker.pendientes.put_nowait(("reparto", self.anillo, indice))
+            except queue.Full:
+                self.loop.run_in_executor(None, worker.pendientes.put, ("reparto", self.anillo, indice))
+
+    def worker_de(self, ip) -> Optional[WorkerTraps]:
+        indice = self.anillo.nodo(ip)
+        return self.workers.get(indice) if indice is not None else None
+
+    def reenviar(self, mensaje, ip: Optional[str] = None) -> bool:
+        """Encola el mensaje para el worker del switch; False si está saturado o no hay workers."""
+        if ip is None:
+            ip = mensaje[2][0] if mensaje[0] == "udp" else _ip_de_texto(mensaje[1])
+        worker = self.worker_de(ip)
+        if worker is None:
+            metrica_descartados.incrementar()
+            return False
+        try:
+            worker.pendientes.put_nowait(mensaje)
+        except queue.Full:
+            metrica_descartados.incrementar()
+            return False
+        worker.switches.add(clave_switch(ip))
+        metrica_reenviados.incrementar(str(worker.indice))
+        return True
+
+    async def reenviar_con_espera(self, texto: str) -> bool:
+        """Reenvía un trap del socket local esperando si el worker está saturado (backpressure)."""
+        if self.reenviar(("texto", texto)):
+            return True
+        worker = self.worker_de(_ip_de_texto(texto))
+        if worker is None:
+            return False
+        try:
+            await asyncio.to_thread(worker.pendientes.put, ("texto", texto), True, TIMEOUT_ENCOLADO)
+        except queue.Full:
+            return False
+        worker.switches.add(clave_switch(_ip_de_texto(texto)))
+        metrica_reenviados.incrementar(str(worker.indice))
+        return True
+
+    def obtener_estadisticas(self) -> Dict:
+        return {
+            'workers': self.procesos,
+            'activos': len(self.workers),
+            'reinicios': self.reinicios,
+            'descartados': metrica_descartados.valor,
+            'por_worker': {
+                str(indice): {'pid': worker.proceso.pid, 'enviados': worker.enviados,
+                              'en_cola': worker.pendientes.qsize(), 'switches': len(worker.switches)}
+                for indice, worker in sorted(self.workers.items())
+            },
+        }
+
+    async def parar(self) -> None:
+        """Pide a los workers que terminen lo pendiente y espera a que salgan."""
+        self.deteniendo = True
+
+        async def parar_worker(worker: WorkerTraps) -> None:
+            try:
+                await asyncio.to_thread(worker.pendientes.put, ("parar",), True, TIMEOUT_PARADA_WORKER)
+                worker.pendientes.put(None)
+            except queue.Full:
+                pass  # el worker no consume: se fuerza su parada al vencer la espera
+            await asyncio.to_thread(worker.proceso.join, TIMEOUT_PARADA_WORKER)
+            if worker.proceso.is_alive():
+                log(f"Supervisor: worker {worker.indice} no terminó a tiempo, se fuerza su parada", "ERROR")
+                worker.proceso.terminate()
+            self.loop.remove_reader(worker.proceso.sentinel)
+
+        await asyncio.gather(*(parar_worker(worker) for worker in list(self.workers.values())))
+        self.workers.clear()
+
+def _ip_de_texto(texto: str) -> str:
+    """IP de origen de un trap en el formato de texto de snmptrapd."""
+    coincidencia = PATRON_TRANSPORTE.search(texto)
+    return coincidencia.group(1) if coincidencia else "desconocido"
+
+class _ProtocoloSupervisor(asyncio.DatagramProtocol):
+    """Recibe traps por UDP y los reenvía sin decodificarlos; el worker los interpreta."""
+
+    def __init__(self, supervisor: SupervisorTraps):
+        self.supervisor = supervisor
+
+    def datagram_received(self, datos, origen):
+        if not self.supervisor.reenviar(("udp", datos, origen[:2]), origen[0]):
+            log(f"Supervisor: trap UDP de {origen[0]} descartado (worker saturado o sin workers)")
+
+def _crear_manejador_socket_supervisor(supervisor: SupervisorTraps):
+    """Manejador del socket local de snmptrap_forward.py en modo supervisor."""
+    async def manejar_conexion(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            trap_data = (await reader.read()).decode(errors="replace")
+            if not trap_data.strip():
+                writer.write(b"EMPTY\n")
+            else:
+                writer.write(b"OK\n" if await supervisor.reenviar_con_espera(trap_data) else b"BUSY\n")
+            await writer.drain()
+        except OSError as e:
+            log(f"Error recibiendo trap por socket local: {str(e)}")
+        finally:
+            writer.close()
+    return manejar_conexion
+
+async def ejecutar_supervisor(procesos: int, puerto_udp: Optional[int] = None,
+                              ruta_socket: Optional[str] = manejador.SOCKET_DAEMON,
+                              puerto_metricas: Optional[int] = None, **opciones) -> None:
+    """
+    Ejecuta el supervisor con `procesos` workers.
+
+    Args:
+        procesos (int): Número de procesos worker (normalmente, uno por núcleo).
+        puerto_udp (int): Puerto UDP en el que escuchar traps (None para no escuchar).
+        ruta_socket (str): Socket local para el reenviador de snmptrapd (None para no escuchar).
+        puerto_metricas (int): Métricas del supervisor en este puerto; el worker i usa puerto + 1 + i.
+        opciones: Resto de argumentos de snmptrap_handler.ejecutar_daemon para cada worker
+            (workers, ventana_antirrebote, intervalo_sondeo_fdb, trabajos_simultaneos, ruta_diario).
+    """
+    loop = asyncio.get_running_loop()
+    detener = asyncio.Event()
+    supervisor = SupervisorTraps(procesos, dict(opciones, puerto_metricas=puerto_metricas))
+    supervisor.iniciar()
+    cierres = []
+
+    registrar_fuente_estadisticas('supervisor', supervisor.obtener_estadisticas)
+    publicador = PublicadorEstado(f"supervisor:{os.getpid()}")
+    publicador.iniciar()
+    if puerto_metricas:
+        servidor_metricas = metricas.ServidorMetricas(puerto_metricas)
+        servidor_metricas.iniciar()
+        cierres.append(servidor_metricas.parar)
+
+    if ruta_socket:
+        if os.path.exists(ruta_socket):
+            os.unlink(ruta_socket)
+        servidor = await asyncio.start_unix_server(_crear_manejador_socket_supervisor(supervisor), path=ruta_socket)
+        os.chmod(ruta_socket, 0o660)
+        cierres.append(servidor.close)
+        log(f"Supervisor escuchando traps reenviados en {ruta_socket}")
+
+    if puerto_udp:
+        sock_udp = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        sock_udp.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        sock_udp.bind(("::", puerto_udp))
+        transporte, _ = await loop.create_datagram_endpoint(lambda: _ProtocoloSupervisor(supervisor), sock=sock_udp)
+        cierres.append(transporte.close)
+        log(f"Supervisor escuchando traps SNMP en UDP/{puerto_udp} con {procesos} workers")
+
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(senal, detener.set)
+
+    try:
+        await detener.wait()
+        log("Señal recibida, deteniendo supervisor y workers...")
+    finally:
+        for cerrar in cierres:
+            cerrar()
+        if ruta_socket and os.path.exists(ruta_socket):
+            os.unlink(ruta_socket)
+        estadisticas = supervisor.obtener_estadisticas()
+        await supervisor.parar()
+        await asyncio.to_thread(publicador.parar)
+        log(f"Supervisor detenido. Estadísticas: {estadisticas}")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Modelo incremental de la tabla de puente (FDB) de un switch.
+Cada walk se aplica como diferencia con el anterior: MACs nuevas, movidas de puerto y
+envejecidas. Los índices ifIndex -> MACs y MAC -> ifIndex se actualizan solo en lo que
+cambia, y los cambios se devuelven para alimentar a los suscriptores.
+"""
+
+import time
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+CAMBIO_NUEVA = "nueva"
+CAMBIO_MOVIDA = "movida"
+CAMBIO_ENVEJECIDA = "envejecida"
+
+# Un cambio del FDB; ifindex es None en una MAC envejecida e ifindex_anterior solo se usa
+# en movidas y envejecidas
+CambioFDB = namedtuple("CambioFDB", ["switch", "tipo", "mac", "ifindex", "ifindex_anterior", "instante"])
+
+class TablaFDB:
+    """
+    Estado del FDB de un switch. Los índices publicados no se modifican nunca: cada
+    aplicación con cambios publica copias nuevas, de modo que quien lee un snapshot
+    anterior (desde otro thread) no ve actualizaciones a medias. Las listas de MACs por
+    ifIndex van en orden de aparición: delante las de walks anteriores y, dentro de un
+    mismo walk (también el primero), ordenadas por MAC. Un walk no dice en qué orden
+    aprendió el switch las MACs, así que no es el orden de aprendizaje real.
+    """
+
+    def __init__(self, switch: str):
+        self.switch = switch
+        self.mac_to_port = {}       # MAC -> portNum del último walk
+        self.port_to_ifindex = {}   # portNum -> ifIndex del último walk
+        self.mac_to_ifindex = {}    # MAC -> ifIndex (solo MACs en puertos con ifIndex)
+        self.ifindex_to_macs = {}   # ifIndex -> [MACs] en orden de aparición (ver docstring)
+        self.mac_to_vlan = {}       # MAC -> VLAN (solo con el FDB de Q-BRIDGE-MIB)
+        self.inicializada = False
+        self.aplicaciones = 0
+        self.sin_cambios = 0
+        self.lock = threading.Lock()
+
+    def aplicar(self, mac_to_port: Dict[str, int], port_to_ifindex: Dict[int, int],
+                instante: Optional[float] = None,
+                mac_to_vlan: Optional[Dict[str, int]] = None) -> Tuple[Dict, List[CambioFDB]]:
+        """
+        Aplica el resultado de un walk.
+
+        Args:
+            mac_to_port (dict): MAC -> portNum (dot1dTpFdbPort).
+            port_to_ifindex (dict): portNum -> ifIndex (dot1dBasePortIfIndex).
+            instante (float): Momento del walk (time.time() por defecto).
+            mac_to_vlan (dict): MAC -> VLAN si el walk fue de dot1qTpFdbPort. Un cambio
+                solo de VLAN actualiza el índice sin producir cambios de puerto.
+
+        Returns:
+            tuple: Snapshot con los índices vigentes y lista de cambios, ordenada por
+            MAC (no por orden de aprendizaje). El primer walk establece la referencia y
+            no produce cambios.
+        """
+        instante = time.time() if instante is None else instante
+        mac_to_vlan = mac_to_vlan or {}
+        with self.lock:
+            self.aplicaciones += 1
+            if mac_to_vlan != self.mac_to_vlan:
+                self.mac_to_vlan = mac_to_vlan
+            elif self.inicializada and mac_to_port == self.mac_to_port and port_to_ifindex == self.port_to_ifindex:
+                # Caso habitual en el sondeo: la tabla no ha cambiado y se reutilizan los índices
+                self.sin_cambios += 1
+                return self._snapshot(instante, []), []
+
+            if port_to_ifindex == self.port_to_ifindex:
+                # Solo se recorren las MACs que cambian (diferencias de conjuntos en C)
+                port_to_ifindex = self.port_to_ifindex
+                mac_to_ifindex = dict(self.mac_to_ifindex)
+                retiradas = self.mac_to_port.keys() - mac_to_port.keys()
+                modificadas = mac_to_port.items() - self.mac_to_port.items()
+                for mac in retiradas:
+                    mac_to_ifindex.pop(mac, None)
+                for mac, port_num in modificadas:
+                    ifindex = port_to_ifindex.get(port_num)
+                    if ifindex is None:
+                        mac_to_ifindex.pop(mac, None)
+                    else:
+                        mac_to_ifindex[mac] = ifindex
+                candidatas = retiradas.union(mac for mac, _ in modificadas)
+            else:
+                # Cambió el mapeo portNum -> ifIndex: se recalcula el índice completo
+                mac_to_ifindex = {}
+                for mac, port_num in mac_to_port.items():
+                    ifindex = port_to_ifindex.get(port_num)
+                    if ifindex is not None:
+                        mac_to_ifindex[mac] = ifindex
+                candidatas = self.mac_to_ifindex.keys() | mac_to_ifindex.keys()
+
+            cambios = []
+            ifindex_to_macs = dict(self.ifindex_to_macs)
+            for mac in sorted(candidatas):
+                anterior = self.mac_to_ifindex.get(mac)
+                actual = mac_to_ifindex.get(mac)
+                if actual == anterior:
+                    continue
+                if anterior is not None:
+                    self._retirar(ifindex_to_macs, anterior, mac)
+                if actual is not None:
+                    ifindex_to_macs[actual] = ifindex_to_macs.get(actual, []) + [mac]
+                if anterior is None:
+                    tipo = CAMBIO_NUEVA
+                elif actual is None:
+                    tipo = CAMBIO_ENVEJECIDA
+                else:
+                    tipo = CAMBIO_MOVIDA
+                cambios.append(CambioFDB(self.switch, tipo, mac, actual, anterior, instante))
+
+            self.mac_to_port = mac_to_port
+            self.port_to_ifindex = port_to_ifindex
+            self.mac_to_ifindex = mac_to_ifindex
+            self.ifindex_to_macs = ifindex_to_macs
+            if not self.inicializada:
+                self.inicializada = True
+                cambios = []
+            return self._snapshot(instante, cambios), cambios
+
+    @staticmethod
+    def _retirar(ifindex_to_macs: Dict[int, List[str]], ifindex: int, mac: str) -> None:
+        macs = [m for m in ifindex_to_macs.get(ifindex, []) if m != mac]
+        if macs:
+            ifindex_to_macs[ifindex] = macs
+        else:
+            ifindex_to_macs.pop(ifindex, None)
+
+    def _snapshot(self, instante: float, cambios: List[CambioFDB]) -> Dict:
+        return {
+            'timestamp': instante,
+            'mac_to_port': self.mac_to_port,
+            'port_to_ifindex': self.port_to_ifindex,
+            'mac_to_ifindex': self.mac_to_ifindex,
+            'ifindex_to_macs': self.ifindex_to_macs,
+            'mac_to_vlan': self.mac_to_vlan,
+            'cambios': cambios,
+        }
+
+    def obtener_estadisticas(self) -> Dict:
+        with self.lock:
+            return {
+                'macs': len(self.mac_to_ifindex),
+                'puertos_con_mac': len(self.ifindex_to_macs),
+                'aplicaciones': self.aplicaciones,
+                'sin_cambios': self.sin_cambios,
+            }
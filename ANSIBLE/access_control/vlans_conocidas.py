@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Registro de las VLANs que ya existen en cada switch.
+Se siembra con un walk de la tabla de VLANs de CISCO-VTP-MIB (vtpVlanState) y se
+actualiza cuando una VLAN creada por vlan_config.yml aparece operativa. Con él, la
+conexión de un equipo a una VLAN existente no vuelve a ejecutar vlan_config.yml ni sus
+esperas de estabilización, y una VLAN nueva se espera consultando su estado por SNMP
+en lugar de con esperas fijas. En el aprovisionamiento por lotes, las VLANs registradas
+no generan bloques de VLAN ni de interfaz Vlan.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+# Agregar el directorio raíz al sys.path
+sys.path.append(os.path.abspath("/home/tdg2025/Escritorio/TDGRedes/ANSIBLE"))
+
+from access_control.snmp_utils import log, snmp_walk_async, INTERVALO_SONDEO_MIN, FACTOR_BACKOFF_SONDEO
+from access_control.snmp_nativo import TIPOS_EXCEPCION
+from access_control import metricas
+
+OID_VTP_VLAN_STATE = "1.3.6.1.4.1.9.9.46.1.3.1.1.2"  # vtpVlanState (índice: dominio de gestión, VLAN)
+ESTADO_VLAN_OPERATIVA = 1  # operational(1)
+INTERVALO_SONDEO_VLAN_MAX = 2  # segundos entre consultas mientras se espera una VLAN nueva
+TIMEOUT_VLAN_OPERATIVA = 20  # segundos; lo mismo que las esperas fijas que sustituye
+
+vlans_por_switch = {}  # switch -> set de VLANs operativas
+vlans_lock = threading.Lock()
+
+metrica_omitidas = metricas.contador(
+    "vlans_creaciones_omitidas_total", "Conexiones a una VLAN ya existente que no ejecutan vlan_config.yml")
+metrica_espera = metricas.histograma_etiquetado(
+    "vlans_espera_operativa_segundos", "Espera hasta ver operativa una VLAN recién creada", ("resultado",))
+
+def _parsear_tabla_vlans(varbinds) -> Set[int]:
+    """VLANs en estado operativo a partir del walk de vtpVlanState."""
+    return {vb.oid[-1] for vb in varbinds
+            if vb.tipo not in TIPOS_EXCEPCION and vb.valor == ESTADO_VLAN_OPERATIVA}
+
+async def leer_vlans_switch(switch_ip: str, community: str = "proyectoTDG") -> Optional[Set[int]]:
+    """
+    Lee las VLANs operativas del switch y las guarda en el registro.
+
+    Returns:
+        set o None si la consulta falla o el switch no ofrece CISCO-VTP-MIB (tabla vacía:
+        un switch con la tabla siempre tiene al menos la VLAN 1).
+    """
+    varbinds = await snmp_walk_async(switch_ip, OID_VTP_VLAN_STATE, community)
+    vlans = _parsear_tabla_vlans(varbinds) if varbinds else set()
+    if not vlans:
+        return None
+    with vlans_lock:
+        vlans_por_switch[switch_ip] = vlans
+    return vlans
+
+async def sembrar_registro(switches: Iterable[str], community: str = "proyectoTDG") -> None:
+    """Lee en paralelo la tabla de VLANs de los switches (arranque del daemon)."""
+    switches = list(switches)
+    leidas = await asyncio.gather(*(leer_vlans_switch(ip, community) for ip in switches))
+    sin_tabla = [ip for ip, vlans in zip(switches, leidas) if vlans is None]
+    log(f"Registro de VLANs: {len(switches) - len(sin_tabla)}/{len(switches)} switches leídos"
+        f"{' (sin tabla de VLANs: ' + ', '.join(sin_tabla) + ')' if sin_tabla else ''}", "INFO")
+
+def registrar_vlan(switch_ip: str, vlan_id) -> None:
+    with vlans_lock:
+        vlans_por_switch.setdefault(switch_ip, set()).add(int(vlan_id))
+
+async def vlan_existente(switch_ip: str, vlan_id, community: str = "proyectoTDG") -> bool:
+    """
+    True si la VLAN ya existe en el switch. Un switch que aún no está en el registro
+    (modo stdin, o arranque sin respuesta SNMP) se lee una vez antes de decidir.
+    """
+    with vlans_lock:
+        vlans = vlans_por_switch.get(switch_ip)
+    if vlans is None:
+        vlans = await leer_vlans_switch(switch_ip, community)
+        if vlans is None:
+            # Sin tabla de VLANs no se vuelve a consultar en cada conexión
+            with vlans_lock:
+                vlans = vlans_por_switch.setdefault(switch_ip, set())
+    existe = int(vlan_id) in vlans
+    if existe:
+        metrica_omitidas.incrementar()
+    return existe
+
+async def esperar_vlan_operativa(switch_ip: str, vlan_id, community: str = "proyectoTDG",
+                                 timeout: float = TIMEOUT_VLAN_OPERATIVA) -> bool:
+    """
+    Consulta la tabla de VLANs con espera creciente hasta ver la VLAN operativa. Si el
+    switch no ofrece la tabla se agota el plazo, como con las antiguas esperas fijas.
+
+    Returns:
+        bool: True si la VLAN quedó operativa dentro del plazo.
+    """
+    inicio = time.monotonic()
+    intervalo = INTERVALO_SONDEO_MIN
+    while True:
+        vlans = await leer_vlans_switch(switch_ip, community)
+        if vlans is not None and int(vlan_id) in vlans:
+            metrica_espera.observar(time.monotonic() - inicio, "operativa")
+            return True
+        restante = timeout - (time.monotonic() - inicio)
+        if restante <= 0:
+            metrica_espera.observar(time.monotonic() - inicio, "timeout")
+            return False
+        await asyncio.sleep(min(intervalo, restante))
+        intervalo = min(intervalo * FACTOR_BACKOFF_SONDEO, INTERVALO_SONDEO_VLAN_MAX)
+
+def obtener_estadisticas_vlans() -> Dict:
+    with vlans_lock:
+        por_switch = {ip: sorted(vlans) for ip, vlans in vlans_por_switch.items()}
+    return {
+        'switches': len(por_switch),
+        'vlans': sum(len(vlans) for vlans in por_switch.values()),
+        'creaciones_omitidas': metrica_omitidas.valor,
+        'por_switch': por_switch,
+    }
@@ -0,0 +1,52 @@
+"""Pruebas del antirrebote de eventos de enlace y de su reflejo en el diario de eventos."""
+
+import asyncio
+
+from access_control import snmptrap_handler as manejador
+from access_control.antirrebote import AntirrebotePuertos
+
+CLAVE = ("192.0.2.10", "10001")
+
+class DiarioPrueba:
+    def __init__(self):
+        self.etapas = []
+
+    def registrar_etapa(self, id_evento, etapa, **datos):
+        self.etapas.append((id_evento, etapa, datos))
+
+def test_notificar_indica_si_cancela_el_trabajo_anterior():
+    async def escenario():
+        antirrebote = AntirrebotePuertos(ventana=0.01)
+        aplicando = asyncio.Event()
+        seguir = asyncio.Event()
+
+        async def trabajo_largo():
+            antirrebote.marcar_aplicando(CLAVE)
+            aplicando.set()
+            await seguir.wait()
+
+        async def trabajo():
+            pass
+
+        primero = antirrebote.notificar(CLAVE, "conectar", trabajo)
+        en_ventana = antirrebote.notificar(CLAVE, "desconectar", trabajo_largo)
+        await aplicando.wait()
+        durante_aplicacion = antirrebote.notificar(CLAVE, "conectar", trabajo)
+        seguir.set()
+        await asyncio.sleep(0.05)
+        return primero, en_ventana, durante_aplicacion
+
+    assert asyncio.run(escenario()) == (False, True, False)
+
+def test_solo_se_sustituye_el_evento_cuyo_trabajo_se_cancela(monkeypatch):
+    diario = DiarioPrueba()
+    monkeypatch.setattr(manejador, "diario", diario)
+    monkeypatch.setattr(manejador, "eventos_puerto", {})
+
+    manejador._sustituir_evento_puerto(CLAVE, 1, False)
+    manejador._sustituir_evento_puerto(CLAVE, 2, False)  # el 1 ya estaba aplicando
+    assert diario.etapas == []
+
+    manejador._sustituir_evento_puerto(CLAVE, 3, True)
+    assert diario.etapas == [(2, "completado", {'resultado': "sustituido", 'por': 3})]
+    assert manejador.eventos_puerto == {CLAVE: 3}
@@ -0,0 +1,116 @@
+"""Pruebas de la generación y aplicación de lotes de aprovisionamiento."""
+
+import asyncio
+import json
+
+from access_control import aprovisionamiento, reconciliador, vlans_conocidas
+
+def test_backend_ansible_no_aplica_lotes_de_switches_fuera_del_inventario(monkeypatch):
+    ejecutados = []
+
+    async def crear_proceso(*args, **kwargs):
+        ejecutados.append(args)
+        raise AssertionError("no debe ejecutarse ansible-playbook")
+
+    monkeypatch.setattr(aprovisionamiento, "host_inventario_por_ip", lambda ip: None)
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", crear_proceso)
+    items = [{'accion': 'desconectar', 'interface_name': 'FastEthernet0/1'},
+             {'accion': 'conectar', 'interface_name': 'FastEthernet0/2', 'mac_address': '00:11:22:33:44:55',
+              'mac_addresses': ['00:11:22:33:44:55'], 'max_macs': 1, 'vlan_id': 20}]
+
+    resultados = asyncio.run(aprovisionamiento.BackendAnsible().aplicar_lote("192.0.2.10", items))
+
+    assert resultados == {'FastEthernet0/1': (False, "switch no está en el inventario"),
+                          'FastEthernet0/2': (False, "switch no está en el inventario")}
+    assert not ejecutados
+
+CONFIGURACION = """interface FastEthernet0/1
+ switchport mode access
+interface FastEthernet0/2
+ switchport access vlan 20
+ switchport mode access
+ switchport port-security
+"""
+
+class ProcesoAnsible:
+    """ansible-playbook simulado: responde con la salida del callback json."""
+
+    def __init__(self, resultado_host):
+        self.returncode = 0
+        self.salida = {'plays': [{'tasks': [{'task': {'name': "tarea"}, 'hosts': {'switch1': resultado_host}}]}],
+                       'stats': {'switch1': {'unreachable': 0}}}
+
+    async def communicate(self):
+        return json.dumps(self.salida).encode(), b""
+
+def _simular_ansible(monkeypatch):
+    ejecutados = []
+
+    async def crear_proceso(*args, **kwargs):
+        variables = json.loads(args[3])
+        ejecutados.append((args[1], variables))
+        if args[1] == aprovisionamiento.PLAYBOOK_LECTURA:
+            return ProcesoAnsible({'stdout': [CONFIGURACION, "1    default    active"]})
+        return ProcesoAnsible({'results': [{'changed': True} for _ in variables['bloques']]})
+
+    monkeypatch.setattr(aprovisionamiento, "host_inventario_por_ip", lambda ip: "switch1")
+    monkeypatch.setattr(aprovisionamiento, "cargar_variables_grupo", lambda *grupos: {'vlans_switch': []})
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", crear_proceso)
+    reconciliador.invalidar_modelo("192.0.2.10")
+    return ejecutados
+
+def test_backend_ansible_no_rebota_un_puerto_ya_limpio(monkeypatch):
+    ejecutados = _simular_ansible(monkeypatch)
+
+    resultados = asyncio.run(aprovisionamiento.BackendAnsible().aplicar_lote(
+        "192.0.2.10", [{'accion': 'desconectar', 'interface_name': 'FastEthernet0/1'}]))
+
+    assert resultados == {'FastEthernet0/1': (True, "sin cambios")}
+    assert [playbook for playbook, _ in ejecutados] == [aprovisionamiento.PLAYBOOK_LECTURA]
+    reconciliador.invalidar_modelo("192.0.2.10")
+
+def test_backend_ansible_solo_envia_las_lineas_que_faltan(monkeypatch):
+    ejecutados = _simular_ansible(monkeypatch)
+    items = [{'accion': 'desconectar', 'interface_name': 'FastEthernet0/2'}]
+
+    backend = aprovisionamiento.BackendAnsible()
+    resultados = asyncio.run(backend.aplicar_lote("192.0.2.10", items))
+    repetido = asyncio.run(backend.aplicar_lote("192.0.2.10", items))
+
+    assert resultados == {'FastEthernet0/2': (True, "ok")}
+    assert repetido == {'FastEthernet0/2': (True, "sin cambios")}
+    assert [playbook for playbook, _ in ejecutados] == [aprovisionamiento.PLAYBOOK_LECTURA,
+                                                        aprovisionamiento.PLAYBOOK_LOTE]
+    assert ejecutados[1][1]['bloques'] == [{'padre': "interface FastEthernet0/2", 'lineas': [
+        "shutdown", "no switchport access vlan", "no switchport port-security", "no shutdown"]}]
+    reconciliador.invalidar_modelo("192.0.2.10")
+
+class BackendRegistro:
+    """Backend de prueba: genera los bloques del lote frente a un switch sin configuración."""
+
+    nombre = "prueba"
+
+    def __init__(self):
+        self.bloques = []
+
+    async def aplicar_lote(self, switch_ip, items):
+        variables = {'vlans_switch': [{'id': 20, 'name': "PCs", 'vlan_ipv6_address': "2001:db8:20::1"},
+                                      {'id': 30, 'name': "VoIP", 'vlan_ipv6_address': "2001:db8:30::1"}],
+                     'router_ipv6': "2001:db8::1"}
+        self.bloques = aprovisionamiento.bloques_lote(items, variables, reconciliador.interpretar_configuracion(""))
+        return {item['interface_name']: (True, "ok") for item in items}
+
+def test_lote_no_recrea_vlans_del_registro_y_registra_las_nuevas(monkeypatch):
+    monkeypatch.setattr(vlans_conocidas, "vlans_por_switch", {"192.0.2.10": {1, 20}})
+    backend = BackendRegistro()
+
+    async def aplicar():
+        agrupador = aprovisionamiento.AgrupadorAprovisionamiento(backend, ventana=0)
+        return await asyncio.gather(
+            agrupador.solicitar("192.0.2.10", "conectar", "FastEthernet0/1", "00:11:22:33:44:55", 20),
+            agrupador.solicitar("192.0.2.10", "conectar", "FastEthernet0/2", "00:11:22:33:44:66", 30))
+
+    assert asyncio.run(aplicar()) == [(True, "ok"), (True, "ok")]
+    assert [padre for _, padre, _ in backend.bloques] == [
+        "vlan 30", "interface Vlan30", "interface FastEthernet0/1", "interface FastEthernet0/2"]
+    assert vlans_conocidas.vlans_por_switch["192.0.2.10"] == {1, 20, 30}
@@ -0,0 +1,87 @@
+"""Pruebas del cache con TTL y desalojo LRU."""
+
+import pytest
+
+from access_control import cache
+from access_control.cache import AUSENTE, CacheTTL
+
+class Reloj:
+    """Sustituye al módulo time en cache.py: el reloj monótono y el de pared avanzan juntos."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+    def time(self):
+        return self.ahora + 1.7e9
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache, "time", reloj)
+    return reloj
+
+def test_entradas_caducan_con_su_ttl(reloj):
+    c = CacheTTL("prueba", 10, ttl=5, ttl_negativo=1)
+    c.guardar("a", "MAC")
+    c.guardar("b", None)
+    reloj.ahora += 2
+    assert c.obtener("a") == "MAC"
+    assert c.obtener("b") is AUSENTE
+    reloj.ahora += 4
+    assert c.obtener("a") is AUSENTE
+    assert c.estadisticas()['expiradas'] == 2
+
+def test_entrada_negativa_solo_si_se_piden(reloj):
+    c = CacheTTL("prueba", 10, ttl=5, ttl_negativo=5)
+    c.guardar("a", None)
+    assert c.obtener("a") is None
+    assert c.obtener("a", incluir_negativas=False) is AUSENTE
+
+def test_desaloja_la_menos_usada(reloj):
+    c = CacheTTL("prueba", 2, ttl=60)
+    c.guardar("a", 1)
+    c.guardar("b", 2)
+    c.obtener("a")
+    c.guardar("c", 3)
+    assert c.obtener("b") is AUSENTE
+    assert (c.obtener("a"), c.obtener("c")) == (1, 3)
+    assert c.estadisticas()['desalojos'] == 1
+
+def test_valor_none_sin_ttl_negativo_descarta_el_anterior(reloj):
+    c = CacheTTL("prueba", 10, ttl=60, ttl_negativo=0)
+    c.guardar("a", "MAC")
+    c.guardar("a", None)  # la MAC envejeció: no debe seguir sirviéndose
+    assert c.obtener("a") is AUSENTE
+    assert len(c) == 0
+
+def test_invalidar_si(reloj):
+    c = CacheTTL("prueba", 10, ttl=60)
+    for clave in ("sw1:1", "sw1:2", "sw2:1"):
+        c.guardar(clave, clave)
+    assert c.invalidar_si(lambda clave: clave.startswith("sw1:")) == 2
+    assert [clave for clave, *_ in c.elementos()] == ["sw2:1"]
+
+def test_purgar_tras_importar_entradas_que_caducan_antes(reloj):
+    origen = CacheTTL("origen", 10, ttl=60)
+    origen.guardar("importada", "MAC1")
+    exportadas = origen.exportar()
+
+    reloj.ahora += 50
+    destino = CacheTTL("destino", 10, ttl=60)
+    destino.guardar("local", "MAC2")  # caduca 50 s después que la importada
+    assert destino.importar(exportadas) == 1
+
+    reloj.ahora += 15
+    assert destino.purgar() == 1
+    assert destino.obtener("importada") is AUSENTE
+    assert destino.obtener("local") == "MAC2"
+
+def test_importar_no_sustituye_ni_carga_caducadas(reloj):
+    c = CacheTTL("prueba", 10, ttl=60)
+    c.guardar("a", "nueva")
+    exportadas = [("a", "vieja", 0.0, reloj.time() + 30), ("b", "caducada", 0.0, reloj.time() - 1)]
+    assert c.importar(exportadas) == 0
+    assert c.obtener("a") == "nueva"
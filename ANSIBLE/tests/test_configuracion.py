@@ -0,0 +1,20 @@
+"""Pruebas de la carga y recarga del archivo de configuración."""
+
+import json
+
+from access_control import configuracion
+
+def escribir(ruta, dispositivos):
+    datos = json.load(open(configuracion.CONFIG_FILE))
+    datos['dispositivos_por_ip'] = dispositivos
+    ruta.write_text(json.dumps(datos))
+    return str(ruta)
+
+def test_cada_ruta_tiene_su_configuracion(tmp_path):
+    primera = escribir(tmp_path / "a.json", {"192.0.2.1": "SW-A"})
+    segunda = escribir(tmp_path / "b.json", {"192.0.2.2": "SW-B", "192.0.2.3": "SW-C"})
+
+    assert configuracion.obtener_configuracion(primera).dispositivo("192.0.2.1") == "SW-A"
+    assert configuracion.obtener_configuracion(segunda).dispositivo("192.0.2.1") == "DESCONOCIDO"
+    assert configuracion.obtener_configuracion(segunda).dispositivo("192.0.2.2") == "SW-B"
+    assert configuracion.obtener_configuracion(primera).dispositivo("192.0.2.2") == "DESCONOCIDO"
@@ -0,0 +1,62 @@
+"""Pruebas del diario de eventos: recuperación al arrancar y rotación."""
+
+import json
+import time
+
+from access_control.diario import (DiarioEventos, leer_registros, traps_del_diario, ETAPA_RECIBIDO,
+                                   ETAPA_RESUELTO, ETAPA_APLICANDO, ETAPA_COMPLETADO)
+
+def escribir(ruta, registros, cola=""):
+    ruta.write_text("".join(json.dumps(r) + "\n" for r in registros) + cola)
+    return str(ruta)
+
+def test_recupera_los_eventos_sin_completar(tmp_path):
+    ahora = time.time()
+    ruta = escribir(tmp_path / "eventos.diario", [
+        {'id': 1, 'etapa': ETAPA_RECIBIDO, 't': ahora, 'trap': "trap-1"},
+        {'id': 2, 'etapa': ETAPA_RECIBIDO, 't': ahora, 'trap': "trap-2"},
+        {'id': 3, 'etapa': ETAPA_RECIBIDO, 't': ahora, 'trap': "trap-3"},
+        {'id': 1, 'etapa': ETAPA_COMPLETADO, 't': ahora, 'resultado': "ok"},
+        {'id': 2, 'etapa': ETAPA_RESUELTO, 't': ahora},
+        {'id': 2, 'etapa': ETAPA_APLICANDO, 't': ahora},
+    ], cola='{"id": 4, "etapa": "recib')  # última línea cortada por una caída
+
+    diario = DiarioEventos(ruta)
+    assert diario.recuperar() == [(2, "trap-2", ETAPA_APLICANDO), (3, "trap-3", ETAPA_RECIBIDO)]
+    assert diario.ultimo_id == 3
+    assert diario.registrar_recibido("trap-4") == 4
+
+def test_eventos_antiguos_se_completan_como_caducados(tmp_path):
+    ahora = time.time()
+    ruta = escribir(tmp_path / "eventos.diario", [
+        {'id': 1, 'etapa': ETAPA_RECIBIDO, 't': ahora - 601, 'trap': "viejo"},
+        {'id': 2, 'etapa': ETAPA_RECIBIDO, 't': ahora - 10, 'trap': "reciente"},
+    ])
+    diario = DiarioEventos(ruta)
+    assert diario.recuperar() == [(2, "reciente", ETAPA_RECIBIDO)]
+    diario.iniciar()
+    diario.cerrar()
+
+    assert DiarioEventos(ruta).recuperar() == [(2, "reciente", ETAPA_RECIBIDO)]
+    completados = [r for r in leer_registros(ruta) if r['etapa'] == ETAPA_COMPLETADO]
+    assert [(r['id'], r['resultado']) for r in completados] == [(1, "caducado")]
+
+def test_la_rotacion_conserva_los_pendientes(tmp_path):
+    ruta = str(tmp_path / "eventos.diario")
+    diario = DiarioEventos(ruta, max_bytes=2000, copias=2)
+    diario.recuperar()
+    diario.iniciar()
+    ids = [diario.registrar_recibido(f"trap-{i}") for i in range(60)]
+    for id_evento in ids:
+        if id_evento % 3:
+            diario.registrar_etapa(id_evento, ETAPA_COMPLETADO, resultado="ok")
+    assert diario.esperar_persistido(ids[-1])
+    diario.cerrar()
+
+    assert (tmp_path / "eventos.diario.1").exists()
+    pendientes = [(id_evento, f"trap-{id_evento - 1}", ETAPA_RECIBIDO) for id_evento in ids if id_evento % 3 == 0]
+    assert DiarioEventos(ruta).recuperar() == pendientes
+    # Los eventos reescritos al rotar no se repiten al reproducir el diario
+    traps = traps_del_diario(ruta, copias=2)
+    assert len(traps) == len(set(traps))
+    assert traps[-1] == "trap-59"
@@ -0,0 +1,69 @@
+"""Pruebas del planificador de trabajos de puerto: prioridades y reparto por switch."""
+
+import asyncio
+
+from access_control.planificador import (PlanificadorTrabajos, PRIORIDAD_LIMPIEZA, PRIORIDAD_CONEXION,
+                                         PRIORIDAD_FONDO)
+
+async def orden_de_atencion(planificador, trabajos):
+    """Encola `trabajos` (clase, switch, nombre) con el único hueco ocupado y devuelve el orden de turno."""
+    orden = []
+    liberar = asyncio.Event()
+
+    async def ocupar():
+        async with planificador.turno(PRIORIDAD_CONEXION, "ocupante"):
+            await liberar.wait()
+
+    async def trabajo(clase, switch, nombre):
+        async with planificador.turno(clase, switch):
+            orden.append(nombre)
+            await asyncio.sleep(0)
+
+    ocupante = asyncio.create_task(ocupar())
+    await asyncio.sleep(0)
+    tareas = []
+    for clase, switch, nombre in trabajos:
+        tareas.append(asyncio.create_task(trabajo(clase, switch, nombre)))
+        await asyncio.sleep(0)
+    liberar.set()
+    await asyncio.gather(ocupante, *tareas)
+    return orden
+
+def test_limpiezas_antes_que_conexiones_y_fondo():
+    trabajos = [(PRIORIDAD_FONDO, "sw1", "fondo"), (PRIORIDAD_CONEXION, "sw1", "conexion"),
+                (PRIORIDAD_LIMPIEZA, "sw1", "limpieza")]
+    orden = asyncio.run(orden_de_atencion(PlanificadorTrabajos(1), trabajos))
+    assert orden == ["limpieza", "conexion", "fondo"]
+
+def test_los_switches_se_turnan_dentro_de_una_clase():
+    trabajos = [(PRIORIDAD_CONEXION, "sw1", f"sw1-{i}") for i in range(3)]
+    trabajos += [(PRIORIDAD_CONEXION, "sw2", "sw2-0"), (PRIORIDAD_CONEXION, "sw3", "sw3-0")]
+    orden = asyncio.run(orden_de_atencion(PlanificadorTrabajos(1), trabajos))
+    assert orden == ["sw1-0", "sw2-0", "sw3-0", "sw1-1", "sw1-2"]
+
+def test_trabajo_cancelado_en_espera_no_ocupa_turno():
+    async def escenario():
+        planificador = PlanificadorTrabajos(1)
+        async with planificador.turno(PRIORIDAD_CONEXION, "sw1"):
+            espera = asyncio.create_task(planificador._adquirir(PRIORIDAD_CONEXION, "sw2"))
+            await asyncio.sleep(0)
+            assert planificador.en_espera() == 1
+            espera.cancel()
+            await asyncio.gather(espera, return_exceptions=True)
+            assert planificador.en_espera() == 0
+        return planificador.obtener_estadisticas()
+
+    estadisticas = asyncio.run(escenario())
+    assert estadisticas['en_curso'] == 0
+    assert estadisticas['atendidos'][PRIORIDAD_CONEXION] == 1
+
+def test_sin_espera_mientras_haya_huecos():
+    async def escenario():
+        planificador = PlanificadorTrabajos(2)
+        async with planificador.turno(PRIORIDAD_FONDO, "sw1"):
+            async with planificador.turno(PRIORIDAD_FONDO, "sw1"):
+                return planificador.obtener_estadisticas()
+
+    estadisticas = asyncio.run(escenario())
+    assert estadisticas['en_curso'] == 2
+    assert estadisticas['en_espera'][PRIORIDAD_FONDO] == 0
@@ -0,0 +1,40 @@
+"""Pruebas de la reducción de los lotes frente a la configuración en ejecución."""
+
+from access_control.reconciliador import estado_configurado, interpretar_configuracion, lineas_puerto
+
+CONFIGURACION = """interface FastEthernet0/1
+ switchport access vlan 20
+ switchport mode access
+ switchport port-security maximum 2
+ switchport port-security
+ switchport port-security mac-address 0011.2233.4455
+ switchport port-security mac-address 0011.2233.4466
+ switchport port-security violation restrict
+"""
+
+def conectar(*macs, maximo=1, vlan=20):
+    return {'accion': 'conectar', 'interface_name': 'FastEthernet0/1', 'mac_address': macs[0],
+            'mac_addresses': list(macs), 'max_macs': maximo, 'vlan_id': vlan}
+
+def test_macs_sobrantes_se_retiran_antes_de_bajar_el_maximo():
+    estado = interpretar_configuracion(CONFIGURACION).estado_puerto("FastEthernet0/1")
+    lineas = lineas_puerto(conectar("00:11:22:33:44:77"), estado)
+    assert lineas == ["no switchport port-security mac-address 0011.2233.4455",
+                      "no switchport port-security mac-address 0011.2233.4466",
+                      "switchport port-security maximum 1",
+                      "switchport port-security mac-address 00:11:22:33:44:77"]
+
+def test_puerto_ya_configurado_no_genera_lineas():
+    estado = interpretar_configuracion(CONFIGURACION).estado_puerto("FastEthernet0/1")
+    assert lineas_puerto(conectar("00:11:22:33:44:55", "00:11:22:33:44:66", maximo=2), estado) == []
+
+def test_puerto_sin_configurar_recibe_la_configuracion_completa():
+    lineas = lineas_puerto(conectar("00:11:22:33:44:55"), estado_configurado(""))
+    assert lineas == ["switchport mode access", "switchport access vlan 20", "switchport port-security",
+                      "switchport port-security mac-address 00:11:22:33:44:55",
+                      "switchport port-security violation restrict"]
+
+def test_desconectar_limpia_y_rebota_el_puerto():
+    estado = interpretar_configuracion(CONFIGURACION).estado_puerto("FastEthernet0/1")
+    assert lineas_puerto({'accion': 'desconectar', 'interface_name': 'FastEthernet0/1'}, estado) == [
+        "shutdown", "no switchport access vlan", "no switchport port-security", "no shutdown"]
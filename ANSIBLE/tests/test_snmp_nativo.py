@@ -0,0 +1,201 @@
+"""
+Pruebas del motor SNMP nativo contra un agente UDP local de prueba (asyncio).
+Cada prueba se ejecuta con el cliente síncrono y con el asíncrono.
+"""
+
+import asyncio
+import bisect
+import socket
+import threading
+
+import pytest
+
+from access_control.snmp_nativo import (ClienteSNMP, ClienteSNMPAsync, ErrorSNMP, VarBind, codificar_mensaje,
+                                        decodificar_mensaje, oid_a_tupla, _tlv, _codificar_entero,
+                                        PDU_GET, PDU_GETNEXT, PDU_GETBULK, PDU_RESPONSE, TAG_SEQUENCE,
+                                        TAG_OCTET_STRING, TAG_OID, TAG_NULL)
+
+BASE = oid_a_tupla("1.3.6.1.2.1.17.4.3.1.2")
+VALORES = {BASE + (0, 17, 34, 51, 68, i): VarBind(BASE + (0, 17, 34, 51, 68, i), "INTEGER", i) for i in range(1, 8)}
+FUERA = oid_a_tupla("1.3.6.1.2.1.17.7.1.2.2.1.2.1")
+VALORES[FUERA] = VarBind(FUERA, "INTEGER", 99)
+
+class AgentePrueba(asyncio.DatagramProtocol):
+    """Agente SNMP mínimo; `modo` simula pérdidas, respuestas ajenas, errores y datagramas corruptos."""
+
+    def __init__(self):
+        self.valores = dict(VALORES)
+        self.oids = sorted(self.valores)
+        self.modo = "normal"
+        self.peticiones = []
+        self.transporte = None
+
+    def connection_made(self, transporte):
+        self.transporte = transporte
+
+    def _siguientes(self, oid, cantidad):
+        resultado = []
+        posicion = bisect.bisect_right(self.oids, oid)
+        for _ in range(cantidad):
+            if posicion >= len(self.oids):
+                resultado.append(VarBind(oid, "endOfMibView", None))
+                break
+            resultado.append(self.valores[self.oids[posicion]])
+            if self.modo != "no_creciente":
+                posicion += 1
+        return resultado
+
+    def _enviar(self, mensaje, request_id, varbinds, error_status, origen):
+        self.transporte.sendto(codificar_mensaje(mensaje['version'], mensaje['community'], PDU_RESPONSE,
+                                                 request_id, varbinds, error_status, 1 if error_status else 0),
+                               origen)
+
+    def datagram_received(self, datos, origen):
+        mensaje = decodificar_mensaje(datos)
+        self.peticiones.append(mensaje)
+        if self.modo == "silencio" or (self.modo == "pierde_primera" and len(self.peticiones) == 1):
+            return
+        tipo = mensaje['tipo_pdu']
+        if tipo == PDU_GET:
+            varbinds = [self.valores.get(vb.oid, VarBind(vb.oid, "noSuchObject", None)) for vb in mensaje['varbinds']]
+        elif tipo == PDU_GETNEXT:
+            varbinds = [self._siguientes(vb.oid, 1)[0] for vb in mensaje['varbinds']]
+        else:
+            varbinds = self._siguientes(mensaje['varbinds'][0].oid, mensaje['error_index'])
+        request_id = mensaje['request_id']
+        if self.modo == "request_id_ajeno":
+            self._enviar(mensaje, request_id + 1, [VarBind(FUERA, "INTEGER", -1)], 0, origen)
+        if self.modo == "malformado":
+            self.transporte.sendto(b"\x30\x82\xff\xff\x02\x01", origen)
+            self.transporte.sendto(respuesta_oid_truncado(request_id), origen)
+        self._enviar(mensaje, request_id, varbinds, 2 if self.modo == "error" else 0, origen)
+
+def respuesta_oid_truncado(request_id: int) -> bytes:
+    """Respuesta con el request-id correcto pero un OID cuyo último byte tiene el bit de continuación."""
+    varbind = _tlv(TAG_SEQUENCE, _tlv(TAG_OID, b"\x2b\x06\x81") + _tlv(TAG_NULL, b""))
+    pdu = _tlv(PDU_RESPONSE, _codificar_entero(request_id) + _codificar_entero(0) + _codificar_entero(0)
+               + _tlv(TAG_SEQUENCE, varbind))
+    return _tlv(TAG_SEQUENCE, _codificar_entero(1) + _tlv(TAG_OCTET_STRING, b"public") + pdu)
+
+@pytest.fixture
+def agente():
+    """Agente en un event loop propio (thread), compartido por el cliente síncrono y el asíncrono."""
+    loop = asyncio.new_event_loop()
+    hilo = threading.Thread(target=loop.run_forever, daemon=True)
+    hilo.start()
+    transporte, protocolo = asyncio.run_coroutine_threadsafe(
+        loop.create_datagram_endpoint(AgentePrueba, local_addr=("127.0.0.1", 0)), loop).result(5)
+    protocolo.puerto = transporte.get_extra_info("sockname")[1]
+    yield protocolo
+    loop.call_soon_threadsafe(transporte.close)
+    loop.call_soon_threadsafe(loop.stop)
+    hilo.join(5)
+    loop.close()
+
+@pytest.fixture(params=["sincrono", "asincrono"])
+def consultar(request, agente):
+    """Ejecuta una operación del cliente (síncrono o asíncrono) contra el agente."""
+    def ejecutar(operacion, *args, timeout=0.3, reintentos=1, **kwargs):
+        clase = ClienteSNMP if request.param == "sincrono" else ClienteSNMPAsync
+        cliente = clase(community="public", puerto=agente.puerto, timeout=timeout, reintentos=reintentos)
+        resultado = getattr(cliente, operacion)("127.0.0.1", *args, **kwargs)
+        if asyncio.iscoroutine(resultado):
+            return asyncio.run(resultado)
+        return resultado
+    return ejecutar
+
+def test_get(consultar):
+    primero = BASE + (0, 17, 34, 51, 68, 1)
+    varbinds = consultar("get", [primero, BASE + (9,)])
+    assert varbinds[0] == VarBind(primero, "INTEGER", 1)
+    assert varbinds[1].tipo == "noSuchObject"
+
+def test_get_next(consultar):
+    varbinds = consultar("get_next", [BASE])
+    assert varbinds == [VALORES[BASE + (0, 17, 34, 51, 68, 1)]]
+
+def test_get_bulk(consultar, agente):
+    varbinds = consultar("get_bulk", BASE, 3)
+    assert [vb.valor for vb in varbinds] == [1, 2, 3]
+    assert agente.peticiones[-1]['tipo_pdu'] == PDU_GETBULK
+    assert agente.peticiones[-1]['error_index'] == 3
+
+def test_walk_recorre_el_subarbol_en_varias_peticiones(consultar, agente):
+    varbinds = consultar("walk", BASE, 3)
+    assert [vb.valor for vb in varbinds] == list(range(1, 8))
+    assert len(agente.peticiones) == 3
+
+def test_walk_hasta_el_final_de_la_mib(consultar):
+    assert [vb.valor for vb in consultar("walk", FUERA[:-1])] == [99]
+
+def test_walk_con_oid_no_creciente(consultar, agente):
+    agente.modo = "no_creciente"
+    with pytest.raises(ErrorSNMP, match="no creciente"):
+        consultar("walk", BASE, 3)
+
+def test_timeout_tras_agotar_reintentos(consultar, agente):
+    agente.modo = "silencio"
+    with pytest.raises(ErrorSNMP, match="Timeout"):
+        consultar("get", [BASE], timeout=0.1, reintentos=2)
+    assert len(agente.peticiones) == 3
+
+def test_reintento_tras_perder_la_primera_respuesta(consultar, agente):
+    agente.modo = "pierde_primera"
+    assert consultar("get_next", [BASE], timeout=0.2)[0].valor == 1
+    assert len(agente.peticiones) == 2
+    assert agente.peticiones[0]['request_id'] == agente.peticiones[1]['request_id']
+
+def test_respuesta_con_request_id_ajeno_se_ignora(consultar, agente):
+    agente.modo = "request_id_ajeno"
+    assert consultar("get_next", [BASE])[0].valor == 1
+    assert len(agente.peticiones) == 1
+
+def test_datagramas_malformados_se_ignoran(consultar, agente):
+    agente.modo = "malformado"
+    assert consultar("get_next", [BASE])[0].valor == 1
+    assert len(agente.peticiones) == 1
+
+def test_error_status_del_agente(consultar, agente):
+    agente.modo = "error"
+    with pytest.raises(ErrorSNMP, match="Error SNMP 2"):
+        consultar("get", [BASE])
+
+@pytest.mark.parametrize("clase", [ClienteSNMP, ClienteSNMPAsync])
+def test_puerto_sin_agente(clase):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        puerto = sock.getsockname()[1]
+    cliente = clase(community="public", puerto=puerto, timeout=0.2, reintentos=1)
+    with pytest.raises(ErrorSNMP):
+        resultado = cliente.get("127.0.0.1", [BASE])
+        if asyncio.iscoroutine(resultado):
+            asyncio.run(resultado)
+
+@pytest.mark.parametrize("tipo, valor", [
+    ("INTEGER", -129), ("INTEGER", 2 ** 31 - 1), ("OCTET STRING", b"\x00\x11\x22"), ("OID", (1, 3, 6, 1, 4, 1, 9)),
+    ("IpAddress", "10.0.0.1"), ("Counter32", 2 ** 32 - 1), ("Gauge32", 0), ("Timeticks", 123456),
+    ("Counter64", 2 ** 64 - 1), ("NULL", None),
+])
+def test_codificacion_ida_y_vuelta(tipo, valor):
+    oid = oid_a_tupla("1.3.6.1.2.1.1.1.0")
+    mensaje = decodificar_mensaje(codificar_mensaje(1, "public", PDU_GET, 1234, [VarBind(oid, tipo, valor)]))
+    assert mensaje['request_id'] == 1234
+    assert mensaje['varbinds'] == [VarBind(oid, tipo, valor)]
+
+def test_oid_con_subidentificadores_grandes():
+    oid = (1, 3, 6, 1, 4, 1, 2 ** 32 - 1, 128, 16383, 16384)
+    mensaje = decodificar_mensaje(codificar_mensaje(1, "public", PDU_GETNEXT, 1, [VarBind(oid, "NULL", None)]))
+    assert mensaje['varbinds'][0].oid == oid
+
+@pytest.mark.parametrize("datos", [
+    b"",
+    b"\x30",
+    b"\x02\x01\x00",
+    b"\x30\x82\xff\xff\x02\x01",
+    codificar_mensaje(1, "public", PDU_RESPONSE, 7, [VarBind(BASE, "INTEGER", 1)])[:-2],
+    respuesta_oid_truncado(7),
+    respuesta_oid_truncado(7).replace(b"\x06\x03\x2b\x06\x81", b"\x06\x00\x05\x00\x00"),
+])
+def test_mensajes_malformados_lanzan_error_snmp(datos):
+    with pytest.raises(ErrorSNMP):
+        decodificar_mensaje(datos)
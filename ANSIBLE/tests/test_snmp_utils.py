@@ -0,0 +1,38 @@
+"""Pruebas del cache de MACs y del sondeo periódico del FDB."""
+
+import asyncio
+
+from access_control import snmp_utils
+
+def test_sondeo_no_deshace_la_invalidacion_de_un_puerto():
+    clave = snmp_utils.get_cache_key("192.0.2.10", 10001, "proyectoTDG")
+    snapshot = {'ifindex_to_macs': {10001: ["00:11:22:33:44:55"]}, 'cambios': []}
+
+    async def comparar():
+        sondeo = snmp_utils.SondeoPeriodicoFDB(lambda: [])
+        snmp_utils.set_cache(clave, "00:11:22:33:44:55")
+        snmp_utils.invalidar_cache_puerto("192.0.2.10", 10001)  # linkDown posterior al walk
+        sondeo._comparar("192.0.2.10", snapshot)
+        return sondeo
+
+    sondeo = asyncio.run(comparar())
+    assert snmp_utils.consultar_cache(clave) is snmp_utils.AUSENTE
+    assert sondeo.obtener_estadisticas()['puertos_con_mac'] == 1
+
+def test_busqueda_concurrente_espera_por_el_resolvedor(monkeypatch):
+    pedidas = []
+
+    async def esperar(switch_ip, ifindex, community, ifindex_validos, plazo):
+        pedidas.append((ifindex, plazo))
+        if ifindex == 10002:
+            raise RuntimeError("switch inalcanzable")
+        return "00:11:22:33:44:55" if ifindex == 10001 else None
+
+    monkeypatch.setattr(snmp_utils, "esperar_mac_en_puerto", esperar)
+    resultados = snmp_utils.buscar_mac_concurrente([
+        {'switch_ip': "192.0.2.10", 'ifindex': 10001, 'plazo': 5},
+        {'switch_ip': "192.0.2.10", 'ifindex': 10002},
+        {'switch_ip': "192.0.2.10", 'ifindex': 10003, 'request_id': "pc-3"},
+    ])
+    assert resultados == {"192.0.2.10:10001": "00:11:22:33:44:55", "192.0.2.10:10002": None, "pc-3": None}
+    assert sorted(pedidas) == [(10001, 5), (10002, None), (10003, None)]
@@ -0,0 +1,73 @@
+"""Pruebas del reparto de switches entre workers y del traspaso al caer un worker."""
+
+import asyncio
+
+from access_control.diario import DiarioEventos, ETAPA_COMPLETADO, leer_registros
+from access_control.registro import EscritorLog
+from access_control.supervisor import AnilloConsistente, SupervisorTraps, clave_switch, ruta_worker
+
+SWITCHES = [f"10.0.{i // 250}.{i % 250 + 1}" for i in range(1000)]
+
+def reparto(anillo):
+    return {ip: anillo.nodo(ip) for ip in SWITCHES}
+
+def test_reparto_estable_y_uniforme():
+    anillo = AnilloConsistente(range(4))
+    asignacion = reparto(anillo)
+    assert asignacion == reparto(AnilloConsistente([3, 1, 0, 2]))
+    por_worker = [list(asignacion.values()).count(i) for i in range(4)]
+    assert min(por_worker) > 150
+
+def test_al_retirar_un_worker_solo_se_mueven_sus_switches():
+    anillo = AnilloConsistente(range(4))
+    antes = reparto(anillo)
+    anillo.retirar(2)
+    despues = reparto(anillo)
+    assert 2 not in despues.values()
+    assert all(despues[ip] == worker for ip, worker in antes.items() if worker != 2)
+    anillo.agregar(2)
+    assert reparto(anillo) == antes
+
+def test_anillo_vacio_y_notaciones_de_ip():
+    assert AnilloConsistente().nodo("10.0.0.1") is None
+    assert clave_switch("::ffff:10.0.0.1") == clave_switch("10.0.0.1")
+    assert clave_switch("203F:A:B:1:0::1") == "203f:a:b:1::1"
+
+def test_rutas_propias_de_cada_worker():
+    assert ruta_worker("/logs/snmp_traps.log", 3) == "/logs/snmp_traps-worker3.log"
+    assert ruta_worker("/logs/eventos.diario", 0) == "/logs/eventos-worker0.diario"
+
+def test_escritor_de_log_cambia_de_archivo_en_marcha(tmp_path):
+    escritor = EscritorLog(str(tmp_path / "comun.log"), 1 << 20)
+    escritor.escribir("antes")
+    escritor.vaciar()
+    escritor.ruta = str(tmp_path / "comun-worker0.log")
+    escritor.escribir("despues")
+    escritor.cerrar()
+    assert "antes" in (tmp_path / "comun.log").read_text()
+    assert "despues" in (tmp_path / "comun-worker0.log").read_text()
+    assert "despues" not in (tmp_path / "comun.log").read_text()
+
+def test_eventos_pendientes_del_worker_caido_pasan_a_los_nuevos_duenos(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "eventos-worker1.diario")
+    diario = DiarioEventos(ruta)
+    diario.recuperar()
+    diario.iniciar()
+    arriba = diario.registrar_recibido("UDP: [10.0.0.1]:161->[10.0.0.9]:162\nlinkUp 1")
+    abajo = diario.registrar_recibido("UDP: [10.0.0.1]:161->[10.0.0.9]:162\nlinkDown 1")
+    hecho = diario.registrar_recibido("UDP: [10.0.0.2]:161->[10.0.0.9]:162\nlinkUp 2")
+    diario.registrar_etapa(hecho, ETAPA_COMPLETADO, resultado="ok")
+    diario.cerrar()
+
+    reenviados = []
+    monkeypatch.setattr(SupervisorTraps, "reenviar", lambda self, mensaje, ip=None: reenviados.append(mensaje) or True)
+
+    async def traspasar():
+        SupervisorTraps(2, {})._traspasar_diario(ruta)
+    asyncio.run(traspasar())
+
+    # En el orden de llegada, y el sustituto del worker ya no los reanuda
+    assert [texto.split("\n")[1] for _, texto in reenviados] == ["linkUp 1", "linkDown 1"]
+    assert DiarioEventos(ruta).recuperar() == []
+    resultados = {r['id']: r.get('resultado') for r in leer_registros(ruta) if r['etapa'] == ETAPA_COMPLETADO}
+    assert resultados == {hecho: "ok", arriba: "reasignado", abajo: "reasignado"}
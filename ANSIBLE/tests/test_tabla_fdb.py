@@ -0,0 +1,59 @@
+"""Pruebas del modelo incremental de la tabla de puente."""
+
+from access_control.tabla_fdb import TablaFDB, CAMBIO_NUEVA, CAMBIO_MOVIDA, CAMBIO_ENVEJECIDA
+
+PUERTOS = {1: 10001, 2: 10002, 3: 10003}
+A, B, C = "00:11:22:33:44:0a", "00:11:22:33:44:0b", "00:11:22:33:44:0c"
+
+def resumen(cambios):
+    return [(c.tipo, c.mac, c.ifindex, c.ifindex_anterior) for c in cambios]
+
+def test_el_primer_walk_no_produce_cambios():
+    tabla = TablaFDB("sw")
+    snapshot, cambios = tabla.aplicar({B: 1, A: 1, C: 2}, PUERTOS, instante=1.0)
+    assert cambios == [] and snapshot['cambios'] == []
+    assert snapshot['ifindex_to_macs'] == {10001: [A, B], 10002: [C]}
+    assert snapshot['mac_to_ifindex'] == {A: 10001, B: 10001, C: 10002}
+
+def test_macs_nuevas_movidas_y_envejecidas():
+    tabla = TablaFDB("sw")
+    tabla.aplicar({A: 1, B: 2}, PUERTOS)
+    snapshot, cambios = tabla.aplicar({A: 3, C: 1}, PUERTOS, instante=2.0)
+    assert resumen(cambios) == [(CAMBIO_MOVIDA, A, 10003, 10001), (CAMBIO_ENVEJECIDA, B, None, 10002),
+                                (CAMBIO_NUEVA, C, 10001, None)]
+    assert all(c.instante == 2.0 and c.switch == "sw" for c in cambios)
+    assert snapshot['ifindex_to_macs'] == {10003: [A], 10001: [C]}
+
+def test_las_macs_de_walks_anteriores_van_delante():
+    tabla = TablaFDB("sw")
+    tabla.aplicar({C: 1}, PUERTOS)
+    snapshot, _ = tabla.aplicar({C: 1, B: 1, A: 1}, PUERTOS)
+    assert snapshot['ifindex_to_macs'][10001] == [C, A, B]
+
+def test_walk_identico_reutiliza_los_indices():
+    tabla = TablaFDB("sw")
+    primero, _ = tabla.aplicar({A: 1}, PUERTOS)
+    segundo, cambios = tabla.aplicar({A: 1}, dict(PUERTOS))
+    assert cambios == []
+    assert segundo['ifindex_to_macs'] is primero['ifindex_to_macs']
+    assert tabla.obtener_estadisticas()['sin_cambios'] == 1
+
+def test_los_snapshots_publicados_no_cambian():
+    tabla = TablaFDB("sw")
+    anterior, _ = tabla.aplicar({A: 1}, PUERTOS)
+    tabla.aplicar({A: 2, B: 2}, PUERTOS)
+    assert anterior['ifindex_to_macs'] == {10001: [A]}
+
+def test_cambio_del_mapeo_de_puertos_mueve_las_macs():
+    tabla = TablaFDB("sw")
+    tabla.aplicar({A: 1, B: 2}, PUERTOS)
+    snapshot, cambios = tabla.aplicar({A: 1, B: 2}, {1: 10002, 2: 10002})
+    assert resumen(cambios) == [(CAMBIO_MOVIDA, A, 10002, 10001)]
+    assert snapshot['ifindex_to_macs'] == {10002: [B, A]}
+
+def test_mac_en_puerto_sin_ifindex_no_se_indexa():
+    tabla = TablaFDB("sw")
+    tabla.aplicar({A: 1}, PUERTOS)
+    snapshot, cambios = tabla.aplicar({A: 9}, PUERTOS)
+    assert resumen(cambios) == [(CAMBIO_ENVEJECIDA, A, None, 10001)]
+    assert snapshot['ifindex_to_macs'] == {}